@@ -0,0 +1,108 @@
+"""チャートAPIのレスポンス形式ベンチマーク（ペイロードサイズ・整形+直列化時間）
+
+    cd backend && python scripts/bench_chart_payload.py [--codes 50] [--days 245]
+
+指標計算（pandas_ta）と DB 読み出しは形式によらず共通なので除外し、
+同じ DataFrame から各形式のレスポンスボディを作るまでを計測する。
+
+- legacy:   旧実装（iterrows + 1行ずつ round）→ Pydantic 検証 → json
+- rows:     chart_rows（列単位で丸めてから zip）→ Pydantic 検証 → json
+- columnar: chart_columns（numpy 配列）→ orjson
+"""
+import argparse
+import gzip
+import json
+import sys
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+import numpy as np
+import orjson
+import pandas as pd
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.models.schemas import ChartDataResponse  # noqa: E402
+from src.services.stock_service import chart_columns, chart_rows  # noqa: E402
+
+_rows_adapter = TypeAdapter(list[ChartDataResponse])
+
+
+def _frame(days: int, seed: int) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    close = 3000 * np.exp(np.cumsum(rng.normal(0, 0.015, days)))
+    df = pd.DataFrame({
+        'date': [date(2025, 1, 1) + timedelta(days=i) for i in range(days)],
+        'open': close * (1 + rng.normal(0, 0.005, days)),
+        'high': close * 1.01,
+        'low': close * 0.99,
+        'close': close,
+        'volume': rng.integers(100_000, 5_000_000, days),
+    })
+    for length, col in ((5, 'sma5'), (25, 'sma25'), (75, 'sma75')):
+        df[col] = df['close'].rolling(length).mean()
+    std = df['close'].rolling(20).std(ddof=0)
+    mid = df['close'].rolling(20).mean()
+    df['bb_upper'], df['bb_lower'] = mid + 2 * std, mid - 2 * std
+    return df
+
+
+def _legacy_rows(df: pd.DataFrame) -> list[dict]:
+    result = []
+    for _, row in df.iterrows():
+        result.append({
+            'date': row['date'].strftime('%m/%d'),
+            'open': row['open'],
+            'high': row['high'],
+            'low': row['low'],
+            'close': row['close'],
+            'volume': int(row['volume']),
+            'sma5': round(row['sma5'], 0) if pd.notna(row.get('sma5')) else None,
+            'sma25': round(row['sma25'], 0) if pd.notna(row.get('sma25')) else None,
+            'sma75': round(row['sma75'], 0) if pd.notna(row.get('sma75')) else None,
+            'bbUpper': round(row['bb_upper'], 0) if pd.notna(row.get('bb_upper')) else None,
+            'bbLower': round(row['bb_lower'], 0) if pd.notna(row.get('bb_lower')) else None,
+        })
+    return result
+
+
+def _response_json(rows: list[dict]) -> bytes:
+    """FastAPI の response_model 経路（検証 → jsonable_encoder → JSONResponse）と同等"""
+    content = jsonable_encoder(_rows_adapter.validate_python(rows))
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(',', ':')).encode()
+
+
+FORMATS = {
+    'legacy': lambda df: _response_json(_legacy_rows(df)),
+    'rows': lambda df: _response_json(chart_rows(df)),
+    'columnar': lambda df: orjson.dumps(chart_columns(df), option=orjson.OPT_SERIALIZE_NUMPY),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--codes', type=int, default=50, help='銘柄数（1銘柄=1リクエスト）')
+    parser.add_argument('--days', type=int, default=245, help='1銘柄あたりの本数（1y ≒ 245営業日）')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    frames = [_frame(args.days, seed) for seed in range(args.codes)]
+    print(f'{args.codes} codes x {args.days} days, best of {args.repeat}')
+    print(f'{"format":<10}{"ms/chart":>10}{"bytes":>10}{"gzip":>10}')
+    for name, build in FORMATS.items():
+        best = float('inf')
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            bodies = [build(df) for df in frames]
+            best = min(best, time.perf_counter() - start)
+        size = sum(len(b) for b in bodies) / len(bodies)
+        gz = sum(len(gzip.compress(b, compresslevel=9)) for b in bodies) / len(bodies)
+        print(f'{name:<10}{best / len(frames) * 1000:>10.2f}{size:>10.0f}{gz:>10.0f}')
+    print('※ legacy/rows は ChartDataResponse に bbUpper/bbLower が無いため columnar より2系列少ない')
+
+
+if __name__ == '__main__':
+    main()
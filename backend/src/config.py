@@ -10,6 +10,14 @@ class Settings(BaseSettings):
     cors_origins: str = os.getenv('CORS_ORIGINS', '') or 'http://localhost:3847'
     mock_mode: bool = os.getenv('MOCK_MODE', 'false').lower() == 'true'
 
+    # プロファイラ（logs/profiles に保存）: リクエストは PROFILE_REQUESTS=true の間
+    # ?profile=1 / X-Profile: 1 で個別に有効化、データ更新は PROFILE_JOBS=true の間すべての実行を記録
+    profile_requests: bool = os.getenv('PROFILE_REQUESTS', 'false').lower() == 'true'
+    profile_jobs: bool = os.getenv('PROFILE_JOBS', 'false').lower() == 'true'
+
+    # この時間以上かかった SQL をパラメータ付きでログに出す（src/services/query_stats.py）
+    slow_query_ms: int = int(os.getenv('SLOW_QUERY_MS', '200'))
+
     # シグナル判定デフォルト値
     rsi_buy_threshold: int = 40
     rsi_sell_threshold: int = 60
@@ -7,6 +7,7 @@ from logging.handlers import TimedRotatingFileHandler
 from pathlib import Path
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.responses import JSONResponse
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
@@ -16,15 +17,15 @@ from apscheduler.schedulers.background import BackgroundScheduler
 from sqlalchemy import text
 
 from src.config import settings
-from src.models.database import Base, engine, SessionLocal
+from src.models.database import engine, async_engine, SessionLocal
+from src.models.migrations import run_migrations
 from src.routers import (
     stocks_router, settings_router, transactions_router,
     alerts_router, risk_router, backtests_router, brokerage_router,
-    auto_trade_router,
+    auto_trade_router, events_router, update_router, metrics_router,
 )
+from src.services import events, metrics, profiler, query_stats, update_jobs
 from src.services.stock_service import StockService
-from src.services.alert_service import AlertService
-from src.services.auto_trade_service import AutoTradeService
 
 # ロギング設定: stdout + ファイル（日次ローテーション30日保持）
 _log_fmt = logging.Formatter('%(asctime)s [%(levelname)s] %(message)s')
@@ -136,33 +137,16 @@ def _auto_trade_not_run_today() -> bool:
         db.close()
 
 
-def scheduled_update():
-    """定期更新ジョブ"""
-    logger.info("=== Scheduled update started ===")
-    db = SessionLocal()
-    try:
-        service = StockService(db)
-        service.update_all_stocks()
-        logger.info("Stock data updated successfully")
-
-        alert_service = AlertService(db)
-        alert_service.check_alerts()
-        logger.info("Alert check completed")
-
-        auto_trade_service = AutoTradeService(db)
-        auto_config = auto_trade_service.get_config()
-        logger.info(f"Auto-trade config: enabled={auto_config['enabled']}, dryRun={auto_config['dryRun']}")
-        auto_trade_service.process_auto_trades()
-        logger.info("Auto-trade processing completed")
-    except Exception as e:
-        logger.error(f"Scheduled update failed: {e}", exc_info=True)
-    finally:
-        db.close()
-    logger.info("=== Scheduled update finished ===")
+def scheduled_update(source: str = 'schedule'):
+    """定期更新ジョブ（更新ジョブ管理に全段の実行を要求するだけで、完了は待たない）"""
+    run = update_jobs.manager.trigger(update_jobs.FULL, source)
+    logger.info(f"[{source}] Update requested → run #{run.id} ({run.status})")
 
 
 def watchdog_check():
     """WSLスリープ復帰対策: データが古い or 自動売買未実行なら即時更新"""
+    if update_jobs.manager.busy:
+        return
     if not _is_trading_day():
         return
     if not _should_have_run_today():
@@ -177,124 +161,16 @@ def watchdog_check():
     if no_trade:
         reason.append("no auto-trade logs today")
     logger.info(f"[watchdog] Catch-up needed: {', '.join(reason)}")
-    scheduled_update()
+    scheduled_update('watchdog')
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # 起動時
-    Base.metadata.create_all(bind=engine)
-
-    # 簡易マイグレーション: signals テーブルに新列追加
-    new_columns = [
-        ("signal_strength", "INTEGER"),
-        ("active_signals", "VARCHAR(200)"),
-        ("target_price", "FLOAT"),
-        ("stop_loss_price", "FLOAT"),
-        ("support_price", "FLOAT"),
-        ("resistance_price", "FLOAT"),
-        ("bb_upper", "FLOAT"),
-        ("bb_lower", "FLOAT"),
-        ("bb_middle", "FLOAT"),
-        ("atr", "FLOAT"),
-        ("volume_ratio", "FLOAT"),
-        ("signal_score", "FLOAT"),
-        ("stoch_k", "FLOAT"),
-        ("stoch_d", "FLOAT"),
-        ("williams_r", "FLOAT"),
-        ("adx", "FLOAT"),
-    ]
-    with engine.connect() as conn:
-        for col_name, col_type in new_columns:
-            try:
-                conn.execute(text(f"ALTER TABLE signals ADD COLUMN {col_name} {col_type}"))
-                logger.info(f"[migration] Added column signals.{col_name}")
-            except Exception as e:
-                err_msg = str(e).lower()
-                if "already exists" in err_msg or "duplicate column" in err_msg:
-                    pass  # 既に存在 → 正常
-                else:
-                    logger.error(f"[migration] Failed to add signals.{col_name}: {e}")
-                conn.rollback()
-        conn.commit()
-
-    # 簡易マイグレーション: 列幅拡張
-    alter_type_queries = [
-        ("ALTER TABLE signals ALTER COLUMN active_signals TYPE VARCHAR(200)", "signals.active_signals → VARCHAR(200)"),
-        ("ALTER TABLE settings ALTER COLUMN value TYPE VARCHAR(500)", "settings.value → VARCHAR(500)"),
-    ]
-    for query, desc in alter_type_queries:
-        with engine.connect() as conn:
-            try:
-                conn.execute(text(query))
-                conn.commit()
-                logger.info(f"[migration] Expanded {desc}")
-            except Exception as e:
-                conn.rollback()
-                err_msg = str(e).lower()
-                if "already" not in err_msg:
-                    logger.error(f"[migration] Failed to expand {desc}: {e}")
-
-    # マイグレーション検証: 必須列の存在確認
-    with engine.connect() as conn:
-        result = conn.execute(text(
-            "SELECT column_name FROM information_schema.columns "
-            "WHERE table_name = 'signals'"
-        ))
-        existing_cols = {row[0] for row in result}
-        required = {col_name for col_name, _ in new_columns}
-        missing = required - existing_cols
-        if missing:
-            logger.error(f"[migration] CRITICAL: signals table missing columns: {missing}")
-        else:
-            logger.info(f"[migration] Verified: all {len(required)} columns present")
-
-    # Phase 20 マイグレーション: 旧デフォルト値を新デフォルト値にアップグレード
-    phase20_upgrades = [
-        # (テーブル, キー列, 値列, キー, 旧デフォルト, 新デフォルト)
-        ('settings', 'key', 'value', 'investmentBudget', '50000', '1000000'),
-        ('auto_trade_config', 'key', 'value', 'maxTradesPerDay', '5', '15'),
-        ('auto_trade_config', 'key', 'value', 'takeProfitPercent', '5.0', '8.0'),
-        ('auto_trade_config', 'key', 'value', 'stopLossPercent', '-3.0', '-5.0'),
-        ('risk_rules', 'key', 'value', 'maxOpenPositions', '5', '10'),
-    ]
-    with engine.connect() as conn:
-        for table, key_col, val_col, key, old_val, new_val in phase20_upgrades:
-            try:
-                result = conn.execute(text(
-                    f"UPDATE {table} SET {val_col} = :new_val "
-                    f"WHERE {key_col} = :key AND {val_col} = :old_val"
-                ), {'new_val': new_val, 'old_val': old_val, 'key': key})
-                if result.rowcount > 0:
-                    logger.info(f"[migration/phase20] {table}.{key}: {old_val} → {new_val}")
-            except Exception as e:
-                conn.rollback()
-                logger.debug(f"[migration/phase20] {table}.{key} skip: {e}")
-        conn.commit()
-
-    # Phase 21 マイグレーション: RSI閾値を緩和（シグナル感度向上）
-    phase21_upgrades = [
-        ('settings', 'key', 'value', 'rsiBuyThreshold', '30', '40'),
-        ('settings', 'key', 'value', 'rsiBuyThreshold', '35', '40'),
-        ('settings', 'key', 'value', 'rsiSellThreshold', '70', '60'),
-        ('settings', 'key', 'value', 'rsiSellThreshold', '65', '60'),
-    ]
-    with engine.connect() as conn:
-        for table, key_col, val_col, key, old_val, new_val in phase21_upgrades:
-            try:
-                result = conn.execute(text(
-                    f"UPDATE {table} SET {val_col} = :new_val "
-                    f"WHERE {key_col} = :key AND {val_col} = :old_val"
-                ), {'new_val': new_val, 'old_val': old_val, 'key': key})
-                if result.rowcount > 0:
-                    logger.info(f"[migration/phase21] {table}.{key}: {old_val} → {new_val}")
-            except Exception as e:
-                conn.rollback()
-                logger.debug(f"[migration/phase21] {table}.{key} skip: {e}")
-        conn.commit()
+    # 起動時: テーブル作成 + 未適用マイグレーションのみ実行（schema_version で管理）
+    run_migrations(engine)
 
     # Phase 21: 銘柄自動登録（STOCK_NAMESの未登録銘柄をバルク追加）
-    from src.services.stock_service import STOCK_NAMES
+    from src.services.stock_service import STOCK_NAMES, get_stock_names, invalidate_stock_names
     with SessionLocal() as db:
         try:
             existing_codes = {row[0] for row in db.execute(text("SELECT code FROM stocks")).fetchall()}
@@ -320,132 +196,31 @@ async def lifespan(app: FastAPI):
         except Exception as e:
             db.rollback()
             logger.error(f"[migration/phase21] Stock registration failed: {e}")
+        # 銘柄名キャッシュを事前ロード（一覧系エンドポイントの名前解決用）
+        invalidate_stock_names()
+        get_stock_names(db)
+
+    # stock_latest 初回バックフィル（既存の株価・シグナル履歴から構築）
+    with SessionLocal() as db:
+        try:
+            from src.models.stock import StockLatest
+            if db.query(StockLatest.id).first() is None:
+                count = StockService(db).refresh_latest()
+                logger.info(f"[migration] Backfilled stock_latest: {count} stocks")
+        except Exception as e:
+            db.rollback()
+            logger.error(f"[migration] stock_latest backfill failed: {e}")
 
-    # Phase 22 マイグレーション: 利益率・勝率改善パラメータ
-    phase22_upgrades = [
-        # minSignalStrength: 1→2（弱いシグナルでの取引を排除）
-        ('auto_trade_config', 'key', 'value', 'minSignalStrength', '1', '2'),
-        # takeProfitPercent: 8.0→10.0（リスクリワード比 1:2 に改善）
-        ('auto_trade_config', 'key', 'value', 'takeProfitPercent', '8.0', '10.0'),
-    ]
-    with engine.connect() as conn:
-        for table, key_col, val_col, key, old_val, new_val in phase22_upgrades:
-            try:
-                result = conn.execute(text(
-                    f"UPDATE {table} SET {val_col} = :new_val "
-                    f"WHERE {key_col} = :key AND {val_col} = :old_val"
-                ), {'new_val': new_val, 'old_val': old_val, 'key': key})
-                if result.rowcount > 0:
-                    logger.info(f"[migration/phase22] {table}.{key}: {old_val} → {new_val}")
-            except Exception as e:
-                conn.rollback()
-                logger.debug(f"[migration/phase22] {table}.{key} skip: {e}")
-        conn.commit()
-
-    # Phase 23 マイグレーション: ポジション集中 + 利益率改善
-    phase23_upgrades = [
-        # maxOpenPositions: 10→5（1銘柄あたり投資額を倍増）
-        ('risk_rules', 'key', 'value', 'maxOpenPositions', '10', '5'),
-    ]
-    with engine.connect() as conn:
-        for table, key_col, val_col, key, old_val, new_val in phase23_upgrades:
-            try:
-                result = conn.execute(text(
-                    f"UPDATE {table} SET {val_col} = :new_val "
-                    f"WHERE {key_col} = :key AND {val_col} = :old_val"
-                ), {'new_val': new_val, 'old_val': old_val, 'key': key})
-                if result.rowcount > 0:
-                    logger.info(f"[migration/phase23] {table}.{key}: {old_val} → {new_val}")
-            except Exception as e:
-                conn.rollback()
-                logger.debug(f"[migration/phase23] {table}.{key} skip: {e}")
-        conn.commit()
-
-    # Phase 24 マイグレーション: 取引頻度改善（リスク緩和 + シグナル強度閾値引き下げ）
-    phase24_upgrades = [
-        ('auto_trade_config', 'key', 'value', 'minSignalStrength', '2', '1'),
-        ('risk_rules', 'key', 'value', 'maxPositionPercent', '30', '40'),
-        ('risk_rules', 'key', 'value', 'maxLossPerTrade', '10', '15'),
-        ('risk_rules', 'key', 'value', 'maxOpenPositions', '5', '10'),
-    ]
-    with engine.connect() as conn:
-        for table, key_col, val_col, key, old_val, new_val in phase24_upgrades:
-            try:
-                result = conn.execute(text(
-                    f"UPDATE {table} SET {val_col} = :new_val "
-                    f"WHERE {key_col} = :key AND {val_col} = :old_val"
-                ), {'new_val': new_val, 'old_val': old_val, 'key': key})
-                if result.rowcount > 0:
-                    logger.info(f"[migration/phase24] {table}.{key}: {old_val} → {new_val}")
-            except Exception as e:
-                conn.rollback()
-                logger.debug(f"[migration/phase24] {table}.{key} skip: {e}")
-        conn.commit()
-
-    # Phase 25 マイグレーション: 利益率改善（エントリー精度向上 + ポジション集中）
-    # Why: minSignalStrength 1→2 行は撤回。Phase 45 まで進んだ現状では強度2 buy が単元金額的に残高で買えず約定ゼロ要因となるため、SCOPE_PROGRESS.md 現行設定表どおり 1 を維持する。
-    phase25_upgrades = [
-        ('risk_rules', 'key', 'value', 'maxOpenPositions', '10', '5'),
-    ]
-    with engine.connect() as conn:
-        for table, key_col, val_col, key, old_val, new_val in phase25_upgrades:
-            try:
-                result = conn.execute(text(
-                    f"UPDATE {table} SET {val_col} = :new_val "
-                    f"WHERE {key_col} = :key AND {val_col} = :old_val"
-                ), {'new_val': new_val, 'old_val': old_val, 'key': key})
-                if result.rowcount > 0:
-                    logger.info(f"[migration/phase25] {table}.{key}: {old_val} → {new_val}")
-            except Exception as e:
-                conn.rollback()
-                logger.debug(f"[migration/phase25] {table}.{key} skip: {e}")
-        conn.commit()
-
-    # Phase 26 マイグレーション: 取引実行率・利益率の改善
-    phase26_upgrades = [
-        # maxOpenPositions: 5→8（保有上限拒否46件を解消）
-        ('risk_rules', 'key', 'value', 'maxOpenPositions', '5', '8'),
-        # maxLossPerTrade: 15→20（ATR損切り距離に適合、拒否44件を解消）
-        ('risk_rules', 'key', 'value', 'maxLossPerTrade', '15', '20'),
-        # maxPortfolioLoss: 10→15（ポートフォリオ損失許容拡大）
-        ('risk_rules', 'key', 'value', 'maxPortfolioLoss', '10', '15'),
-    ]
-    with engine.connect() as conn:
-        for table, key_col, val_col, key, old_val, new_val in phase26_upgrades:
-            try:
-                result = conn.execute(text(
-                    f"UPDATE {table} SET {val_col} = :new_val "
-                    f"WHERE {key_col} = :key AND {val_col} = :old_val"
-                ), {'new_val': new_val, 'old_val': old_val, 'key': key})
-                if result.rowcount > 0:
-                    logger.info(f"[migration/phase26] {table}.{key}: {old_val} → {new_val}")
-            except Exception as e:
-                conn.rollback()
-                logger.debug(f"[migration/phase26] {table}.{key} skip: {e}")
-        conn.commit()
-
-    # Phase 27 マイグレーション: R/R比改善 + リスクルール適正化
-    phase27_upgrades = [
-        # maxLossPerTrade: 20→10（ATR 2×ATR損切りに整合）
-        ('risk_rules', 'key', 'value', 'maxLossPerTrade', '20', '10'),
-        # maxPositionPercent: 40→50（空ポートフォリオ拒否を緩和）
-        ('risk_rules', 'key', 'value', 'maxPositionPercent', '40', '50'),
-        # maxPortfolioLoss: 15→20（損失許容を緩和し早期停止を防止）
-        ('risk_rules', 'key', 'value', 'maxPortfolioLoss', '15', '20'),
-    ]
-    with engine.connect() as conn:
-        for table, key_col, val_col, key, old_val, new_val in phase27_upgrades:
-            try:
-                result = conn.execute(text(
-                    f"UPDATE {table} SET {val_col} = :new_val "
-                    f"WHERE {key_col} = :key AND {val_col} = :old_val"
-                ), {'new_val': new_val, 'old_val': old_val, 'key': key})
-                if result.rowcount > 0:
-                    logger.info(f"[migration/phase27] {table}.{key}: {old_val} → {new_val}")
-            except Exception as e:
-                conn.rollback()
-                logger.debug(f"[migration/phase27] {table}.{key} skip: {e}")
-        conn.commit()
+    # chart_series 初回バックフィル（以降は株価更新のたびに書き直す）
+    with SessionLocal() as db:
+        try:
+            from src.models.stock import ChartSeries
+            if db.query(ChartSeries.id).first() is None:
+                count = StockService(db).refresh_chart_series()
+                logger.info(f"[migration] Backfilled chart_series: {count} stocks")
+        except Exception as e:
+            db.rollback()
+            logger.error(f"[migration] chart_series backfill failed: {e}")
 
     # 依存ライブラリチェック
     for lib in ['yfinance', 'pandas_ta', 'curl_cffi']:
@@ -482,7 +257,7 @@ async def lifespan(app: FastAPI):
             if no_trade:
                 reason.append("no auto-trade logs today")
             logger.info(f"[startup] Catch-up needed: {', '.join(reason)}")
-            scheduler.add_job(scheduled_update, id='startup_catchup')
+            scheduler.add_job(scheduled_update, args=['startup'], id='startup_catchup')
         else:
             logger.info("[startup] No catch-up needed")
     else:
@@ -490,7 +265,8 @@ async def lifespan(app: FastAPI):
 
     yield
 
-    # 終了時
+    # 終了時（SSE 接続を先に閉じないと uvicorn が接続終了を待ち続ける）
+    events.bus.close()
     scheduler.shutdown()
     logger.info("Scheduler stopped")
 
@@ -507,6 +283,19 @@ app = FastAPI(
 app.state.limiter = limiter
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 
+class _GZipMiddleware(GZipMiddleware):
+    """SSE（/api/events）は1イベントずつ即時に届ける必要があるため圧縮しない"""
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and scope['path'].startswith('/api/events'):
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+
+# レスポンス圧縮（1KB以上。チャート・一覧系のJSON向け）
+app.add_middleware(_GZipMiddleware, minimum_size=1000)
+
 # CORS設定
 origins = [o.strip() for o in settings.cors_origins.split(',') if o.strip()]
 app.add_middleware(
@@ -516,8 +305,22 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", profiler.ARTIFACT_HEADER, query_stats.QUERY_COUNT_HEADER, "Server-Timing"],
 )
 
+# リクエストごとの SQL 件数・時間（N+1 の疑いを警告、スロークエリをログ出力）
+app.add_middleware(query_stats.QueryStatsMiddleware)
+query_stats.instrument_engine(engine)
+query_stats.instrument_engine(async_engine.sync_engine)
+
+# オンデマンドプロファイラ（?profile=1 / X-Profile: 1 のリクエストのみ。logs/profiles に保存）
+app.add_middleware(profiler.ProfilerMiddleware, enabled=settings.profile_requests)
+
+# メトリクス（/metrics）: ルート別の処理時間と全 SQL の実行時間。SSE は長時間接続のため除外
+app.add_middleware(metrics.HTTPMetricsMiddleware, skip_prefixes=('/api/events',))
+metrics.instrument_engine(engine)
+metrics.instrument_engine(async_engine.sync_engine)
+
 # ルーター登録
 app.include_router(stocks_router)
 app.include_router(settings_router)
@@ -527,6 +330,9 @@ app.include_router(risk_router)
 app.include_router(backtests_router)
 app.include_router(brokerage_router)
 app.include_router(auto_trade_router)
+app.include_router(events_router)
+app.include_router(update_router)
+app.include_router(metrics_router)
 
 
 @app.get('/api/health')
@@ -545,18 +351,6 @@ def health_check():
         db.close()
 
 
-@app.post('/api/update')
-def trigger_update():
-    """手動データ更新"""
-    db = SessionLocal()
-    try:
-        service = StockService(db)
-        service.update_all_stocks()
-        return {'message': 'データを更新しました'}
-    finally:
-        db.close()
-
-
 # グレースフルシャットダウン
 def handle_sigterm(signum, frame):
     logger.info("Received SIGTERM, shutting down...")
@@ -1,4 +1,5 @@
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 from src.config import settings
 
@@ -18,6 +19,12 @@ else:
 engine = create_engine(db_url, **engine_args)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# async ルート用エンジン（SQLite は aiosqlite、PostgreSQL は psycopg3 の非同期モード）
+async_db_url = db_url.replace('sqlite://', 'sqlite+aiosqlite://', 1) if db_url.startswith('sqlite://') else db_url
+async_engine_args = {} if 'sqlite' in db_url else {'pool_pre_ping': True, 'pool_recycle': 300}
+async_engine = create_async_engine(async_db_url, **async_engine_args)
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
 
@@ -27,3 +34,8 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,140 @@
+"""バックテスト資産推移の圧縮カラムナ形式
+
+1バックテスト = 1行（backtest_curves.data）に日付・評価額・現金・ベンチマークの4列を格納する。
+レイアウト(v2): MAGIC(4) + version(1) + 総件数(uint32) + セグメント*
+    セグメント = 件数(uint32) + 圧縮長(uint32) + zlib圧縮(
+        日付差分 int32[k] + portfolio_value float64[k] + cash float64[k] + benchmark float64[k])
+日付はセグメント先頭を序数そのまま、以降は前日との差分で保持し圧縮率を上げる。
+延長実行は append_curve で末尾にセグメントを足すだけで、既存分を展開・再圧縮しない。
+旧形式(v1: 単一ブロック・ベンチマークなし)も読み込める（ベンチマークは NaN）。
+"""
+import struct
+import zlib
+from datetime import date
+
+import numpy as np
+
+MAGIC = b'EQCV'
+VERSION = 2
+_HEADER = struct.Struct('<4sBI')
+_SEGMENT = struct.Struct('<II')
+
+
+def _columns(dates, portfolio_values, cash, benchmark) -> tuple[np.ndarray, ...]:
+    n = len(dates)
+    if len(portfolio_values) != n or len(cash) != n or (benchmark is not None and len(benchmark) != n):
+        raise ValueError('系列の長さが一致しません')
+    ordinals = np.fromiter((d.toordinal() for d in dates), dtype=np.int64, count=n)
+    bench = np.full(n, np.nan) if benchmark is None else benchmark
+    return (
+        np.diff(ordinals, prepend=0).astype('<i4'),
+        np.asarray(portfolio_values, dtype='<f8'),
+        np.asarray(cash, dtype='<f8'),
+        np.asarray(bench, dtype='<f8'),
+    )
+
+
+def _segment(dates, portfolio_values, cash, benchmark) -> bytes:
+    body = zlib.compress(b''.join(c.tobytes() for c in _columns(dates, portfolio_values, cash, benchmark)), 6)
+    return _SEGMENT.pack(len(dates), len(body)) + body
+
+
+def encode_curve(dates, portfolio_values, cash, benchmark=None) -> bytes:
+    """日付・評価額・現金（・ベンチマーク）の系列をバイナリに変換"""
+    return _HEADER.pack(MAGIC, VERSION, len(dates)) + _segment(dates, portfolio_values, cash, benchmark)
+
+
+def append_curve(blob: bytes, dates, portfolio_values, cash, benchmark=None) -> bytes:
+    """既存の系列の末尾に追記（v1 は一度だけ v2 に変換する）"""
+    magic, version, n = _HEADER.unpack_from(blob)
+    if magic != MAGIC or version not in (1, VERSION):
+        raise ValueError('未対応の資産推移フォーマットです')
+    if version == 1:
+        prev = EquityCurve(blob)
+        blob = encode_curve(prev.dates, prev.portfolio_values, prev.cash)
+    if not len(dates):
+        return blob
+    return (_HEADER.pack(MAGIC, VERSION, n + len(dates)) + blob[_HEADER.size:]
+            + _segment(dates, portfolio_values, cash, benchmark))
+
+
+class EquityCurve:
+    """圧縮済み資産推移の遅延デコーダ（初回アクセス時に一度だけ展開）"""
+
+    __slots__ = ('_blob', '_version', '_n', '_ordinals', '_values', '_cash', '_benchmark')
+
+    def __init__(self, blob: bytes):
+        magic, version, n = _HEADER.unpack_from(blob)
+        if magic != MAGIC or version not in (1, VERSION):
+            raise ValueError('未対応の資産推移フォーマットです')
+        self._blob = blob
+        self._version = version
+        self._n = n
+        self._ordinals = None
+        self._values = None
+        self._cash = None
+        self._benchmark = None
+
+    def __len__(self) -> int:
+        return self._n
+
+    def _decode(self):
+        if self._ordinals is not None:
+            return
+        if self._version == 1:
+            raw = zlib.decompress(self._blob[_HEADER.size:])
+            n = self._n
+            self._ordinals = np.cumsum(np.frombuffer(raw, dtype='<i4', count=n), dtype=np.int64)
+            self._values = np.frombuffer(raw, dtype='<f8', count=n, offset=4 * n)
+            self._cash = np.frombuffer(raw, dtype='<f8', count=n, offset=12 * n)
+            self._benchmark = np.full(n, np.nan)
+            return
+
+        columns: list[list[np.ndarray]] = [[], [], [], []]
+        offset = _HEADER.size
+        while offset < len(self._blob):
+            k, size = _SEGMENT.unpack_from(self._blob, offset)
+            offset += _SEGMENT.size
+            raw = zlib.decompress(self._blob[offset:offset + size])
+            offset += size
+            columns[0].append(np.cumsum(np.frombuffer(raw, dtype='<i4', count=k), dtype=np.int64))
+            for i, start in enumerate((4 * k, 12 * k, 20 * k), start=1):
+                columns[i].append(np.frombuffer(raw, dtype='<f8', count=k, offset=start))
+        empty = (np.empty(0, dtype=np.int64),) + (np.empty(0),) * 3
+        self._ordinals, self._values, self._cash, self._benchmark = (
+            np.concatenate(c) if c else e for c, e in zip(columns, empty)
+        )
+
+    @property
+    def ordinals(self) -> np.ndarray:
+        """日付の序数（date.toordinal）配列"""
+        self._decode()
+        return self._ordinals
+
+    @property
+    def dates(self) -> list[date]:
+        return [date.fromordinal(int(o)) for o in self.ordinals]
+
+    @property
+    def portfolio_values(self) -> np.ndarray:
+        self._decode()
+        return self._values
+
+    @property
+    def cash(self) -> np.ndarray:
+        self._decode()
+        return self._cash
+
+    @property
+    def benchmark(self) -> np.ndarray:
+        """ベンチマーク指数（保存していない期間は NaN）"""
+        self._decode()
+        return self._benchmark
+
+    def to_snapshots(self) -> list[dict]:
+        """BacktestSnapshotResponse 互換の dict リスト"""
+        return [{
+            'date': d.isoformat(),
+            'portfolioValue': float(v),
+            'cash': float(c),
+        } for d, v, c in zip(self.dates, self.portfolio_values, self.cash)]
@@ -0,0 +1,239 @@
+"""バージョン管理付きマイグレーション
+
+schema_version テーブルに適用済みバージョンを1行ずつ記録し、未適用のステップだけを
+番号順に1回ずつ実行する。各ステップは「ステップ本体 + バージョン記録」を1トランザクションで行う。
+列追加・インデックス作成は既存スキーマを確認してから実行するため、旧方式（起動毎の
+ALTER TABLE + エラー握りつぶし）で既に適用済みのDBでもそのまま記録だけ進む。
+
+新しいステップは MIGRATIONS の末尾に (次の番号, 説明, 関数) で追加する。
+"""
+import logging
+from typing import Callable
+
+from sqlalchemy import Engine, inspect, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from src.models.database import Base
+from src.models.stock import (
+    SchemaVersion, StockPrice, Signal, AutoTradeLog, Transaction, AlertHistory, BrokerageOrder,
+)
+from src.services import config_cache
+
+logger = logging.getLogger(__name__)
+
+
+def _add_columns(table: str, columns: list[tuple[str, str]]) -> Callable[[Connection], None]:
+    """未作成の列だけ ADD COLUMN するステップ"""
+    def step(conn: Connection):
+        existing = {c['name'] for c in inspect(conn).get_columns(table)}
+        for name, col_type in columns:
+            if name not in existing:
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {col_type}"))
+                logger.info(f"[migration] Added column {table}.{name}")
+    return step
+
+
+def _widen_columns(conn: Connection):
+    """列幅拡張（SQLite は VARCHAR 長を強制しないため PostgreSQL のみ）"""
+    if conn.dialect.name != 'postgresql':
+        return
+    conn.execute(text("ALTER TABLE signals ALTER COLUMN active_signals TYPE VARCHAR(200)"))
+    conn.execute(text("ALTER TABLE settings ALTER COLUMN value TYPE VARCHAR(500)"))
+
+
+def _upgrade_values(upgrades: list[tuple[str, str, str, str]]) -> Callable[[Connection], None]:
+    """旧デフォルト値のままのキーだけ新しい値に置き換えるステップ
+
+    upgrades: (テーブル, キー, 旧値, 新値)。キー列は key、値列は value。
+    """
+    def step(conn: Connection):
+        for table, key, old_val, new_val in upgrades:
+            result = conn.execute(text(
+                f"UPDATE {table} SET value = :new_val WHERE key = :key AND value = :old_val"
+            ), {'new_val': new_val, 'old_val': old_val, 'key': key})
+            if result.rowcount > 0:
+                logger.info(f"[migration] {table}.{key}: {old_val} → {new_val}")
+                _bump_config_version(conn, CONFIG_SECTIONS[table])
+    return step
+
+
+# 設定テーブル → config_cache のセクション名
+CONFIG_SECTIONS = {
+    'settings': config_cache.SETTINGS,
+    'risk_rules': config_cache.RISK_RULES,
+    'auto_trade_config': config_cache.AUTO_TRADE,
+    'brokerage_config': config_cache.BROKERAGE,
+}
+
+
+def _bump_config_version(conn: Connection, section: str):
+    """起動中の他ワーカーの設定キャッシュを無効化"""
+    result = conn.execute(text(
+        "UPDATE config_versions SET version = version + 1 WHERE section = :section"
+    ), {'section': section})
+    if result.rowcount == 0:
+        conn.execute(text(
+            "INSERT INTO config_versions (section, version) VALUES (:section, 1)"
+        ), {'section': section})
+
+
+def _create_indexes(*indexes) -> Callable[[Connection], None]:
+    def step(conn: Connection):
+        for index in indexes:
+            index.create(bind=conn, checkfirst=True)
+    return step
+
+
+def _drop_indexes(*names: str) -> Callable[[Connection], None]:
+    """不要になったインデックスを削除するステップ（未作成なら何もしない）"""
+    def step(conn: Connection):
+        for name in names:
+            conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+    return step
+
+
+def _unique_stock_prices(conn: Connection):
+    """stock_prices の (code, date) 重複を除去してから一意インデックスを作成"""
+    result = conn.execute(text(
+        "DELETE FROM stock_prices WHERE id NOT IN ("
+        "SELECT MAX(id) FROM stock_prices GROUP BY code, date)"
+    ))
+    if result.rowcount:
+        logger.info(f"[migration] Removed {result.rowcount} duplicate stock_prices rows")
+    _index(StockPrice, 'uq_stock_prices_code_date').create(bind=conn, checkfirst=True)
+
+
+def _backfill_positions(conn: Connection):
+    """既存の取引履歴から保有台帳を構築"""
+    from src.services.position_service import PositionService
+
+    with Session(bind=conn) as session:
+        count = PositionService(session).rebuild()
+    logger.info(f"[migration] Backfilled positions: {count} codes")
+
+
+def _backfill_virtual_positions(conn: Connection):
+    """既存のドライランログから仮想保有台帳を構築"""
+    from src.services.position_service import VirtualPositionService
+
+    with Session(bind=conn) as session:
+        count = VirtualPositionService(session).rebuild()
+    logger.info(f"[migration] Backfilled virtual_positions: {count} fills")
+
+
+def _index(model, name: str):
+    return next(i for i in model.__table__.indexes if i.name == name)
+
+
+MIGRATIONS: list[tuple[int, str, Callable[[Connection], None]]] = [
+    (1, 'signals: 指標列追加', _add_columns('signals', [
+        ('signal_strength', 'INTEGER'),
+        ('active_signals', 'VARCHAR(200)'),
+        ('target_price', 'FLOAT'),
+        ('stop_loss_price', 'FLOAT'),
+        ('support_price', 'FLOAT'),
+        ('resistance_price', 'FLOAT'),
+        ('bb_upper', 'FLOAT'),
+        ('bb_lower', 'FLOAT'),
+        ('bb_middle', 'FLOAT'),
+        ('atr', 'FLOAT'),
+        ('volume_ratio', 'FLOAT'),
+        ('signal_score', 'FLOAT'),
+        ('stoch_k', 'FLOAT'),
+        ('stoch_d', 'FLOAT'),
+        ('williams_r', 'FLOAT'),
+        ('adx', 'FLOAT'),
+    ])),
+    (2, '列幅拡張: signals.active_signals / settings.value', _widen_columns),
+    (3, 'Phase 20: 旧デフォルト値の更新', _upgrade_values([
+        ('settings', 'investmentBudget', '50000', '1000000'),
+        ('auto_trade_config', 'maxTradesPerDay', '5', '15'),
+        ('auto_trade_config', 'takeProfitPercent', '5.0', '8.0'),
+        ('auto_trade_config', 'stopLossPercent', '-3.0', '-5.0'),
+        ('risk_rules', 'maxOpenPositions', '5', '10'),
+    ])),
+    (4, 'Phase 21: RSI閾値を緩和（シグナル感度向上）', _upgrade_values([
+        ('settings', 'rsiBuyThreshold', '30', '40'),
+        ('settings', 'rsiBuyThreshold', '35', '40'),
+        ('settings', 'rsiSellThreshold', '70', '60'),
+        ('settings', 'rsiSellThreshold', '65', '60'),
+    ])),
+    (5, 'Phase 22: 利益率・勝率改善パラメータ', _upgrade_values([
+        ('auto_trade_config', 'minSignalStrength', '1', '2'),
+        ('auto_trade_config', 'takeProfitPercent', '8.0', '10.0'),
+    ])),
+    (6, 'Phase 23: ポジション集中 + 利益率改善', _upgrade_values([
+        ('risk_rules', 'maxOpenPositions', '10', '5'),
+    ])),
+    (7, 'Phase 24: 取引頻度改善', _upgrade_values([
+        ('auto_trade_config', 'minSignalStrength', '2', '1'),
+        ('risk_rules', 'maxPositionPercent', '30', '40'),
+        ('risk_rules', 'maxLossPerTrade', '10', '15'),
+        ('risk_rules', 'maxOpenPositions', '5', '10'),
+    ])),
+    # Phase 25: minSignalStrength 1→2 は撤回済み（強度2 buy が単元金額的に買えず約定ゼロ要因のため 1 を維持）
+    (8, 'Phase 25: 利益率改善（ポジション集中）', _upgrade_values([
+        ('risk_rules', 'maxOpenPositions', '10', '5'),
+    ])),
+    (9, 'Phase 26: 取引実行率・利益率の改善', _upgrade_values([
+        ('risk_rules', 'maxOpenPositions', '5', '8'),
+        ('risk_rules', 'maxLossPerTrade', '15', '20'),
+        ('risk_rules', 'maxPortfolioLoss', '10', '15'),
+    ])),
+    (10, 'Phase 27: R/R比改善 + リスクルール適正化', _upgrade_values([
+        ('risk_rules', 'maxLossPerTrade', '20', '10'),
+        ('risk_rules', 'maxPositionPercent', '40', '50'),
+        ('risk_rules', 'maxPortfolioLoss', '15', '20'),
+    ])),
+    (11, 'backtests: 終端状態列追加', _add_columns('backtests', [('end_state', 'TEXT')])),
+    (12, 'stock_prices: (code, date) 一意インデックス', _unique_stock_prices),
+    (13, 'signals: (code, date DESC) インデックス', _create_indexes(
+        _index(Signal, 'ix_signals_code_date_desc'),
+    )),
+    (14, 'auto_trade_log: created_at / (code, dry_run, result_status) インデックス', _create_indexes(
+        # created_at 単独のインデックスは v17 の (created_at, id) で代替したため作らない（既存DBは v18 で削除）
+        _index(AutoTradeLog, 'ix_auto_trade_log_code_dry_run_status'),
+    )),
+    (15, 'positions: 取引履歴から保有台帳を構築', _backfill_positions),
+    (16, 'virtual_positions: ドライランログから仮想保有台帳を構築', _backfill_virtual_positions),
+    (17, '履歴一覧: (時刻, id) カーソルページング用インデックス', _create_indexes(
+        _index(Transaction, 'ix_transactions_date_id'),
+        _index(AutoTradeLog, 'ix_auto_trade_log_created_at_id'),
+        _index(AlertHistory, 'ix_alert_history_triggered_at_id'),
+        _index(BrokerageOrder, 'ix_brokerage_orders_created_at_id'),
+    )),
+    (18, 'auto_trade_log: (created_at, id) と重複する created_at インデックスを削除', _drop_indexes(
+        'ix_auto_trade_log_created_at',
+    )),
+]
+
+
+def run_migrations(engine: Engine) -> list[int]:
+    """テーブル作成 + 未適用マイグレーションの実行。適用したバージョン番号を返す
+
+    失敗したステップはロールバックして以降を中断する（次回起動時に再試行）。
+    """
+    Base.metadata.create_all(bind=engine)
+    with engine.connect() as conn:
+        applied = {row[0] for row in conn.execute(text("SELECT version FROM schema_version"))}
+
+    done = []
+    for version, description, step in MIGRATIONS:
+        if version in applied:
+            continue
+        try:
+            with engine.begin() as conn:
+                step(conn)
+                conn.execute(SchemaVersion.__table__.insert().values(
+                    version=version, description=description,
+                ))
+        except Exception as e:
+            logger.error(f"[migration] v{version} {description} failed: {e}")
+            break
+        logger.info(f"[migration] Applied v{version}: {description}")
+        done.append(version)
+
+    if not done:
+        logger.info(f"[migration] Schema up to date (v{max(applied, default=0)})")
+    return done
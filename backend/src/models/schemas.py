@@ -238,6 +238,15 @@ class PriceSuggestionsResponse(BaseModel):
     suggestions: list[PriceSuggestion]
 
 
+class DashboardResponse(BaseModel):
+    """一覧・詳細ページの一括取得（要求したセクションのみ。銘柄別は 銘柄コード → 値）"""
+    stocks: Optional[list[StockResponse]] = None
+    details: Optional[dict[str, StockDetailResponse]] = None
+    charts: Optional[dict[str, list[ChartDataResponse]]] = None
+    checklists: Optional[dict[str, ChecklistResponse]] = None
+    suggestions: Optional[dict[str, PriceSuggestionsResponse]] = None
+
+
 # バックテスト関連
 class BacktestCreateRequest(BaseModel):
     name: str = Field(..., min_length=1, max_length=100)
@@ -248,6 +257,10 @@ class BacktestCreateRequest(BaseModel):
     strategyParams: Optional[dict] = None
 
 
+class BacktestExtendRequest(BaseModel):
+    endDate: str  # YYYY-MM-DD
+
+
 class BacktestSummary(BaseModel):
     id: int
     name: str
@@ -286,6 +299,7 @@ class BacktestDetailResponse(BaseModel):
     strategyParams: Optional[dict] = None
     resultSummary: Optional[dict] = None
     createdAt: str
+    metrics: Optional[dict] = None
 
 
 class BacktestCompareRequest(BaseModel):
@@ -296,6 +310,24 @@ class BacktestCompareResponse(BaseModel):
     backtests: list[BacktestDetailResponse]
 
 
+class BacktestCompareCurvesRequest(BaseModel):
+    ids: list[int] = Field(..., min_length=2, max_length=5)
+    points: int = Field(300, ge=10, le=5000)  # 系列あたりの最大点数
+
+
+class BacktestCurveSeries(BaseModel):
+    id: int
+    name: str
+    dates: list[str]
+    values: list[float]  # 初期資金=1.0 の指数
+
+
+class BacktestCompareCurvesResponse(BaseModel):
+    startDate: Optional[str] = None
+    endDate: Optional[str] = None
+    series: list[BacktestCurveSeries]
+
+
 # 証券API関連
 class BrokerageConfigResponse(BaseModel):
     host: str
@@ -412,6 +444,8 @@ class VirtualPortfolioResponse(BaseModel):
     realizedProfitLoss: float
     unrealizedProfitLoss: float
     tradeCount: int
+    winRate: float = 0.0
+    profitFactor: float = 0.0
 
 
 class AutoTradeLogResponse(BaseModel):
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Date, DateTime, BigInteger, Boolean, Text, JSON
+from sqlalchemy import Column, Index, Integer, String, Float, Date, DateTime, BigInteger, Boolean, Text, JSON, LargeBinary
 from sqlalchemy.sql import func
 from .database import Base
 
@@ -14,6 +14,9 @@ class Stock(Base):
 
 class StockPrice(Base):
     __tablename__ = 'stock_prices'
+    __table_args__ = (
+        Index('uq_stock_prices_code_date', 'code', 'date', unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     code = Column(String(10), index=True, nullable=False)
@@ -56,6 +59,45 @@ class Signal(Base):
     williams_r = Column(Float, nullable=True)     # ウィリアムズ %R
     adx = Column(Float, nullable=True)            # ADX(14) トレンド強度
 
+    __table_args__ = (
+        Index('ix_signals_code_date_desc', code, date.desc()),
+    )
+
+
+class StockLatest(Base):
+    """銘柄ごとの最新状態（1銘柄1行の読み取りモデル、update_stock_data が更新）"""
+    __tablename__ = 'stock_latest'
+
+    id = Column(Integer, primary_key=True, index=True)
+    code = Column(String(10), unique=True, index=True, nullable=False)
+    price_date = Column(Date, nullable=False)      # 最新株価の日付
+    current_price = Column(Float, nullable=False)
+    previous_close = Column(Float, nullable=False)
+    change_percent = Column(Float, nullable=False, default=0.0)
+    signal_date = Column(Date, nullable=True)
+    signal_type = Column(String(10), nullable=True)  # buy, sell, hold
+    previous_signal_type = Column(String(10), nullable=True)  # 前回シグナル（シグナル変化アラート用）
+    signal_strength = Column(Integer, nullable=True)
+    active_signals = Column(String(200), nullable=True)
+    signal_score = Column(Float, nullable=True)
+    rsi = Column(Float, nullable=True)
+    macd = Column(Float, nullable=True)
+    macd_signal = Column(Float, nullable=True)
+    macd_histogram = Column(Float, nullable=True)
+    sma5 = Column(Float, nullable=True)
+    sma25 = Column(Float, nullable=True)
+    sma75 = Column(Float, nullable=True)
+    target_price = Column(Float, nullable=True)
+    stop_loss_price = Column(Float, nullable=True)
+    support_price = Column(Float, nullable=True)
+    resistance_price = Column(Float, nullable=True)
+    bb_upper = Column(Float, nullable=True)
+    bb_lower = Column(Float, nullable=True)
+    bb_middle = Column(Float, nullable=True)
+    atr = Column(Float, nullable=True)
+    volume_ratio = Column(Float, nullable=True)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
 
 class Setting(Base):
     __tablename__ = 'settings'
@@ -76,6 +118,55 @@ class Transaction(Base):
     transaction_date = Column(DateTime, server_default=func.now())
     memo = Column(String(200), nullable=True)
 
+    __table_args__ = (
+        Index('ix_transactions_date_id', 'transaction_date', 'id'),
+    )
+
+
+class Position(Base):
+    """実取引の保有台帳（1銘柄1行、取引の追加・削除と同一トランザクションで更新）"""
+    __tablename__ = 'positions'
+
+    id = Column(Integer, primary_key=True, index=True)
+    code = Column(String(10), unique=True, index=True, nullable=False)
+    quantity = Column(Integer, nullable=False, default=0)
+    cost_basis = Column(Float, nullable=False, default=0.0)    # 残ロットの取得原価合計
+    realized_pnl = Column(Float, nullable=False, default=0.0)  # FIFO で確定した実現損益
+    lots = Column(JSON, nullable=False, default=list)          # 未決済ロット [[数量, 単価], ...]（古い順）
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+
+class VirtualPosition(Base):
+    """ドライランの仮想保有台帳（列の意味は Position と同じ）"""
+    __tablename__ = 'virtual_positions'
+
+    id = Column(Integer, primary_key=True, index=True)
+    code = Column(String(10), unique=True, index=True, nullable=False)
+    quantity = Column(Integer, nullable=False, default=0)
+    cost_basis = Column(Float, nullable=False, default=0.0)
+    realized_pnl = Column(Float, nullable=False, default=0.0)
+    lots = Column(JSON, nullable=False, default=list)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+
+class VirtualFill(Base):
+    """仮想台帳に反映したドライラン約定（同一銘柄・同一方向・同一時間枠は最初の1件のみ）"""
+    __tablename__ = 'virtual_fills'
+
+    id = Column(Integer, primary_key=True, index=True)
+    log_id = Column(Integer, index=True, nullable=False)  # auto_trade_log.id
+    code = Column(String(10), nullable=False)
+    side = Column(String(4), nullable=False)  # buy, sell
+    slot = Column(DateTime, nullable=False)   # created_at を時単位に切り捨てた時間枠
+    price = Column(Float, nullable=False)
+    quantity = Column(Integer, nullable=False)
+    pnl = Column(Float, nullable=True)        # 売りで決済した分の実現損益（買い・空売りは NULL）
+    created_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index('uq_virtual_fills_slot', 'code', 'side', 'slot', unique=True),
+    )
+
 
 class Alert(Base):
     __tablename__ = 'alerts'
@@ -102,6 +193,10 @@ class AlertHistory(Base):
     is_read = Column(Boolean, default=False)
     triggered_at = Column(DateTime, server_default=func.now())
 
+    __table_args__ = (
+        Index('ix_alert_history_triggered_at_id', 'triggered_at', 'id'),
+    )
+
 
 class RiskRule(Base):
     __tablename__ = 'risk_rules'
@@ -121,6 +216,7 @@ class Backtest(Base):
     initial_capital = Column(Float, nullable=False)
     strategy_params = Column(Text, nullable=True)  # JSON
     result_summary = Column(Text, nullable=True)  # JSON
+    end_state = Column(Text, nullable=True)  # JSON: 延長実行用の終端状態（保有・現金・最終日）
     status = Column(String(20), default='pending')  # pending, running, completed, failed
     created_at = Column(DateTime, server_default=func.now())
 
@@ -148,6 +244,33 @@ class BacktestSnapshot(Base):
     cash = Column(Float, nullable=False)
 
 
+class BacktestCurve(Base):
+    """資産推移の圧縮カラムナ格納（1バックテスト1行, 形式は equity_curve.py 参照）"""
+    __tablename__ = 'backtest_curves'
+
+    id = Column(Integer, primary_key=True, index=True)
+    backtest_id = Column(Integer, unique=True, index=True, nullable=False)
+    num_points = Column(Integer, nullable=False)
+    data = Column(LargeBinary, nullable=False)
+
+
+class ChartSeries(Base):
+    """配信用チャート系列（銘柄×期間1行。本文は gzip 済み JSON, 形式は chart_series.py 参照）"""
+    __tablename__ = 'chart_series'
+    __table_args__ = (
+        Index('uq_chart_series_code_period', 'code', 'period', unique=True),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    code = Column(String(10), nullable=False)
+    period = Column(String(4), nullable=False)
+    num_points = Column(Integer, nullable=False)
+    settings_version = Column(Integer, nullable=False)  # 作成時の表示設定バージョン（SMA期間の変更で無効）
+    rows_body = Column(LargeBinary, nullable=False)
+    columns_body = Column(LargeBinary, nullable=False)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+
 class BrokerageHealth(Base):
     __tablename__ = 'brokerage_health'
 
@@ -182,6 +305,10 @@ class BrokerageOrder(Base):
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
 
+    __table_args__ = (
+        Index('ix_brokerage_orders_created_at_id', 'created_at', 'id'),
+    )
+
 
 class AutoTradeConfig(Base):
     __tablename__ = 'auto_trade_config'
@@ -219,3 +346,33 @@ class AutoTradeLog(Base):
     transaction_id = Column(Integer, nullable=True)
     brokerage_order_id = Column(String(50), nullable=True)
     created_at = Column(DateTime, server_default=func.now())
+
+    __table_args__ = (
+        Index('ix_auto_trade_log_created_at_id', 'created_at', 'id'),
+        Index('ix_auto_trade_log_code_dry_run_status', 'code', 'dry_run', 'result_status'),
+    )
+
+
+class SchemaVersion(Base):
+    """適用済みマイグレーション（src.models.migrations が1ステップ1行で記録）"""
+    __tablename__ = 'schema_version'
+
+    version = Column(Integer, primary_key=True)
+    description = Column(String(200), nullable=False)
+    applied_at = Column(DateTime, server_default=func.now())
+
+
+class ConfigVersion(Base):
+    """設定セクションごとの更新番号（src.services.config_cache のキャッシュ無効化に使用）"""
+    __tablename__ = 'config_versions'
+
+    section = Column(String(50), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+
+class DataVersion(Base):
+    """表示データの更新番号（HTTP ETag 用、src.services.data_version が管理）"""
+    __tablename__ = 'data_versions'
+
+    key = Column(String(50), primary_key=True)  # stocks（全体）/ stock:{code}（銘柄別）
+    version = Column(Integer, nullable=False, default=0)
@@ -6,9 +6,12 @@ from .risk import router as risk_router
 from .backtests import router as backtests_router
 from .brokerage import router as brokerage_router
 from .auto_trade import router as auto_trade_router
+from .events import router as events_router
+from .update import router as update_router
+from .metrics import router as metrics_router
 
 __all__ = [
     'stocks_router', 'settings_router', 'transactions_router',
     'alerts_router', 'risk_router', 'backtests_router', 'brokerage_router',
-    'auto_trade_router',
+    'auto_trade_router', 'events_router', 'update_router', 'metrics_router',
 ]
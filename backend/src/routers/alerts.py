@@ -1,10 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
 from src.models.database import get_db
 from src.models.schemas import (
     AlertCreateRequest, AlertResponse, AlertHistoryResponse,
     MarkReadRequest, UnreadCountResponse, MessageResponse,
 )
+from src.services import pagination
 from src.services.alert_service import AlertService
 
 router = APIRouter(prefix='/api/alerts', tags=['alerts'])
@@ -34,10 +35,21 @@ def delete_alert(alert_id: int, db: Session = Depends(get_db)):
 
 
 @router.get('/history', response_model=list[AlertHistoryResponse])
-def get_alert_history(db: Session = Depends(get_db)):
-    """アラート履歴を取得"""
+def get_alert_history(
+    response: Response,
+    limit: int = Query(100, ge=1, le=pagination.MAX_LIMIT),
+    cursor: str | None = None,
+    code: str | None = None,
+    db: Session = Depends(get_db),
+):
+    """アラート履歴を取得（新しい順。続きは X-Next-Cursor）"""
     service = AlertService(db)
-    return service.get_alert_history()
+    try:
+        history = service.get_alert_history(limit, cursor=cursor, code=code)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    pagination.set_next_cursor(response, history, limit, 'triggeredAt')
+    return history
 
 
 @router.post('/mark-read', response_model=MessageResponse)
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
 from src.models.database import get_db
 from src.models.schemas import (
@@ -7,6 +7,7 @@ from src.models.schemas import (
     AutoTradeStockUpdateRequest, AutoTradeLogResponse,
     VirtualPortfolioResponse, MessageResponse,
 )
+from src.services import pagination
 from src.services.auto_trade_service import AutoTradeService
 
 router = APIRouter(prefix='/api/auto-trade', tags=['auto-trade'])
@@ -32,9 +33,23 @@ def toggle(request: AutoTradeToggleRequest, db: Session = Depends(get_db)):
 
 
 @router.get('/log', response_model=list[AutoTradeLogResponse])
-def get_log(limit: int = 50, db: Session = Depends(get_db)):
+def get_log(
+    response: Response,
+    limit: int = Query(pagination.DEFAULT_LIMIT, ge=1, le=pagination.MAX_LIMIT),
+    cursor: str | None = None,
+    code: str | None = None,
+    status: str | None = None,
+    dry_run: bool | None = Query(None, alias='dryRun'),
+    db: Session = Depends(get_db),
+):
+    """実行ログ（新しい順）。続きがあれば X-Next-Cursor ヘッダのカーソルを cursor に渡す"""
     service = AutoTradeService(db)
-    return service.get_logs(limit)
+    try:
+        logs = service.get_logs(limit, cursor=cursor, code=code, status=status, dry_run=dry_run)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    pagination.set_next_cursor(response, logs, limit, 'createdAt')
+    return logs
 
 
 @router.get('/virtual-portfolio', response_model=VirtualPortfolioResponse)
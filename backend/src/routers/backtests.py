@@ -2,9 +2,10 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from src.models.database import get_db
 from src.models.schemas import (
-    BacktestCreateRequest, BacktestSummary, BacktestDetailResponse,
+    BacktestCreateRequest, BacktestExtendRequest, BacktestSummary, BacktestDetailResponse,
     BacktestTradeResponse, BacktestSnapshotResponse,
-    BacktestCompareRequest, BacktestCompareResponse, MessageResponse,
+    BacktestCompareRequest, BacktestCompareResponse,
+    BacktestCompareCurvesRequest, BacktestCompareCurvesResponse, MessageResponse,
 )
 from src.services.backtest_service import BacktestService
 
@@ -51,6 +52,19 @@ def delete_backtest(backtest_id: int, db: Session = Depends(get_db)):
     return {'message': '削除しました'}
 
 
+@router.post('/{backtest_id}/extend', response_model=BacktestDetailResponse)
+def extend_backtest(backtest_id: int, request: BacktestExtendRequest, db: Session = Depends(get_db)):
+    """完了済みバックテストを新しい終了日まで延長（追加日のみ計算）"""
+    service = BacktestService(db)
+    try:
+        result = service.extend_backtest(backtest_id, request.endDate)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not result:
+        raise HTTPException(status_code=404, detail='バックテストが見つかりません')
+    return result
+
+
 @router.get('/{backtest_id}/trades', response_model=list[BacktestTradeResponse])
 def get_backtest_trades(backtest_id: int, db: Session = Depends(get_db)):
     """バックテストの取引一覧"""
@@ -71,3 +85,10 @@ def compare_backtests(request: BacktestCompareRequest, db: Session = Depends(get
     service = BacktestService(db)
     results = service.compare_backtests(request.ids)
     return {'backtests': results}
+
+
+@router.post('/compare/curves', response_model=BacktestCompareCurvesResponse)
+def compare_backtest_curves(request: BacktestCompareCurvesRequest, db: Session = Depends(get_db)):
+    """複数バックテストの資産推移（共通日付軸・正規化・LTTB間引き済み）"""
+    service = BacktestService(db)
+    return service.compare_curves(request.ids, request.points)
@@ -1,12 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from src.models.database import get_db
+from src.models.database import get_async_db, get_db
 from src.models.schemas import (
     BrokerageConfigResponse, BrokerageConfigUpdateRequest,
     BrokerageConnectResponse, BrokerageBalanceResponse,
     BrokeragePositionResponse, OrderCreateRequest, OrderResponse,
     MessageResponse,
 )
+from src.services import pagination
 from src.services.brokerage_service import BrokerageService
 
 router = APIRouter(prefix='/api/brokerage', tags=['brokerage'])
@@ -35,14 +37,14 @@ def update_config(request: BrokerageConfigUpdateRequest, db: Session = Depends(g
 
 
 @router.post('/connect', response_model=BrokerageConnectResponse)
-async def connect(force_restart: bool = False, db: Session = Depends(get_db)):
+async def connect(force_restart: bool = False, db: AsyncSession = Depends(get_async_db)):
     """接続テスト。force_restart=trueの時のみ失敗時にkabu STATIONを再起動する"""
     service = BrokerageService(db)
     return await service.connect(force_restart=force_restart)
 
 
 @router.get('/balance', response_model=BrokerageBalanceResponse)
-async def get_balance(db: Session = Depends(get_db)):
+async def get_balance(db: AsyncSession = Depends(get_async_db)):
     """残高照会"""
     service = BrokerageService(db)
     try:
@@ -52,7 +54,7 @@ async def get_balance(db: Session = Depends(get_db)):
 
 
 @router.get('/positions', response_model=list[BrokeragePositionResponse])
-async def get_positions(db: Session = Depends(get_db)):
+async def get_positions(db: AsyncSession = Depends(get_async_db)):
     """保有銘柄照会"""
     service = BrokerageService(db)
     try:
@@ -62,14 +64,26 @@ async def get_positions(db: Session = Depends(get_db)):
 
 
 @router.get('/orders', response_model=list[OrderResponse])
-def get_orders(db: Session = Depends(get_db)):
-    """注文一覧を取得"""
+def get_orders(
+    response: Response,
+    limit: int = Query(pagination.DEFAULT_LIMIT, ge=1, le=pagination.MAX_LIMIT),
+    cursor: str | None = None,
+    code: str | None = None,
+    status: str | None = None,
+    db: Session = Depends(get_db),
+):
+    """注文一覧を取得（新しい順。続きは X-Next-Cursor）"""
     service = BrokerageService(db)
-    return service.get_orders()
+    try:
+        orders = service.get_orders(limit, cursor=cursor, code=code, status=status)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    pagination.set_next_cursor(response, orders, limit, 'createdAt')
+    return orders
 
 
 @router.post('/orders', response_model=OrderResponse)
-async def create_order(request: OrderCreateRequest, db: Session = Depends(get_db)):
+async def create_order(request: OrderCreateRequest, db: AsyncSession = Depends(get_async_db)):
     """注文を送信"""
     service = BrokerageService(db)
     return await service.create_order(
@@ -82,7 +96,7 @@ async def create_order(request: OrderCreateRequest, db: Session = Depends(get_db
 
 
 @router.delete('/orders/{order_id}', response_model=MessageResponse)
-async def cancel_order(order_id: int, db: Session = Depends(get_db)):
+async def cancel_order(order_id: int, db: AsyncSession = Depends(get_async_db)):
     """注文をキャンセル"""
     service = BrokerageService(db)
     if not await service.cancel_order(order_id):
@@ -91,7 +105,7 @@ async def cancel_order(order_id: int, db: Session = Depends(get_db)):
 
 
 @router.post('/sync', response_model=MessageResponse)
-async def sync_positions(db: Session = Depends(get_db)):
+async def sync_positions(db: AsyncSession = Depends(get_async_db)):
     """ポジション同期"""
     service = BrokerageService(db)
     try:
@@ -101,7 +115,7 @@ async def sync_positions(db: Session = Depends(get_db)):
 
 
 @router.post('/sync-orders', response_model=MessageResponse)
-async def sync_orders(db: Session = Depends(get_db)):
+async def sync_orders(db: AsyncSession = Depends(get_async_db)):
     """注文約定状態を同期（submitted→filled/cancelled）"""
     service = BrokerageService(db)
     try:
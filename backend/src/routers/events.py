@@ -0,0 +1,43 @@
+import asyncio
+
+from fastapi import APIRouter, Header
+from fastapi.responses import StreamingResponse
+
+from src.services import events
+
+router = APIRouter(prefix='/api/events', tags=['events'])
+
+HEARTBEAT_SECONDS = 15
+RETRY_MS = 5000
+
+
+async def _stream(subscriber: events.Subscriber):
+    try:
+        yield f'retry: {RETRY_MS}\n\n'
+        while True:
+            try:
+                event = await asyncio.wait_for(subscriber.get(), HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ': ping\n\n'  # プロキシのアイドル切断防止
+                continue
+            if event is None:
+                return
+            yield event.encode()
+    finally:
+        events.bus.unsubscribe(subscriber)
+
+
+@router.get('')
+async def stream_events(last_event_id: str | None = Header(None)):
+    """パイプライン更新イベント（Server-Sent Events）
+
+    event: prices / signals / alerts / orders / pipeline / resync。data は差分のみの JSON。
+    resync を受けたら一覧を取り直す。再接続時はブラウザが Last-Event-ID を送り、取りこぼしを再送する。
+    """
+    last_id = int(last_event_id) if last_event_id and last_event_id.isdigit() else None
+    subscriber = events.bus.subscribe(last_id)
+    return StreamingResponse(
+        _stream(subscriber),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
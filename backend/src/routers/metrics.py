@@ -0,0 +1,12 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from src.services import metrics
+
+router = APIRouter(tags=['metrics'])
+
+
+@router.get('/metrics', response_class=PlainTextResponse)
+def get_metrics():
+    """Prometheus 形式のメトリクス（HTTP・データ更新・SQL・yfinance・kabu API）"""
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
@@ -1,4 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException
+from typing import Literal
+
+import gzip
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import ORJSONResponse
 from sqlalchemy.orm import Session
 from src.models.database import get_db
 from src.models.schemas import (
@@ -7,23 +12,43 @@ from src.models.schemas import (
     StockDetailResponse,
     ChartDataResponse,
     MessageResponse,
-    RecommendationsResponse
+    RecommendationsResponse,
+    DashboardResponse,
 )
+from src.services import config_cache, dashboard_service, data_version
+from src.services.dashboard_service import DashboardService
 from src.services.stock_service import StockService
 
 router = APIRouter(prefix='/api', tags=['stocks'])
 
 
+def _not_modified(request: Request, response: Response, db: Session, *keys: str,
+                  configs: tuple[str, ...] = (config_cache.SETTINGS,)) -> Response | None:
+    """データバージョンから ETag を付与し、If-None-Match が一致すれば 304 を返す"""
+    etag = data_version.etag(db, *keys, configs=configs)
+    headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+    if data_version.matches(request.headers.get('if-none-match'), etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
+
+
 @router.get('/recommendations', response_model=RecommendationsResponse)
-def get_recommendations(db: Session = Depends(get_db)):
+def get_recommendations(request: Request, response: Response, db: Session = Depends(get_db)):
     """おすすめ銘柄を取得"""
+    cached = _not_modified(request, response, db, data_version.ALL_STOCKS)
+    if cached is not None:
+        return cached
     service = StockService(db)
     return service.get_recommendations()
 
 
 @router.get('/stocks', response_model=list[StockResponse])
-def get_stocks(db: Session = Depends(get_db)):
+def get_stocks(request: Request, response: Response, db: Session = Depends(get_db)):
     """監視銘柄一覧を取得"""
+    cached = _not_modified(request, response, db, data_version.ALL_STOCKS)
+    if cached is not None:
+        return cached
     service = StockService(db)
     return service.get_all_stocks()
 
@@ -53,8 +78,11 @@ def delete_stock(code: str, db: Session = Depends(get_db)):
 
 
 @router.get('/stocks/{code}', response_model=StockDetailResponse)
-def get_stock_detail(code: str, db: Session = Depends(get_db)):
+def get_stock_detail(code: str, request: Request, response: Response, db: Session = Depends(get_db)):
     """銘柄詳細を取得"""
+    cached = _not_modified(request, response, db, data_version.stock_key(code))
+    if cached is not None:
+        return cached
     service = StockService(db)
     detail = service.get_stock_detail(code)
     if not detail:
@@ -63,7 +91,67 @@ def get_stock_detail(code: str, db: Session = Depends(get_db)):
 
 
 @router.get('/stocks/{code}/chart', response_model=list[ChartDataResponse])
-def get_chart_data(code: str, period: str = '3m', db: Session = Depends(get_db)):
-    """チャートデータを取得"""
+def get_chart_data(code: str, request: Request, response: Response, period: str = '3m',
+                   format: Literal['rows', 'columnar'] = 'rows',
+                   points: int | None = Query(None, ge=10, le=5000),
+                   db: Session = Depends(get_db)):
+    """チャートデータを取得
+
+    format=columnar は {dates: [...], close: [...], sma5: [...], ...} の列形式
+    （キーの繰り返しがなく、numpy 配列のまま orjson で直列化する）。
+    points を指定すると LTTB で最大 points 点に間引く（描画幅に合わせた長期間表示用）。
+    間引かない場合は更新時に保存した gzip 済み本文をそのまま返す。
+    """
+    cached = _not_modified(request, response, db, data_version.stock_key(code))
+    if cached is not None:
+        return cached
     service = StockService(db)
+    columnar = format == 'columnar'
+    if points is not None:
+        return ORJSONResponse(service.get_chart_downsampled(code, period, points, columnar),
+                              headers=dict(response.headers))
+    body = service.get_chart_body(code, period, columnar)
+    if body is not None:
+        return _gzip_body_response(request, response, body)
+    if columnar:
+        return ORJSONResponse(service.get_chart_columns(code, period), headers=dict(response.headers))
     return service.get_chart_data(code, period)
+
+
+def _gzip_body_response(request: Request, response: Response, body: bytes) -> Response:
+    """gzip 済み JSON 本文を返す（gzip 非対応のクライアントには展開して返す）"""
+    headers = {**response.headers, 'Vary': 'Accept-Encoding'}
+    if 'gzip' in request.headers.get('accept-encoding', ''):
+        headers['Content-Encoding'] = 'gzip'
+    else:
+        body = gzip.decompress(body)
+    return Response(body, media_type='application/json', headers=headers)
+
+
+@router.get('/dashboard', response_model=DashboardResponse)
+def get_dashboard(request: Request, response: Response, codes: str = '',
+                  sections: str = ','.join(dashboard_service.SECTIONS), period: str = '3m',
+                  db: Session = Depends(get_db)):
+    """一覧・詳細・チャート・チェックリスト・指値提案を1リクエストで取得
+
+    codes: カンマ区切りの銘柄コード（最大50）。sections: stocks,detail,chart,checklist,suggestions の一部
+    （要求しなかったセクションは null）。
+    """
+    code_list = list(dict.fromkeys(c.strip() for c in codes.split(',') if c.strip()))
+    section_set = {s.strip() for s in sections.split(',') if s.strip()}
+    unknown = section_set - set(dashboard_service.SECTIONS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f'不明なセクション: {", ".join(sorted(unknown))}')
+    if len(code_list) > dashboard_service.MAX_CODES:
+        raise HTTPException(status_code=400, detail=f'銘柄は最大{dashboard_service.MAX_CODES}件です')
+
+    keys = [data_version.stock_key(code) for code in code_list]
+    if dashboard_service.STOCKS in section_set:
+        keys.append(data_version.ALL_STOCKS)
+    configs = (config_cache.SETTINGS,)
+    if dashboard_service.CHECKLIST in section_set:
+        configs += (config_cache.RISK_RULES,)
+    cached = _not_modified(request, response, db, *keys, configs=configs)
+    if cached is not None:
+        return cached
+    return DashboardService(db).get_dashboard(code_list, section_set, period)
@@ -0,0 +1,38 @@
+import asyncio
+
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from src.services import update_jobs
+
+router = APIRouter(prefix='/api/update', tags=['update'])
+
+WAIT_TIMEOUT_SECONDS = 300
+
+
+@router.post('')
+async def trigger_update(wait: bool = True):
+    """手動データ更新（株価・シグナル）
+
+    実行中の更新があればそれに合流する。wait=true（既定）は完了まで待って結果を返し、
+    WAIT_TIMEOUT_SECONDS を過ぎるか wait=false なら 202 で実行状態だけを返す
+    （待機はイベントループ上で行い、スレッドを占有しない）。
+    """
+    run = update_jobs.manager.trigger(update_jobs.PRICES, 'api')
+    if wait:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + WAIT_TIMEOUT_SECONDS
+        while not run.finished and loop.time() < deadline:
+            await asyncio.sleep(0.5)
+    if not run.finished:
+        return JSONResponse({'message': 'データ更新を開始しました', 'job': run.to_dict()}, status_code=202)
+    if run.status == 'failed':
+        return JSONResponse({'message': f'データ更新に失敗しました: {run.error}', 'job': run.to_dict()},
+                            status_code=500)
+    return {'message': 'データを更新しました', 'job': run.to_dict()}
+
+
+@router.get('/status')
+def get_update_status():
+    """実行中・待機中の更新と直近の履歴"""
+    return update_jobs.manager.status()
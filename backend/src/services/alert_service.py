@@ -1,5 +1,10 @@
+from typing import Iterable
+
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
-from src.models.stock import Alert, AlertHistory, Stock, StockPrice, Signal
+from src.models.stock import Alert, AlertHistory, StockLatest
+from src.services import pagination
+from src.services.stock_service import get_stock_name
 
 
 class AlertService:
@@ -11,11 +16,10 @@ class AlertService:
         alerts = self.db.query(Alert).order_by(Alert.created_at.desc()).all()
         result = []
         for a in alerts:
-            stock = self.db.query(Stock).filter(Stock.code == a.code).first()
             result.append({
                 'id': a.id,
                 'code': a.code,
-                'name': stock.name if stock else f'銘柄{a.code}',
+                'name': get_stock_name(self.db, a.code),
                 'alertType': a.alert_type,
                 'conditionValue': a.condition_value,
                 'isActive': a.is_active,
@@ -35,11 +39,10 @@ class AlertService:
         self.db.commit()
         self.db.refresh(alert)
 
-        stock = self.db.query(Stock).filter(Stock.code == code).first()
         return {
             'id': alert.id,
             'code': alert.code,
-            'name': stock.name if stock else f'銘柄{code}',
+            'name': get_stock_name(self.db, code),
             'alertType': alert.alert_type,
             'conditionValue': alert.condition_value,
             'isActive': alert.is_active,
@@ -55,17 +58,20 @@ class AlertService:
         self.db.commit()
         return True
 
-    def get_alert_history(self) -> list[dict]:
-        """アラート履歴を取得"""
-        history = self.db.query(AlertHistory).order_by(AlertHistory.triggered_at.desc()).limit(100).all()
+    def get_alert_history(self, limit: int = 100, cursor: str | None = None,
+                          code: str | None = None) -> list[dict]:
+        """アラート履歴を新しい順に1ページ取得"""
+        query = self.db.query(AlertHistory)
+        if code:
+            query = query.filter(AlertHistory.code == code)
+        history = pagination.paginate(query, AlertHistory.triggered_at, AlertHistory.id, cursor, limit)
         result = []
         for h in history:
-            stock = self.db.query(Stock).filter(Stock.code == h.code).first()
             result.append({
                 'id': h.id,
                 'alertId': h.alert_id,
                 'code': h.code,
-                'name': stock.name if stock else f'銘柄{h.code}',
+                'name': get_stock_name(self.db, h.code),
                 'message': h.message,
                 'alertType': h.alert_type,
                 'signalBefore': h.signal_before,
@@ -88,19 +94,37 @@ class AlertService:
         """未読アラート数を取得"""
         return self.db.query(AlertHistory).filter(AlertHistory.is_read == False).count()
 
-    def check_alerts(self):
-        """全アクティブアラートをチェックし、条件を満たしたらアラート履歴に追加"""
-        active_alerts = self.db.query(Alert).filter(Alert.is_active == True).all()
-
+    def check_alerts(self, codes: Iterable[str] | None = None, exclude_codes: Iterable[str] = ()):
+        """アクティブアラートをチェックし、条件を満たしたらアラート履歴に追加
+
+        codes を渡すとその銘柄のアラートだけ、exclude_codes の銘柄は除外（更新パイプラインで
+        株価更新済みの銘柄から順に判定するため）。
+        """
+        query = self.db.query(Alert).filter(Alert.is_active == True)
+        if codes is not None:
+            query = query.filter(Alert.code.in_(list(codes)))
+        exclude_codes = list(exclude_codes)
+        if exclude_codes:
+            query = query.filter(Alert.code.notin_(exclude_codes))
+        active_alerts = query.all()
+
+        codes = {alert.code for alert in active_alerts}
+        latest_by_code = {
+            row.code: row for row in self.db.query(StockLatest).filter(StockLatest.code.in_(codes)).all()
+        } if codes else {}
+        # 記録済みのシグナル変化（同じ変化を二重に記録しないため。アラートごとに引かず1回で読む）
+        signal_alert_ids = [a.id for a in active_alerts if a.alert_type == 'signal_change']
+        recorded_changes = set(self.db.query(
+            AlertHistory.alert_id, AlertHistory.signal_before, AlertHistory.signal_after,
+        ).filter(AlertHistory.alert_id.in_(signal_alert_ids)).all()) if signal_alert_ids else set()
+
+        histories = []
         for alert in active_alerts:
-            latest_price = self.db.query(StockPrice).filter(
-                StockPrice.code == alert.code
-            ).order_by(StockPrice.date.desc()).first()
-
-            if not latest_price:
+            latest = latest_by_code.get(alert.code)
+            if not latest:
                 continue
 
-            current_price = latest_price.close
+            current_price = latest.current_price
             triggered = False
             message = ''
 
@@ -115,49 +139,35 @@ class AlertService:
                     message = f'{alert.code} が ¥{alert.condition_value:,.0f} 以下になりました（現在 ¥{current_price:,.0f}）'
 
             elif alert.alert_type == 'signal_change':
-                latest_signal = self.db.query(Signal).filter(
-                    Signal.code == alert.code
-                ).order_by(Signal.date.desc()).first()
-                prev_signal = self.db.query(Signal).filter(
-                    Signal.code == alert.code
-                ).order_by(Signal.date.desc()).offset(1).first()
-
-                if latest_signal and prev_signal and latest_signal.signal_type != prev_signal.signal_type:
+                latest_type = latest.signal_type
+                prev_type = latest.previous_signal_type
+
+                if latest_type and prev_type and latest_type != prev_type:
                     # 既に同じ変化を記録済みかチェック
-                    existing = self.db.query(AlertHistory).filter(
-                        AlertHistory.alert_id == alert.id,
-                        AlertHistory.signal_before == prev_signal.signal_type,
-                        AlertHistory.signal_after == latest_signal.signal_type,
-                    ).first()
-                    if not existing:
+                    if (alert.id, prev_type, latest_type) not in recorded_changes:
                         triggered = True
                         signal_labels = {'buy': '買い', 'sell': '売り', 'hold': '様子見'}
-                        before = signal_labels.get(prev_signal.signal_type, prev_signal.signal_type)
-                        after = signal_labels.get(latest_signal.signal_type, latest_signal.signal_type)
+                        before = signal_labels.get(prev_type, prev_type)
+                        after = signal_labels.get(latest_type, latest_type)
                         message = f'{alert.code} のシグナルが {before} → {after} に変化しました'
 
             if triggered:
-                latest_signal = self.db.query(Signal).filter(
-                    Signal.code == alert.code
-                ).order_by(Signal.date.desc()).first()
-                prev_signal = self.db.query(Signal).filter(
-                    Signal.code == alert.code
-                ).order_by(Signal.date.desc()).offset(1).first()
-
-                history = AlertHistory(
-                    alert_id=alert.id,
-                    code=alert.code,
-                    message=message,
-                    alert_type=alert.alert_type,
-                    signal_before=prev_signal.signal_type if prev_signal else None,
-                    signal_after=latest_signal.signal_type if latest_signal else None,
-                    price_at_trigger=current_price,
-                    is_read=False,
-                )
-                self.db.add(history)
+                histories.append({
+                    'alert_id': alert.id,
+                    'code': alert.code,
+                    'message': message,
+                    'alert_type': alert.alert_type,
+                    'signal_before': latest.previous_signal_type,
+                    'signal_after': latest.signal_type,
+                    'price_at_trigger': current_price,
+                    'is_read': False,
+                })
 
                 # price系アラートは一度発火したら無効化
                 if alert.alert_type in ('price_above', 'price_below'):
                     alert.is_active = False
 
+        # 履歴は1回の executemany で挿入（ORM の add だと RETURNING 付きで1行ずつになる）
+        if histories:
+            self.db.execute(insert(AlertHistory), histories)
         self.db.commit()
@@ -1,15 +1,20 @@
 import asyncio
 import logging
+from dataclasses import dataclass
 from datetime import date, datetime, time
+from typing import TypedDict
+
 from sqlalchemy.orm import Session
 from sqlalchemy import func as sql_func, text
 from src.models.stock import (
     AutoTradeConfig, AutoTradeStock, AutoTradeLog,
-    Stock, Signal, Transaction, StockPrice, BrokerageOrder,
+    Stock, Signal, Transaction, StockPrice, StockLatest, BrokerageOrder,
 )
 from src.services.risk_service import RiskService
 from src.services.brokerage_service import BrokerageService
+from src.services.position_service import PositionService, VirtualPositionService
 from src.services.stock_service import StockService
+from src.services import config_cache, pagination, performance
 
 logger = logging.getLogger(__name__)
 
@@ -24,6 +29,17 @@ DEFAULT_CONFIG = {
     'tradingMode': 'cash',  # cash / margin_system / margin_general
 }
 
+
+class AutoTradeSettings(TypedDict):
+    enabled: bool
+    minSignalStrength: int
+    maxTradesPerDay: int
+    orderType: str
+    dryRun: bool
+    takeProfitPercent: float
+    stopLossPercent: float
+    tradingMode: str
+
 # 時間帯重み: 昼休み前後は実行禁止、信頼性の高い時間帯にボーナス
 TIME_WEIGHTS = {
     9: {0: 1.1, 30: 1.2},    # 9:00=1.1, 9:30=1.2（寄付き後トレンド確認期）
@@ -46,21 +62,45 @@ def _get_time_weight() -> float:
     return hour_weights.get(minute_key, 1.0)
 
 
+@dataclass
+class TradeRun:
+    """1回の自動売買実行の状態（start_run が作り、trade_code が銘柄ごとに更新する）"""
+    config: AutoTradeSettings
+    settings: dict
+    risk_service: RiskService
+    brokerage_service: BrokerageService
+    codes: list[str]          # 対象銘柄（AutoTradeStock.enabled）
+    remaining_trades: int     # 本日あと何件取引できるか
+    cash_balance: float | None = None  # 実資金モードの実残高/信用余力
+    commit_each_code: bool = False     # 銘柄ごとに commit する（他の Session と並行して書き込む場合）
+
+
 class AutoTradeService:
     def __init__(self, db: Session):
         self.db = db
+        # 実行中のみ有効なログ書き込みバッファ（None の間は _add_log が即 commit）
+        self._log_buffer: list[AutoTradeLog] | None = None
 
     # --- 設定 CRUD ---
 
-    def get_config(self) -> dict:
-        """自動売買設定を取得"""
-        result = dict(DEFAULT_CONFIG)
+    def get_config(self) -> AutoTradeSettings:
+        """自動売買設定を取得（config_cache 経由）"""
         try:
-            db_config = self.db.query(AutoTradeConfig).all()
-            for c in db_config:
-                result[c.key] = c.value
+            return config_cache.get(self.db, config_cache.AUTO_TRADE, self._load_config)
         except Exception as e:
+            self.db.rollback()
             logger.error(f"[auto-trade] DB設定読み込み失敗（デフォルト使用）: {e}")
+            return self._parse_config(dict(DEFAULT_CONFIG))
+
+    @classmethod
+    def _load_config(cls, db: Session) -> AutoTradeSettings:
+        result = dict(DEFAULT_CONFIG)
+        for c in db.query(AutoTradeConfig).filter(AutoTradeConfig.key.in_(DEFAULT_CONFIG)).all():
+            result[c.key] = c.value
+        return cls._parse_config(result)
+
+    @staticmethod
+    def _parse_config(result: dict) -> AutoTradeSettings:
         trading_mode = result.get('tradingMode', 'cash')
         if trading_mode not in ('cash', 'margin_system', 'margin_general'):
             trading_mode = 'cash'
@@ -75,7 +115,7 @@ class AutoTradeService:
             'tradingMode': trading_mode,
         }
 
-    def update_config(self, data: dict) -> dict:
+    def update_config(self, data: dict) -> AutoTradeSettings:
         """自動売買設定を更新"""
         key_map = {
             'enabled': lambda v: str(v).lower(),
@@ -96,10 +136,11 @@ class AutoTradeService:
                 config.value = str_value
             else:
                 self.db.add(AutoTradeConfig(key=key, value=str_value))
+        config_cache.bump(self.db, config_cache.AUTO_TRADE)
         self.db.commit()
         return self.get_config()
 
-    def toggle(self, enabled: bool) -> dict:
+    def toggle(self, enabled: bool) -> AutoTradeSettings:
         """グローバルON/OFF"""
         return self.update_config({'enabled': enabled})
 
@@ -136,11 +177,18 @@ class AutoTradeService:
 
     # --- ログ取得 ---
 
-    def get_logs(self, limit: int = 50) -> list[dict]:
-        """実行ログを取得"""
-        logs = self.db.query(AutoTradeLog).order_by(
-            AutoTradeLog.created_at.desc()
-        ).limit(limit).all()
+    def get_logs(self, limit: int = pagination.DEFAULT_LIMIT, cursor: str | None = None,
+                 code: str | None = None, status: str | None = None,
+                 dry_run: bool | None = None) -> list[dict]:
+        """実行ログを新しい順に1ページ取得（cursor は前ページ末尾から pagination.encode_cursor で生成）"""
+        query = self.db.query(AutoTradeLog)
+        if code:
+            query = query.filter(AutoTradeLog.code == code)
+        if status:
+            query = query.filter(AutoTradeLog.result_status == status)
+        if dry_run is not None:
+            query = query.filter(AutoTradeLog.dry_run == dry_run)
+        logs = pagination.paginate(query, AutoTradeLog.created_at, AutoTradeLog.id, cursor, limit)
         return [
             {
                 'id': log.id,
@@ -165,41 +213,21 @@ class AutoTradeService:
         ]
 
     def get_virtual_portfolio(self) -> dict:
-        """ドライランの仮想収支を計算"""
-        # 重複除外: 同一時間枠(hour)・同一銘柄・同一方向は1件のみ
-        logs = self.db.execute(text('''
-            SELECT DISTINCT ON (code, signal_type, DATE_TRUNC('hour', created_at))
-                code, signal_type, order_price, quantity, created_at
-            FROM auto_trade_log
-            WHERE result_status = 'success' AND dry_run = true
-            ORDER BY code, signal_type, DATE_TRUNC('hour', created_at), created_at
-        ''')).fetchall()
-
-        # 仮想ポジション集計
-        positions: dict[str, dict] = {}
-        trades = []
-        realized_pnl = 0.0
-        for code, sig, price, qty, created_at in logs:
-            if not qty or not price:
-                continue
-            trades.append({
-                'code': code,
-                'side': sig,
-                'price': float(price),
-                'quantity': qty,
-                'date': created_at.isoformat(),
-            })
-            if code not in positions:
-                positions[code] = {'qty': 0, 'cost': 0.0}
-            if sig == 'buy':
-                positions[code]['qty'] += qty
-                positions[code]['cost'] += float(price) * qty
-            else:
-                avg = positions[code]['cost'] / positions[code]['qty'] if positions[code]['qty'] > 0 else 0
-                sell_qty = min(qty, positions[code]['qty'])
-                realized_pnl += (float(price) - avg) * sell_qty
-                positions[code]['qty'] -= sell_qty
-                positions[code]['cost'] -= avg * sell_qty
+        """ドライランの仮想収支（仮想保有台帳から集計）"""
+        ledger = VirtualPositionService(self.db)
+        positions = {
+            code: {'qty': p.quantity, 'cost': p.cost_basis} for code, p in ledger.get_open().items()
+        }
+        fills = ledger.get_fills()
+        trades = [{
+            'code': f.code,
+            'side': f.side,
+            'price': f.price,
+            'quantity': f.quantity,
+            'date': f.created_at.isoformat(),
+        } for f in fills]
+        closed_pnls = [f.pnl for f in fills if f.pnl is not None]
+        realized_pnl = ledger.total_realized_pnl()
 
         # 銘柄名・現在価格を取得
         codes = [c for c, p in positions.items() if p['qty'] > 0]
@@ -207,12 +235,11 @@ class AutoTradeService:
         if codes:
             stocks = self.db.query(Stock).filter(Stock.code.in_(codes)).all()
             stock_info = {s.code: s.name for s in stocks}
-            for code in codes:
-                latest = self.db.query(StockPrice).filter(
-                    StockPrice.code == code
-                ).order_by(StockPrice.date.desc()).first()
-                if latest:
-                    stock_info[code] = {'name': stock_info.get(code, code), 'price': float(latest.close)}
+            latest_rows = self.db.query(StockLatest.code, StockLatest.current_price).filter(
+                StockLatest.code.in_(codes)
+            ).all()
+            for code, current_price in latest_rows:
+                stock_info[code] = {'name': stock_info.get(code, code), 'price': float(current_price)}
 
         # レスポンス組み立て
         holdings = []
@@ -256,16 +283,51 @@ class AutoTradeService:
             'realizedProfitLoss': round(realized_pnl, 0),
             'unrealizedProfitLoss': round(unrealized_pnl, 0),
             'tradeCount': len(trades),
+            'winRate': round(performance.win_rate(closed_pnls), 1),
+            'profitFactor': round(performance.profit_factor(closed_pnls), 2),
             'trades': trades,
         }
 
     # --- コア処理 ---
 
     def _add_log(self, **kwargs) -> AutoTradeLog:
-        """ログレコード追加"""
+        """ログレコード追加
+
+        自動売買の実行中はバッファに溜め、_checkpoint でまとめて1回の commit で書き込む。
+        ドライラン約定は同じ実行内の保有判定に使うため、仮想台帳へ即反映して flush する。
+        """
+        if self._log_buffer is not None:
+            # 書き込みは後でまとめて行うため、作成時刻は判定時点で確定させる
+            kwargs.setdefault('created_at', datetime.now())
         log = AutoTradeLog(**kwargs)
-        self.db.add(log)
+        if self._log_buffer is None:
+            self.db.add(log)
+            VirtualPositionService(self.db).record_log(log)
+            self.db.commit()
+        elif VirtualPositionService.is_fill(log):
+            self.db.add(log)
+            VirtualPositionService(self.db).record_log(log)
+            self.db.flush()
+        else:
+            self._log_buffer.append(log)
+        return log
+
+    def _checkpoint(self):
+        """バッファ済みログを一括 insert し、実行中の変更をまとめて commit"""
+        if self._log_buffer:
+            self.db.add_all(self._log_buffer)
+            self._log_buffer.clear()
         self.db.commit()
+
+    def _record_order(self, transaction: Transaction, **log_kwargs) -> AutoTradeLog:
+        """実注文の取引と実行ログを同じ commit で記録
+
+        実行ログは日次取引数の集計に使うため、取引だけが先に commit された状態を作らない。
+        """
+        PositionService(self.db).add_transaction(transaction)
+        self.db.flush()
+        log = self._add_log(transaction_id=transaction.id, executed=True, dry_run=False, **log_kwargs)
+        self._checkpoint()
         return log
 
     def _get_today_trade_count(self, dry_run: bool = False) -> int:
@@ -284,15 +346,8 @@ class AutoTradeService:
         return query.count()
 
     def _get_holding_quantity(self, code: str) -> int:
-        """保有数量を計算"""
-        transactions = self.db.query(Transaction).filter(Transaction.code == code).all()
-        qty = 0
-        for t in transactions:
-            if t.transaction_type == 'buy':
-                qty += t.quantity
-            else:
-                qty -= t.quantity
-        return max(qty, 0)
+        """保有数量（保有台帳から取得）"""
+        return PositionService(self.db).quantity(code)
 
     def _has_today_buy_order(self, code: str) -> bool:
         """本日この銘柄に対する買い注文が既に存在するか（status不問、failedも含む）"""
@@ -304,67 +359,16 @@ class AutoTradeService:
         ).first() is not None
 
     def _get_entry_price(self, code: str) -> float | None:
-        """保有銘柄の平均取得単価を計算"""
-        transactions = self.db.query(Transaction).filter(
-            Transaction.code == code
-        ).order_by(Transaction.transaction_date).all()
-        qty = 0
-        total_cost = 0.0
-        for t in transactions:
-            if t.transaction_type == 'buy':
-                qty += t.quantity
-                total_cost += t.quantity * t.price
-            else:
-                if qty > 0:
-                    avg = total_cost / qty
-                    sell_qty = min(t.quantity, qty)
-                    qty -= sell_qty
-                    total_cost -= sell_qty * avg
-        return (total_cost / qty) if qty > 0 else None
+        """保有銘柄の平均取得単価（保有台帳の FIFO 残ロットから取得）"""
+        return PositionService(self.db).average_price(code)
 
     def _get_dry_run_holding_quantity(self, code: str) -> int:
-        """ドライランの仮想保有数量を計算（auto_trade_logから）"""
-        logs = self.db.execute(text('''
-            SELECT DISTINCT ON (code, signal_type, DATE_TRUNC('hour', created_at))
-                signal_type, quantity
-            FROM auto_trade_log
-            WHERE code = :code AND result_status = 'success' AND dry_run = true
-            ORDER BY code, signal_type, DATE_TRUNC('hour', created_at), created_at
-        '''), {'code': code}).fetchall()
-        qty = 0
-        for sig, q in logs:
-            if not q:
-                continue
-            if sig == 'buy':
-                qty += q
-            else:
-                qty -= q
-        return max(qty, 0)
+        """ドライランの仮想保有数量（仮想保有台帳から取得）"""
+        return VirtualPositionService(self.db).quantity(code)
 
     def _get_dry_run_entry_price(self, code: str) -> float | None:
-        """ドライランの仮想平均取得単価を計算（auto_trade_logから）"""
-        logs = self.db.execute(text('''
-            SELECT DISTINCT ON (code, signal_type, DATE_TRUNC('hour', created_at))
-                signal_type, order_price, quantity
-            FROM auto_trade_log
-            WHERE code = :code AND result_status = 'success' AND dry_run = true
-            ORDER BY code, signal_type, DATE_TRUNC('hour', created_at), created_at
-        '''), {'code': code}).fetchall()
-        qty = 0
-        total_cost = 0.0
-        for sig, price, q in logs:
-            if not q or not price:
-                continue
-            if sig == 'buy':
-                qty += q
-                total_cost += float(price) * q
-            else:
-                if qty > 0:
-                    avg = total_cost / qty
-                    sell_qty = min(q, qty)
-                    qty -= sell_qty
-                    total_cost -= sell_qty * avg
-        return (total_cost / qty) if qty > 0 else None
+        """ドライランの仮想平均取得単価（仮想保有台帳から取得）"""
+        return VirtualPositionService(self.db).average_price(code)
 
     def _acquire_lock(self) -> bool:
         """同一時間枠での重複実行を防止（DBロック）"""
@@ -396,12 +400,59 @@ class AutoTradeService:
             self.db.rollback()
 
     def process_auto_trades(self):
-        """自動売買メイン処理（scheduled_updateから呼ばれる）"""
+        """自動売買メイン処理（全対象銘柄を順に判定）
+
+        1回の実行を1つの作業単位として扱い、判定ログは終了時（または実注文の記録時）に
+        まとめて commit する。データ更新パイプラインは start_run → trade_code（銘柄ごと）→
+        finish_run を直接呼び、シグナルが出た銘柄から順に判定する。
+        """
+        run = None
+        try:
+            run = self.start_run()
+            if run is not None:
+                for code in run.codes:
+                    if run.remaining_trades <= 0:
+                        break
+                    self.trade_code(run, code)
+        finally:
+            self.finish_run(run)
+
+    def start_run(self, commit_each_code: bool = False) -> TradeRun | None:
+        """実行を開始（重複実行防止ロック・日次上限・証券口座の確認）
+
+        この時間枠で実行済み、または実行しない理由がある場合は None（理由はログに残す）。
+        None でも finish_run は必ず呼ぶこと。
+        commit_each_code=True なら trade_code ごとに commit する。SQLite では未 commit の
+        書き込み（ドライラン約定の flush）が DB 全体の書き込みロックを握るため、他の Session が
+        並行して書き込むデータ更新パイプラインではこちらを使う。
+        """
         # 重複実行防止
         self._cleanup_old_locks()
         if not self._acquire_lock():
+            return None
+        self._log_buffer = []
+        run = self._prepare_run()
+        if run is not None:
+            run.commit_each_code = commit_each_code
+        return run
+
+    def finish_run(self, run: TradeRun | None):
+        """バッファ済みの判定ログを書き込んで実行を終える"""
+        if self._log_buffer is None:
             return
+        try:
+            if run is not None:
+                logger.info(
+                    f"[auto-trade] Processing complete. "
+                    f"Trades today: {self._get_today_trade_count(dry_run=run.config['dryRun'])}"
+                )
+            self._checkpoint()
+        except Exception as e:
+            self.db.rollback()
+            logger.error(f"[auto-trade] ログ書き込み失敗: {e}")
+        self._log_buffer = None
 
+    def _prepare_run(self) -> TradeRun | None:
         config = self.get_config()
 
         logger.info(f"[auto-trade] Processing started (enabled={config['enabled']}, dryRun={config['dryRun']})")
@@ -416,7 +467,7 @@ class AutoTradeService:
                 result_message='自動売買が無効です',
                 dry_run=config['dryRun'],
             )
-            return
+            return None
 
         # 2. 日次上限チェック
         today_count = self._get_today_trade_count(dry_run=config['dryRun'])
@@ -429,7 +480,7 @@ class AutoTradeService:
                 result_message=f'日次取引上限到達 ({today_count}/{config["maxTradesPerDay"]})',
                 dry_run=config['dryRun'],
             )
-            return
+            return None
 
         # 3. 有効な銘柄を取得
         enabled_stocks = self.db.query(AutoTradeStock).filter(
@@ -444,7 +495,7 @@ class AutoTradeService:
                 result_message='対象銘柄が未設定です',
                 dry_run=config['dryRun'],
             )
-            return
+            return None
 
         stock_service = StockService(self.db)
         risk_service = RiskService(self.db)
@@ -467,7 +518,7 @@ class AutoTradeService:
                     result_message=f'取引時間外 ({now.strftime("%H:%M")})',
                     dry_run=False,
                 )
-                return
+                return None
             # 昼休み (11:30-12:25) は注文を控える
             if time(11, 30) <= now.time() <= time(12, 25):
                 logger.info(f"[auto-trade] 昼休み中 ({now.strftime('%H:%M')}). 実資金注文をスキップ")
@@ -477,7 +528,7 @@ class AutoTradeService:
                     result_message=f'昼休み中 ({now.strftime("%H:%M")})',
                     dry_run=False,
                 )
-                return
+                return None
             try:
                 conn_result = asyncio.run(brokerage_service.connect())
                 if not conn_result.get('connected'):
@@ -488,7 +539,7 @@ class AutoTradeService:
                         result_message=f'kabu STATION接続失敗: {conn_result.get("message")}',
                         dry_run=False,
                     )
-                    return
+                    return None
                 logger.info("[auto-trade] kabu STATION接続確認OK")
                 # 既存の submitted 注文の約定状態を同期（submitted→filled/cancelled）
                 # 収支集計を正確に保つため。失敗しても発注処理は続行する。
@@ -506,7 +557,7 @@ class AutoTradeService:
                     result_message=f'kabu STATION接続エラー: {str(e)}',
                     dry_run=False,
                 )
-                return
+                return None
             # 実残高取得（数量計算と発注前検証に使用）
             # tradingMode=margin_* のときは信用余力(MarginAccountWallet) を effective_budget に使う。
             # kabu の get_balance() は cashBalance と marginBalance を返す（brokerage_service:320-322）。
@@ -527,519 +578,523 @@ class AutoTradeService:
                     result_message=f'残高取得エラー: {str(e)}',
                     dry_run=False,
                 )
-                return
-
-        for auto_stock in enabled_stocks:
-            if remaining_trades <= 0:
-                break
+                return None
+
+        return TradeRun(
+            config=config,
+            settings=settings,
+            risk_service=risk_service,
+            brokerage_service=brokerage_service,
+            codes=[auto_stock.code for auto_stock in enabled_stocks],
+            remaining_trades=remaining_trades,
+            cash_balance=cash_balance,
+        )
 
-            code = auto_stock.code
+    def trade_code(self, run: TradeRun, code: str):
+        """1銘柄の売買判定と発注（日次上限到達後・対象外の銘柄は何もしない）"""
+        if run.remaining_trades <= 0 or code not in run.codes:
+            return
+        self._trade_code(run, code)
+        if run.commit_each_code:
+            self._checkpoint()
 
-            # a. 最新シグナル取得
-            latest_signal = self.db.query(Signal).filter(
-                Signal.code == code
-            ).order_by(Signal.date.desc()).first()
+    def _trade_code(self, run: TradeRun, code: str):
+        config, settings, cash_balance = run.config, run.settings, run.cash_balance
+        risk_service, brokerage_service = run.risk_service, run.brokerage_service
 
-            if not latest_signal:
-                self._add_log(
-                    code=code,
-                    signal_type='hold',
-                    result_status='skipped',
-                    result_message='シグナルデータなし',
-                    dry_run=config['dryRun'],
-                )
-                continue
+        # a. 最新シグナル取得
+        latest_signal = self.db.query(Signal).filter(
+            Signal.code == code
+        ).order_by(Signal.date.desc()).first()
 
-            # a.1 最新価格取得
-            latest_price = self.db.query(StockPrice).filter(
-                StockPrice.code == code
-            ).order_by(StockPrice.date.desc()).first()
-            if not latest_price:
-                self._add_log(
-                    code=code,
-                    signal_type=latest_signal.signal_type,
-                    signal_strength=latest_signal.signal_strength or 0,
-                    active_signals=latest_signal.active_signals,
-                    result_status='skipped',
-                    result_message='価格データなし',
-                    dry_run=config['dryRun'],
-                )
-                continue
-            current_price = latest_price.close
+        if not latest_signal:
+            self._add_log(
+                code=code,
+                signal_type='hold',
+                result_status='skipped',
+                result_message='シグナルデータなし',
+                dry_run=config['dryRun'],
+            )
+            return
 
-            # a.2 保有中 → シグナル種別に関係なく自動利確・損切りチェック（ATR動的閾値 + トレーリングストップ）
-            # BUG FIX: 以前は hold シグナル限定だったため、株価下落→RSI低下→buyシグナル発生時に
-            # 損切りチェックがバイパスされていた。全シグナルで保有チェックを実行する。
-            if config['dryRun']:
-                entry_price = self._get_dry_run_entry_price(code)
-                hold_qty = self._get_dry_run_holding_quantity(code)
-            else:
-                entry_price = self._get_entry_price(code)
-                hold_qty = self._get_holding_quantity(code)
-
-            if hold_qty > 0:
-                take_profit_pct = config['takeProfitPercent']
-                stop_loss_pct = config['stopLossPercent']
-                sell_reason = None
-
-                # ATR値を取得（動的閾値用）
-                sig_atr = latest_signal.atr if hasattr(latest_signal, 'atr') else None
-
-                if entry_price and current_price > 0 and hold_qty > 0:
-                    gain_pct = ((current_price - entry_price) / entry_price) * 100
-
-                    if sig_atr and sig_atr > 0:
-                        # --- ATR動的閾値 + 3段階利確 + トレーリングストップ ---
-                        atr_take_profit = entry_price + 4 * sig_atr
-                        atr_stop_loss = entry_price - 2 * sig_atr
-                        # 損切りは設定値(stopLossPercent)を上限に締める。
-                        # ATRが広い銘柄でも最大損失を設定%（例 -5%）以内に抑える。
-                        fixed_stop = entry_price * (1 + stop_loss_pct / 100)
-                        atr_stop_loss = max(atr_stop_loss, fixed_stop)
-                        atr_gain = current_price - entry_price
-                        # 単元株数（買い側 line ~864 の (raw_qty // 100) * 100 と同じ前提）。
-                        # 部分売却数量を単元の倍数に丸めないと kabu API が Code 1002 で拒否する。
-                        unit_shares = 100
-                        # 3段階利確閾値
-                        atr_stage1 = 1.5 * sig_atr  # 第1段階: 33%利確
-                        atr_stage2 = 2.5 * sig_atr  # 第2段階: 33%利確
-                        atr_stage3 = 4.0 * sig_atr  # 第3段階: 全量利確
-                        atr_trailing_threshold = 2.5 * sig_atr
-                        atr_breakeven_threshold = 3.0 * sig_atr
-
-                        if current_price >= atr_take_profit:
-                            # 第3段階: entry + 5*ATR 到達 → 全量利確
+        # a.1 最新価格取得
+        latest_price = self.db.query(StockPrice).filter(
+            StockPrice.code == code
+        ).order_by(StockPrice.date.desc()).first()
+        if not latest_price:
+            self._add_log(
+                code=code,
+                signal_type=latest_signal.signal_type,
+                signal_strength=latest_signal.signal_strength or 0,
+                active_signals=latest_signal.active_signals,
+                result_status='skipped',
+                result_message='価格データなし',
+                dry_run=config['dryRun'],
+            )
+            return
+        current_price = latest_price.close
+
+        # a.2 保有中 → シグナル種別に関係なく自動利確・損切りチェック（ATR動的閾値 + トレーリングストップ）
+        # BUG FIX: 以前は hold シグナル限定だったため、株価下落→RSI低下→buyシグナル発生時に
+        # 損切りチェックがバイパスされていた。全シグナルで保有チェックを実行する。
+        if config['dryRun']:
+            entry_price = self._get_dry_run_entry_price(code)
+            hold_qty = self._get_dry_run_holding_quantity(code)
+        else:
+            entry_price = self._get_entry_price(code)
+            hold_qty = self._get_holding_quantity(code)
+
+        if hold_qty > 0:
+            take_profit_pct = config['takeProfitPercent']
+            stop_loss_pct = config['stopLossPercent']
+            sell_reason = None
+
+            # ATR値を取得（動的閾値用）
+            sig_atr = latest_signal.atr if hasattr(latest_signal, 'atr') else None
+
+            if entry_price and current_price > 0 and hold_qty > 0:
+                gain_pct = ((current_price - entry_price) / entry_price) * 100
+
+                if sig_atr and sig_atr > 0:
+                    # --- ATR動的閾値 + 3段階利確 + トレーリングストップ ---
+                    atr_take_profit = entry_price + 4 * sig_atr
+                    atr_stop_loss = entry_price - 2 * sig_atr
+                    # 損切りは設定値(stopLossPercent)を上限に締める。
+                    # ATRが広い銘柄でも最大損失を設定%（例 -5%）以内に抑える。
+                    fixed_stop = entry_price * (1 + stop_loss_pct / 100)
+                    atr_stop_loss = max(atr_stop_loss, fixed_stop)
+                    atr_gain = current_price - entry_price
+                    # 単元株数（買い側 line ~864 の (raw_qty // 100) * 100 と同じ前提）。
+                    # 部分売却数量を単元の倍数に丸めないと kabu API が Code 1002 で拒否する。
+                    unit_shares = 100
+                    # 3段階利確閾値
+                    atr_stage1 = 1.5 * sig_atr  # 第1段階: 33%利確
+                    atr_stage2 = 2.5 * sig_atr  # 第2段階: 33%利確
+                    atr_stage3 = 4.0 * sig_atr  # 第3段階: 全量利確
+                    atr_trailing_threshold = 2.5 * sig_atr
+                    atr_breakeven_threshold = 3.0 * sig_atr
+
+                    if current_price >= atr_take_profit:
+                        # 第3段階: entry + 5*ATR 到達 → 全量利確
+                        sell_reason = (
+                            f'ATR利確・第3段階（現在値 {current_price:.0f} >= 目標 {atr_take_profit:.0f}, '
+                            f'含み益 {gain_pct:.1f}%）'
+                        )
+                    elif atr_gain >= atr_stage2:
+                        # 第2段階: 含み益 >= 2.5*ATR → 33%利確（単元単位に丸め、最低1単元）
+                        partial_qty = max((hold_qty // 3) // unit_shares * unit_shares, unit_shares)
+                        if partial_qty < hold_qty:
                             sell_reason = (
-                                f'ATR利確・第3段階（現在値 {current_price:.0f} >= 目標 {atr_take_profit:.0f}, '
-                                f'含み益 {gain_pct:.1f}%）'
+                                f'段階的利確・第2段階（含み益 {gain_pct:.1f}%, '
+                                f'{atr_gain:.0f} >= 2.5×ATR {atr_stage2:.0f}, '
+                                f'{partial_qty}/{hold_qty}株売却）'
                             )
-                        elif atr_gain >= atr_stage2:
-                            # 第2段階: 含み益 >= 2.5*ATR → 33%利確（単元単位に丸め、最低1単元）
-                            partial_qty = max((hold_qty // 3) // unit_shares * unit_shares, unit_shares)
-                            if partial_qty < hold_qty:
-                                sell_reason = (
-                                    f'段階的利確・第2段階（含み益 {gain_pct:.1f}%, '
-                                    f'{atr_gain:.0f} >= 2.5×ATR {atr_stage2:.0f}, '
-                                    f'{partial_qty}/{hold_qty}株売却）'
-                                )
-                                hold_qty = partial_qty
-                            else:
-                                sell_reason = (
-                                    f'段階的利確・第2段階（含み益 {gain_pct:.1f}%, '
-                                    f'{atr_gain:.0f} >= 2.5×ATR {atr_stage2:.0f}, '
-                                    f'全{hold_qty}株売却）'
-                                )
-                        elif atr_gain >= atr_stage1:
-                            # 第1段階: 含み益 >= 1.5*ATR → 33%利確（単元単位に丸め、最低1単元）
-                            partial_qty = max((hold_qty // 3) // unit_shares * unit_shares, unit_shares)
-                            if partial_qty < hold_qty:
-                                sell_reason = (
-                                    f'段階的利確・第1段階（含み益 {gain_pct:.1f}%, '
-                                    f'{atr_gain:.0f} >= 1.5×ATR {atr_stage1:.0f}, '
-                                    f'{partial_qty}/{hold_qty}株売却→残りトレーリング）'
-                                )
-                                hold_qty = partial_qty
-                            else:
-                                sell_reason = (
-                                    f'段階的利確・第1段階（含み益 {gain_pct:.1f}%, '
-                                    f'{atr_gain:.0f} >= 1.5×ATR {atr_stage1:.0f}, '
-                                    f'全{hold_qty}株売却）'
-                                )
-
-                        elif atr_gain >= atr_breakeven_threshold:
-                            # ブレークイーブンストップ: 含み益 >= 3*ATR到達後、entry価格まで戻ったら売り
-                            if current_price <= entry_price:
-                                sell_reason = (
-                                    f'ブレークイーブンストップ（現在値 {current_price:.0f} <= '
-                                    f'取得単価 {entry_price:.0f}）'
-                                )
-                        elif atr_gain >= atr_trailing_threshold:
-                            # トレーリングストップ: 含み益 >= 2.5*ATR → current - 2*ATR を下回ったら売り
-                            trailing_stop = current_price - 2.0 * sig_atr
-                            recent_prices = self.db.query(StockPrice).filter(
-                                StockPrice.code == code
-                            ).order_by(StockPrice.date.desc()).limit(2).all()
-                            if len(recent_prices) >= 2 and recent_prices[0].low <= trailing_stop:
-                                sell_reason = (
-                                    f'トレーリングストップ（安値 {recent_prices[0].low:.0f} <= '
-                                    f'トレーリング {trailing_stop:.0f}, 含み益 {gain_pct:.1f}%）'
-                                )
-                        elif current_price <= atr_stop_loss:
-                            # ATR損切り: entry - 2.5*ATR
+                            hold_qty = partial_qty
+                        else:
                             sell_reason = (
-                                f'ATR損切り（現在値 {current_price:.0f} <= 損切り {atr_stop_loss:.0f}, '
-                                f'含み損 {gain_pct:.1f}%）'
+                                f'段階的利確・第2段階（含み益 {gain_pct:.1f}%, '
+                                f'{atr_gain:.0f} >= 2.5×ATR {atr_stage2:.0f}, '
+                                f'全{hold_qty}株売却）'
                             )
-                    else:
-                        # --- フォールバック: 従来の固定%ロジック ---
-                        # 大幅利益 → 無条件利確
-                        if gain_pct >= take_profit_pct * 2.0:
-                            sell_reason = f'自動利確（含み益 {gain_pct:.1f}% >= {take_profit_pct * 2.0:.1f}%）'
-                        # 利確閾値超え + 直近下落 → 利確
-                        elif gain_pct >= take_profit_pct:
-                            recent_2 = self.db.query(StockPrice).filter(
-                                StockPrice.code == code
-                            ).order_by(StockPrice.date.desc()).limit(2).all()
-                            if len(recent_2) == 2 and recent_2[0].close < recent_2[1].close:
-                                sell_reason = f'自動利確（含み益 {gain_pct:.1f}%, 直近下落中）'
-                        # 損切り
-                        elif gain_pct <= stop_loss_pct:
-                            sell_reason = f'自動損切り（含み損 {gain_pct:.1f}% <= {stop_loss_pct:.1f}%）'
-
-                if sell_reason and hold_qty > 0:
-                    # 利確・損切り売り実行
-                    logger.info(
-                        f"[auto-trade] {code}: EXIT {sell_reason} "
-                        f"(signal={latest_signal.signal_type}, entry={entry_price:.0f}, "
-                        f"current={current_price:.0f}, qty={hold_qty})"
-                    )
-                    if config['dryRun']:
-                        self._add_log(
-                            code=code,
-                            signal_type='sell',
-                            signal_strength=latest_signal.signal_strength or 0,
-                            active_signals=latest_signal.active_signals,
-                            order_type=config['orderType'],
-                            order_price=current_price,
-                            quantity=hold_qty,
-                            risk_passed=True,
-                            executed=False,
-                            dry_run=True,
-                            result_status='success',
-                            result_message=f'[DRY-RUN] {sell_reason}',
-                        )
-                        remaining_trades -= 1
-                    else:
-                        try:
-                            order_result = asyncio.run(
-                                brokerage_service.create_order(
-                                    code=code, order_type=config['orderType'],
-                                    side='sell', quantity=hold_qty,
-                                    price=current_price if config['orderType'] == 'limit' else None,
-                                    trading_mode=config.get('tradingMode', 'cash'),
-                                )
+                    elif atr_gain >= atr_stage1:
+                        # 第1段階: 含み益 >= 1.5*ATR → 33%利確（単元単位に丸め、最低1単元）
+                        partial_qty = max((hold_qty // 3) // unit_shares * unit_shares, unit_shares)
+                        if partial_qty < hold_qty:
+                            sell_reason = (
+                                f'段階的利確・第1段階（含み益 {gain_pct:.1f}%, '
+                                f'{atr_gain:.0f} >= 1.5×ATR {atr_stage1:.0f}, '
+                                f'{partial_qty}/{hold_qty}株売却→残りトレーリング）'
                             )
-                            if order_result.get('status') == 'failed':
-                                raise RuntimeError(f"売注文がfailedステータスで返却 (id={order_result.get('id')})")
-                            transaction = Transaction(
-                                code=code, transaction_type='sell',
-                                quantity=hold_qty, price=current_price,
-                                memo=f'[自動売買] {sell_reason}',
+                            hold_qty = partial_qty
+                        else:
+                            sell_reason = (
+                                f'段階的利確・第1段階（含み益 {gain_pct:.1f}%, '
+                                f'{atr_gain:.0f} >= 1.5×ATR {atr_stage1:.0f}, '
+                                f'全{hold_qty}株売却）'
                             )
-                            self.db.add(transaction)
-                            self.db.commit()
-                            self.db.refresh(transaction)
-                            self._add_log(
-                                code=code, signal_type='sell',
-                                signal_strength=latest_signal.signal_strength or 0,
-                                active_signals=latest_signal.active_signals,
-                                order_type=config['orderType'], order_price=current_price,
-                                quantity=hold_qty, risk_passed=True,
-                                executed=True, dry_run=False,
-                                result_status='success',
-                                result_message=f'{sell_reason} (Order: {order_result.get("brokerageOrderId", "N/A")})',
-                                transaction_id=transaction.id,
-                                brokerage_order_id=order_result.get('brokerageOrderId'),
+
+                    elif atr_gain >= atr_breakeven_threshold:
+                        # ブレークイーブンストップ: 含み益 >= 3*ATR到達後、entry価格まで戻ったら売り
+                        if current_price <= entry_price:
+                            sell_reason = (
+                                f'ブレークイーブンストップ（現在値 {current_price:.0f} <= '
+                                f'取得単価 {entry_price:.0f}）'
                             )
-                            remaining_trades -= 1
-                        except Exception as e:
-                            self._add_log(
-                                code=code, signal_type='sell',
-                                signal_strength=latest_signal.signal_strength or 0,
-                                active_signals=latest_signal.active_signals,
-                                order_price=current_price, quantity=hold_qty,
-                                executed=False, dry_run=False,
-                                result_status='failed',
-                                result_message=f'{sell_reason} 注文失敗: {str(e)}',
+                    elif atr_gain >= atr_trailing_threshold:
+                        # トレーリングストップ: 含み益 >= 2.5*ATR → current - 2*ATR を下回ったら売り
+                        trailing_stop = current_price - 2.0 * sig_atr
+                        recent_prices = self.db.query(StockPrice).filter(
+                            StockPrice.code == code
+                        ).order_by(StockPrice.date.desc()).limit(2).all()
+                        if len(recent_prices) >= 2 and recent_prices[0].low <= trailing_stop:
+                            sell_reason = (
+                                f'トレーリングストップ（安値 {recent_prices[0].low:.0f} <= '
+                                f'トレーリング {trailing_stop:.0f}, 含み益 {gain_pct:.1f}%）'
                             )
-                    continue
-
-                # イグジット未発動 → 保有状況ログ出力
-                gain_pct = ((current_price - entry_price) / entry_price) * 100 if entry_price else 0
-                atr_info = ''
-                if sig_atr and sig_atr > 0 and entry_price:
-                    atr_sl = entry_price - 2 * sig_atr
-                    atr_tp = entry_price + 4 * sig_atr
-                    atr_info = f', ATR={sig_atr:.0f}, SL={atr_sl:.0f}, TP={atr_tp:.0f}'
-                entry_str = f'{entry_price:.0f}' if entry_price else 'N/A'
+                    elif current_price <= atr_stop_loss:
+                        # ATR損切り: entry - 2.5*ATR
+                        sell_reason = (
+                            f'ATR損切り（現在値 {current_price:.0f} <= 損切り {atr_stop_loss:.0f}, '
+                            f'含み損 {gain_pct:.1f}%）'
+                        )
+                else:
+                    # --- フォールバック: 従来の固定%ロジック ---
+                    # 大幅利益 → 無条件利確
+                    if gain_pct >= take_profit_pct * 2.0:
+                        sell_reason = f'自動利確（含み益 {gain_pct:.1f}% >= {take_profit_pct * 2.0:.1f}%）'
+                    # 利確閾値超え + 直近下落 → 利確
+                    elif gain_pct >= take_profit_pct:
+                        recent_2 = self.db.query(StockPrice).filter(
+                            StockPrice.code == code
+                        ).order_by(StockPrice.date.desc()).limit(2).all()
+                        if len(recent_2) == 2 and recent_2[0].close < recent_2[1].close:
+                            sell_reason = f'自動利確（含み益 {gain_pct:.1f}%, 直近下落中）'
+                    # 損切り
+                    elif gain_pct <= stop_loss_pct:
+                        sell_reason = f'自動損切り（含み損 {gain_pct:.1f}% <= {stop_loss_pct:.1f}%）'
+
+            if sell_reason and hold_qty > 0:
+                # 利確・損切り売り実行
                 logger.info(
-                    f"[auto-trade] {code}: HOLD (signal={latest_signal.signal_type}, "
-                    f"entry={entry_str}, current={current_price:.0f}, "
-                    f"gain={gain_pct:+.1f}%, qty={hold_qty}{atr_info})"
+                    f"[auto-trade] {code}: EXIT {sell_reason} "
+                    f"(signal={latest_signal.signal_type}, entry={entry_price:.0f}, "
+                    f"current={current_price:.0f}, qty={hold_qty})"
                 )
-
-                # holdシグナルなら様子見ログ、buy/sellシグナルなら保有中スキップ
-                if latest_signal.signal_type == 'hold':
-                    msg = f'holdシグナル（含み益 {gain_pct:+.1f}%）'
-                elif latest_signal.signal_type == 'buy':
-                    msg = f'既に保有中（{hold_qty}株, 含み益 {gain_pct:+.1f}%）'
-                else:
-                    # sellシグナルだがイグジット条件未達 → 通常sell処理へ進む
-                    pass
-
-                if latest_signal.signal_type in ('hold', 'buy'):
+                if config['dryRun']:
                     self._add_log(
                         code=code,
-                        signal_type=latest_signal.signal_type,
+                        signal_type='sell',
                         signal_strength=latest_signal.signal_strength or 0,
                         active_signals=latest_signal.active_signals,
+                        order_type=config['orderType'],
                         order_price=current_price,
-                        result_status='skipped',
-                        result_message=msg,
-                        dry_run=config['dryRun'],
+                        quantity=hold_qty,
+                        risk_passed=True,
+                        executed=False,
+                        dry_run=True,
+                        result_status='success',
+                        result_message=f'[DRY-RUN] {sell_reason}',
                     )
-                    continue
-                # sellシグナルの場合はイグジット未発動でも通常sell処理に進む
-            elif latest_signal.signal_type == 'hold':
-                # 未保有 + holdシグナル → 何もしない
-                self._add_log(
-                    code=code,
-                    signal_type='hold',
-                    signal_strength=latest_signal.signal_strength or 0,
-                    active_signals=latest_signal.active_signals,
-                    order_price=current_price,
-                    result_status='skipped',
-                    result_message='holdシグナル（様子見）',
-                    dry_run=config['dryRun'],
-                )
-                continue
+                    run.remaining_trades -= 1
+                else:
+                    try:
+                        order_result = asyncio.run(
+                            brokerage_service.create_order(
+                                code=code, order_type=config['orderType'],
+                                side='sell', quantity=hold_qty,
+                                price=current_price if config['orderType'] == 'limit' else None,
+                                trading_mode=config.get('tradingMode', 'cash'),
+                            )
+                        )
+                        if order_result.get('status') == 'failed':
+                            raise RuntimeError(f"売注文がfailedステータスで返却 (id={order_result.get('id')})")
+                        transaction = Transaction(
+                            code=code, transaction_type='sell',
+                            quantity=hold_qty, price=current_price,
+                            memo=f'[自動売買] {sell_reason}',
+                        )
+                        self._record_order(
+                            transaction,
+                            code=code, signal_type='sell',
+                            signal_strength=latest_signal.signal_strength or 0,
+                            active_signals=latest_signal.active_signals,
+                            order_type=config['orderType'], order_price=current_price,
+                            quantity=hold_qty, risk_passed=True,
+                            result_status='success',
+                            result_message=f'{sell_reason} (Order: {order_result.get("brokerageOrderId", "N/A")})',
+                            brokerage_order_id=order_result.get('brokerageOrderId'),
+                        )
+                        run.remaining_trades -= 1
+                    except Exception as e:
+                        self._add_log(
+                            code=code, signal_type='sell',
+                            signal_strength=latest_signal.signal_strength or 0,
+                            active_signals=latest_signal.active_signals,
+                            order_price=current_price, quantity=hold_qty,
+                            executed=False, dry_run=False,
+                            result_status='failed',
+                            result_message=f'{sell_reason} 注文失敗: {str(e)}',
+                        )
+                return
 
-            # b. 時間帯重み適用 + シグナル強度チェック
-            time_weight = _get_time_weight()
-            raw_score = latest_signal.signal_score or 0
-            adjusted_score = raw_score * time_weight
-            # 調整後スコアで強度を再計算
-            if adjusted_score >= 2.5:
-                strength = 3
-            elif adjusted_score >= 1.0:
-                strength = 2
-            elif adjusted_score > 0:
-                strength = 1
+            # イグジット未発動 → 保有状況ログ出力
+            gain_pct = ((current_price - entry_price) / entry_price) * 100 if entry_price else 0
+            atr_info = ''
+            if sig_atr and sig_atr > 0 and entry_price:
+                atr_sl = entry_price - 2 * sig_atr
+                atr_tp = entry_price + 4 * sig_atr
+                atr_info = f', ATR={sig_atr:.0f}, SL={atr_sl:.0f}, TP={atr_tp:.0f}'
+            entry_str = f'{entry_price:.0f}' if entry_price else 'N/A'
+            logger.info(
+                f"[auto-trade] {code}: HOLD (signal={latest_signal.signal_type}, "
+                f"entry={entry_str}, current={current_price:.0f}, "
+                f"gain={gain_pct:+.1f}%, qty={hold_qty}{atr_info})"
+            )
+
+            # holdシグナルなら様子見ログ、buy/sellシグナルなら保有中スキップ
+            if latest_signal.signal_type == 'hold':
+                msg = f'holdシグナル（含み益 {gain_pct:+.1f}%）'
+            elif latest_signal.signal_type == 'buy':
+                msg = f'既に保有中（{hold_qty}株, 含み益 {gain_pct:+.1f}%）'
             else:
-                strength = latest_signal.signal_strength or 0
-            if strength < config['minSignalStrength']:
+                # sellシグナルだがイグジット条件未達 → 通常sell処理へ進む
+                pass
+
+            if latest_signal.signal_type in ('hold', 'buy'):
                 self._add_log(
                     code=code,
                     signal_type=latest_signal.signal_type,
-                    signal_strength=strength,
+                    signal_strength=latest_signal.signal_strength or 0,
                     active_signals=latest_signal.active_signals,
+                    order_price=current_price,
                     result_status='skipped',
-                    result_message=f'シグナル強度不足 ({strength} < {config["minSignalStrength"]})',
+                    result_message=msg,
                     dry_run=config['dryRun'],
                 )
-                continue
-
-            # c. 数量計算（1銘柄あたり = 予算 / 最大保有銘柄数）
-            if latest_signal.signal_type == 'buy':
-                # 重複買い防止: 既に保有中の銘柄はスキップ
-                existing_qty = (self._get_dry_run_holding_quantity(code) if config['dryRun']
-                                else self._get_holding_quantity(code))
-                if existing_qty > 0:
-                    self._add_log(
-                        code=code, signal_type='buy', signal_strength=strength,
-                        active_signals=latest_signal.active_signals,
-                        order_price=current_price, quantity=0,
-                        result_status='skipped',
-                        result_message=f'既に保有中（{existing_qty}株）',
-                        dry_run=config['dryRun'],
-                    )
-                    continue
-                # 実資金モード: 当日その銘柄に既に発注済み（pending/submitted/filled/failed）ならスキップ
-                # → 同一スロットや次スロットで同じバグ注文を繰り返さないため
-                if not config['dryRun'] and self._has_today_buy_order(code):
-                    self._add_log(
-                        code=code, signal_type='buy', signal_strength=strength,
-                        active_signals=latest_signal.active_signals,
-                        order_price=current_price, quantity=0,
-                        result_status='skipped',
-                        result_message='本日この銘柄に発注済み（重複防止）',
-                        dry_run=False,
-                    )
-                    continue
-                risk_rules = risk_service.get_risk_rules()
-                max_positions = risk_rules['maxOpenPositions'] or 5
-                # 実資金モードでは実残高で予算をクランプ
-                effective_budget = settings['investmentBudget']
-                if not config['dryRun'] and cash_balance is not None:
-                    effective_budget = min(effective_budget, cash_balance)
-                budget = effective_budget / max_positions
-                raw_qty = int(budget / current_price) if current_price > 0 else 0
-                quantity = (raw_qty // 100) * 100  # 単元株（100株）の倍数に切り捨て
-                if quantity <= 0:
-                    self._add_log(
-                        code=code,
-                        signal_type='buy',
-                        signal_strength=strength,
-                        active_signals=latest_signal.active_signals,
-                        order_price=current_price,
-                        quantity=0,
-                        result_status='skipped',
-                        result_message='予算不足で購入数量が0',
-                        dry_run=config['dryRun'],
-                    )
-                    continue
-                # 実資金モード: 注文額が実残高(5%バッファ)を超えるなら数量を下げる
-                if not config['dryRun'] and cash_balance is not None:
-                    affordable_qty = int((cash_balance * 0.95) / current_price) if current_price > 0 else 0
-                    affordable_qty = (affordable_qty // 100) * 100
-                    if affordable_qty < quantity:
-                        if affordable_qty <= 0:
-                            self._add_log(
-                                code=code, signal_type='buy', signal_strength=strength,
-                                active_signals=latest_signal.active_signals,
-                                order_price=current_price, quantity=0,
-                                result_status='skipped',
-                                result_message=f'残高不足（残高{cash_balance:,.0f}円, 単価{current_price:.0f}円）',
-                                dry_run=False,
-                            )
-                            continue
-                        logger.info(f"[auto-trade] {code}: 残高により数量を {quantity}→{affordable_qty} に縮小")
-                        quantity = affordable_qty
-            else:  # sell
-                if config['dryRun']:
-                    quantity = self._get_dry_run_holding_quantity(code)
-                else:
-                    quantity = self._get_holding_quantity(code)
-                if quantity <= 0:
-                    logger.debug(f"[auto-trade] {code}: sell skipped (no holdings)")
-                    self._add_log(
-                        code=code,
-                        signal_type='sell',
-                        signal_strength=strength,
-                        active_signals=latest_signal.active_signals,
-                        order_price=current_price,
-                        quantity=0,
-                        result_status='skipped',
-                        result_message='保有数量が0のため売却不可',
-                        dry_run=config['dryRun'],
-                    )
-                    continue
-
-            order_price = current_price if config['orderType'] == 'market' else (
-                latest_signal.target_price or current_price
+                return
+            # sellシグナルの場合はイグジット未発動でも通常sell処理に進む
+        elif latest_signal.signal_type == 'hold':
+            # 未保有 + holdシグナル → 何もしない
+            self._add_log(
+                code=code,
+                signal_type='hold',
+                signal_strength=latest_signal.signal_strength or 0,
+                active_signals=latest_signal.active_signals,
+                order_price=current_price,
+                result_status='skipped',
+                result_message='holdシグナル（様子見）',
+                dry_run=config['dryRun'],
             )
+            return
 
-            # d. リスク評価
-            risk_result = risk_service.evaluate_trade(
-                code, latest_signal.signal_type, quantity, current_price,
+        # b. 時間帯重み適用 + シグナル強度チェック
+        time_weight = _get_time_weight()
+        raw_score = latest_signal.signal_score or 0
+        adjusted_score = raw_score * time_weight
+        # 調整後スコアで強度を再計算
+        if adjusted_score >= 2.5:
+            strength = 3
+        elif adjusted_score >= 1.0:
+            strength = 2
+        elif adjusted_score > 0:
+            strength = 1
+        else:
+            strength = latest_signal.signal_strength or 0
+        if strength < config['minSignalStrength']:
+            self._add_log(
+                code=code,
+                signal_type=latest_signal.signal_type,
+                signal_strength=strength,
+                active_signals=latest_signal.active_signals,
+                result_status='skipped',
+                result_message=f'シグナル強度不足 ({strength} < {config["minSignalStrength"]})',
                 dry_run=config['dryRun'],
             )
-            risk_warnings = [
-                {'level': w['level'], 'message': w['message']}
-                for w in risk_result['warnings']
-            ]
+            return
 
-            if not risk_result['passed']:
-                warn_msgs = [w['message'] for w in risk_warnings]
-                logger.info(
-                    f"[auto-trade] {code}: RISK_BLOCKED {latest_signal.signal_type} "
-                    f"(strength={strength}, price={current_price:.0f}, qty={quantity}, "
-                    f"reasons={warn_msgs})"
+        # c. 数量計算（1銘柄あたり = 予算 / 最大保有銘柄数）
+        if latest_signal.signal_type == 'buy':
+            # 重複買い防止: 既に保有中の銘柄はスキップ
+            existing_qty = (self._get_dry_run_holding_quantity(code) if config['dryRun']
+                            else self._get_holding_quantity(code))
+            if existing_qty > 0:
+                self._add_log(
+                    code=code, signal_type='buy', signal_strength=strength,
+                    active_signals=latest_signal.active_signals,
+                    order_price=current_price, quantity=0,
+                    result_status='skipped',
+                    result_message=f'既に保有中（{existing_qty}株）',
+                    dry_run=config['dryRun'],
                 )
+                return
+            # 実資金モード: 当日その銘柄に既に発注済み（pending/submitted/filled/failed）ならスキップ
+            # → 同一スロットや次スロットで同じバグ注文を繰り返さないため
+            if not config['dryRun'] and self._has_today_buy_order(code):
+                self._add_log(
+                    code=code, signal_type='buy', signal_strength=strength,
+                    active_signals=latest_signal.active_signals,
+                    order_price=current_price, quantity=0,
+                    result_status='skipped',
+                    result_message='本日この銘柄に発注済み（重複防止）',
+                    dry_run=False,
+                )
+                return
+            risk_rules = risk_service.get_risk_rules()
+            max_positions = risk_rules['maxOpenPositions'] or 5
+            # 実資金モードでは実残高で予算をクランプ
+            effective_budget = settings['investmentBudget']
+            if not config['dryRun'] and cash_balance is not None:
+                effective_budget = min(effective_budget, cash_balance)
+            budget = effective_budget / max_positions
+            raw_qty = int(budget / current_price) if current_price > 0 else 0
+            quantity = (raw_qty // 100) * 100  # 単元株（100株）の倍数に切り捨て
+            if quantity <= 0:
                 self._add_log(
                     code=code,
-                    signal_type=latest_signal.signal_type,
+                    signal_type='buy',
                     signal_strength=strength,
                     active_signals=latest_signal.active_signals,
-                    order_type=config['orderType'],
-                    order_price=order_price,
-                    quantity=quantity,
-                    risk_passed=False,
-                    risk_warnings=risk_warnings,
-                    result_status='risk_blocked',
-                    result_message='リスク評価で拒否されました',
+                    order_price=current_price,
+                    quantity=0,
+                    result_status='skipped',
+                    result_message='予算不足で購入数量が0',
                     dry_run=config['dryRun'],
                 )
-                continue
-
-            # e. ドライラン
+                return
+            # 実資金モード: 注文額が実残高(5%バッファ)を超えるなら数量を下げる
+            if not config['dryRun'] and cash_balance is not None:
+                affordable_qty = int((cash_balance * 0.95) / current_price) if current_price > 0 else 0
+                affordable_qty = (affordable_qty // 100) * 100
+                if affordable_qty < quantity:
+                    if affordable_qty <= 0:
+                        self._add_log(
+                            code=code, signal_type='buy', signal_strength=strength,
+                            active_signals=latest_signal.active_signals,
+                            order_price=current_price, quantity=0,
+                            result_status='skipped',
+                            result_message=f'残高不足（残高{cash_balance:,.0f}円, 単価{current_price:.0f}円）',
+                            dry_run=False,
+                        )
+                        return
+                    logger.info(f"[auto-trade] {code}: 残高により数量を {quantity}→{affordable_qty} に縮小")
+                    quantity = affordable_qty
+        else:  # sell
             if config['dryRun']:
-                logger.info(
-                    f"[auto-trade] {code}: EXECUTE {latest_signal.signal_type} "
-                    f"(strength={strength}, price={current_price:.0f}, qty={quantity}, "
-                    f"signals={latest_signal.active_signals})"
-                )
+                quantity = self._get_dry_run_holding_quantity(code)
+            else:
+                quantity = self._get_holding_quantity(code)
+            if quantity <= 0:
+                logger.debug(f"[auto-trade] {code}: sell skipped (no holdings)")
                 self._add_log(
                     code=code,
-                    signal_type=latest_signal.signal_type,
+                    signal_type='sell',
                     signal_strength=strength,
                     active_signals=latest_signal.active_signals,
-                    order_type=config['orderType'],
-                    order_price=order_price,
-                    quantity=quantity,
-                    risk_passed=True,
-                    risk_warnings=risk_warnings,
-                    executed=False,
-                    dry_run=True,
-                    result_status='success',
-                    result_message='[DRY-RUN] 注文は送信されませんでした',
+                    order_price=current_price,
+                    quantity=0,
+                    result_status='skipped',
+                    result_message='保有数量が0のため売却不可',
+                    dry_run=config['dryRun'],
                 )
-                remaining_trades -= 1
-                continue
+                return
 
-            # f. 実注文送信
-            try:
-                order_result = asyncio.run(
-                    brokerage_service.create_order(
-                        code=code,
-                        order_type=config['orderType'],
-                        side=latest_signal.signal_type,
-                        quantity=quantity,
-                        price=order_price if config['orderType'] == 'limit' else None,
-                        trading_mode=config.get('tradingMode', 'cash'),
-                    )
-                )
+        order_price = current_price if config['orderType'] == 'market' else (
+            latest_signal.target_price or current_price
+        )
 
-                # 注文ステータス確認（failedならTransaction作成しない）
-                if order_result.get('status') == 'failed':
-                    raise RuntimeError(f"注文がfailedステータスで返却 (id={order_result.get('id')})")
+        # d. リスク評価
+        risk_result = risk_service.evaluate_trade(
+            code, latest_signal.signal_type, quantity, current_price,
+            dry_run=config['dryRun'],
+        )
+        risk_warnings = [
+            {'level': w['level'], 'message': w['message']}
+            for w in risk_result['warnings']
+        ]
 
-                # Transaction レコード作成
-                transaction = Transaction(
-                    code=code,
-                    transaction_type=latest_signal.signal_type,
-                    quantity=quantity,
-                    price=current_price,
-                    memo=f'[自動売買] {latest_signal.active_signals}',
-                )
-                self.db.add(transaction)
-                self.db.commit()
-                self.db.refresh(transaction)
+        if not risk_result['passed']:
+            warn_msgs = [w['message'] for w in risk_warnings]
+            logger.info(
+                f"[auto-trade] {code}: RISK_BLOCKED {latest_signal.signal_type} "
+                f"(strength={strength}, price={current_price:.0f}, qty={quantity}, "
+                f"reasons={warn_msgs})"
+            )
+            self._add_log(
+                code=code,
+                signal_type=latest_signal.signal_type,
+                signal_strength=strength,
+                active_signals=latest_signal.active_signals,
+                order_type=config['orderType'],
+                order_price=order_price,
+                quantity=quantity,
+                risk_passed=False,
+                risk_warnings=risk_warnings,
+                result_status='risk_blocked',
+                result_message='リスク評価で拒否されました',
+                dry_run=config['dryRun'],
+            )
+            return
 
-                self._add_log(
-                    code=code,
-                    signal_type=latest_signal.signal_type,
-                    signal_strength=strength,
-                    active_signals=latest_signal.active_signals,
-                    order_type=config['orderType'],
-                    order_price=order_price,
-                    quantity=quantity,
-                    risk_passed=True,
-                    risk_warnings=risk_warnings,
-                    executed=True,
-                    dry_run=False,
-                    result_status='success',
-                    result_message=f'注文送信完了 (Order ID: {order_result.get("brokerageOrderId", "N/A")})',
-                    transaction_id=transaction.id,
-                    brokerage_order_id=order_result.get('brokerageOrderId'),
-                )
-                remaining_trades -= 1
+        # e. ドライラン
+        if config['dryRun']:
+            logger.info(
+                f"[auto-trade] {code}: EXECUTE {latest_signal.signal_type} "
+                f"(strength={strength}, price={current_price:.0f}, qty={quantity}, "
+                f"signals={latest_signal.active_signals})"
+            )
+            self._add_log(
+                code=code,
+                signal_type=latest_signal.signal_type,
+                signal_strength=strength,
+                active_signals=latest_signal.active_signals,
+                order_type=config['orderType'],
+                order_price=order_price,
+                quantity=quantity,
+                risk_passed=True,
+                risk_warnings=risk_warnings,
+                executed=False,
+                dry_run=True,
+                result_status='success',
+                result_message='[DRY-RUN] 注文は送信されませんでした',
+            )
+            run.remaining_trades -= 1
+            return
 
-            except Exception as e:
-                self._add_log(
+        # f. 実注文送信
+        try:
+            order_result = asyncio.run(
+                brokerage_service.create_order(
                     code=code,
-                    signal_type=latest_signal.signal_type,
-                    signal_strength=strength,
-                    active_signals=latest_signal.active_signals,
                     order_type=config['orderType'],
-                    order_price=order_price,
+                    side=latest_signal.signal_type,
                     quantity=quantity,
-                    risk_passed=True,
-                    risk_warnings=risk_warnings,
-                    executed=False,
-                    dry_run=False,
-                    result_status='failed',
-                    result_message=f'注文送信失敗: {str(e)}',
+                    price=order_price if config['orderType'] == 'limit' else None,
+                    trading_mode=config.get('tradingMode', 'cash'),
                 )
+            )
+
+            # 注文ステータス確認（failedならTransaction作成しない）
+            if order_result.get('status') == 'failed':
+                raise RuntimeError(f"注文がfailedステータスで返却 (id={order_result.get('id')})")
+
+            # Transaction レコード作成
+            transaction = Transaction(
+                code=code,
+                transaction_type=latest_signal.signal_type,
+                quantity=quantity,
+                price=current_price,
+                memo=f'[自動売買] {latest_signal.active_signals}',
+            )
+            self._record_order(
+                transaction,
+                code=code,
+                signal_type=latest_signal.signal_type,
+                signal_strength=strength,
+                active_signals=latest_signal.active_signals,
+                order_type=config['orderType'],
+                order_price=order_price,
+                quantity=quantity,
+                risk_passed=True,
+                risk_warnings=risk_warnings,
+                result_status='success',
+                result_message=f'注文送信完了 (Order ID: {order_result.get("brokerageOrderId", "N/A")})',
+                brokerage_order_id=order_result.get('brokerageOrderId'),
+            )
+            run.remaining_trades -= 1
 
-        logger.info(f"[auto-trade] Processing complete. Trades today: {self._get_today_trade_count(dry_run=config['dryRun'])}")
+        except Exception as e:
+            self._add_log(
+                code=code,
+                signal_type=latest_signal.signal_type,
+                signal_strength=strength,
+                active_signals=latest_signal.active_signals,
+                order_type=config['orderType'],
+                order_price=order_price,
+                quantity=quantity,
+                risk_passed=True,
+                risk_warnings=risk_warnings,
+                executed=False,
+                dry_run=False,
+                result_status='failed',
+                result_message=f'注文送信失敗: {str(e)}',
+            )
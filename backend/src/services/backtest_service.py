@@ -1,10 +1,16 @@
 import json
 import numpy as np
 import pandas as pd
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
 from sqlalchemy.orm import Session
-from src.models.stock import Backtest, BacktestTrade, BacktestSnapshot, Stock, StockPrice
+from src.models.stock import Backtest, BacktestTrade, BacktestSnapshot, BacktestCurve, Stock, StockPrice
+from src.models.equity_curve import EquityCurve, append_curve, encode_curve
 from src.services.stock_service import StockService
+from src.services.risk_service import RiskService
+from src.services import performance
+from src.services.downsample import lttb_indices
+
+EXTEND_LOOKBACK_DAYS = 400  # 延長時に指標計算のため遡って読み込む暦日数
 
 
 class BacktestService:
@@ -53,7 +59,7 @@ class BacktestService:
         self.db.refresh(backtest)
 
         try:
-            self._run_backtest(backtest, codes)
+            self._run_backtest(backtest, codes, params)
             backtest.status = 'completed'
         except Exception as e:
             backtest.status = 'failed'
@@ -63,59 +69,199 @@ class BacktestService:
 
         return self._format_detail(backtest)
 
-    def _run_backtest(self, backtest: Backtest, codes: list[str]):
-        """バックテストを実行"""
+    def _run_backtest(self, backtest: Backtest, codes: list[str], params: dict | None = None,
+                      state: dict | None = None):
+        """バックテストを実行
+
+        params['mode'] == 'ranked' の場合はシグナルスコア上位N銘柄のポートフォリオ構築、
+        それ以外は従来の均等配分（買いシグナル全銘柄をコード順に約定）。
+        state（前回の終端状態）を渡すと lastDate 翌日以降のみをシミュレーションし、
+        取引・資産推移を追記する。
+        """
+        params = params or {}
         stock_service = StockService(self.db)
         settings = stock_service.get_settings()
 
-        cash = backtest.initial_capital
-        positions: dict[str, dict] = {}  # code -> {quantity, avg_price}
-        all_trades: list[dict] = []
+        resume_after = date.fromisoformat(state['lastDate']) if state else None
+        load_from = backtest.start_date
+        if resume_after:
+            # 指標計算用に遡って読み込むが、シミュレーションは新しい日付のみ
+            load_from = max(backtest.start_date, resume_after - timedelta(days=EXTEND_LOOKBACK_DAYS))
+        stock_data = self._load_stock_data(codes, load_from, backtest.end_date, stock_service, settings)
+        if not stock_data and not state:
+            raise ValueError('指定期間のデータがありません')
 
-        # 各銘柄の株価データを取得（DB内のデータを使用）
-        stock_data: dict[str, pd.DataFrame] = {}
-        for code in codes:
-            prices = self.db.query(StockPrice).filter(
-                StockPrice.code == code,
-                StockPrice.date >= backtest.start_date,
-                StockPrice.date <= backtest.end_date,
-            ).order_by(StockPrice.date.asc()).all()
+        # 全日付を収集 + 銘柄ごとの日付→行インデックス
+        date_index: dict[str, dict[date, int]] = {}
+        for code, df in stock_data.items():
+            date_index[code] = {
+                (d.date() if isinstance(d, datetime) else d): i
+                for i, d in enumerate(df['date'])
+            }
+        sorted_dates = sorted(
+            d for d in set().union(*(idx.keys() for idx in date_index.values()))
+            if resume_after is None or d > resume_after
+        )
+        closes = {code: df['close'].to_numpy(dtype=float) for code, df in stock_data.items()}
 
-            if not prices:
-                continue
+        cash = float(state['cash']) if state else float(backtest.initial_capital)
+        positions = {
+            code: {'quantity': p['quantity'], 'avg_price': p['avgPrice']}
+            for code, p in (state['positions'] if state else {}).items()
+        }
+        simulate = self._simulate_ranked if params.get('mode') == 'ranked' else self._simulate_equal_split
+        all_trades, equity_curve, cash_curve, cash = simulate(
+            codes, stock_data, sorted_dates, date_index, closes,
+            stock_service, settings, params, cash, positions,
+        )
 
-            df = pd.DataFrame([{
-                'date': p.date, 'open': p.open, 'high': p.high,
-                'low': p.low, 'close': p.close, 'volume': p.volume,
-            } for p in prices])
+        bench_base = dict(state['benchmarkBase']) if state else {}
+        bench_last = dict(state['benchmarkLast']) if state else {}
+        benchmark = self._equal_weight_benchmark(sorted_dates, date_index, closes, bench_base, bench_last)
 
+        # 取引記録を保存
+        for t in all_trades:
+            trade = BacktestTrade(
+                backtest_id=backtest.id,
+                code=t['code'],
+                trade_type=t['trade_type'],
+                quantity=t['quantity'],
+                price=t['price'],
+                trade_date=t['trade_date'],
+                pnl=t.get('pnl'),
+            )
+            self.db.add(trade)
+
+        totals = performance.trade_totals(
+            [t['pnl'] for t in all_trades if t['trade_type'] == 'sell' and t.get('pnl') is not None],
+            [t['quantity'] * t['price'] for t in all_trades],
+        )
+
+        # 資産推移は圧縮ブロブ1行で保存（日次行は作らない）。延長時は新しい日付分を末尾に追記する
+        curve_row = self.db.query(BacktestCurve).filter(BacktestCurve.backtest_id == backtest.id).first()
+        if state and curve_row:
+            prev_blob = curve_row.data
+            legacy_benchmark = state.get('benchmark')  # 旧形式: ベンチマークを end_state に保持していた
+            if legacy_benchmark is not None:
+                prev = EquityCurve(prev_blob)
+                if len(legacy_benchmark) != len(prev):
+                    legacy_benchmark = None
+                prev_blob = encode_curve(prev.dates, prev.portfolio_values, prev.cash, legacy_benchmark)
+            blob = append_curve(prev_blob, sorted_dates, equity_curve, cash_curve, benchmark)
+            totals = performance.merge_trade_totals(
+                state['trades'] if 'trades' in state else self._trade_totals(backtest.id), totals,
+            )
+        else:
+            blob = encode_curve(sorted_dates, equity_curve, cash_curve, benchmark)
+        curve = EquityCurve(blob)
+        if curve_row:
+            curve_row.data = blob
+            curve_row.num_points = len(curve)
+        else:
+            self.db.add(BacktestCurve(backtest_id=backtest.id, num_points=len(curve), data=blob))
+
+        # パフォーマンス計算（メモリ上の配列と取引累計のみ、DB再読込なし）
+        # 旧形式から変換した系列はベンチマークが欠けている（NaN）ため alpha/beta を出さない
+        benchmark = curve.benchmark if np.isfinite(curve.benchmark).all() else None
+        summary = performance.compute_summary(
+            curve.portfolio_values, curve.cash, backtest.initial_capital,
+            benchmark=benchmark, totals=totals,
+        )
+        summary['totalTrades'] = totals['trades']
+        backtest.result_summary = json.dumps(summary)
+
+        # 延長実行用の終端状態
+        last_date = sorted_dates[-1] if sorted_dates else resume_after
+        backtest.end_state = json.dumps({
+            'lastDate': last_date.isoformat() if last_date else None,
+            'cash': float(cash),  # 丸めると延長後の約定数量・現金が通し実行とずれる
+            'positions': {
+                code: {'quantity': int(p['quantity']), 'avgPrice': float(p['avg_price'])}
+                for code, p in positions.items()
+            },
+            'benchmarkBase': bench_base,
+            'benchmarkLast': bench_last,
+            'trades': totals,
+        })
+
+    def extend_backtest(self, backtest_id: int, end_date: str) -> dict | None:
+        """完了済みバックテストを end_date まで延長（新しい日付分のみシミュレーション）"""
+        bt = self.db.query(Backtest).filter(Backtest.id == backtest_id).first()
+        if not bt:
+            return None
+        if bt.status != 'completed' or not bt.end_state:
+            raise ValueError('延長できるのは完了済みのバックテストのみです')
+        new_end = datetime.strptime(end_date, '%Y-%m-%d').date()
+        if new_end <= bt.end_date:
+            raise ValueError('延長後の終了日は現在の終了日より後にしてください')
+
+        state = json.loads(bt.end_state)
+        params = json.loads(bt.strategy_params) if bt.strategy_params else {}
+        bt.end_date = new_end
+        try:
+            self._run_backtest(bt, params.get('codes', []), params, state)
+        except Exception:
+            self.db.rollback()
+            raise
+        self.db.commit()
+        return self._format_detail(bt)
+
+    def _trade_totals(self, backtest_id: int) -> dict:
+        """保存済み取引の累計（取引累計を end_state に持たない旧形式の延長用）"""
+        pnls, values = [], []
+        for trade_type, quantity, price, pnl in self.db.query(
+            BacktestTrade.trade_type, BacktestTrade.quantity, BacktestTrade.price, BacktestTrade.pnl,
+        ).filter(BacktestTrade.backtest_id == backtest_id).all():
+            values.append(quantity * price)
+            if trade_type == 'sell' and pnl is not None:
+                pnls.append(pnl)
+        return performance.trade_totals(pnls, values)
+
+    def _load_stock_data(self, codes: list[str], start: date, end: date,
+                         stock_service: StockService, settings: dict) -> dict[str, pd.DataFrame]:
+        """対象銘柄の株価を1クエリで取得し、銘柄ごとに指標を計算"""
+        rows = self.db.query(
+            StockPrice.code, StockPrice.date, StockPrice.open, StockPrice.high,
+            StockPrice.low, StockPrice.close, StockPrice.volume,
+        ).filter(
+            StockPrice.code.in_(codes),
+            StockPrice.date >= start,
+            StockPrice.date <= end,
+        ).order_by(StockPrice.code, StockPrice.date.asc()).all()
+        if not rows:
+            return {}
+
+        frame = pd.DataFrame(rows, columns=['code', 'date', 'open', 'high', 'low', 'close', 'volume'])
+        grouped = {code: g.drop(columns='code').reset_index(drop=True) for code, g in frame.groupby('code', sort=False)}
+
+        stock_data: dict[str, pd.DataFrame] = {}
+        for code in codes:
+            df = grouped.get(code)
+            if df is None:
+                continue
             if len(df) >= 26:
                 df = stock_service.calculate_indicators(df, settings)
             stock_data[code] = df
+        return stock_data
 
-        if not stock_data:
-            raise ValueError('指定期間のデータがありません')
+    def _simulate_equal_split(self, codes: list[str], stock_data: dict[str, pd.DataFrame],
+                              sorted_dates: list[date], date_index: dict[str, dict[date, int]],
+                              closes: dict[str, np.ndarray], stock_service: StockService,
+                              settings: dict, params: dict, cash: float, positions: dict[str, dict]):
+        """従来方式: 買いシグナルをコード順に約定し、資金を未保有銘柄数で均等配分
 
-        # 全日付を収集
-        all_dates = set()
-        for df in stock_data.values():
-            for d in df['date']:
-                if isinstance(d, datetime):
-                    d = d.date()
-                all_dates.add(d)
-        sorted_dates = sorted(all_dates)
+        positions（code -> {quantity, avg_price}）はその場で更新する。
+        戻り値は (取引, 日次評価額, 日次現金, 最終現金)。
+        """
+        all_trades: list[dict] = []
+        equity_curve = np.empty(len(sorted_dates))
+        cash_curve = np.empty(len(sorted_dates))
 
         # 日次シミュレーション
-        for current_date in sorted_dates:
+        for day_i, current_date in enumerate(sorted_dates):
             for code, df in stock_data.items():
-                date_rows = df[df['date'].apply(
-                    lambda x: x.date() if isinstance(x, datetime) else x
-                ) == current_date]
-                if date_rows.empty:
-                    continue
-
-                idx = df.index.get_loc(date_rows.index[0])
-                if idx < 1:
+                idx = date_index[code].get(current_date)
+                if idx is None or idx < 1:
                     continue
 
                 # シグナル計算（直近2日分のデータで判定）
@@ -124,7 +270,7 @@ class BacktestService:
                     continue
 
                 details = stock_service.calculate_signal_details(sub_df, settings)
-                current_price = float(df.iloc[idx]['close'])
+                current_price = float(closes[code][idx])
 
                 if details['signal_type'] == 'buy' and code not in positions:
                     # 買い: 資金の1/銘柄数で配分
@@ -154,93 +300,188 @@ class BacktestService:
             # 日次スナップショット
             portfolio_value = cash
             for code, pos in positions.items():
-                df = stock_data.get(code)
-                if df is not None:
-                    date_rows = df[df['date'].apply(
-                        lambda x: x.date() if isinstance(x, datetime) else x
-                    ) == current_date]
-                    if not date_rows.empty:
-                        portfolio_value += pos['quantity'] * float(date_rows.iloc[0]['close'])
-                    else:
-                        portfolio_value += pos['quantity'] * pos['avg_price']
-
-            snapshot = BacktestSnapshot(
-                backtest_id=backtest.id,
-                date=current_date,
-                portfolio_value=round(portfolio_value, 2),
-                cash=round(cash, 2),
-            )
-            self.db.add(snapshot)
-
-        # 取引記録を保存
-        for t in all_trades:
-            trade = BacktestTrade(
-                backtest_id=backtest.id,
-                code=t['code'],
-                trade_type=t['trade_type'],
-                quantity=t['quantity'],
-                price=t['price'],
-                trade_date=t['trade_date'],
-                pnl=t.get('pnl'),
-            )
-            self.db.add(trade)
+                idx = date_index.get(code, {}).get(current_date)
+                if idx is not None:
+                    portfolio_value += pos['quantity'] * float(closes[code][idx])
+                else:
+                    portfolio_value += pos['quantity'] * pos['avg_price']
+
+            equity_curve[day_i] = round(portfolio_value, 2)
+            cash_curve[day_i] = round(cash, 2)
+
+        return all_trades, equity_curve, cash_curve, cash
+
+    def _build_signal_panel(self, stock_data: dict[str, pd.DataFrame], sorted_dates: list[date],
+                            date_index: dict[str, dict[date, int]],
+                            stock_service: StockService, settings: dict) -> dict[str, np.ndarray]:
+        """銘柄×日付のパネル（終値・シグナル・スコア・損切り価格）を構築
+
+        signal は 1=buy / -1=sell / 0=hold。終値は評価用に前日値で補完し、
+        has_bar でその日に実際の足があるかを表す。sorted_dates より前の行
+        （延長時の遡り分）は指標と補完の起点にのみ使う。
+        """
+        n_codes, n_days = len(stock_data), len(sorted_dates)
+        pos_of = {d: i for i, d in enumerate(sorted_dates)}
+        close = np.full((n_codes, n_days + 1), np.nan)  # 先頭列は期間前の直近終値
+        signal = np.zeros((n_codes, n_days), dtype=np.int8)
+        score = np.zeros((n_codes, n_days))
+        stop_loss = np.full((n_codes, n_days), np.nan)
+
+        for row, (code, df) in enumerate(stock_data.items()):
+            df_close = df['close'].to_numpy(dtype=float)
+            # 銘柄ごとに全行のシグナルを1回の列演算で求める
+            series = stock_service.calculate_signal_series(df, settings)
+            df_signal = series['signal'].to_numpy()
+            df_score = series['signal_score'].to_numpy()
+            df_stop = series['stop_loss_price'].to_numpy()
+            for d, idx in date_index[code].items():
+                col = pos_of.get(d)
+                if col is None:
+                    if n_days and d < sorted_dates[0]:
+                        close[row, 0] = df_close[idx]
+                    continue
+                close[row, col + 1] = df_close[idx]
+                # シグナルは26本以上揃った日から（従来方式と同じ判定）
+                if idx < 25:
+                    continue
+                signal[row, col] = df_signal[idx]
+                score[row, col] = df_score[idx]
+                stop_loss[row, col] = df_stop[idx]
 
-        # パフォーマンス計算
-        snapshots = self.db.query(BacktestSnapshot).filter(
-            BacktestSnapshot.backtest_id == backtest.id
-        ).order_by(BacktestSnapshot.date.asc()).all()
-
-        final_value = snapshots[-1].portfolio_value if snapshots else backtest.initial_capital
-        total_return = final_value - backtest.initial_capital
-        total_return_pct = (total_return / backtest.initial_capital) * 100
-
-        # 最大ドローダウン
-        peak = backtest.initial_capital
-        max_dd = 0
-        for s in snapshots:
-            if s.portfolio_value > peak:
-                peak = s.portfolio_value
-            dd = (peak - s.portfolio_value) / peak * 100
-            if dd > max_dd:
-                max_dd = dd
-
-        # 勝率
-        sell_trades = [t for t in all_trades if t['trade_type'] == 'sell' and t.get('pnl') is not None]
-        wins = len([t for t in sell_trades if t['pnl'] > 0])
-        win_rate = (wins / len(sell_trades) * 100) if sell_trades else 0
-
-        # プロフィットファクター
-        gross_profit = sum(t['pnl'] for t in sell_trades if t['pnl'] > 0)
-        gross_loss = abs(sum(t['pnl'] for t in sell_trades if t['pnl'] < 0))
-        profit_factor = (gross_profit / gross_loss) if gross_loss > 0 else float('inf') if gross_profit > 0 else 0
-
-        # シャープレシオ（日次リターン）
-        if len(snapshots) >= 2:
-            daily_returns = []
-            for i in range(1, len(snapshots)):
-                r = (snapshots[i].portfolio_value - snapshots[i - 1].portfolio_value) / snapshots[i - 1].portfolio_value
-                daily_returns.append(r)
-            if daily_returns:
-                mean_r = np.mean(daily_returns)
-                std_r = np.std(daily_returns)
-                risk_free_daily = 0.001 / 252  # 年率0.1%
-                sharpe = ((mean_r - risk_free_daily) / std_r * np.sqrt(252)) if std_r > 0 else 0
-            else:
-                sharpe = 0
-        else:
-            sharpe = 0
-
-        summary = {
-            'totalReturn': round(total_return, 2),
-            'totalReturnPercent': round(total_return_pct, 2),
-            'finalValue': round(final_value, 2),
-            'maxDrawdown': round(max_dd, 2),
-            'winRate': round(win_rate, 1),
-            'totalTrades': len(all_trades),
-            'profitFactor': round(profit_factor, 2) if profit_factor != float('inf') else 999.99,
-            'sharpeRatio': round(sharpe, 2),
+        has_bar = ~np.isnan(close[:, 1:])
+        close_ffill = pd.DataFrame(close.T).ffill().to_numpy().T[:, 1:]
+        return {
+            'close': close_ffill, 'has_bar': has_bar,
+            'signal': signal, 'score': score, 'stop_loss': stop_loss,
         }
-        backtest.result_summary = json.dumps(summary)
+
+    def _simulate_ranked(self, codes: list[str], stock_data: dict[str, pd.DataFrame],
+                         sorted_dates: list[date], date_index: dict[str, dict[date, int]],
+                         closes: dict[str, np.ndarray], stock_service: StockService,
+                         settings: dict, params: dict, cash: float, positions: dict[str, dict]):
+        """スコア順位方式: 毎日買い候補をsignal_score上位から空き枠(maxOpenPositions)まで約定
+
+        リスクルール（RiskService.get_risk_rules）を本番と同様に適用する:
+        - maxOpenPositions: 同時保有上限（params['maxPositions'] で上書き可）
+        - maxPositionPercent: 1銘柄あたり投資額の上限（評価額比）
+        - maxLossPerTrade: 損切りラインまでの損失率が上限超の候補は除外
+        - maxPortfolioLoss: 保有全体の含み損率が上限超なら新規買いを停止
+        """
+        rules = RiskService(self.db).get_risk_rules()
+        max_positions = int(params.get('maxPositions') or rules['maxOpenPositions'] or 5)
+        panel_codes = list(stock_data.keys())
+        panel = self._build_signal_panel(stock_data, sorted_dates, date_index, stock_service, settings)
+        close, has_bar = panel['close'], panel['has_bar']
+        signal, score, stop_loss = panel['signal'], panel['score'], panel['stop_loss']
+
+        n_codes, n_days = close.shape
+        qty = np.zeros(n_codes, dtype=np.int64)
+        avg_price = np.zeros(n_codes)
+        for i, code in enumerate(panel_codes):
+            if code in positions:
+                pos = positions.pop(code)
+                qty[i] = pos['quantity']
+                avg_price[i] = pos['avg_price']
+        # 期間内に株価がない保有銘柄は取得価格で評価したまま持ち越す
+        carried_value = sum(p['quantity'] * p['avg_price'] for p in positions.values())
+        carried_count = len(positions)
+
+        all_trades: list[dict] = []
+        equity_curve = np.empty(n_days)
+        cash_curve = np.empty(n_days)
+
+        for d in range(n_days):
+            current_date = sorted_dates[d]
+            price = close[:, d]
+            bar = has_bar[:, d]
+            held = qty > 0
+
+            # 1. 売りシグナルの保有銘柄を決済
+            for i in np.flatnonzero(held & bar & (signal[:, d] == -1)):
+                proceeds = qty[i] * price[i]
+                pnl = proceeds - qty[i] * avg_price[i]
+                cash += proceeds
+                all_trades.append({
+                    'code': panel_codes[i], 'trade_type': 'sell', 'quantity': int(qty[i]),
+                    'price': float(price[i]), 'trade_date': current_date, 'pnl': round(float(pnl), 2),
+                })
+                qty[i] = 0
+                avg_price[i] = 0.0
+            held = qty > 0
+
+            # 2. 空き枠があれば買い候補をスコア上位から約定
+            free_slots = max_positions - int(held.sum()) - carried_count
+            held_value = float(np.nansum(qty * price)) + carried_value
+            held_cost = float((qty * avg_price).sum()) + carried_value
+            portfolio_loss_pct = ((held_cost - held_value) / held_cost * 100) if held_cost > 0 else 0.0
+            if free_slots > 0 and portfolio_loss_pct <= rules['maxPortfolioLoss']:
+                with np.errstate(invalid='ignore'):
+                    loss_pct = (price - stop_loss[:, d]) / price * 100
+                loss_ok = np.isnan(stop_loss[:, d]) | (loss_pct <= rules['maxLossPerTrade'])
+                mask = ~held & bar & (signal[:, d] == 1) & (score[:, d] > 0) & loss_ok & (price > 0)
+                candidates = np.flatnonzero(mask)
+                if candidates.size > free_slots:
+                    top = np.argpartition(-score[candidates, d], free_slots - 1)[:free_slots]
+                    candidates = candidates[top]
+                candidates = candidates[np.argsort(-score[candidates, d], kind='stable')]
+
+                equity = cash + held_value
+                per_slot = min(equity / max_positions, equity * rules['maxPositionPercent'] / 100)
+                for i in candidates:
+                    budget = min(per_slot, cash)
+                    quantity = int(budget / price[i])
+                    if quantity <= 0:
+                        continue
+                    cash -= quantity * price[i]
+                    qty[i] = quantity
+                    avg_price[i] = price[i]
+                    all_trades.append({
+                        'code': panel_codes[i], 'trade_type': 'buy', 'quantity': quantity,
+                        'price': float(price[i]), 'trade_date': current_date, 'pnl': None,
+                    })
+
+            # 3. 日次評価
+            portfolio_value = cash + float(np.nansum(qty * price)) + carried_value
+            equity_curve[d] = round(portfolio_value, 2)
+            cash_curve[d] = round(cash, 2)
+
+        for i in np.flatnonzero(qty > 0):
+            positions[panel_codes[i]] = {'quantity': int(qty[i]), 'avg_price': float(avg_price[i])}
+        return all_trades, equity_curve, cash_curve, float(cash)
+
+    @staticmethod
+    def _equal_weight_benchmark(sorted_dates: list[date], date_index: dict[str, dict[date, int]],
+                                closes: dict[str, np.ndarray], base: dict | None = None,
+                                last: dict | None = None) -> np.ndarray:
+        """対象銘柄の等金額バイ&ホールド指数（基準価格=1.0、欠損日は前日値で補完）
+
+        base / last（銘柄→基準価格・直近終値）を渡すと延長分の続きとして計算し、
+        両方をその場で更新する。
+        """
+        n = len(sorted_dates)
+        if n == 0 or not closes:
+            return np.empty(0)
+        base = {} if base is None else base
+        last = {} if last is None else last
+        codes = list(closes)
+        panel = np.full((len(codes), n + 1), np.nan)  # 先頭列は前回の直近終値
+        pos_of = {d: i + 1 for i, d in enumerate(sorted_dates)}
+        for row, code in enumerate(codes):
+            panel[row, 0] = last.get(code, np.nan)
+            pairs = [(pos_of[d], idx) for d, idx in date_index[code].items() if d in pos_of]
+            if pairs:
+                cols, rows_idx = np.array(pairs, dtype=np.int64).T
+                panel[row, cols] = closes[code][rows_idx]
+        panel = pd.DataFrame(panel.T).ffill().bfill().to_numpy().T[:, 1:]
+        base_arr = np.array([base.get(code, panel[row, 0]) for row, code in enumerate(codes)], dtype=float)
+        for row, code in enumerate(codes):
+            if np.isfinite(base_arr[row]):
+                base[code] = float(base_arr[row])
+            if np.isfinite(panel[row, -1]):
+                last[code] = float(panel[row, -1])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            normalized = np.where(base_arr[:, None] > 0, panel / base_arr[:, None], np.nan)
+        return np.nanmean(normalized, axis=0)
 
     def get_backtest(self, backtest_id: int) -> dict | None:
         """バックテスト詳細を取得"""
@@ -256,6 +497,7 @@ class BacktestService:
             return False
         self.db.query(BacktestTrade).filter(BacktestTrade.backtest_id == backtest_id).delete()
         self.db.query(BacktestSnapshot).filter(BacktestSnapshot.backtest_id == backtest_id).delete()
+        self.db.query(BacktestCurve).filter(BacktestCurve.backtest_id == backtest_id).delete()
         self.db.delete(bt)
         self.db.commit()
         return True
@@ -277,19 +519,96 @@ class BacktestService:
 
     def get_snapshots(self, backtest_id: int) -> list[dict]:
         """バックテストの資産推移"""
-        snapshots = self.db.query(BacktestSnapshot).filter(
-            BacktestSnapshot.backtest_id == backtest_id
-        ).order_by(BacktestSnapshot.date.asc()).all()
-        return [{
-            'date': s.date.isoformat(),
-            'portfolioValue': s.portfolio_value,
-            'cash': s.cash,
-        } for s in snapshots]
+        curve = self._load_curves([backtest_id]).get(backtest_id)
+        return curve.to_snapshots() if curve else []
+
+    def _load_curves(self, ids: list[int]) -> dict[int, EquityCurve]:
+        """資産推移をまとめて取得（圧縮ブロブ優先、旧形式の日次行にフォールバック）"""
+        curves = {
+            bt_id: EquityCurve(blob)
+            for bt_id, blob in self.db.query(BacktestCurve.backtest_id, BacktestCurve.data).filter(
+                BacktestCurve.backtest_id.in_(ids)
+            ).all()
+        }
+        legacy_ids = [i for i in ids if i not in curves]
+        if legacy_ids:
+            rows: dict[int, tuple[list, list, list]] = {}
+            for bt_id, d, value, cash in self.db.query(
+                BacktestSnapshot.backtest_id, BacktestSnapshot.date,
+                BacktestSnapshot.portfolio_value, BacktestSnapshot.cash,
+            ).filter(BacktestSnapshot.backtest_id.in_(legacy_ids)).order_by(
+                BacktestSnapshot.backtest_id, BacktestSnapshot.date.asc(),
+            ).all():
+                r = rows.setdefault(bt_id, ([], [], []))
+                r[0].append(d)
+                r[1].append(value)
+                r[2].append(cash)
+            for bt_id, (dates, values, cash) in rows.items():
+                curves[bt_id] = EquityCurve(encode_curve(dates, values, cash))
+        return curves
 
     def compare_backtests(self, ids: list[int]) -> list[dict]:
-        """複数バックテストの比較"""
+        """複数バックテストの比較（資産推移・取引は一括取得し指標を再計算）"""
         backtests = self.db.query(Backtest).filter(Backtest.id.in_(ids)).all()
-        return [self._format_detail(bt) for bt in backtests]
+
+        curves = self._load_curves([bt.id for bt in backtests])
+        trades: dict[int, tuple[list[float], list[float]]] = {bt.id: ([], []) for bt in backtests}
+        trade_rows = self.db.query(
+            BacktestTrade.backtest_id, BacktestTrade.trade_type,
+            BacktestTrade.quantity, BacktestTrade.price, BacktestTrade.pnl,
+        ).filter(BacktestTrade.backtest_id.in_(ids)).all()
+        for bt_id, trade_type, qty, price, pnl in trade_rows:
+            trades[bt_id][1].append(qty * price)
+            if trade_type == 'sell' and pnl is not None:
+                trades[bt_id][0].append(pnl)
+
+        result = []
+        for bt in backtests:
+            detail = self._format_detail(bt)
+            curve = curves.get(bt.id)
+            if curve is not None and len(curve):
+                pnls, values = trades[bt.id]
+                detail['metrics'] = performance.compute_summary(
+                    curve.portfolio_values, curve.cash, bt.initial_capital,
+                    trade_pnls=pnls, trade_values=values,
+                )
+            result.append(detail)
+        return result
+
+    def compare_curves(self, ids: list[int], points: int = 300) -> dict:
+        """複数バックテストの資産推移を共通日付軸に揃え、初期資金で正規化してLTTBで間引く
+
+        各系列は初期資金=1.0 の指数。開始前の日付は含めず、欠損日は前日値で補完する。
+        """
+        backtests = self.db.query(Backtest).filter(Backtest.id.in_(ids)).all()
+        curves = self._load_curves([bt.id for bt in backtests])
+        nonempty = [curves[bt.id].ordinals for bt in backtests if bt.id in curves and len(curves[bt.id])]
+        if not nonempty:
+            return {'startDate': None, 'endDate': None, 'series': []}
+        axis = np.unique(np.concatenate(nonempty))
+
+        series = []
+        for bt in backtests:
+            curve = curves.get(bt.id)
+            if curve is None or not len(curve) or not bt.initial_capital:
+                series.append({'id': bt.id, 'name': bt.name, 'dates': [], 'values': []})
+                continue
+            pos = np.searchsorted(curve.ordinals, axis, side='right') - 1
+            valid = pos >= 0
+            x = axis[valid]
+            y = curve.portfolio_values[pos[valid]] / bt.initial_capital
+            keep = lttb_indices(x, y, points)
+            series.append({
+                'id': bt.id,
+                'name': bt.name,
+                'dates': [date.fromordinal(int(o)).isoformat() for o in x[keep]],
+                'values': np.round(y[keep], 6).tolist(),
+            })
+        return {
+            'startDate': date.fromordinal(int(axis[0])).isoformat(),
+            'endDate': date.fromordinal(int(axis[-1])).isoformat(),
+            'series': series,
+        }
 
     def _format_detail(self, bt: Backtest) -> dict:
         """バックテスト詳細のフォーマット"""
@@ -3,10 +3,14 @@ import logging
 import subprocess
 import time
 from datetime import datetime
+from typing import TypedDict
 
 import httpx
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from src.models.stock import BrokerageConfig, BrokerageHealth, BrokerageOrder, Stock, Transaction
+from src.models.stock import BrokerageConfig, BrokerageHealth, BrokerageOrder, Transaction
+from src.services import config_cache, events, metrics, pagination
+from src.services.stock_service import get_stock_names
 
 logger = logging.getLogger(__name__)
 
@@ -40,10 +44,10 @@ class KabuStationClient:
     async def connect(self) -> str:
         """APIトークンを取得"""
         async with httpx.AsyncClient(headers={'Host': 'localhost'}) as client:
-            resp = await client.post(
+            resp = await self._timed('post', '/token', client.post(
                 f'{self.base_url}/token',
                 json={'APIPassword': self.api_password},
-            )
+            ))
             if resp.status_code == 401:
                 body = resp.json() if resp.headers.get('content-type', '').startswith('application/json') else {}
                 logger.error(
@@ -68,7 +72,9 @@ class KabuStationClient:
         for attempt in range(3):
             async with httpx.AsyncClient() as client:
                 func = getattr(client, method)
-                resp = await func(f'{self.base_url}{path}', headers=self._headers(), **kwargs)
+                resp = await self._timed(
+                    method, path, func(f'{self.base_url}{path}', headers=self._headers(), **kwargs),
+                )
             if resp.status_code == 401:
                 logger.info(f"[kabu-api] 401応答、トークン再取得 (attempt {attempt + 1}/3)")
                 self.token = None
@@ -86,6 +92,20 @@ class KabuStationClient:
             return resp
         raise httpx.HTTPStatusError("3回リトライ後も認証失敗", request=resp.request, response=resp)
 
+    @staticmethod
+    async def _timed(method: str, path: str, request) -> httpx.Response:
+        """API 呼び出しの所要時間をエンドポイント・ステータス別に記録（接続失敗は status=error）"""
+        start = time.perf_counter()
+        status = 'error'
+        try:
+            resp = await request
+            status = str(resp.status_code)
+            return resp
+        finally:
+            metrics.KABU_REQUEST_SECONDS.observe(
+                time.perf_counter() - start, method=method.upper(), endpoint=path, status=status,
+            )
+
     def _headers(self) -> dict:
         return {'X-API-KEY': self.token or '', 'Host': 'localhost'}
 
@@ -165,25 +185,132 @@ class KabuStationClient:
         return resp.json()
 
 
+class BrokerageConnectionConfig(TypedDict):
+    host: str
+    port: int
+    apiPassword: str
+    loginId: str
+    loginPassword: str
+
+
+def _load_config(db: Session) -> BrokerageConnectionConfig:
+    result = dict(DEFAULT_CONFIG)
+    for c in db.query(BrokerageConfig).all():
+        result[c.key] = c.value
+    return {
+        'host': result['host'],
+        'port': int(result['port']),
+        'apiPassword': result['apiPassword'],
+        'loginId': result.get('loginId', ''),
+        'loginPassword': result.get('loginPassword', ''),
+    }
+
+
+def _read_config(db: Session) -> BrokerageConnectionConfig:
+    """接続設定を読み込み（同期Session上で実行、config_cache 経由）"""
+    return config_cache.get(db, config_cache.BROKERAGE, _load_config)
+
+
+def _health_row(db: Session) -> BrokerageHealth:
+    """ヘルス状態を取得（なければ作成）"""
+    health = db.query(BrokerageHealth).first()
+    if not health:
+        health = BrokerageHealth(status='unknown', consecutive_failures=0)
+        db.add(health)
+        db.commit()
+        db.refresh(health)
+    return health
+
+
+def _write_success(db: Session):
+    health = _health_row(db)
+    health.status = 'connected'
+    health.consecutive_failures = 0
+    health.last_success_at = datetime.now()
+    health.last_error_message = None
+    db.commit()
+
+
+def _write_failure(db: Session, error_message: str) -> tuple[int, str]:
+    health = _health_row(db)
+    health.consecutive_failures += 1
+    health.last_failure_at = datetime.now()
+    health.last_error_message = error_message
+
+    if 'ConnectError' in error_message or '接続できません' in error_message:
+        health.status = 'disconnected'
+    elif '認証' in error_message or '401' in error_message:
+        health.status = 'auth_error'
+    else:
+        health.status = 'error'
+
+    db.commit()
+    return health.consecutive_failures, health.status
+
+
+def _order_dict(o: BrokerageOrder) -> dict:
+    return {
+        'id': o.id,
+        'code': o.code,
+        'orderType': o.order_type,
+        'side': o.side,
+        'quantity': o.quantity,
+        'price': o.price,
+        'status': o.status,
+        'brokerageOrderId': o.brokerage_order_id,
+        'createdAt': o.created_at.isoformat() if o.created_at else '',
+        'updatedAt': o.updated_at.isoformat() if o.updated_at else '',
+    }
+
+
+def _insert_order(db: Session, **fields) -> int:
+    order = BrokerageOrder(status='pending', **fields)
+    db.add(order)
+    db.commit()
+    return order.id
+
+
+def _order_event(o: BrokerageOrder) -> dict:
+    return {
+        'orderId': o.id, 'code': o.code, 'side': o.side, 'quantity': o.quantity,
+        'price': o.price, 'status': o.status, 'dryRun': False,
+    }
+
+
+def _finish_order(db: Session, order_id: int, status: str, brokerage_order_id: str | None = None) -> dict:
+    order = db.get(BrokerageOrder, order_id)
+    order.status = status
+    if brokerage_order_id is not None:
+        order.brokerage_order_id = brokerage_order_id
+    db.commit()
+    db.refresh(order)
+    events.publish_orders([_order_event(order)])
+    return _order_dict(order)
+
+
 class BrokerageService:
-    def __init__(self, db: Session):
+    """証券API連携サービス
+
+    db は同期 Session（スケジューラ/自動売買スレッド・同期ルート）と
+    AsyncSession（async ルート）のどちらでもよい。async メソッド内のDB処理は
+    _run_db を経由し、AsyncSession の場合は非同期ドライバ上で実行されるため
+    イベントループを塞がない。
+    """
+
+    def __init__(self, db: Session | AsyncSession):
         self.db = db
 
-    def get_config(self) -> dict:
+    async def _run_db(self, fn, *args, **kwargs):
+        """同期Session前提の関数 fn(session, ...) を実行"""
+        if isinstance(self.db, AsyncSession):
+            return await self.db.run_sync(fn, *args, **kwargs)
+        return fn(self.db, *args, **kwargs)
+
+    def get_config(self) -> BrokerageConnectionConfig:
         """接続設定を取得"""
-        result = dict(DEFAULT_CONFIG)
-        db_config = self.db.query(BrokerageConfig).all()
-        for c in db_config:
-            result[c.key] = c.value
-        return {
-            'host': result['host'],
-            'port': int(result['port']),
-            'apiPassword': result['apiPassword'],
-            'loginId': result.get('loginId', ''),
-            'loginPassword': result.get('loginPassword', ''),
-        }
+        return _read_config(self.db)
 
-    def update_config(self, data: dict) -> dict:
+    def update_config(self, data: dict) -> BrokerageConnectionConfig:
         """接続設定を更新"""
         for key, value in data.items():
             if key not in DEFAULT_CONFIG:
@@ -193,60 +320,36 @@ class BrokerageService:
                 config.value = str(value)
             else:
                 self.db.add(BrokerageConfig(key=key, value=str(value)))
+        config_cache.bump(self.db, config_cache.BROKERAGE)
         self.db.commit()
         return self.get_config()
 
-    def _get_client(self) -> KabuStationClient:
-        """クライアントを取得"""
-        config = self.get_config()
+    @staticmethod
+    def _client_from(config: dict) -> KabuStationClient:
         return KabuStationClient(config['host'], config['port'], config['apiPassword'])
 
-    def _get_health(self) -> BrokerageHealth:
-        """ヘルス状態を取得（なければ作成）"""
-        health = self.db.query(BrokerageHealth).first()
-        if not health:
-            health = BrokerageHealth(status='unknown', consecutive_failures=0)
-            self.db.add(health)
-            self.db.commit()
-            self.db.refresh(health)
-        return health
-
-    def _record_success(self):
+    async def _get_client(self) -> KabuStationClient:
+        """クライアントを取得"""
+        return self._client_from(await self._run_db(_read_config))
+
+    async def _record_success(self):
         """接続成功を記録"""
-        health = self._get_health()
-        health.status = 'connected'
-        health.consecutive_failures = 0
-        health.last_success_at = datetime.now()
-        health.last_error_message = None
-        self.db.commit()
+        await self._run_db(_write_success)
         logger.info("[broker-health] 接続成功")
 
-    def _record_failure(self, error_message: str):
+    async def _record_failure(self, error_message: str):
         """接続失敗を記録"""
-        health = self._get_health()
-        health.consecutive_failures += 1
-        health.last_failure_at = datetime.now()
-        health.last_error_message = error_message
-
-        if 'ConnectError' in error_message or '接続できません' in error_message:
-            health.status = 'disconnected'
-        elif '認証' in error_message or '401' in error_message:
-            health.status = 'auth_error'
-        else:
-            health.status = 'error'
-
-        self.db.commit()
-        n = health.consecutive_failures
+        n, status = await self._run_db(_write_failure, error_message)
         logger.error(f"[broker-health] 接続失敗 ({n}回連続): {error_message}")
         if n >= 3:
             logger.critical(
                 f"[broker-health] kabu STATION {n}回連続接続失敗！ "
-                f"自動売買が停止しています。状態: {health.status}"
+                f"自動売買が停止しています。状態: {status}"
             )
 
     def get_health(self) -> dict:
         """ヘルス状態をAPIレスポンス用に返す"""
-        health = self._get_health()
+        health = _health_row(self.db)
         return {
             'status': health.status,
             'consecutiveFailures': health.consecutive_failures,
@@ -255,10 +358,10 @@ class BrokerageService:
             'lastErrorMessage': health.last_error_message,
         }
 
-    def _restart_kabu_station(self) -> bool:
-        """WSLからWindows側のkabu STATIONを再起動+自動ログイン"""
+    @staticmethod
+    def _restart_kabu_station(config: dict) -> bool:
+        """WSLからWindows側のkabu STATIONを再起動+自動ログイン（ブロッキング、スレッドで実行）"""
         try:
-            config = self.get_config()
             login_id = config.get('loginId', '')
             login_password = config.get('loginPassword', '')
 
@@ -293,55 +396,55 @@ class BrokerageService:
 
         既定では再起動しない（手動診断でログイン中セッションを破壊しないため）。
         """
-        client = self._get_client()
+        client = await self._get_client()
         try:
             token = await client.connect()
-            self._record_success()
+            await self._record_success()
             return {'connected': True, 'message': '接続成功（トークン取得済み）'}
         except httpx.ConnectError:
             msg = 'kabu STATIONに接続できません'
-            self._record_failure(msg)
+            await self._record_failure(msg)
             if force_restart:
                 return await self._connect_with_restart()
             return {'connected': False, 'message': f'{msg}（force_restart=trueで再起動可）'}
         except httpx.HTTPStatusError as e:
             msg = f'認証エラー: {e.response.status_code}'
-            self._record_failure(msg)
+            await self._record_failure(msg)
             if e.response.status_code == 401 and force_restart:
                 return await self._connect_with_restart()
             return {'connected': False, 'message': msg}
         except Exception as e:
             msg = f'接続エラー: {str(e)}'
-            self._record_failure(msg)
+            await self._record_failure(msg)
             if force_restart:
                 return await self._connect_with_restart()
             return {'connected': False, 'message': msg}
 
     async def _connect_with_restart(self) -> dict:
         """kabu STATIONを再起動して再接続"""
-        health = self._get_health()
-        if not self._restart_kabu_station():
+        config = await self._run_db(_read_config)
+        if not await asyncio.to_thread(self._restart_kabu_station, config):
             return {'connected': False, 'message': 'kabu STATION再起動に失敗しました'}
 
         # 再起動後、最大3回リトライ
-        client = self._get_client()
+        client = self._client_from(config)
         for attempt in range(3):
             try:
                 await asyncio.sleep(10)
                 token = await client.connect()
-                self._record_success()
+                await self._record_success()
                 logger.info(f"[broker-health] 再起動後の接続成功 (attempt {attempt + 1})")
                 return {'connected': True, 'message': f'kabu STATION再起動後に接続成功'}
             except Exception as e:
                 logger.warning(f"[broker-health] 再起動後リトライ {attempt + 1}/3 失敗: {e}")
 
         msg = 'kabu STATION再起動後も接続失敗。手動でログインが必要な可能性があります'
-        self._record_failure(msg)
+        await self._record_failure(msg)
         return {'connected': False, 'message': msg}
 
     async def get_balance(self) -> dict:
         """残高照会"""
-        client = self._get_client()
+        client = await self._get_client()
         await client.connect()
         data = await client.get_balance()
         return {
@@ -352,10 +455,10 @@ class BrokerageService:
 
     async def get_positions(self) -> list[dict]:
         """保有銘柄照会"""
-        client = self._get_client()
+        client = await self._get_client()
         await client.connect()
         positions = await client.get_positions()
-        result = []
+        held = []
         for pos in positions:
             # 売り切った残骸建玉（LeavesQty=0）は保有銘柄ではないので除外。
             # 残すと ProfitLoss=None を返しレスポンス検証(float必須)が落ちる。
@@ -363,63 +466,46 @@ class BrokerageService:
             if qty == 0:
                 continue
             code = pos.get('Symbol', '').split('@')[0] if '@' in pos.get('Symbol', '') else pos.get('Symbol', '')
-            stock = self.db.query(Stock).filter(Stock.code == code).first()
-            result.append({
-                'code': code,
-                'name': stock.name if stock else pos.get('SymbolName', f'銘柄{code}'),
-                'quantity': qty,
-                # kabu /positions の取得単価は 'Price' フィールド（'AveragePrice' は存在しない）。
-                # None を返すケースに備え 0 にフォールバック。
-                'averagePrice': pos.get('Price') or 0,
-                'currentPrice': pos.get('CurrentPrice') or 0,
-                'profitLoss': pos.get('ProfitLoss') or 0,
-            })
-        return result
+            held.append((code, qty, pos))
 
-    def get_orders(self) -> list[dict]:
-        """注文一覧を取得"""
-        orders = self.db.query(BrokerageOrder).order_by(BrokerageOrder.created_at.desc()).all()
+        names = await self._run_db(get_stock_names) if held else {}
         return [{
-            'id': o.id,
-            'code': o.code,
-            'orderType': o.order_type,
-            'side': o.side,
-            'quantity': o.quantity,
-            'price': o.price,
-            'status': o.status,
-            'brokerageOrderId': o.brokerage_order_id,
-            'createdAt': o.created_at.isoformat() if o.created_at else '',
-            'updatedAt': o.updated_at.isoformat() if o.updated_at else '',
-        } for o in orders]
+            'code': code,
+            'name': names.get(code) or pos.get('SymbolName', f'銘柄{code}'),
+            'quantity': qty,
+            # kabu /positions の取得単価は 'Price' フィールド（'AveragePrice' は存在しない）。
+            # None を返すケースに備え 0 にフォールバック。
+            'averagePrice': pos.get('Price') or 0,
+            'currentPrice': pos.get('CurrentPrice') or 0,
+            'profitLoss': pos.get('ProfitLoss') or 0,
+        } for code, qty, pos in held]
+
+    def get_orders(self, limit: int = pagination.DEFAULT_LIMIT, cursor: str | None = None,
+                   code: str | None = None, status: str | None = None) -> list[dict]:
+        """注文一覧を新しい順に1ページ取得"""
+        query = self.db.query(BrokerageOrder)
+        if code:
+            query = query.filter(BrokerageOrder.code == code)
+        if status:
+            query = query.filter(BrokerageOrder.status == status)
+        orders = pagination.paginate(query, BrokerageOrder.created_at, BrokerageOrder.id, cursor, limit)
+        return [_order_dict(o) for o in orders]
 
     async def create_order(self, code: str, order_type: str, side: str,
                            quantity: int, price: float | None = None,
                            trading_mode: str = 'cash') -> dict:
         """注文を送信。trading_mode: cash=現物 / margin_system=制度信用 / margin_general=一般信用"""
-        # DB記録を先に作成
-        order = BrokerageOrder(
-            code=code,
-            order_type=order_type,
-            side=side,
-            quantity=quantity,
-            price=price,
-            status='pending',
+        # DB記録を先に作成（証券会社への送信前にコミット）
+        order_id = await self._run_db(
+            _insert_order, code=code, order_type=order_type, side=side, quantity=quantity, price=price,
         )
-        self.db.add(order)
-        self.db.commit()
-        self.db.refresh(order)
 
         try:
-            client = self._get_client()
+            client = await self._get_client()
             await client.connect()
             result = await client.send_order(code, side, quantity, order_type, price, trading_mode)
-
-            order.brokerage_order_id = result.get('OrderId')
-            order.status = 'submitted'
-            self.db.commit()
         except Exception as e:
-            order.status = 'failed'
-            self.db.commit()
+            await self._run_db(_finish_order, order_id, 'failed')
             detail = ''
             if hasattr(e, 'response') and e.response is not None:
                 try:
@@ -429,35 +515,26 @@ class BrokerageService:
             logger.error(f"[brokerage] Order failed for {code}: {e} | detail={detail}")
             raise
 
-        return {
-            'id': order.id,
-            'code': order.code,
-            'orderType': order.order_type,
-            'side': order.side,
-            'quantity': order.quantity,
-            'price': order.price,
-            'status': order.status,
-            'brokerageOrderId': order.brokerage_order_id,
-            'createdAt': order.created_at.isoformat() if order.created_at else '',
-            'updatedAt': order.updated_at.isoformat() if order.updated_at else '',
-        }
+        return await self._run_db(_finish_order, order_id, 'submitted', result.get('OrderId'))
 
     async def cancel_order(self, order_id: int) -> bool:
         """注文をキャンセル"""
-        order = self.db.query(BrokerageOrder).filter(BrokerageOrder.id == order_id).first()
-        if not order:
+        found = await self._run_db(
+            lambda db: db.query(BrokerageOrder.brokerage_order_id).filter(BrokerageOrder.id == order_id).first()
+        )
+        if not found:
             return False
 
-        if order.brokerage_order_id:
+        brokerage_order_id = found[0]
+        if brokerage_order_id:
             try:
-                client = self._get_client()
+                client = await self._get_client()
                 await client.connect()
-                await client.cancel_order(order.brokerage_order_id)
+                await client.cancel_order(brokerage_order_id)
             except Exception as e:
                 print(f"Cancel failed: {e}")
 
-        order.status = 'cancelled'
-        self.db.commit()
+        await self._run_db(_finish_order, order_id, 'cancelled')
         return True
 
     async def sync_positions(self) -> dict:
@@ -506,33 +583,45 @@ class BrokerageService:
         """kabu STATION の注文約定状態を取得し brokerage_orders を更新する。
         submitted のまま止まっている注文を filled / cancelled へ反映し、
         約定単価が判明すれば price も実約定値に更新する（収支集計の精度向上）。"""
-        pending = self.db.query(BrokerageOrder).filter(
+        pending = await self._run_db(lambda db: db.query(
+            BrokerageOrder.id, BrokerageOrder.code, BrokerageOrder.brokerage_order_id,
+        ).filter(
             BrokerageOrder.status == 'submitted',
             BrokerageOrder.brokerage_order_id.isnot(None),
-        ).all()
+        ).all())
         if not pending:
             return {'message': '同期対象の注文はありません', 'updated': 0}
 
-        client = self._get_client()
+        client = await self._get_client()
         await client.connect()
         broker_orders = await client.get_orders()
         by_id = {str(o.get('ID')): o for o in broker_orders}
 
-        updated = 0
-        for order in pending:
-            bo = by_id.get(str(order.brokerage_order_id))
+        changes: dict[int, tuple[str, float | None]] = {}
+        for order_id, code, brokerage_order_id in pending:
+            bo = by_id.get(str(brokerage_order_id))
             if not bo:
                 continue
             new_status, fill_price = self._interpret_order_state(bo)
-            if new_status and new_status != order.status:
+            if new_status and new_status != 'submitted':
+                changes[order_id] = (new_status, fill_price)
+
+        def _apply(db: Session):
+            orders = db.query(BrokerageOrder).filter(BrokerageOrder.id.in_(changes)).all()
+            for order in orders:
+                new_status, fill_price = changes[order.id]
                 order.status = new_status
                 if new_status == 'filled' and fill_price:
                     order.price = fill_price
-                updated += 1
                 logger.info(
                     f"[brokerage] sync: {order.code} order#{order.id} "
                     f"submitted→{new_status} (price={order.price})"
                 )
-        if updated:
-            self.db.commit()
+            changed = [_order_event(o) for o in orders]
+            db.commit()
+            events.publish_orders(changed)
+
+        if changes:
+            await self._run_db(_apply)
+        updated = len(changes)
         return {'message': f'{updated}件の注文状態を更新しました', 'updated': updated}
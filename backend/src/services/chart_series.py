@@ -0,0 +1,52 @@
+"""配信用チャート系列（chart_series）の本文エンコードと間引き
+
+更新パイプラインが銘柄×期間ごとに行形式・列形式の JSON 本文を作り、gzip 済みで保存する。
+チャート要求は保存済みのバイト列をそのまま返し（Content-Encoding: gzip）、
+points 指定時だけ列形式を展開して LTTB で間引く。
+"""
+import gzip
+
+import numpy as np
+import orjson
+
+from src.services.downsample import lttb_indices
+
+PERIOD_DAYS = {'1m': 30, '3m': 90, '6m': 180, '1y': 365}
+DEFAULT_PERIOD = '3m'
+
+# 行形式で返すキー（ChartDataResponse と同じ）
+ROW_KEYS = ['date', 'open', 'high', 'low', 'close', 'volume', 'sma5', 'sma25', 'sma75']
+
+
+def encode(content) -> bytes:
+    """JSON 本文（gzip 済み）"""
+    return gzip.compress(orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY), compresslevel=6)
+
+
+def decode(body: bytes):
+    return orjson.loads(gzip.decompress(body))
+
+
+def rows_from_columns(columns: dict) -> list[dict]:
+    """列形式 → 行形式（ROW_KEYS のみ。NaN は None）"""
+    if not columns['dates']:
+        return []
+    series = [columns['dates']] + [
+        [None if v is None or v != v else v for v in np.asarray(columns[key]).tolist()]
+        for key in ROW_KEYS[1:]
+    ]
+    return [dict(zip(ROW_KEYS, values)) for values in zip(*series)]
+
+
+def downsample(columns: dict, points: int) -> dict:
+    """終値の形状を保つ LTTB で全系列を同じ点に間引く（points 以下ならそのまま）"""
+    n = len(columns['dates'])
+    if n <= points:
+        return columns
+    close = np.asarray(columns['close'], dtype=np.float64)
+    keep = lttb_indices(np.arange(n), close, points)
+    result = {'dates': [columns['dates'][i] for i in keep]}
+    for key, values in columns.items():
+        if key != 'dates':
+            result[key] = np.asarray(values, dtype=np.float64 if key != 'volume' else np.int64)[keep]
+    return result
@@ -0,0 +1,72 @@
+"""設定のバージョン付きプロセス内キャッシュ
+
+設定セクション（settings / risk_rules / auto_trade / brokerage）ごとに config_versions に
+バージョン番号を持ち、update_* が同じトランザクション内で番号を進める。
+キャッシュはバージョン一致の間だけ有効で、バージョン確認は Session ごとに1回
+（= 1リクエスト・1回の自動売買実行につき1回）だけ行う。複数ワーカー間でも
+DB上の番号を見るため、他ワーカーの更新は次のリクエストから反映される。
+"""
+import threading
+from typing import Callable, TypeVar
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from src.models.stock import ConfigVersion
+
+T = TypeVar('T')
+
+SETTINGS = 'settings'
+RISK_RULES = 'risk_rules'
+AUTO_TRADE = 'auto_trade'
+BROKERAGE = 'brokerage'
+
+_cache: dict[str, tuple[int, object]] = {}
+_lock = threading.Lock()
+
+
+def _session_versions(db: Session) -> dict[str, int]:
+    """この Session で確認済みのバージョン"""
+    return db.info.setdefault('config_versions', {})
+
+
+def version(db: Session, section: str) -> int:
+    """section の現在のバージョン（Session ごとに1回だけ DB を確認）"""
+    checked = _session_versions(db)
+    if section not in checked:
+        row = db.query(ConfigVersion.version).filter(ConfigVersion.section == section).first()
+        checked[section] = row[0] if row else 0
+    return checked[section]
+
+
+def get(db: Session, section: str, loader: Callable[[Session], T]) -> T:
+    """section の設定を返す。キャッシュが古ければ loader(db) で読み直す（返り値はコピー）"""
+    current = version(db, section)
+    entry = _cache.get(section)
+    if entry is None or entry[0] != current:
+        value = loader(db)
+        with _lock:
+            _cache[section] = (current, value)
+    else:
+        value = entry[1]
+    return dict(value)
+
+
+def bump(db: Session, section: str):
+    """section のバージョンを進める（呼び出し側の commit で確定）"""
+    result = db.execute(
+        update(ConfigVersion).where(ConfigVersion.section == section)
+        .values(version=ConfigVersion.version + 1)
+    )
+    if result.rowcount == 0:
+        db.add(ConfigVersion(section=section, version=1))
+        db.flush()
+    _session_versions(db).pop(section, None)
+    with _lock:
+        _cache.pop(section, None)
+
+
+def clear():
+    """全キャッシュを破棄"""
+    with _lock:
+        _cache.clear()
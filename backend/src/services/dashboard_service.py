@@ -0,0 +1,58 @@
+"""一覧・詳細ページ用の一括取得
+
+/stocks, /stocks/{code}, /stocks/{code}/chart, /risk/checklist/{code}, /risk/suggest-prices/{code}
+を銘柄ごとに呼ぶ代わりに、指定銘柄・指定セクションをまとめて組み立てる。
+stock_latest は全セクションで1回だけ読み、チャートは全銘柄分を1クエリで取る。
+"""
+from sqlalchemy.orm import Session
+
+from src.services.risk_service import RiskService
+from src.services.stock_service import StockService
+
+STOCKS = 'stocks'
+DETAIL = 'detail'
+CHART = 'chart'
+CHECKLIST = 'checklist'
+SUGGESTIONS = 'suggestions'
+SECTIONS = (STOCKS, DETAIL, CHART, CHECKLIST, SUGGESTIONS)
+MAX_CODES = 50
+
+
+class DashboardService:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def get_dashboard(self, codes: list[str], sections: set[str], period: str = '3m') -> dict:
+        """sections: SECTIONS の部分集合。銘柄別セクションは codes の順に dict で返す"""
+        stock_service = StockService(self.db)
+        result: dict = {}
+        if STOCKS in sections:
+            result['stocks'] = stock_service.get_all_stocks()
+
+        per_code = sections & {DETAIL, CHECKLIST, SUGGESTIONS}
+        latest_map = stock_service.get_latest_map(codes) if codes and per_code else {}
+
+        def _latest(code: str):
+            return latest_map.get(code, (None, None))[1]
+
+        def _name(code: str) -> str:
+            stock = latest_map.get(code, (None, None))[0]
+            return stock.name if stock else f'銘柄{code}'
+
+        if DETAIL in sections:
+            result['details'] = {
+                code: StockService.format_detail(latest_map[code][0], _latest(code))
+                for code in codes if _latest(code) is not None
+            }
+        if CHART in sections:
+            result['charts'] = stock_service.get_charts(codes, period) if codes else {}
+        if CHECKLIST in sections:
+            rules = RiskService(self.db).get_risk_rules()
+            result['checklists'] = {
+                code: RiskService.build_checklist(code, _name(code), _latest(code), rules) for code in codes
+            }
+        if SUGGESTIONS in sections:
+            result['suggestions'] = {
+                code: RiskService.build_price_suggestions(code, _name(code), _latest(code)) for code in codes
+            }
+        return result
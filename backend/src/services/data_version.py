@@ -0,0 +1,57 @@
+"""表示データのバージョン番号と ETag
+
+株価・シグナルの書き込み（stock_latest の更新）と同じトランザクションで番号を進め、
+一覧・詳細・チャートの GET はこの番号だけから ETag を作る。番号が変わらない限り
+If-None-Match に 304 を返せるため、ポーリングでサービス層の再計算が走らない。
+"""
+import time
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from src.models.stock import DataVersion
+from src.services import config_cache
+
+ALL_STOCKS = 'stocks'
+
+# プロセス起動ごとに変わるトークン（レスポンス形式の変更を含むデプロイ後に旧 ETag を無効化）
+_BOOT_TOKEN = format(int(time.time()), 'x')
+
+
+def stock_key(code: str) -> str:
+    return f'stock:{code}'
+
+
+def bump(db: Session, *keys: str):
+    """keys の番号を進める（commit は呼び出し側）"""
+    for key in keys:
+        result = db.execute(
+            update(DataVersion).where(DataVersion.key == key).values(version=DataVersion.version + 1)
+        )
+        if result.rowcount == 0:
+            db.add(DataVersion(key=key, version=1))
+            db.flush()
+
+
+def bump_stock(db: Session, code: str):
+    """銘柄の表示データが変わったことを記録（銘柄別 + 全体）"""
+    bump(db, stock_key(code), ALL_STOCKS)
+
+
+def etag(db: Session, *keys: str, configs: tuple[str, ...] = (config_cache.SETTINGS,)) -> str:
+    """keys の番号と設定（configs: 既定は表示設定）のバージョンから弱い ETag を作る"""
+    versions = dict(db.query(DataVersion.key, DataVersion.version).filter(DataVersion.key.in_(keys)).all())
+    parts = [str(versions.get(key, 0)) for key in keys]
+    parts.extend(str(config_cache.version(db, section)) for section in configs)
+    return f'W/"{_BOOT_TOKEN}-{"-".join(parts)}"'
+
+
+def matches(if_none_match: str | None, current: str) -> bool:
+    """If-None-Match ヘッダが current に一致するか（弱い比較）"""
+    if not if_none_match:
+        return False
+    candidates = {tag.strip() for tag in if_none_match.split(',')}
+    if '*' in candidates:
+        return True
+    bare = current.removeprefix('W/')
+    return any(tag.removeprefix('W/') == bare for tag in candidates)
@@ -0,0 +1,44 @@
+"""時系列の形状保持ダウンサンプリング（LTTB: Largest-Triangle-Three-Buckets）"""
+import numpy as np
+
+
+def lttb_indices(x, y, threshold: int) -> np.ndarray:
+    """LTTBで残す点のインデックスを返す（先頭・末尾は必ず含む）
+
+    x は単調増加の数値軸（日付なら序数）、y は値。NaN を含まないこと。
+    threshold 以下の長さ、または threshold < 3 の場合は全点を返す。
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = x.size
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    # 先頭・末尾を除いた n-2 点を threshold-2 個のバケットに分割
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        # 次バケットの平均点（最終バケットの次は末尾点）
+        if i + 2 < len(edges):
+            nxt_start, nxt_end = edges[i + 1], edges[i + 2]
+            avg_x = x[nxt_start:nxt_end].mean()
+            avg_y = y[nxt_start:nxt_end].mean()
+        else:
+            avg_x, avg_y = x[-1], y[-1]
+        bx = x[start:end]
+        by = y[start:end]
+        area = np.abs((x[a] - avg_x) * (by - y[a]) - (x[a] - bx) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def lttb(x, y, threshold: int) -> tuple[np.ndarray, np.ndarray]:
+    """LTTBで間引いた (x, y) を返す"""
+    idx = lttb_indices(x, y, threshold)
+    return np.asarray(x)[idx], np.asarray(y)[idx]
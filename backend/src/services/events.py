@@ -0,0 +1,191 @@
+"""パイプライン更新イベントのプロセス内配信（Server-Sent Events 用）
+
+scheduled_update の各段（株価更新・シグナル変化・アラート発火・発注/約定）が終わるたびに
+差分だけを publish し、/api/events の購読者へ配る。
+
+- publish はスケジューラスレッドからでも呼べる（イベントループへ call_soon_threadsafe で渡す）
+- 購読者ごとに上限付きキューを持ち、溢れた遅い購読者は未送信分を捨てて resync を1件送る
+  （publish 側は購読者を待たない。クライアントは resync を受けたら一覧を取り直す）
+- 直近のイベントを履歴に残し、再接続時の Last-Event-ID 以降を再送する
+- 待機中の接続はキュー1つとコルーチン1つだけで、スレッドもDB接続も持たない
+"""
+import asyncio
+import json
+import threading
+from collections import deque
+from dataclasses import dataclass
+
+from sqlalchemy.orm import Session
+
+from src.models.stock import AlertHistory, AutoTradeLog, StockLatest
+
+QUEUE_SIZE = 100
+HISTORY_SIZE = 256
+
+PRICES = 'prices'
+SIGNALS = 'signals'
+ALERTS = 'alerts'
+ORDERS = 'orders'
+PIPELINE = 'pipeline'
+RESYNC = 'resync'
+
+
+@dataclass(frozen=True)
+class Event:
+    id: int
+    type: str
+    data: dict
+
+    def encode(self) -> str:
+        """SSE のフレーム"""
+        data = json.dumps(self.data, ensure_ascii=False, separators=(',', ':'))
+        return f'id: {self.id}\nevent: {self.type}\ndata: {data}\n\n'
+
+
+class Subscriber:
+    """1接続分の上限付きキュー（イベントループ上でのみ操作する）"""
+
+    def __init__(self, maxsize: int):
+        self._queue: asyncio.Queue[Event | None] = asyncio.Queue(maxsize)
+
+    def put(self, event: Event | None):
+        """event が None ならバス終了"""
+        if self._queue.full():
+            # 溢れたら未送信分を捨て、取り直しを促す resync（終了時は終了通知）だけを残す
+            while not self._queue.empty():
+                self._queue.get_nowait()
+            if event is not None:
+                event = Event(event.id, RESYNC, {})
+        self._queue.put_nowait(event)
+
+    async def get(self) -> Event | None:
+        """次のイベント。None はバス終了"""
+        return await self._queue.get()
+
+
+class EventBus:
+    def __init__(self, queue_size: int = QUEUE_SIZE, history_size: int = HISTORY_SIZE):
+        self._queue_size = queue_size
+        self._history: deque[Event] = deque(maxlen=history_size)
+        self._subscribers: set[Subscriber] = set()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    def publish(self, event_type: str, data: dict) -> Event:
+        """イベントを発行（任意のスレッドから呼べる）"""
+        with self._lock:
+            self._seq += 1
+            event = Event(self._seq, event_type, data)
+            self._history.append(event)
+        self._dispatch_threadsafe(event)
+        return event
+
+    def subscribe(self, last_event_id: int | None = None) -> Subscriber:
+        """購読を開始（イベントループ上で呼ぶ）。last_event_id より後の履歴を先に積む"""
+        self._loop = asyncio.get_running_loop()
+        subscriber = Subscriber(self._queue_size)
+        if last_event_id is not None:
+            with self._lock:
+                missed = [e for e in self._history if e.id > last_event_id]
+                # 履歴から溢れた分がある / 再起動で番号が巻き戻っている場合は取り直しを促す
+                lost = last_event_id > self._seq or bool(missed and missed[0].id > last_event_id + 1)
+            if lost:
+                subscriber.put(Event(self._seq, RESYNC, {}))
+            else:
+                for event in missed:
+                    subscriber.put(event)
+        self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self._subscribers.discard(subscriber)
+
+    def close(self):
+        """全購読者のストリームを終了させる（シャットダウン時）"""
+        self._dispatch_threadsafe(None)
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def _dispatch_threadsafe(self, event: Event | None):
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            loop.call_soon_threadsafe(self._dispatch, event)
+        except RuntimeError:
+            pass  # ループ終了直後
+
+    def _dispatch(self, event: Event | None):
+        for subscriber in list(self._subscribers):
+            subscriber.put(event)
+
+
+bus = EventBus()
+
+
+# --- パイプライン各段の差分 ---
+
+def latest_snapshot(db: Session) -> dict[str, tuple]:
+    """銘柄 → (現在値, 騰落率, シグナル)"""
+    return {
+        code: (price, change, signal)
+        for code, price, change, signal in db.query(
+            StockLatest.code, StockLatest.current_price,
+            StockLatest.change_percent, StockLatest.signal_type,
+        ).all()
+    }
+
+
+def publish_latest_changes(before: dict[str, tuple], after: dict[str, tuple]):
+    """株価更新段の前後スナップショットから prices / signals イベントを発行"""
+    prices, signals = [], []
+    for code, (price, change, signal) in after.items():
+        prev = before.get(code)
+        if prev is None or prev[0] != price or prev[1] != change:
+            prices.append({'code': code, 'price': price, 'changePercent': change})
+        if prev is not None and prev[2] != signal:
+            signals.append({'code': code, 'signal': signal, 'previous': prev[2]})
+    if prices:
+        bus.publish(PRICES, {'updated': prices})
+    if signals:
+        bus.publish(SIGNALS, {'changes': signals})
+
+
+def max_id(db: Session, model) -> int:
+    return db.query(model.id).order_by(model.id.desc()).limit(1).scalar() or 0
+
+
+def publish_new_alerts(db: Session, after_id: int):
+    """after_id より後に記録されたアラート履歴を alerts イベントとして発行"""
+    rows = db.query(AlertHistory).filter(AlertHistory.id > after_id).order_by(AlertHistory.id).all()
+    if rows:
+        bus.publish(ALERTS, {'triggered': [
+            {'id': h.id, 'code': h.code, 'alertType': h.alert_type, 'message': h.message}
+            for h in rows
+        ]})
+
+
+def publish_dry_run_fills(db: Session, after_id: int):
+    """after_id より後のドライラン約定を orders イベントとして発行
+
+    実注文は BrokerageService が発注・約定同期の時点で publish_orders する。
+    """
+    rows = db.query(AutoTradeLog).filter(
+        AutoTradeLog.id > after_id,
+        AutoTradeLog.dry_run == True,
+        AutoTradeLog.result_status == 'success',
+    ).order_by(AutoTradeLog.id).all()
+    publish_orders([
+        {'logId': log.id, 'code': log.code, 'side': log.signal_type, 'quantity': log.quantity,
+         'price': log.order_price, 'status': 'filled', 'dryRun': True}
+        for log in rows
+    ])
+
+
+def publish_orders(orders: list[dict]):
+    """発注・約定の差分（1件以上あるときだけ）を orders イベントとして発行"""
+    if orders:
+        bus.publish(ORDERS, {'orders': orders})
@@ -0,0 +1,237 @@
+"""Prometheus テキスト形式のメトリクス（外部ライブラリなし）
+
+カウンタとヒストグラムだけを持つ最小実装。値はプロセス内メモリに積算し、
+GET /metrics で Prometheus の text exposition format (0.0.4) として返す。
+記録は dict 参照 + bisect + ロック1回で、リクエスト・クエリごとに呼んでも負荷は小さい。
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1.0)
+STAGE_BUCKETS = (0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+_registry: list['_Metric'] = []
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = '') -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric:
+    type = ''
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: dict[tuple[str, ...], object] = {}
+        _registry.append(self)
+
+    def _key(self, labels: dict) -> tuple[str, ...]:
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def render(self) -> list[str]:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.type}']
+        with self._lock:
+            items = sorted(self._values.items())
+            for key, value in items:
+                lines.extend(self._render_one(key, value))
+        return lines
+
+    def _render_one(self, key, value) -> list[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    type = 'counter'
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def get(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def _render_one(self, key, value) -> list[str]:
+        return [f'{self.name}_total{_format_labels(self.labelnames, key)} {_format_value(value)}']
+
+
+class Histogram(_Metric):
+    type = 'histogram'
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [バケット別件数(非累積, 末尾は +Inf), 合計, 件数]
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """with ブロックの所要秒数を記録（例外でも記録する）"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def get(self, **labels) -> tuple[int, float]:
+        """(件数, 合計秒数)"""
+        state = self._values.get(self._key(labels))
+        return (state[2], state[1]) if state else (0, 0.0)
+
+    def _render_one(self, key, value) -> list[str]:
+        counts, total, count = value
+        lines = []
+        cumulative = 0
+        for bound, n in zip(self.buckets + (float('inf'),), counts):
+            cumulative += n
+            le = 'le="' + _format_value(bound) + '"'
+            lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}')
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+        lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+def render() -> str:
+    """全メトリクスを text exposition format で出力"""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+# ---- HTTP ----
+
+HTTP_REQUEST_SECONDS = Histogram(
+    'http_request_duration_seconds', 'HTTP リクエストの処理時間（ルートのパステンプレート別）',
+    ('method', 'route', 'status'),
+)
+
+# ---- データ更新 ----
+
+UPDATE_STAGE_SECONDS = Histogram(
+    'update_stage_duration_seconds',
+    'データ更新の段ごとの所要時間（fetch/indicators/signals は1回の更新での全銘柄合計）',
+    ('stage',), buckets=STAGE_BUCKETS,
+)
+UPDATE_RUNS = Counter('update_runs', 'データ更新の実行回数', ('kind', 'status'))
+
+# ---- DB ----
+
+DB_QUERY_SECONDS = Histogram(
+    'db_query_duration_seconds', 'SQL 実行時間（文の種類別）', ('statement',), buckets=QUERY_BUCKETS,
+)
+DB_QUERY_ERRORS = Counter('db_query_errors', 'SQL 実行エラー数', ('statement',))
+DB_N_PLUS_ONE = Counter('db_n_plus_one', 'N+1 の疑い（同じ文の繰り返し）を検出した回数（計測範囲別）', ('scope',))
+
+# ---- 外部 API ----
+
+YFINANCE_SECONDS = Histogram(
+    'yfinance_request_duration_seconds', 'yfinance 呼び出しの所要時間（待機の sleep は含まない）', ('call',),
+)
+YFINANCE_ERRORS = Counter('yfinance_errors', 'yfinance 呼び出しの失敗数（例外・空データ）', ('call', 'reason'))
+KABU_REQUEST_SECONDS = Histogram(
+    'kabu_api_request_duration_seconds', 'kabu STATION API 呼び出しの所要時間', ('method', 'endpoint', 'status'),
+)
+
+
+class HTTPMetricsMiddleware:
+    """ルート別の HTTP 処理時間を記録する ASGI ミドルウェア
+
+    ラベルはパス実値ではなくルートのテンプレート（/api/stocks/{code}）にして系列数を抑える。
+    skip_prefixes（SSE など長時間接続）は記録しない。
+    """
+
+    def __init__(self, app, skip_prefixes: tuple[str, ...] = ()):
+        self.app = app
+        self.skip_prefixes = skip_prefixes
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['path'].startswith(self.skip_prefixes):
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        start = time.perf_counter()
+
+        async def _send(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            route = scope.get('route')
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - start,
+                method=scope['method'], route=getattr(route, 'path', 'unmatched'), status=status,
+            )
+
+
+def _statement_kind(statement: str) -> str:
+    kind = statement.lstrip()[:6].lower()
+    return kind if kind in ('select', 'insert', 'update', 'delete') else 'other'
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metrics_query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('metrics_query_start')
+    if starts:
+        DB_QUERY_SECONDS.observe(time.perf_counter() - starts.pop(), statement=_statement_kind(statement))
+
+
+def _handle_error(exception_context):
+    conn = exception_context.connection
+    starts = conn.info.get('metrics_query_start') if conn is not None else None
+    if starts:
+        starts.pop()
+    DB_QUERY_ERRORS.inc(statement=_statement_kind(exception_context.statement or ''))
+
+
+def instrument_engine(engine: Engine):
+    """エンジンの全 SQL の実行時間・エラーを記録する（非同期エンジンは sync_engine を渡す）"""
+    if event.contains(engine, 'before_cursor_execute', _before_cursor_execute):
+        return
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(engine, 'handle_error', _handle_error)
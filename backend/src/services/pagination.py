@@ -0,0 +1,49 @@
+"""キーセット（カーソル）ページング
+
+並び順は (時刻 DESC, id DESC)。カーソルは前ページ末尾行の (時刻, id) を不透明な文字列にしたもの。
+OFFSET を使わず (時刻, id) インデックスの範囲走査で次ページを取るため、
+何ページ目でもテーブルサイズに依存しない。
+"""
+import base64
+from datetime import datetime
+
+from fastapi import Response
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.orm import Query
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+NEXT_CURSOR_HEADER = 'X-Next-Cursor'
+
+
+def encode_cursor(timestamp: str, row_id: int) -> str:
+    return base64.urlsafe_b64encode(f'{timestamp}|{row_id}'.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    """カーソルを (時刻, id) に戻す。不正な値は ValueError"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        timestamp, row_id = raw.rsplit('|', 1)
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except Exception:
+        raise ValueError('不正なカーソルです')
+
+
+def paginate(query: Query, time_col, id_col, cursor: str | None, limit: int) -> list:
+    """query を (time_col, id_col) の降順で1ページ分取得"""
+    if cursor:
+        timestamp, last_id = decode_cursor(cursor)
+        # 境界の時刻はDB上の値そのものを使う（SQLite は時刻を文字列で持ち、書式が行ごとに
+        # 異なり得るため、バインド値との等値比較だと同時刻の行を取りこぼす）。行が削除済みならカーソルの値。
+        anchor = func.coalesce(
+            select(time_col).where(id_col == last_id).scalar_subquery(), timestamp,
+        )
+        query = query.filter(or_(time_col < anchor, and_(time_col == anchor, id_col < last_id)))
+    return query.order_by(time_col.desc(), id_col.desc()).limit(limit).all()
+
+
+def set_next_cursor(response: Response, items: list[dict], limit: int, time_key: str):
+    """ページが満杯なら末尾行から次ページのカーソルを X-Next-Cursor ヘッダに設定"""
+    if items and len(items) >= limit and items[-1].get(time_key):
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(items[-1][time_key], items[-1]['id'])
@@ -0,0 +1,240 @@
+"""資産推移・取引損益のパフォーマンス指標（NumPy配列ベース）
+
+バックテスト・仮想ポートフォリオ・比較APIで共通利用する。
+入力はすべてメモリ上の配列で、DBアクセスは行わない。
+"""
+import numpy as np
+
+TRADING_DAYS = 252
+RISK_FREE_ANNUAL = 0.001  # 年率0.1%
+PROFIT_FACTOR_CAP = 999.99  # 損失ゼロ時のPF表示上限
+
+
+def _as_array(values) -> np.ndarray:
+    """float64配列に変換（None/NaNは除外しない）"""
+    return np.asarray(values if values is not None else [], dtype=np.float64)
+
+
+def daily_returns(equity) -> np.ndarray:
+    """日次リターン系列（長さ n-1）"""
+    eq = _as_array(equity)
+    if eq.size < 2:
+        return np.empty(0)
+    prev = eq[:-1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r = np.where(prev != 0, np.diff(eq) / prev, 0.0)
+    return r
+
+
+def drawdown_series(equity, initial: float | None = None) -> np.ndarray:
+    """ドローダウン率(%)系列。initial を渡すと初期資金をピークの起点にする"""
+    eq = _as_array(equity)
+    if eq.size == 0:
+        return np.empty(0)
+    peak = np.maximum.accumulate(eq)
+    if initial is not None:
+        peak = np.maximum(peak, initial)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        dd = np.where(peak > 0, (peak - eq) / peak * 100, 0.0)
+    return dd
+
+
+def max_drawdown(equity, initial: float | None = None) -> float:
+    """最大ドローダウン(%)"""
+    dd = drawdown_series(equity, initial)
+    return float(dd.max()) if dd.size else 0.0
+
+
+def ulcer_index(equity, initial: float | None = None) -> float:
+    """アルサー指数: ドローダウン(%)の二乗平均平方根"""
+    dd = drawdown_series(equity, initial)
+    return float(np.sqrt(np.mean(dd ** 2))) if dd.size else 0.0
+
+
+def sharpe_ratio(returns, risk_free_annual: float = RISK_FREE_ANNUAL) -> float:
+    """年率換算シャープレシオ"""
+    r = _as_array(returns)
+    if r.size == 0:
+        return 0.0
+    std = r.std()
+    if std <= 0:
+        return 0.0
+    return float((r.mean() - risk_free_annual / TRADING_DAYS) / std * np.sqrt(TRADING_DAYS))
+
+
+def sortino_ratio(returns, risk_free_annual: float = RISK_FREE_ANNUAL) -> float:
+    """年率換算ソルティノレシオ（下方偏差ベース）"""
+    r = _as_array(returns)
+    if r.size == 0:
+        return 0.0
+    excess = r - risk_free_annual / TRADING_DAYS
+    downside = np.minimum(excess, 0.0)
+    dd = np.sqrt(np.mean(downside ** 2))
+    if dd <= 0:
+        return 0.0
+    return float(excess.mean() / dd * np.sqrt(TRADING_DAYS))
+
+
+def annualized_return(equity, initial: float | None = None) -> float:
+    """年率リターン(%)（日数は営業日ベース）"""
+    eq = _as_array(equity)
+    if eq.size == 0:
+        return 0.0
+    start = initial if initial else eq[0]
+    if start <= 0 or eq[-1] <= 0:
+        return 0.0
+    periods = eq.size if initial else eq.size - 1
+    if periods <= 0:
+        return 0.0
+    return float(((eq[-1] / start) ** (TRADING_DAYS / periods) - 1) * 100)
+
+
+def calmar_ratio(equity, initial: float | None = None) -> float:
+    """カルマーレシオ: 年率リターン / 最大ドローダウン"""
+    mdd = max_drawdown(equity, initial)
+    if mdd <= 0:
+        return 0.0
+    return float(annualized_return(equity, initial) / mdd)
+
+
+def rolling_sharpe(returns, window: int = 20,
+                   risk_free_annual: float = RISK_FREE_ANNUAL) -> np.ndarray:
+    """ローリングシャープレシオ（長さ n-window+1、データ不足時は空配列）"""
+    r = _as_array(returns)
+    if window <= 1 or r.size < window:
+        return np.empty(0)
+    windows = np.lib.stride_tricks.sliding_window_view(r, window)
+    mean = windows.mean(axis=1)
+    std = windows.std(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rs = np.where(std > 0, (mean - risk_free_annual / TRADING_DAYS) / std * np.sqrt(TRADING_DAYS), 0.0)
+    return rs
+
+
+def alpha_beta(returns, benchmark_returns,
+               risk_free_annual: float = RISK_FREE_ANNUAL) -> tuple[float, float]:
+    """ベンチマークに対する (年率アルファ(%), ベータ)"""
+    r = _as_array(returns)
+    b = _as_array(benchmark_returns)
+    n = min(r.size, b.size)
+    if n < 2:
+        return 0.0, 0.0
+    r, b = r[-n:], b[-n:]
+    var_b = b.var()
+    if var_b <= 0:
+        return 0.0, 0.0
+    beta = float(np.mean((r - r.mean()) * (b - b.mean())) / var_b)
+    rf = risk_free_annual / TRADING_DAYS
+    alpha_daily = (r.mean() - rf) - beta * (b.mean() - rf)
+    return float(alpha_daily * TRADING_DAYS * 100), beta
+
+
+def win_rate(pnls) -> float:
+    """勝率(%)"""
+    p = _as_array(pnls)
+    if p.size == 0:
+        return 0.0
+    return float((p > 0).sum() / p.size * 100)
+
+
+def profit_factor(pnls) -> float:
+    """プロフィットファクター（損失ゼロで利益ありなら上限値）"""
+    p = _as_array(pnls)
+    gross_profit = p[p > 0].sum()
+    gross_loss = -p[p < 0].sum()
+    if gross_loss > 0:
+        return float(min(gross_profit / gross_loss, PROFIT_FACTOR_CAP))
+    return PROFIT_FACTOR_CAP if gross_profit > 0 else 0.0
+
+
+def exposure(equity, cash) -> float:
+    """エクスポージャー(%): ポジションを保有していた日の割合"""
+    eq = _as_array(equity)
+    c = _as_array(cash)
+    if eq.size == 0 or eq.size != c.size:
+        return 0.0
+    invested = eq - c
+    return float((invested > 1e-9).mean() * 100)
+
+
+def turnover(trade_values, equity) -> float:
+    """回転率: 総売買代金 / 平均資産"""
+    tv = _as_array(trade_values)
+    eq = _as_array(equity)
+    if eq.size == 0:
+        return 0.0
+    avg = eq.mean()
+    if avg <= 0:
+        return 0.0
+    return float(np.abs(tv).sum() / avg)
+
+
+def trade_totals(trade_pnls=None, trade_values=None) -> dict:
+    """取引指標の累計（件数・勝ち数・総利益/総損失・総売買代金）
+
+    バックテスト延長では前回分の累計に merge_trade_totals で新しい取引分を足し、
+    過去の取引を読み直さずに勝率・PF・回転率を求める。
+    """
+    p = _as_array(trade_pnls)
+    v = _as_array(trade_values)
+    return {
+        'trades': int(v.size),
+        'closed': int(p.size),
+        'wins': int((p > 0).sum()),
+        'grossProfit': float(p[p > 0].sum()),
+        'grossLoss': float(-p[p < 0].sum()),
+        'tradedValue': float(np.abs(v).sum()),
+    }
+
+
+def merge_trade_totals(a: dict, b: dict) -> dict:
+    """trade_totals の累計 a に b を足したもの（バックテスト延長で前回分に新しい取引分を加える）"""
+    return {key: a.get(key, 0) + value for key, value in b.items()}
+
+
+def compute_summary(equity, cash, initial_capital: float,
+                    trade_pnls=None, trade_values=None,
+                    benchmark=None, rolling_window: int = 20, totals: dict | None = None) -> dict:
+    """result_summary 用の指標一式を計算
+
+    equity / cash は日次の資産・現金、trade_pnls は決済済み取引の損益、
+    trade_values は全取引の約定代金、benchmark はベンチマーク価格系列（任意）。
+    totals（trade_totals の累計）を渡すと trade_pnls / trade_values の代わりに使う。
+    """
+    eq = _as_array(equity)
+    final_value = float(eq[-1]) if eq.size else float(initial_capital)
+    total_return = final_value - initial_capital
+    total_return_pct = (total_return / initial_capital * 100) if initial_capital else 0.0
+
+    rets = daily_returns(eq)
+    totals = totals if totals is not None else trade_totals(trade_pnls, trade_values)
+    rs = rolling_sharpe(rets, rolling_window)
+    if totals['grossLoss'] > 0:
+        pf = min(totals['grossProfit'] / totals['grossLoss'], PROFIT_FACTOR_CAP)
+    else:
+        pf = PROFIT_FACTOR_CAP if totals['grossProfit'] > 0 else 0.0
+    avg_equity = eq.mean() if eq.size else 0.0
+
+    summary = {
+        'totalReturn': round(total_return, 2),
+        'totalReturnPercent': round(total_return_pct, 2),
+        'finalValue': round(final_value, 2),
+        'maxDrawdown': round(max_drawdown(eq, initial_capital), 2),
+        'winRate': round(totals['wins'] / totals['closed'] * 100 if totals['closed'] else 0.0, 1),
+        'profitFactor': round(float(pf), 2),
+        'sharpeRatio': round(sharpe_ratio(rets), 2),
+        'sortinoRatio': round(sortino_ratio(rets), 2),
+        'calmarRatio': round(calmar_ratio(eq, initial_capital), 2),
+        'ulcerIndex': round(ulcer_index(eq, initial_capital), 2),
+        'exposure': round(exposure(eq, cash), 1),
+        'turnover': round(totals['tradedValue'] / avg_equity if avg_equity > 0 else 0.0, 2),
+        'rollingSharpeLatest': round(float(rs[-1]), 2) if rs.size else None,
+    }
+
+    if benchmark is not None:
+        bench = _as_array(benchmark)
+        if bench.size == eq.size and bench.size >= 2:
+            alpha, beta = alpha_beta(rets, daily_returns(bench))
+            summary['alpha'] = round(alpha, 2)
+            summary['beta'] = round(beta, 2)
+    return summary
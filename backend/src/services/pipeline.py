@@ -0,0 +1,184 @@
+"""銘柄単位のステージパイプライン
+
+各ステージは自分の入力キューとワーカースレッド（concurrency 本）を持ち、上流のステージを
+抜けた銘柄から順に処理して下流へ渡す。全銘柄が1つのステージを終えるのを待たないため、
+先に株価が取れた銘柄はそのままシグナル判定・アラート・自動売買まで進む。
+
+- ワーカーはそれぞれ専用の Session を持つ（Session はスレッド間で共有しない）
+- ワーカーは呼び出し元のコンテキスト（ContextVar）を引き継ぐ
+- batch_size > 1 のステージは、キューに溜まっている分をまとめて process_batch に渡す
+- process_one が None を返した銘柄・例外になった銘柄は下流へ流さない（例外はログに残す）
+- ステージごとに処理件数・エラー数・処理時間の合計・最初の銘柄が抜けた時刻・完了時刻を記録する
+"""
+import contextvars
+import logging
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable
+
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+class Stage:
+    """パイプラインの1段。process_one（または process_batch）を実装する
+
+    open / close は実行の最初と、この段の全銘柄の処理が終わった直後に1回ずつ呼ばれる
+    （段専用の Session が渡される）。
+    """
+    name = ''
+    concurrency = 1
+    batch_size = 1
+
+    def open(self, db: Session):
+        pass
+
+    def process_one(self, db: Session, code: str, value: Any) -> Any:
+        return value
+
+    def process_batch(self, db: Session, batch: list[tuple[str, Any]]) -> list[tuple[str, Any]]:
+        return [(code, self.process_one(db, code, value)) for code, value in batch]
+
+    def close(self, db: Session):
+        pass
+
+
+@dataclass
+class StageStats:
+    name: str
+    concurrency: int
+    items: int = 0
+    errors: int = 0
+    busy_seconds: float = 0.0           # 全ワーカーの処理時間の合計
+    first_output: float | None = None   # 開始から最初の銘柄がこの段を処理し終えるまで（秒）
+    finished: float | None = None       # 開始からこの段の完了まで（秒）
+
+    def to_dict(self) -> dict:
+        def _round(value):
+            return round(value, 3) if value is not None else None
+
+        return {
+            'name': self.name,
+            'concurrency': self.concurrency,
+            'items': self.items,
+            'errors': self.errors,
+            'busySeconds': _round(self.busy_seconds),
+            'firstOutputSeconds': _round(self.first_output),
+            'finishedSeconds': _round(self.finished),
+        }
+
+
+class Pipeline:
+    def __init__(self, stages: list[Stage], session_factory: Callable[[], Session]):
+        self.stages = stages
+        self._session_factory = session_factory
+        self._lock = threading.Lock()
+        self._started = 0.0
+
+    def run(self, codes: Iterable[str]) -> list[StageStats]:
+        """codes を先頭の段に流し、全段の完了まで待つ"""
+        self._started = time.perf_counter()
+        stats = [StageStats(stage.name, stage.concurrency) for stage in self.stages]
+        inboxes = [queue.Queue() for _ in self.stages]
+        stage_dbs: list[Session] = []
+        try:
+            for stage in self.stages:
+                db = self._session_factory()
+                stage_dbs.append(db)
+                stage.open(db)
+
+            workers = []
+            for i, stage in enumerate(self.stages):
+                outbox = inboxes[i + 1] if i + 1 < len(self.stages) else None
+                workers.append([
+                    # 呼び出し元の ContextVar（query_stats.track の計測範囲など）を引き継ぐ
+                    threading.Thread(
+                        target=contextvars.copy_context().run,
+                        args=(self._work, stage, inboxes[i], outbox, stats[i]),
+                        name=f'pipeline-{stage.name}-{n}', daemon=True,
+                    )
+                    for n in range(stage.concurrency)
+                ])
+            for thread in (t for group in workers for t in group):
+                thread.start()
+
+            for code in codes:
+                inboxes[0].put((code, None))
+
+            close_error: Exception | None = None
+            for i, stage in enumerate(self.stages):
+                for _ in workers[i]:
+                    inboxes[i].put(_DONE)
+                for thread in workers[i]:
+                    thread.join()
+                try:
+                    stage.close(stage_dbs[i])
+                except Exception as e:
+                    logger.error(f"[pipeline] {stage.name}: close failed: {e}", exc_info=True)
+                    close_error = close_error or e
+                stats[i].finished = time.perf_counter() - self._started
+            if close_error is not None:
+                raise close_error
+            return stats
+        finally:
+            for db in stage_dbs:
+                db.close()
+
+    def _work(self, stage: Stage, inbox: queue.Queue, outbox: queue.Queue | None, stats: StageStats):
+        db = self._session_factory()
+        try:
+            done = False
+            while not done:
+                item = inbox.get()
+                if item is _DONE:
+                    return
+                batch = [item]
+                while len(batch) < stage.batch_size:
+                    try:
+                        item = inbox.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is _DONE:
+                        done = True
+                        break
+                    batch.append(item)
+
+                start = time.perf_counter()
+                results, errors = self._process(stage, db, batch)
+                end = time.perf_counter()
+                forwarded = [(code, value) for code, value in results if value is not None]
+                if outbox is not None:
+                    for result in forwarded:
+                        outbox.put(result)
+                with self._lock:
+                    stats.items += len(batch)
+                    stats.errors += errors
+                    stats.busy_seconds += end - start
+                    if results and stats.first_output is None:
+                        stats.first_output = end - self._started
+        finally:
+            db.close()
+
+    @staticmethod
+    def _process(stage: Stage, db: Session, batch: list[tuple[str, Any]]) -> tuple[list[tuple[str, Any]], int]:
+        """(下流へ渡す結果, エラー件数)。失敗した分はロールバックして捨てる"""
+        if stage.batch_size == 1:
+            code, value = batch[0]
+            try:
+                return [(code, stage.process_one(db, code, value))], 0
+            except Exception as e:
+                db.rollback()
+                logger.error(f"[pipeline] {stage.name}: {code} failed: {e}", exc_info=True)
+                return [], 1
+        try:
+            return stage.process_batch(db, batch), 0
+        except Exception as e:
+            db.rollback()
+            codes = ', '.join(code for code, _ in batch)
+            logger.error(f"[pipeline] {stage.name}: batch [{codes}] failed: {e}", exc_info=True)
+            return [], len(batch)
@@ -0,0 +1,201 @@
+"""保有台帳（positions / virtual_positions）の更新と参照
+
+取得単価・実現損益はすべて FIFO（先入先出）で計算する。
+売りは古いロットから消化し、保有数量を超える売りは保有分だけ決済する。
+"""
+from datetime import datetime
+
+from sqlalchemy.orm import Session
+
+from src.models.stock import AutoTradeLog, Position, Transaction, VirtualFill, VirtualPosition
+
+
+def apply_fill(position, side: str, quantity: int, price: float) -> None:
+    """1件の約定を FIFO でポジション行（quantity / cost_basis / realized_pnl / lots）に反映"""
+    lots = [list(lot) for lot in (position.lots or [])]
+    qty = position.quantity or 0
+    cost = position.cost_basis or 0.0
+    realized = position.realized_pnl or 0.0
+
+    if side == 'buy':
+        lots.append([quantity, price])
+        qty += quantity
+        cost += quantity * price
+    else:
+        remaining = min(quantity, qty)
+        while remaining > 0:
+            lot_qty, lot_price = lots[0]
+            used = min(lot_qty, remaining)
+            realized += used * (price - lot_price)
+            cost -= used * lot_price
+            qty -= used
+            remaining -= used
+            if used == lot_qty:
+                lots.pop(0)
+            else:
+                lots[0][0] = lot_qty - used
+
+    if qty == 0:
+        cost = 0.0
+    position.quantity = qty
+    position.cost_basis = cost
+    position.realized_pnl = realized
+    position.lots = lots  # JSON列は再代入しないと変更検知されない
+
+
+def average_price(position) -> float | None:
+    """残ロットの平均取得単価（保有なしは None）"""
+    if not position or position.quantity <= 0:
+        return None
+    return position.cost_basis / position.quantity
+
+
+class _Ledger:
+    """保有台帳の共通参照（model は Position / VirtualPosition）"""
+    model = Position
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def _new(self, code: str):
+        return self.model(code=code, quantity=0, cost_basis=0.0, realized_pnl=0.0, lots=[])
+
+    def _get_or_create(self, code: str):
+        position = self.get(code)
+        if position is None:
+            position = self._new(code)
+            self.db.add(position)
+            self.db.flush()
+        return position
+
+    def get(self, code: str):
+        return self.db.query(self.model).filter(self.model.code == code).first()
+
+    def get_open(self) -> dict:
+        """保有中（数量 > 0）の銘柄 → ポジション"""
+        return {p.code: p for p in self.db.query(self.model).filter(self.model.quantity > 0).all()}
+
+    def quantity(self, code: str) -> int:
+        row = self.db.query(self.model.quantity).filter(self.model.code == code).first()
+        return row[0] if row else 0
+
+    def average_price(self, code: str) -> float | None:
+        return average_price(self.get(code))
+
+
+class PositionService(_Ledger):
+    """実取引の保有台帳。add_transaction/delete_transaction は commit しない（呼び出し側の取引登録と同一トランザクション）"""
+    model = Position
+
+    def add_transaction(self, transaction: Transaction) -> Position:
+        """取引を追加し台帳に反映"""
+        self.db.add(transaction)
+        position = self._get_or_create(transaction.code)
+        apply_fill(position, transaction.transaction_type, transaction.quantity, transaction.price)
+        return position
+
+    def delete_transaction(self, transaction: Transaction) -> Position:
+        """取引を削除し台帳に反映（FIFO は順序依存のため当該銘柄を残りの取引から再構築）"""
+        self.db.delete(transaction)
+        self.db.flush()
+        return self._rebuild_code(transaction.code)
+
+    def _rebuild_code(self, code: str) -> Position:
+        position = self._get_or_create(code)
+        position.quantity, position.cost_basis, position.realized_pnl, position.lots = 0, 0.0, 0.0, []
+        for t in self.db.query(Transaction).filter(Transaction.code == code).order_by(
+            Transaction.transaction_date, Transaction.id,
+        ).all():
+            apply_fill(position, t.transaction_type, t.quantity, t.price)
+        return position
+
+    def rebuild(self) -> int:
+        """全取引から台帳を再構築（初回バックフィル・整合性修復用）。対象銘柄数を返す"""
+        self.db.query(Position).delete()
+        self.db.flush()
+        positions: dict[str, Position] = {}
+        for t in self.db.query(Transaction).order_by(Transaction.transaction_date, Transaction.id).all():
+            if t.code not in positions:
+                positions[t.code] = self._new(t.code)
+            apply_fill(positions[t.code], t.transaction_type, t.quantity, t.price)
+        self.db.add_all(positions.values())
+        self.db.flush()
+        return len(positions)
+
+
+def _slot(created_at: datetime) -> datetime:
+    return created_at.replace(minute=0, second=0, microsecond=0)
+
+
+class VirtualPositionService(_Ledger):
+    """ドライランの仮想保有台帳
+
+    成功したドライランログのうち、同一銘柄・同一方向・同一時間枠(hour)の最初の1件だけを
+    約定として反映する（自動売買の多重起動・再実行による重複計上を防ぐ）。
+    record_log は commit しない（呼び出し側のログ追加と同一トランザクション）。
+    """
+    model = VirtualPosition
+
+    @staticmethod
+    def is_fill(log: AutoTradeLog) -> bool:
+        return bool(log.dry_run and log.result_status == 'success' and log.quantity and log.order_price)
+
+    def _fill(self, position, log: AutoTradeLog) -> VirtualFill:
+        before_qty, before_realized = position.quantity, position.realized_pnl
+        apply_fill(position, log.signal_type, log.quantity, float(log.order_price))
+        closed = log.signal_type != 'buy' and position.quantity < before_qty
+        return VirtualFill(
+            log_id=log.id, code=log.code, side=log.signal_type, slot=_slot(log.created_at),
+            price=float(log.order_price), quantity=log.quantity,
+            pnl=position.realized_pnl - before_realized if closed else None,
+            created_at=log.created_at,
+        )
+
+    def record_log(self, log: AutoTradeLog) -> VirtualFill | None:
+        """追加したログを仮想台帳に反映。反映しなかった場合は None"""
+        if not self.is_fill(log):
+            return None
+        if log.id is None or log.created_at is None:
+            self.db.flush()
+            self.db.refresh(log)
+        duplicate = self.db.query(VirtualFill.id).filter(
+            VirtualFill.code == log.code,
+            VirtualFill.side == log.signal_type,
+            VirtualFill.slot == _slot(log.created_at),
+        ).first()
+        if duplicate:
+            return None
+        fill = self._fill(self._get_or_create(log.code), log)
+        self.db.add(fill)
+        return fill
+
+    def rebuild(self) -> int:
+        """auto_trade_log 全体から仮想台帳を再構築。反映した約定数を返す"""
+        self.db.query(VirtualFill).delete()
+        self.db.query(VirtualPosition).delete()
+        self.db.flush()
+        positions: dict[str, VirtualPosition] = {}
+        seen: set[tuple] = set()
+        fills = []
+        logs = self.db.query(AutoTradeLog).filter(
+            AutoTradeLog.dry_run == True,
+            AutoTradeLog.result_status == 'success',
+        ).order_by(AutoTradeLog.created_at, AutoTradeLog.id).all()
+        for log in logs:
+            key = (log.code, log.signal_type, _slot(log.created_at))
+            if not self.is_fill(log) or key in seen:
+                continue
+            seen.add(key)
+            if log.code not in positions:
+                positions[log.code] = self._new(log.code)
+            fills.append(self._fill(positions[log.code], log))
+        self.db.add_all(positions.values())
+        self.db.add_all(fills)
+        self.db.flush()
+        return len(fills)
+
+    def get_fills(self) -> list[VirtualFill]:
+        return self.db.query(VirtualFill).order_by(VirtualFill.created_at, VirtualFill.id).all()
+
+    def total_realized_pnl(self) -> float:
+        return sum(p.realized_pnl for p in self.db.query(VirtualPosition).all())
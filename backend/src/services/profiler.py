@@ -0,0 +1,169 @@
+"""オンデマンドのサンプリングプロファイラ
+
+有効にしたリクエスト（?profile=1 または X-Profile: 1）と、PROFILE_JOBS=true のときのデータ更新
+（株価取得〜指標計算〜アラート〜自動売買）について、別スレッドから一定間隔でスタックを採取し、
+collapsed stack 形式（flamegraph.pl / speedscope / inferno でそのまま読める
+「関数;関数;... 回数」の行）で backend/logs/profiles に保存する。
+無効時は何も起動しない（リクエストごとのフラグ確認のみ）。保存数は PROFILE_KEEP 件まで。
+"""
+import logging
+import re
+import sys
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+import anyio
+
+logger = logging.getLogger(__name__)
+
+PROFILE_DIR = Path(__file__).resolve().parent.parent.parent / 'logs' / 'profiles'
+PROFILE_KEEP = 50
+INTERVAL_SECONDS = 0.005
+ARTIFACT_HEADER = 'X-Profile-Artifact'
+
+_SAFE_NAME = re.compile(r'[^A-Za-z0-9.-]+')
+
+
+def _frame_label(frame) -> str:
+    module = frame.f_globals.get('__name__', '?')
+    return f'{module}:{frame.f_code.co_name}:{frame.f_lineno}'.replace(';', ':')
+
+
+class Sampler:
+    """対象スレッドのスタックを INTERVAL_SECONDS ごとに採取する
+
+    thread_ids=None は全スレッド（リクエスト処理はイベントループとスレッドプールに
+    またがるため）。その場合は先頭にスレッド名を付けて区別する。
+    """
+
+    def __init__(self, thread_ids: set[int] | None = None, interval: float = INTERVAL_SECONDS):
+        self.thread_ids = thread_ids
+        self.interval = interval
+        self.stacks: Counter[str] = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()} if self.thread_ids is None else {}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own or (self.thread_ids is not None and thread_id not in self.thread_ids):
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                if self.thread_ids is None:
+                    stack.append(names.get(thread_id, str(thread_id)).replace(';', ':'))
+                self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def folded(self) -> str:
+        """collapsed stack 形式"""
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+
+def save(name: str, sampler: Sampler, directory: Path | None = None, keep: int = PROFILE_KEEP) -> Path:
+    """採取結果を保存し、古いものから keep 件を超えた分を削除する"""
+    directory = directory or PROFILE_DIR
+    directory.mkdir(parents=True, exist_ok=True)
+    stamp = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+    path = directory / f'{stamp}_{_SAFE_NAME.sub("_", name).strip("_")[:80]}.folded'
+    path.write_text(sampler.folded(), encoding='utf-8')
+    for old in sorted(directory.glob('*.folded'))[:-keep]:
+        old.unlink(missing_ok=True)
+    logger.info(f"[profiler] {name}: {sampler.samples} samples → {path}")
+    return path
+
+
+@contextmanager
+def profile(name: str, enabled: bool = True, all_threads: bool = False, directory: Path | None = None):
+    """with ブロックをプロファイルして保存する。返り値の dict の 'path' に保存先が入る
+
+    enabled=False なら何もしない（採取スレッドも起動しない）。
+    """
+    result: dict = {'path': None}
+    if not enabled:
+        yield result
+        return
+    sampler = Sampler(None if all_threads else {threading.get_ident()})
+    sampler.start()
+    try:
+        yield result
+    finally:
+        sampler.stop()
+        try:
+            result['path'] = save(name, sampler, directory)
+        except OSError as e:
+            logger.error(f"[profiler] failed to save {name}: {e}")
+
+
+def _requested(scope) -> bool:
+    for key, value in scope['headers']:
+        if key == b'x-profile':
+            return value not in (b'', b'0', b'false')
+    query = scope.get('query_string', b'')
+    return bool(query) and re.search(rb'(?:^|&)profile=(?:1|true)(?:&|$)', query) is not None
+
+
+class ProfilerMiddleware:
+    """?profile=1 / X-Profile: 1 のリクエストだけプロファイルする ASGI ミドルウェア
+
+    保存はレスポンス開始時に行い、保存先のファイル名を X-Profile-Artifact ヘッダで返す。
+    """
+
+    def __init__(self, app, enabled: bool = True):
+        self.app = app
+        self.enabled = enabled
+
+    async def __call__(self, scope, receive, send):
+        if not self.enabled or scope['type'] != 'http' or not _requested(scope):
+            await self.app(scope, receive, send)
+            return
+
+        sampler = Sampler()
+        sampler.start()
+        name = f"{scope['method']}_{scope['path']}"
+        saved = False
+
+        def _stop_and_save() -> Path | None:
+            sampler.stop()
+            try:
+                return save(name, sampler)
+            except OSError as e:
+                logger.error(f"[profiler] failed to save {name}: {e}")
+                return None
+
+        async def _finish() -> Path | None:
+            # 採取スレッドの join とファイル書き込み・古いファイルの削除はイベントループを塞がないよう別スレッドで
+            nonlocal saved
+            if saved:
+                return None
+            saved = True
+            return await anyio.to_thread.run_sync(_stop_and_save)
+
+        async def _send(message):
+            if message['type'] == 'http.response.start':
+                path = await _finish()
+                if path is not None:
+                    message = {**message, 'headers': [
+                        *message.get('headers', []), (ARTIFACT_HEADER.lower().encode(), path.name.encode()),
+                    ]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            await _finish()
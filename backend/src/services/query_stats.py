@@ -0,0 +1,164 @@
+"""SQL 実行の計測（リクエスト・ジョブ単位の件数/時間、N+1 検出、スロークエリ記録）
+
+track(name) の with ブロック（HTTP リクエストは QueryStatsMiddleware、データ更新は
+update_jobs が囲む）の間に実行された SQL を同じ QueryStats に積算する。
+ブロック終了時、同じ文（= 同じ形。パラメータはバインド変数なので値違いも同一文字列）が
+N_PLUS_ONE_THRESHOLD 回以上あれば N+1 の疑いとして警告する。
+スロークエリ（SLOW_QUERY_MS 以上）は計測範囲の有無に関わらずパラメータ付きでログに出す。
+"""
+import logging
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from src.config import settings
+from src.services import metrics
+
+logger = logging.getLogger(__name__)
+
+N_PLUS_ONE_THRESHOLD = 5
+QUERY_COUNT_HEADER = 'X-Query-Count'
+
+_current: ContextVar['QueryStats | None'] = ContextVar('query_stats', default=None)
+
+
+@dataclass
+class QueryStats:
+    name: str
+    count: int = 0
+    seconds: float = 0.0
+    statements: Counter = field(default_factory=Counter)
+
+    def record(self, statement: str, elapsed: float):
+        self.count += 1
+        self.seconds += elapsed
+        self.statements[statement] += 1
+
+    def repeated(self, threshold: int = N_PLUS_ONE_THRESHOLD) -> list[tuple[str, int]]:
+        """threshold 回以上繰り返された文（多い順）"""
+        return [(s, n) for s, n in self.statements.most_common() if n >= threshold]
+
+    def report(self) -> str:
+        lines = [f'{self.name}: {self.count} queries, {self.seconds * 1000:.1f}ms']
+        lines += [f'  {n}x {_shorten(s)}' for s, n in self.statements.most_common()]
+        return '\n'.join(lines)
+
+
+def _shorten(statement: str, limit: int = 300) -> str:
+    statement = ' '.join(statement.split())
+    return statement if len(statement) <= limit else statement[:limit] + '...'
+
+
+def current() -> QueryStats | None:
+    return _current.get()
+
+
+@contextmanager
+def track(name: str):
+    """with ブロック内の SQL を計測し、終了時に N+1 の疑いを警告する
+
+    ContextVar で引き継ぐため、スレッドプールで動く同期ルート・依存関係の SQL も対象になる。
+    入れ子の場合は内側の範囲だけに数える。
+    """
+    stats = QueryStats(name)
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+        # 範囲名は実行中に確定することがある（QueryStatsMiddleware のルートテンプレート）
+        for statement, n in stats.repeated():
+            metrics.DB_N_PLUS_ONE.inc(scope=stats.name)
+            logger.warning(f"[query] N+1 suspected in {stats.name}: {n}x {_shorten(statement)}")
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_stats_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('query_stats_start')
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    stats = _current.get()
+    if stats is not None:
+        stats.record(statement, elapsed)
+    if elapsed * 1000 >= settings.slow_query_ms:
+        scope = stats.name if stats is not None else '-'
+        logger.warning(
+            f"[query] slow {elapsed * 1000:.0f}ms in {scope}: {_shorten(statement)} params={parameters!r:.500}"
+        )
+
+
+def _handle_error(exception_context):
+    conn = exception_context.connection
+    starts = conn.info.get('query_stats_start') if conn is not None else None
+    if starts:
+        starts.pop()
+
+
+def instrument_engine(engine: Engine):
+    """エンジンの SQL を計測対象にする（非同期エンジンは sync_engine を渡す）"""
+    if event.contains(engine, 'before_cursor_execute', _before_cursor_execute):
+        return
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+    event.listen(engine, 'handle_error', _handle_error)
+
+
+@contextmanager
+def capture(engine: Engine, name: str = 'capture'):
+    """engine で実行された SQL をスレッド・コンテキストに関係なくすべて数える（テスト用）"""
+    stats = QueryStats(name)
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        stats.record(statement, 0.0)
+
+    event.listen(engine, 'after_cursor_execute', _record)
+    try:
+        yield stats
+    finally:
+        event.remove(engine, 'after_cursor_execute', _record)
+
+
+class QueryStatsMiddleware:
+    """リクエストごとに SQL を計測する ASGI ミドルウェア
+
+    計測範囲名はルートのテンプレート（例: GET /api/stocks/{code}）。ルートが解決しなかった
+    パス（404・マウント先）は HTTPMetricsMiddleware と同じく unmatched にまとめ、N+1 メトリクスの
+    ラベルを有限に保つ。レスポンス開始までの件数を X-Query-Count、件数と時間を Server-Timing（db）で返す。
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        with track(f"{scope['method']} {scope['path']}") as stats:
+            async def _send(message):
+                if message['type'] == 'http.response.start':
+                    stats.name = _scope_name(scope)
+                    message = {**message, 'headers': [
+                        *message.get('headers', []),
+                        (QUERY_COUNT_HEADER.lower().encode(), str(stats.count).encode()),
+                        (b'server-timing', f'db;desc="{stats.count} queries";dur={stats.seconds * 1000:.1f}'.encode()),
+                    ]}
+                await send(message)
+
+            try:
+                await self.app(scope, receive, _send)
+            finally:
+                stats.name = _scope_name(scope)
+
+
+def _scope_name(scope) -> str:
+    return f"{scope['method']} {getattr(scope.get('route'), 'path', 'unmatched')}"
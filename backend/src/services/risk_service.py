@@ -1,6 +1,9 @@
+from typing import TypedDict
+
 from sqlalchemy.orm import Session
-from sqlalchemy import text
-from src.models.stock import RiskRule, Stock, StockPrice, Signal, Transaction
+from src.models.stock import RiskRule, Stock, StockLatest
+from src.services import config_cache
+from src.services.position_service import PositionService, VirtualPositionService
 
 
 DEFAULT_RISK_RULES = {
@@ -11,14 +14,25 @@ DEFAULT_RISK_RULES = {
 }
 
 
+class RiskRules(TypedDict):
+    maxPositionPercent: float
+    maxLossPerTrade: float
+    maxPortfolioLoss: float
+    maxOpenPositions: int
+
+
 class RiskService:
     def __init__(self, db: Session):
         self.db = db
 
-    def get_risk_rules(self) -> dict:
-        """リスクルールを取得"""
+    def get_risk_rules(self) -> RiskRules:
+        """リスクルールを取得（config_cache 経由）"""
+        return config_cache.get(self.db, config_cache.RISK_RULES, self._load_risk_rules)
+
+    @staticmethod
+    def _load_risk_rules(db: Session) -> RiskRules:
         result = dict(DEFAULT_RISK_RULES)
-        db_rules = self.db.query(RiskRule).all()
+        db_rules = db.query(RiskRule).all()
         for rule in db_rules:
             result[rule.key] = rule.value
         return {
@@ -28,7 +42,7 @@ class RiskService:
             'maxOpenPositions': int(result['maxOpenPositions']),
         }
 
-    def update_risk_rules(self, data: dict) -> dict:
+    def update_risk_rules(self, data: dict) -> RiskRules:
         """リスクルールを更新"""
         for key, value in data.items():
             if key not in DEFAULT_RISK_RULES:
@@ -38,6 +52,7 @@ class RiskService:
                 rule.value = str(value)
             else:
                 self.db.add(RiskRule(key=key, value=str(value)))
+        config_cache.bump(self.db, config_cache.RISK_RULES)
         self.db.commit()
         return self.get_risk_rules()
 
@@ -55,23 +70,22 @@ class RiskService:
         else:
             holdings = self._get_real_holdings()
 
-        active_positions = 0
+        open_qty = {c: d['quantity'] for c, d in holdings.items()}
+        latest_by_code = {
+            row.code: row for row in self.db.query(StockLatest).filter(
+                StockLatest.code.in_(set(open_qty) | {code})
+            ).all()
+        }
+        active_positions = len(open_qty)
         total_value = 0
-        for c, data in holdings.items():
-            qty = data['buy_qty'] - data['sell_qty']
-            if qty > 0:
-                active_positions += 1
-                latest = self.db.query(StockPrice).filter(
-                    StockPrice.code == c
-                ).order_by(StockPrice.date.desc()).first()
-                if latest:
-                    total_value += qty * latest.close
+        for c, qty in open_qty.items():
+            latest = latest_by_code.get(c)
+            if latest:
+                total_value += qty * latest.current_price
 
         if trade_type == 'buy':
             # 最大保有銘柄数チェック
-            is_new_position = code not in holdings or (
-                holdings[code]['buy_qty'] - holdings[code]['sell_qty'] <= 0
-            )
+            is_new_position = code not in holdings
             if is_new_position and active_positions >= rules['maxOpenPositions']:
                 warnings.append({
                     'level': 'error',
@@ -91,9 +105,7 @@ class RiskService:
                     passed = False
 
             # 損失リスクチェック
-            latest_signal = self.db.query(Signal).filter(
-                Signal.code == code
-            ).order_by(Signal.date.desc()).first()
+            latest_signal = latest_by_code.get(code)
             if latest_signal and latest_signal.stop_loss_price:
                 potential_loss_pct = ((price - latest_signal.stop_loss_price) / price) * 100
                 if potential_loss_pct > rules['maxLossPerTrade']:
@@ -106,12 +118,7 @@ class RiskService:
 
             # ポートフォリオ全体損失率チェック
             if total_value > 0:
-                total_cost = 0.0
-                for c, data in holdings.items():
-                    qty = data['buy_qty'] - data['sell_qty']
-                    if qty > 0 and data['buy_qty'] > 0:
-                        avg_cost = data['buy_total'] / data['buy_qty']
-                        total_cost += qty * avg_cost
+                total_cost = sum(data['cost'] for data in holdings.values())
                 if total_cost > 0:
                     portfolio_loss_pct = ((total_cost - total_value) / total_cost) * 100
                     if portfolio_loss_pct > rules['maxPortfolioLoss']:
@@ -131,50 +138,36 @@ class RiskService:
         }
 
     def _get_real_holdings(self) -> dict:
-        """Transactionテーブルからポートフォリオを計算"""
-        transactions = self.db.query(Transaction).all()
-        holdings = {}
-        for t in transactions:
-            if t.code not in holdings:
-                holdings[t.code] = {'buy_qty': 0, 'buy_total': 0, 'sell_qty': 0}
-            if t.transaction_type == 'buy':
-                holdings[t.code]['buy_qty'] += t.quantity
-                holdings[t.code]['buy_total'] += t.quantity * t.price
-            else:
-                holdings[t.code]['sell_qty'] += t.quantity
-        return holdings
+        """保有台帳（positions）から保有中の銘柄 → {quantity, cost} を取得"""
+        return {
+            code: {'quantity': p.quantity, 'cost': p.cost_basis}
+            for code, p in PositionService(self.db).get_open().items()
+        }
 
     def _get_dry_run_holdings(self) -> dict:
-        """auto_trade_logからドライラン仮想ポートフォリオを計算"""
-        logs = self.db.execute(text('''
-            SELECT DISTINCT ON (code, signal_type, DATE_TRUNC('hour', created_at))
-                code, signal_type, order_price, quantity
-            FROM auto_trade_log
-            WHERE result_status = 'success' AND dry_run = true
-            ORDER BY code, signal_type, DATE_TRUNC('hour', created_at), created_at
-        ''')).fetchall()
-        holdings = {}
-        for code, sig, price, qty in logs:
-            if not qty or not price:
-                continue
-            if code not in holdings:
-                holdings[code] = {'buy_qty': 0, 'buy_total': 0, 'sell_qty': 0}
-            if sig == 'buy':
-                holdings[code]['buy_qty'] += qty
-                holdings[code]['buy_total'] += float(price) * qty
-            else:
-                holdings[code]['sell_qty'] += qty
-        return holdings
+        """仮想保有台帳（virtual_positions）から保有中の銘柄 → {quantity, cost} を取得"""
+        return {
+            code: {'quantity': p.quantity, 'cost': p.cost_basis}
+            for code, p in VirtualPositionService(self.db).get_open().items()
+        }
+
+    def _stock_and_latest(self, code: str) -> tuple[Stock | None, StockLatest | None]:
+        row = self.db.query(Stock, StockLatest).outerjoin(
+            StockLatest, StockLatest.code == Stock.code,
+        ).filter(Stock.code == code).first()
+        if row:
+            return row[0], row[1]
+        return None, self.db.query(StockLatest).filter(StockLatest.code == code).first()
 
     def get_checklist(self, code: str) -> dict:
         """取引チェックリスト"""
-        stock = self.db.query(Stock).filter(Stock.code == code).first()
-        latest_signal = self.db.query(Signal).filter(
-            Signal.code == code
-        ).order_by(Signal.date.desc()).first()
-        latest_price = self.db.query(StockPrice).filter(
-            StockPrice.code == code
-        ).order_by(StockPrice.date.desc()).first()
+        stock, latest = self._stock_and_latest(code)
+        return self.build_checklist(code, stock.name if stock else f'銘柄{code}', latest, self.get_risk_rules())
+
+    @staticmethod
+    def build_checklist(code: str, name: str, latest: StockLatest | None, rules: RiskRules) -> dict:
+        """取引チェックリストを組み立てる（DBアクセスなし）"""
+        latest_signal = latest if latest and latest.signal_type else None
 
         items = []
 
@@ -216,16 +209,16 @@ class RiskService:
                 })
 
             # 目標価格/損切りライン
-            if latest_signal.target_price and latest_price:
-                upside = ((latest_signal.target_price - latest_price.close) / latest_price.close) * 100
+            if latest_signal.target_price:
+                upside = ((latest_signal.target_price - latest.current_price) / latest.current_price) * 100
                 items.append({
                     'label': f'目標価格: ¥{latest_signal.target_price:,.0f}',
                     'status': 'ok' if upside > 0 else 'warning',
                     'detail': f'上昇余地: {upside:+.1f}%',
                 })
 
-            if latest_signal.stop_loss_price and latest_price:
-                downside = ((latest_signal.stop_loss_price - latest_price.close) / latest_price.close) * 100
+            if latest_signal.stop_loss_price:
+                downside = ((latest_signal.stop_loss_price - latest.current_price) / latest.current_price) * 100
                 items.append({
                     'label': f'損切りライン: ¥{latest_signal.stop_loss_price:,.0f}',
                     'status': 'ok' if abs(downside) <= 5 else 'warning',
@@ -233,7 +226,6 @@ class RiskService:
                 })
 
         # リスクルール確認
-        rules = self.get_risk_rules()
         items.append({
             'label': f'最大保有銘柄数: {int(rules["maxOpenPositions"])}',
             'status': 'neutral',
@@ -242,29 +234,29 @@ class RiskService:
 
         return {
             'code': code,
-            'name': stock.name if stock else f'銘柄{code}',
+            'name': name,
             'items': items,
         }
 
     def suggest_prices(self, code: str) -> dict:
         """指値/逆指値の提案"""
-        stock = self.db.query(Stock).filter(Stock.code == code).first()
-        latest_signal = self.db.query(Signal).filter(
-            Signal.code == code
-        ).order_by(Signal.date.desc()).first()
-        latest_price = self.db.query(StockPrice).filter(
-            StockPrice.code == code
-        ).order_by(StockPrice.date.desc()).first()
-
-        if not latest_price:
+        stock, latest = self._stock_and_latest(code)
+        return self.build_price_suggestions(code, stock.name if stock else f'銘柄{code}', latest)
+
+    @staticmethod
+    def build_price_suggestions(code: str, name: str, latest: StockLatest | None) -> dict:
+        """指値/逆指値の提案を組み立てる（DBアクセスなし）"""
+        latest_signal = latest if latest and latest.signal_type else None
+
+        if not latest:
             return {
                 'code': code,
-                'name': stock.name if stock else f'銘柄{code}',
+                'name': name,
                 'currentPrice': 0,
                 'suggestions': [],
             }
 
-        current = latest_price.close
+        current = latest.current_price
         suggestions = []
 
         if latest_signal:
@@ -314,7 +306,7 @@ class RiskService:
 
         return {
             'code': code,
-            'name': stock.name if stock else f'銘柄{code}',
+            'name': name,
             'currentPrice': current,
             'suggestions': suggestions,
         }
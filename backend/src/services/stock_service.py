@@ -1,10 +1,38 @@
+import threading
+import time
+
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
-from typing import Optional, Literal
-from sqlalchemy.orm import Session
-from src.models.stock import Stock, StockPrice, Signal, Setting
+from typing import Optional, Literal, TypedDict
+from sqlalchemy import and_, func
+from sqlalchemy.orm import Session, aliased
+from src.models.stock import Stock, StockPrice, Signal, Setting, StockLatest, ChartSeries
 from src.config import settings as app_settings
+from src.services import chart_series, config_cache, data_version, metrics
+
+
+# stock_latest に複写する最新シグナルの列
+LATEST_SIGNAL_FIELDS = (
+    'signal_type', 'signal_strength', 'active_signals', 'signal_score',
+    'rsi', 'macd', 'macd_signal', 'macd_histogram', 'sma5', 'sma25', 'sma75',
+    'target_price', 'stop_loss_price', 'support_price', 'resistance_price',
+    'bb_upper', 'bb_lower', 'bb_middle', 'atr', 'volume_ratio',
+)
+
+
+class StockSettings(TypedDict):
+    rsiBuyThreshold: int
+    rsiSellThreshold: int
+    smaShortPeriod: int
+    smaMidPeriod: int
+    smaLongPeriod: int
+    investmentBudget: int
+
+
+def _round(values: np.ndarray, digits: int) -> np.ndarray:
+    """組み込み round と同じ丸め（np.round は 0.175 → 0.18 のように境界で結果が変わる）"""
+    return np.fromiter((round(float(v), digits) for v in values), dtype=float, count=len(values))
 
 
 def _import_yfinance():
@@ -73,6 +101,71 @@ STOCK_NAMES = {
     '3659': 'ネクソン',
 }
 
+# 銘柄コード → 銘柄名のプロセス内キャッシュ（初回参照時に1クエリで全件ロード、銘柄の追加・削除で破棄）
+_stock_names: dict[str, str] | None = None
+_stock_names_lock = threading.Lock()
+
+
+def get_stock_names(db: Session) -> dict[str, str]:
+    """登録銘柄の コード → 銘柄名"""
+    global _stock_names
+    names = _stock_names
+    if names is None:
+        with _stock_names_lock:
+            if _stock_names is None:
+                _stock_names = dict(db.query(Stock.code, Stock.name).all())
+            names = _stock_names
+    return names
+
+
+def get_stock_name(db: Session, code: str) -> str:
+    """表示用の銘柄名（未登録は STOCK_NAMES、それもなければ「銘柄{code}」）"""
+    return get_stock_names(db).get(code) or STOCK_NAMES.get(code, f'銘柄{code}')
+
+
+def invalidate_stock_names():
+    """銘柄名キャッシュを破棄（stocks の追加・削除後に呼ぶ）"""
+    global _stock_names
+    with _stock_names_lock:
+        _stock_names = None
+
+
+# チャート系列: (出力キー, DataFrame列, 整数に丸めるか)
+CHART_SERIES = [
+    ('open', 'open', False),
+    ('high', 'high', False),
+    ('low', 'low', False),
+    ('close', 'close', False),
+    ('volume', 'volume', False),
+    ('sma5', 'sma5', True),
+    ('sma25', 'sma25', True),
+    ('sma75', 'sma75', True),
+    ('bbUpper', 'bb_upper', True),
+    ('bbLower', 'bb_lower', True),
+]
+
+
+def chart_columns(df: pd.DataFrame) -> dict:
+    """チャート DataFrame → {dates: [...], close: ndarray, ...}
+
+    行ループを使わず列単位で丸める。未計算の指標は全て NaN の配列（orjson が null にする）。
+    """
+    if df.empty:
+        return {'dates': []}
+    columns: dict = {'dates': pd.to_datetime(df['date']).dt.strftime('%m/%d').tolist()}
+    for key, col, rounded in CHART_SERIES:
+        if col not in df:
+            columns[key] = np.full(len(df), np.nan)
+            continue
+        values = df[col].to_numpy(dtype=np.int64 if col == 'volume' else np.float64)
+        columns[key] = np.round(values, 0) if rounded else values
+    return columns
+
+
+def chart_rows(df: pd.DataFrame) -> list[dict]:
+    """チャート DataFrame → 1日1行の dict リスト（従来形式。NaN は None）"""
+    return chart_series.rows_from_columns(chart_columns(df))
+
 
 class StockService:
     def __init__(self, db: Session):
@@ -100,8 +193,12 @@ class StockService:
         })
         return df
 
-    def get_settings(self) -> dict:
-        """設定を取得"""
+    def get_settings(self) -> StockSettings:
+        """設定を取得（config_cache 経由）"""
+        return config_cache.get(self.db, config_cache.SETTINGS, self._load_settings)
+
+    @staticmethod
+    def _load_settings(db: Session) -> StockSettings:
         defaults = {
             'rsiBuyThreshold': app_settings.rsi_buy_threshold,
             'rsiSellThreshold': app_settings.rsi_sell_threshold,
@@ -110,13 +207,13 @@ class StockService:
             'smaLongPeriod': app_settings.sma_long_period,
             'investmentBudget': app_settings.investment_budget,
         }
-        db_settings = self.db.query(Setting).all()
+        db_settings = db.query(Setting).all()
         for s in db_settings:
             if s.key in defaults:
                 defaults[s.key] = int(s.value)
         return defaults
 
-    def update_settings(self, data: dict) -> dict:
+    def update_settings(self, data: dict) -> StockSettings:
         """設定を更新"""
         for key, value in data.items():
             setting = self.db.query(Setting).filter(Setting.key == key).first()
@@ -124,6 +221,7 @@ class StockService:
                 setting.value = str(value)
             else:
                 self.db.add(Setting(key=key, value=str(value)))
+        config_cache.bump(self.db, config_cache.SETTINGS)
         self.db.commit()
         return self.get_settings()
 
@@ -135,24 +233,27 @@ class StockService:
             return {'code': code, 'name': name}
 
         # 実データ取得
-        import time
         yf = _import_yfinance()
         ticker = yf.Ticker(f"{code}.T")
 
         try:
             time.sleep(1)
-            df = ticker.history(period='5d')
+            with metrics.YFINANCE_SECONDS.time(call='history'):
+                df = ticker.history(period='5d')
             if df.empty:
+                metrics.YFINANCE_ERRORS.inc(call='history', reason='empty')
                 return None
         except Exception:
+            metrics.YFINANCE_ERRORS.inc(call='history', reason='exception')
             return None
 
         name = STOCK_NAMES.get(code, f'銘柄{code}')
         try:
-            info = ticker.info
+            with metrics.YFINANCE_SECONDS.time(call='info'):
+                info = ticker.info
             name = info.get('longName') or info.get('shortName') or name
         except Exception:
-            pass
+            metrics.YFINANCE_ERRORS.inc(call='info', reason='exception')
 
         return {'code': code, 'name': name}
 
@@ -166,13 +267,14 @@ class StockService:
             return self._generate_mock_data(code, days)
 
         # 実データ取得
-        import time
         yf = _import_yfinance()
         try:
             time.sleep(1)
             ticker = yf.Ticker(f"{code}.T")
-            df = ticker.history(period=period)
+            with metrics.YFINANCE_SECONDS.time(call='history'):
+                df = ticker.history(period=period)
             if df.empty:
+                metrics.YFINANCE_ERRORS.inc(call='history', reason='empty')
                 return None
             df = df.reset_index()
             df.columns = [c.lower().replace(' ', '_') for c in df.columns]
@@ -180,6 +282,7 @@ class StockService:
                 df = df.rename(columns={'datetime': 'date'})
             return df[['date', 'open', 'high', 'low', 'close', 'volume']]
         except Exception as e:
+            metrics.YFINANCE_ERRORS.inc(call='history', reason='exception')
             print(f"fetch_stock_data error: {e}")
             return None
 
@@ -620,6 +723,120 @@ class StockService:
         details = self.calculate_signal_details(df, settings)
         return details['signal_type']
 
+    def calculate_signal_series(self, df: pd.DataFrame, settings: dict) -> pd.DataFrame:
+        """全行のシグナルを列演算で一括計算（calculate_signal_details を各行まで適用した結果と同じ）
+
+        返り値は df と同じ index の signal（1=buy / -1=sell / 0=hold）・signal_score・stop_loss_price 列。
+        バックテストのパネル構築用に、行ごとの DataFrame 切り出しを避ける。
+        """
+        n = len(df)
+
+        def col(name: str) -> np.ndarray:
+            return df[name].to_numpy(dtype=float) if name in df.columns else np.full(n, np.nan)
+
+        def prev(values: np.ndarray) -> np.ndarray:
+            return np.concatenate(([np.nan], values[:-1])) if n else values
+
+        with np.errstate(invalid='ignore'):
+            close, low, high = col('close'), col('low'), col('high')
+            rsi, prev_rsi = col('rsi'), prev(col('rsi'))
+            macd, macd_sig = col('macd'), col('macd_signal')
+            hist, prev_hist = col('macd_histogram'), prev(col('macd_histogram'))
+            sma_short, sma_mid, sma_long = col('sma5'), col('sma25'), col('sma75')
+            prev_short, prev_mid = prev(sma_short), prev(sma_mid)
+            stoch_k, stoch_d = col('stoch_k'), col('stoch_d')
+            prev_k, prev_d = prev(stoch_k), prev(stoch_d)
+            willr, prev_willr = col('williams_r'), prev(col('williams_r'))
+            bb_upper, bb_lower = col('bb_upper'), col('bb_lower')
+            atr, adx, volume_ratio = col('atr'), col('adx'), col('volume_ratio')
+            prev_close, prev_low, prev_high = prev(close), prev(low), prev(high)
+            prev_macd, prev_macd_sig = prev(macd), prev(macd_sig)
+            has_macd = 'macd' in df.columns and 'macd_signal' in df.columns
+            buy_thr, sell_thr = settings['rsiBuyThreshold'], settings['rsiSellThreshold']
+
+            # --- 買い（加重スコア）。欠損値との比較は False になり、行ごとの判定の NaN 確認と一致する ---
+            rsi_buy = rsi <= buy_thr
+            rsi_rising = ~rsi_buy & (buy_thr < rsi) & (rsi <= buy_thr + 10) & (rsi > prev_rsi)
+            macd_buy = has_macd & (prev_macd <= prev_macd_sig) & (macd > macd_sig)
+            hist_buy = has_macd & ~macd_buy & (prev_hist <= 0) & (hist > 0)
+            golden = (prev_short <= prev_mid) & (sma_short > sma_mid)
+            above_ma = ~golden & (prev_close <= sma_mid) & (close > sma_mid)
+            bb_bounce = (prev_low <= bb_lower) & (close > bb_lower)
+            rsi_above50 = (rsi > 50) & (prev_rsi < 50) & ~rsi_buy & ~rsi_rising
+            stoch_gc = (stoch_k <= 30) & (prev_k <= prev_d) & (stoch_k > stoch_d)
+            willr_buy = (prev_willr <= -80) & (willr > prev_willr)
+            buy_flags = [rsi_buy, rsi_rising, macd_buy, hist_buy, golden, above_ma,
+                         bb_bounce, rsi_above50, stoch_gc, willr_buy]
+            weights = [1.0, 0.7, 1.5, 1.0, 1.0, 0.5, 0.8, 0.5, 1.0, 0.5]
+            buy_score = sum(np.where(f, w, 0.0) for f, w in zip(buy_flags, weights))
+            buy_any = np.logical_or.reduce(buy_flags)
+            buy_tf = macd_buy | hist_buy | golden | above_ma
+
+            # --- 売り（加重スコア） ---
+            rsi_sell = rsi >= sell_thr
+            rsi_falling = ~rsi_sell & (sell_thr - 10 <= rsi) & (rsi < sell_thr) & (rsi < prev_rsi)
+            macd_sell = has_macd & (prev_macd >= prev_macd_sig) & (macd < macd_sig)
+            hist_sell = has_macd & ~macd_sell & (prev_hist >= 0) & (hist < 0)
+            dead = (prev_short >= prev_mid) & (sma_short < sma_mid)
+            below_ma = ~dead & (prev_close >= sma_mid) & (close < sma_mid)
+            bb_touch = (prev_high >= bb_upper) & (close < bb_upper)
+            rsi_below50 = (rsi < 50) & (prev_rsi > 50) & ~rsi_sell & ~rsi_falling
+            stoch_dc = (stoch_k >= 70) & (prev_k >= prev_d) & (stoch_k < stoch_d)
+            willr_sell = (prev_willr >= -20) & (willr < prev_willr)
+            sell_flags = [rsi_sell, rsi_falling, macd_sell, hist_sell, dead, below_ma,
+                          bb_touch, rsi_below50, stoch_dc, willr_sell]
+            sell_score = sum(np.where(f, w, 0.0) for f, w in zip(sell_flags, weights))
+            sell_any = np.logical_or.reduce(sell_flags)
+            sell_tf = macd_sell | hist_sell | dead | below_ma
+
+            # --- ADX 相場判定 + トレンドフィルター（付記ラベルもシグナル有無に数える） ---
+            has_trend = ~np.isnan(sma_long)
+            has_adx = ~np.isnan(adx) & has_trend
+            below_trend, above_trend = close < sma_long, close > sma_long
+            overheated = has_adx & (adx > 40)
+            strong = has_adx & ~overheated & (adx > 25)
+            ranging = has_adx & (adx < 20)
+            middle = (has_adx & ~overheated & ~strong & ~ranging) | (has_trend & ~has_adx)
+
+            buy_score = np.where(overheated & buy_any, buy_score * 0.7, buy_score)
+            sell_score = np.where(overheated & sell_any, sell_score * 0.7, sell_score)
+            counter_buy = below_trend & buy_any
+            counter_sell = ~counter_buy & above_trend & sell_any
+            penalty = np.select([overheated, strong, middle], [0.5, 0.3, 0.5], 1.0)
+            buy_score = np.where(counter_buy, buy_score * penalty, buy_score)
+            sell_score = np.where(counter_sell, sell_score * penalty, sell_score)
+            buy_score = np.where(ranging & buy_tf, buy_score * 0.5, buy_score)
+            sell_score = np.where(ranging & sell_tf, sell_score * 0.5, sell_score)
+            buy_any = buy_any | strong
+
+            # --- 出来高確認 / 出来高不足フィルター ---
+            has_vol = ~np.isnan(volume_ratio)
+            vol_bonus = np.select([volume_ratio >= 2.0, volume_ratio >= 1.5], [1.5, 1.0], 0.0)
+            vol_factor = np.select(
+                [volume_ratio >= 1.5, volume_ratio < 0.7, volume_ratio < 0.8, ~has_vol], [1.0, 0.0, 0.5, 0.5], 1.0)
+            buy_score = np.where(buy_any, buy_score * vol_factor + vol_bonus, buy_score)
+            sell_score = np.where(sell_any, sell_score * vol_factor + vol_bonus, sell_score)
+
+            # --- トレンド整合 ---
+            buy_score = np.where(has_trend & buy_any & above_trend, buy_score + 0.5, buy_score)
+            sell_score = np.where(has_trend & sell_any & below_trend, sell_score + 0.5, sell_score)
+
+            # --- シグナル判定 + 損切り価格（支持線・抵抗線は直近25日の安値・高値） ---
+            is_buy = (buy_score > sell_score) & buy_any
+            is_sell = ~is_buy & (sell_score > buy_score) & sell_any
+            if n:
+                is_buy[0] = is_sell[0] = False  # 2行未満は hold
+            support = pd.Series(low).rolling(25, min_periods=1).min().to_numpy()
+            resistance = pd.Series(high).rolling(25, min_periods=1).max().to_numpy()
+            buy_stop = np.where(atr > 0, close - 2 * atr, np.maximum(support, close * 0.95))
+            stop_loss = _round(np.select([is_buy, is_sell], [buy_stop, resistance], np.nan), 1)
+
+        return pd.DataFrame({
+            'signal': np.select([is_buy, is_sell], [1, -1], 0).astype(np.int8),
+            'signal_score': _round(np.select([is_buy, is_sell], [buy_score, sell_score], 0.0), 2),
+            'stop_loss_price': np.where(stop_loss == 0, np.nan, stop_loss),
+        }, index=df.index)
+
     def add_stock(self, code: str) -> Optional[Stock]:
         """銘柄を追加"""
         existing = self.db.query(Stock).filter(Stock.code == code).first()
@@ -634,6 +851,7 @@ class StockService:
         self.db.add(stock)
         self.db.commit()
         self.db.refresh(stock)
+        invalidate_stock_names()
 
         # 初回データ取得
         self.update_stock_data(code)
@@ -647,8 +865,12 @@ class StockService:
 
         self.db.query(StockPrice).filter(StockPrice.code == code).delete()
         self.db.query(Signal).filter(Signal.code == code).delete()
+        self.db.query(StockLatest).filter(StockLatest.code == code).delete()
+        self.db.query(ChartSeries).filter(ChartSeries.code == code).delete()
         self.db.delete(stock)
+        data_version.bump_stock(self.db, code)
         self.db.commit()
+        invalidate_stock_names()
         return True
 
     def update_stock_data(self, code: str):
@@ -659,7 +881,10 @@ class StockService:
             return
 
         df = self.calculate_indicators(df, settings)
+        self.save_stock_data(code, df, settings)
 
+    def save_stock_data(self, code: str, df: pd.DataFrame, settings: dict):
+        """指標計算済みの株価からシグナルを判定し、株価・シグナル・最新状態・チャート系列を保存"""
         # 最新データをDBに保存
         latest = df.iloc[-1]
         today = latest['date'].date() if hasattr(latest['date'], 'date') else latest['date']
@@ -722,130 +947,218 @@ class StockService:
             adx=_safe_float(latest.get('adx')),
         )
         self.db.add(signal)
+
+        # 最新状態（stock_latest）も同一トランザクションで更新
+        prev_close = float(df['close'].iloc[-2]) if len(df) >= 2 else float(latest['close'])
+        self._write_latest(code, today, float(latest['close']), prev_close, signal)
+        self._write_chart_series(code, df[self._CHART_COLUMNS], settings)
+        self.db.commit()
+
+    def _write_latest(self, code: str, price_date, current: float, prev_close: float,
+                      signal: Optional[Signal], previous_signal_type: Optional[str] = None):
+        """stock_latest の1行を更新（コミットは呼び出し側）"""
+        row = self.db.query(StockLatest).filter(StockLatest.code == code).first()
+        if row is None:
+            row = StockLatest(code=code)
+            self.db.add(row)
+            if signal is not None and previous_signal_type is None:
+                prev = self.db.query(Signal.signal_type).filter(
+                    Signal.code == code, Signal.date < signal.date,
+                ).order_by(Signal.date.desc()).first()
+                previous_signal_type = prev[0] if prev else None
+        elif signal is not None and previous_signal_type is None:
+            # 同日の再計算なら前回シグナルは据え置き、日付が進んだら直前の値を繰り下げ
+            if row.signal_date is not None and row.signal_date < signal.date:
+                previous_signal_type = row.signal_type
+            else:
+                previous_signal_type = row.previous_signal_type
+
+        row.price_date = price_date
+        row.current_price = current
+        row.previous_close = prev_close
+        row.change_percent = round((current - prev_close) / prev_close * 100, 2) if prev_close else 0.0
+        row.signal_date = signal.date if signal is not None else None
+        row.previous_signal_type = previous_signal_type
+        for field in LATEST_SIGNAL_FIELDS:
+            setattr(row, field, getattr(signal, field) if signal is not None else None)
+        data_version.bump_stock(self.db, code)
+        return row
+
+    def refresh_latest(self, codes: Optional[list[str]] = None) -> int:
+        """stock_latest を株価・シグナル履歴から再構築（初回移行・バックフィル用）"""
+        signal_rank = func.row_number().over(
+            partition_by=Signal.code, order_by=Signal.date.desc()
+        ).label('rn')
+        ranked = self.db.query(Signal.code, Signal.signal_type, signal_rank).subquery()
+        previous_types = dict(
+            self.db.query(ranked.c.code, ranked.c.signal_type).filter(ranked.c.rn == 2).all()
+        )
+        count = 0
+        for stock, current, price_date, prev_close, signal in self._latest_state_rows():
+            if codes is not None and stock.code not in codes:
+                continue
+            self._write_latest(
+                stock.code, price_date, current,
+                prev_close if prev_close is not None else current,
+                signal, previous_types.get(stock.code),
+            )
+            count += 1
         self.db.commit()
+        return count
+
+    def _latest_state_rows(self, code: Optional[str] = None) -> list:
+        """銘柄ごとの最新終値・前日終値・最新シグナルを1クエリで取得
+
+        ROW_NUMBER() OVER (PARTITION BY code ORDER BY date DESC) で順位付けし、
+        rn=1（最新）/ rn=2（前日）を結合する。SQLite(3.25+) と PostgreSQL の両方で動作。
+        戻り値は (Stock, 最新終値, 最新日付, 前日終値 or None, Signal or None) のリスト。
+        """
+        price_rank = func.row_number().over(
+            partition_by=StockPrice.code, order_by=StockPrice.date.desc()
+        ).label('rn')
+        signal_rank = func.row_number().over(
+            partition_by=Signal.code, order_by=Signal.date.desc()
+        ).label('rn')
+        prices_q = self.db.query(StockPrice.code, StockPrice.close, StockPrice.date, price_rank)
+        signals_q = self.db.query(Signal, signal_rank)
+        stocks_filter = []
+        if code is not None:
+            prices_q = prices_q.filter(StockPrice.code == code)
+            signals_q = signals_q.filter(Signal.code == code)
+            stocks_filter.append(Stock.code == code)
+        prices = prices_q.subquery('ranked_prices')
+        signals = signals_q.subquery('ranked_signals')
+
+        latest = aliased(prices, name='latest_price')
+        prev = aliased(prices, name='prev_price')
+        signal = aliased(Signal, signals, name='latest_signal')
+        return self.db.query(
+            Stock, latest.c.close, latest.c.date, prev.c.close, signal,
+        ).join(
+            latest, and_(latest.c.code == Stock.code, latest.c.rn == 1),
+        ).outerjoin(
+            prev, and_(prev.c.code == Stock.code, prev.c.rn == 2),
+        ).outerjoin(
+            signal, and_(signal.code == Stock.code, signals.c.rn == 1),
+        ).filter(*stocks_filter).order_by(Stock.id).all()
+
+    def _latest_rows(self, code: Optional[str] = None) -> list[tuple[Stock, StockLatest]]:
+        """銘柄と stock_latest を結合して取得（株価のない銘柄は含まない）"""
+        query = self.db.query(Stock, StockLatest).join(StockLatest, StockLatest.code == Stock.code)
+        if code is not None:
+            query = query.filter(Stock.code == code)
+        return query.order_by(Stock.id).all()
+
+    def get_latest_map(self, codes: list[str]) -> dict[str, tuple[Stock, StockLatest | None]]:
+        """銘柄コード → (銘柄, stock_latest)。株価のない銘柄は stock_latest が None、未登録の銘柄は含まない"""
+        rows = self.db.query(Stock, StockLatest).outerjoin(
+            StockLatest, StockLatest.code == Stock.code,
+        ).filter(Stock.code.in_(codes)).all()
+        return {stock.code: (stock, latest) for stock, latest in rows}
+
+    @staticmethod
+    def _format_summary(stock: Stock, latest: StockLatest) -> dict:
+        """一覧・詳細で共通の項目"""
+        return {
+            'id': stock.id,
+            'code': stock.code,
+            'name': stock.name,
+            'currentPrice': latest.current_price,
+            'previousClose': latest.previous_close,
+            'changePercent': latest.change_percent,
+            'signal': latest.signal_type or 'hold',
+            'rsi': round(latest.rsi, 1) if latest.rsi else 50.0,
+            'signalStrength': latest.signal_strength or 0,
+            'activeSignals': latest.active_signals.split(',') if latest.active_signals else [],
+            'updatedAt': latest.price_date.isoformat() if latest.price_date else '',
+        }
 
     def get_all_stocks(self) -> list[dict]:
-        """全銘柄の一覧を取得"""
-        stocks = self.db.query(Stock).all()
-        result = []
-        for stock in stocks:
-            latest_signal = self.db.query(Signal).filter(
-                Signal.code == stock.code
-            ).order_by(Signal.date.desc()).first()
-
-            latest_price = self.db.query(StockPrice).filter(
-                StockPrice.code == stock.code
-            ).order_by(StockPrice.date.desc()).first()
-
-            prev_price = self.db.query(StockPrice).filter(
-                StockPrice.code == stock.code
-            ).order_by(StockPrice.date.desc()).offset(1).first()
-
-            if latest_price:
-                current = latest_price.close
-                prev_close = prev_price.close if prev_price else current
-                change = ((current - prev_close) / prev_close * 100) if prev_close else 0
-
-                active_signals_list = (
-                    latest_signal.active_signals.split(',') if latest_signal and latest_signal.active_signals else []
-                )
-                result.append({
-                    'id': stock.id,
-                    'code': stock.code,
-                    'name': stock.name,
-                    'currentPrice': current,
-                    'previousClose': prev_close,
-                    'changePercent': round(change, 2),
-                    'signal': latest_signal.signal_type if latest_signal else 'hold',
-                    'rsi': round(latest_signal.rsi, 1) if latest_signal and latest_signal.rsi else 50.0,
-                    'signalStrength': latest_signal.signal_strength if latest_signal and latest_signal.signal_strength else 0,
-                    'activeSignals': active_signals_list,
-                    'updatedAt': latest_price.date.isoformat() if latest_price else ''
-                })
-        return result
+        """全銘柄の一覧を取得（stock_latest から1クエリ）"""
+        return [self._format_summary(stock, latest) for stock, latest in self._latest_rows()]
 
     def get_stock_detail(self, code: str) -> Optional[dict]:
         """銘柄詳細を取得"""
-        stock = self.db.query(Stock).filter(Stock.code == code).first()
-        if not stock:
-            return None
-
-        latest_signal = self.db.query(Signal).filter(
-            Signal.code == code
-        ).order_by(Signal.date.desc()).first()
-
-        latest_price = self.db.query(StockPrice).filter(
-            StockPrice.code == code
-        ).order_by(StockPrice.date.desc()).first()
-
-        prev_price = self.db.query(StockPrice).filter(
-            StockPrice.code == code
-        ).order_by(StockPrice.date.desc()).offset(1).first()
-
-        if not latest_price:
+        rows = self._latest_rows(code)
+        if not rows:
             return None
+        return self.format_detail(*rows[0])
 
-        current = latest_price.close
-        prev_close = prev_price.close if prev_price else current
-        change = ((current - prev_close) / prev_close * 100) if prev_close else 0
-
-        active_signals_list = (
-            latest_signal.active_signals.split(',') if latest_signal and latest_signal.active_signals else []
-        )
+    @classmethod
+    def format_detail(cls, stock: Stock, latest: StockLatest) -> dict:
+        """銘柄詳細の項目（一覧の項目 + 指標）"""
         return {
-            'id': stock.id,
-            'code': stock.code,
-            'name': stock.name,
-            'currentPrice': current,
-            'previousClose': prev_close,
-            'changePercent': round(change, 2),
-            'signal': latest_signal.signal_type if latest_signal else 'hold',
-            'rsi': round(latest_signal.rsi, 1) if latest_signal and latest_signal.rsi else 50.0,
-            'signalStrength': latest_signal.signal_strength if latest_signal and latest_signal.signal_strength else 0,
-            'activeSignals': active_signals_list,
-            'macd': round(latest_signal.macd, 2) if latest_signal and latest_signal.macd else 0.0,
-            'macdSignal': round(latest_signal.macd_signal, 2) if latest_signal and latest_signal.macd_signal else 0.0,
-            'macdHistogram': round(latest_signal.macd_histogram, 2) if latest_signal and latest_signal.macd_histogram else 0.0,
-            'sma5': round(latest_signal.sma5, 0) if latest_signal and latest_signal.sma5 else 0,
-            'sma25': round(latest_signal.sma25, 0) if latest_signal and latest_signal.sma25 else 0,
-            'sma75': round(latest_signal.sma75, 0) if latest_signal and latest_signal.sma75 else 0,
-            'targetPrice': latest_signal.target_price if latest_signal else None,
-            'stopLossPrice': latest_signal.stop_loss_price if latest_signal else None,
-            'supportPrice': latest_signal.support_price if latest_signal else None,
-            'resistancePrice': latest_signal.resistance_price if latest_signal else None,
-            'bbUpper': round(latest_signal.bb_upper, 1) if latest_signal and latest_signal.bb_upper else None,
-            'bbLower': round(latest_signal.bb_lower, 1) if latest_signal and latest_signal.bb_lower else None,
-            'bbMiddle': round(latest_signal.bb_middle, 1) if latest_signal and latest_signal.bb_middle else None,
-            'atr': round(latest_signal.atr, 1) if latest_signal and latest_signal.atr else None,
-            'volumeRatio': round(latest_signal.volume_ratio, 2) if latest_signal and latest_signal.volume_ratio else None,
-            'signalScore': round(latest_signal.signal_score, 2) if latest_signal and latest_signal.signal_score else None,
-            'updatedAt': latest_price.date.isoformat() if latest_price else ''
+            **cls._format_summary(stock, latest),
+            'macd': round(latest.macd, 2) if latest.macd else 0.0,
+            'macdSignal': round(latest.macd_signal, 2) if latest.macd_signal else 0.0,
+            'macdHistogram': round(latest.macd_histogram, 2) if latest.macd_histogram else 0.0,
+            'sma5': round(latest.sma5, 0) if latest.sma5 else 0,
+            'sma25': round(latest.sma25, 0) if latest.sma25 else 0,
+            'sma75': round(latest.sma75, 0) if latest.sma75 else 0,
+            'targetPrice': latest.target_price,
+            'stopLossPrice': latest.stop_loss_price,
+            'supportPrice': latest.support_price,
+            'resistancePrice': latest.resistance_price,
+            'bbUpper': round(latest.bb_upper, 1) if latest.bb_upper else None,
+            'bbLower': round(latest.bb_lower, 1) if latest.bb_lower else None,
+            'bbMiddle': round(latest.bb_middle, 1) if latest.bb_middle else None,
+            'atr': round(latest.atr, 1) if latest.atr else None,
+            'volumeRatio': round(latest.volume_ratio, 2) if latest.volume_ratio else None,
+            'signalScore': round(latest.signal_score, 2) if latest.signal_score else None,
         }
 
-    def get_chart_data(self, code: str, period: str = '3m') -> list[dict]:
-        """チャートデータを取得"""
-        period_days = {'1m': 30, '3m': 90, '6m': 180, '1y': 365}
-        days = period_days.get(period, 90)
+    _CHART_COLUMNS = ['date', 'open', 'high', 'low', 'close', 'volume']
+    _CHART_DAYS = chart_series.PERIOD_DAYS
 
-        prices = self.db.query(StockPrice).filter(
+    def _chart_frame(self, code: str, period: str) -> pd.DataFrame:
+        """チャート用の株価 + SMA/ボリンジャーバンド（古い順）"""
+        prices = self.db.query(
+            StockPrice.date, StockPrice.open, StockPrice.high, StockPrice.low,
+            StockPrice.close, StockPrice.volume,
+        ).filter(
             StockPrice.code == code
-        ).order_by(StockPrice.date.desc()).limit(days).all()
+        ).order_by(StockPrice.date.desc()).limit(self._CHART_DAYS.get(period, 90)).all()
 
-        prices = list(reversed(prices))
+        if not prices:
+            return pd.DataFrame()
+        df = pd.DataFrame(list(reversed(prices)), columns=self._CHART_COLUMNS)
+        return self._with_chart_indicators(df, self.get_settings())
+
+    def _chart_frames(self, codes: list[str], period: str) -> dict[str, pd.DataFrame]:
+        """複数銘柄のチャート DataFrame を1クエリで取得（銘柄ごとに直近 N 本）"""
+        frames = self._price_frames(codes, self._CHART_DAYS.get(period, 90))
+        if not frames:
+            return {}
         settings = self.get_settings()
+        return {code: self._with_chart_indicators(df, settings) for code, df in frames.items()}
+
+    def _price_frames(self, codes: Optional[list[str]], days: int) -> dict[str, pd.DataFrame]:
+        """銘柄ごとの直近 days 本の株価（古い順, 指標なし）。codes=None は全銘柄"""
+        query = self.db.query(
+            StockPrice.code, *[getattr(StockPrice, c) for c in self._CHART_COLUMNS],
+            func.row_number().over(
+                partition_by=StockPrice.code, order_by=StockPrice.date.desc(),
+            ).label('rn'),
+        )
+        if codes is not None:
+            query = query.filter(StockPrice.code.in_(codes))
+        ranked = query.subquery()
+        rows = self.db.query(
+            ranked.c.code, *[ranked.c[c] for c in self._CHART_COLUMNS],
+        ).filter(ranked.c.rn <= days).order_by(ranked.c.code, ranked.c.date).all()
+        if not rows:
+            return {}
+
+        df_all = pd.DataFrame(rows, columns=['code'] + self._CHART_COLUMNS)
+        return {
+            code: df.drop(columns='code').reset_index(drop=True)
+            for code, df in df_all.groupby('code', sort=False)
+        }
 
-        if not prices:
-            return []
-
-        # DataFrameでSMAを計算
-        df = pd.DataFrame([{
-            'date': p.date,
-            'open': p.open,
-            'high': p.high,
-            'low': p.low,
-            'close': p.close,
-            'volume': p.volume
-        } for p in prices])
+    @staticmethod
+    def _with_chart_indicators(df: pd.DataFrame, settings: dict) -> pd.DataFrame:
+        if len(df) < min(settings['smaShortPeriod'], 20):
+            return df  # どの指標も計算できる本数がない
 
         ta = _import_pandas_ta()
         if len(df) >= settings['smaShortPeriod']:
@@ -861,38 +1174,92 @@ class StockService:
             if bbands is not None:
                 df['bb_lower'] = bbands.iloc[:, 0]
                 df['bb_upper'] = bbands.iloc[:, 2]
+        return df
 
-        result = []
-        for _, row in df.iterrows():
-            result.append({
-                'date': row['date'].strftime('%m/%d'),
-                'open': row['open'],
-                'high': row['high'],
-                'low': row['low'],
-                'close': row['close'],
-                'volume': int(row['volume']),
-                'sma5': round(row['sma5'], 0) if pd.notna(row.get('sma5')) else None,
-                'sma25': round(row['sma25'], 0) if pd.notna(row.get('sma25')) else None,
-                'sma75': round(row['sma75'], 0) if pd.notna(row.get('sma75')) else None,
-                'bbUpper': round(row['bb_upper'], 0) if pd.notna(row.get('bb_upper')) else None,
-                'bbLower': round(row['bb_lower'], 0) if pd.notna(row.get('bb_lower')) else None,
-            })
-        return result
+    def get_chart_data(self, code: str, period: str = '3m') -> list[dict]:
+        """チャートデータを取得（1日1行）"""
+        return chart_rows(self._chart_frame(code, period))
+
+    def get_chart_columns(self, code: str, period: str = '3m') -> dict:
+        """チャートデータを列ごとの配列で取得（orjson で numpy 配列のまま直列化する前提）"""
+        return chart_columns(self._chart_frame(code, period))
+
+    def get_charts(self, codes: list[str], period: str = '3m') -> dict[str, list[dict]]:
+        """複数銘柄のチャートデータ（株価のない銘柄は空リスト）"""
+        frames = self._chart_frames(codes, period)
+        return {code: chart_rows(frames[code]) if code in frames else [] for code in codes}
+
+    # ---- 配信用チャート系列（chart_series） ----
+
+    def _write_chart_series(self, code: str, prices: pd.DataFrame, settings: dict):
+        """株価（古い順）から全期間のチャート本文を作り chart_series に保存（コミットは呼び出し側）"""
+        version = config_cache.version(self.db, config_cache.SETTINGS)
+        existing = {
+            row.period: row
+            for row in self.db.query(ChartSeries).filter(ChartSeries.code == code).all()
+        }
+        for period, days in chart_series.PERIOD_DAYS.items():
+            df = self._with_chart_indicators(prices.tail(days).reset_index(drop=True), settings)
+            columns = chart_columns(df)
+            row = existing.get(period)
+            if row is None:
+                row = ChartSeries(code=code, period=period)
+                self.db.add(row)
+            row.num_points = len(columns['dates'])
+            row.settings_version = version
+            row.columns_body = chart_series.encode(columns)
+            row.rows_body = chart_series.encode(chart_series.rows_from_columns(columns))
+
+    def refresh_chart_series(self, codes: Optional[list[str]] = None) -> int:
+        """chart_series を株価履歴から再構築（初回移行・表示設定変更後のバックフィル用）"""
+        frames = self._price_frames(codes, max(chart_series.PERIOD_DAYS.values()))
+        settings = self.get_settings()
+        for code, df in frames.items():
+            self._write_chart_series(code, df, settings)
+        self.db.commit()
+        return len(frames)
+
+    def _stored_chart(self, code: str, period: str) -> Optional[ChartSeries]:
+        """現在の表示設定で作られた保存済み系列（なければ None）"""
+        period = period if period in chart_series.PERIOD_DAYS else chart_series.DEFAULT_PERIOD
+        row = self.db.query(ChartSeries).filter(
+            ChartSeries.code == code, ChartSeries.period == period,
+        ).first()
+        if row is None or row.settings_version != config_cache.version(self.db, config_cache.SETTINGS):
+            return None
+        return row
+
+    def get_chart_body(self, code: str, period: str = '3m', columnar: bool = False) -> Optional[bytes]:
+        """保存済みのチャート本文（gzip 済み JSON）。未作成・設定変更後は None"""
+        row = self._stored_chart(code, period)
+        if row is None:
+            return None
+        return row.columns_body if columnar else row.rows_body
+
+    def get_chart_downsampled(self, code: str, period: str, points: int, columnar: bool = False):
+        """LTTB で points 点に間引いたチャートデータ（保存済み系列があればそれを使う）"""
+        row = self._stored_chart(code, period)
+        if row is not None:
+            columns = chart_series.decode(row.columns_body)
+        else:
+            columns = chart_columns(self._chart_frame(code, period))
+        columns = chart_series.downsample(columns, points)
+        return columns if columnar else chart_series.rows_from_columns(columns)
 
     def get_recommendations(self) -> dict:
         """おすすめ銘柄を取得"""
         settings = self.get_settings()
         budget = settings['investmentBudget']
-        stocks = self.get_all_stocks()
+        rows = self._latest_rows()
+        latest_by_code = {latest.code: latest for _, latest in rows}
+        stocks = [self._format_summary(stock, latest) for stock, latest in rows]
 
         buy_recs = []
         sell_recs = []
 
         for s in stocks:
             if s['signal'] == 'buy' and s['currentPrice'] > 0:
-                latest_signal = self.db.query(Signal).filter(
-                    Signal.code == s['code']
-                ).order_by(Signal.date.desc()).first()
+                latest_signal = latest_by_code[s['code']]
 
                 target = latest_signal.target_price if latest_signal else None
                 stop_loss = latest_signal.stop_loss_price if latest_signal else None
@@ -927,9 +1294,7 @@ class StockService:
                 })
 
             elif s['signal'] == 'sell':
-                latest_signal = self.db.query(Signal).filter(
-                    Signal.code == s['code']
-                ).order_by(Signal.date.desc()).first()
+                latest_signal = latest_by_code[s['code']]
 
                 sell_recs.append({
                     'code': s['code'],
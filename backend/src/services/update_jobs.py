@@ -0,0 +1,207 @@
+"""データ更新ジョブの一元管理
+
+/api/update・定期スケジュール・watchdog・起動時キャッチアップの更新要求をすべてここに集め、
+専用のワーカースレッドで1本ずつ実行する（リクエストスレッド・スケジューラスレッドは待たない）。
+
+- 実行中の更新があれば新しい要求はそれに合流する（株価取得は1回だけ）。
+  株価のみ(prices)の実行中に全段(full)が要求されたら、取得後の段まで延長する
+- 取得段を過ぎていて合流できない要求は待機枠1つにまとめる。待機分の実行は、直前の取得から
+  FRESH_SECONDS 以内なら株価取得を省略し後段だけ行う
+- 全段(full)の実行は株価取得〜自動売買を銘柄単位のパイプライン（update_pipeline.py）で流す
+- 実行状態と直近の履歴（段ごとの処理件数・所要時間を含む）は status() で参照できる（プロセス内のみ）
+"""
+import logging
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Callable
+
+from sqlalchemy.orm import Session
+
+from src.models import database
+from src.config import settings as app_settings
+from src.services import events, metrics, profiler, query_stats, update_pipeline
+from src.services.pipeline import StageStats
+
+logger = logging.getLogger(__name__)
+
+PRICES = 'prices'   # 株価・シグナル更新のみ
+FULL = 'full'       # 株価更新 → アラート判定 → 自動売買
+
+FRESH_SECONDS = 120
+HISTORY_SIZE = 20
+
+
+@dataclass
+class UpdateRun:
+    id: int
+    kind: str
+    sources: list[str]
+    status: str = 'queued'  # queued / running / succeeded / failed
+    stage: str | None = None
+    fetched: bool = False   # 株価取得を行ったか（鮮度により省略した場合 False）
+    error: str | None = None
+    queued_at: datetime = field(default_factory=datetime.now)
+    started_at: datetime | None = None
+    finished_at: datetime | None = None
+    stages: list[StageStats] = field(default_factory=list)
+    _done: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    @property
+    def finished(self) -> bool:
+        return self._done.is_set()
+
+    def wait(self, timeout: float | None = None) -> bool:
+        return self._done.wait(timeout)
+
+    def to_dict(self) -> dict:
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'sources': list(self.sources),
+            'status': self.status,
+            'stage': self.stage,
+            'fetched': self.fetched,
+            'error': self.error,
+            'queuedAt': self.queued_at.isoformat(),
+            'startedAt': self.started_at.isoformat() if self.started_at else None,
+            'finishedAt': self.finished_at.isoformat() if self.finished_at else None,
+            'stages': [s.to_dict() for s in self.stages],
+        }
+
+
+def fetch_prices(db: Session) -> list[StageStats]:
+    """取得段: 全銘柄の株価取得 → 指標計算 → シグナル判定・保存"""
+    stats = update_pipeline.run(db, update_pipeline.price_stages())
+    logger.info("Stock data updated successfully")
+    return stats
+
+
+def run_after_fetch(db: Session) -> list[StageStats]:
+    """後段: アラート判定 → 自動売買（株価取得を省略した実行用）"""
+    return update_pipeline.run(db, update_pipeline.after_fetch_stages())
+
+
+def run_full(db: Session) -> list[StageStats]:
+    """全段を1本のパイプラインで実行（株価が取れた銘柄から順にアラート・自動売買まで進む）"""
+    stats = update_pipeline.run(db, update_pipeline.price_stages() + update_pipeline.after_fetch_stages())
+    logger.info("Stock data updated successfully")
+    return stats
+
+
+class UpdateJobManager:
+    def __init__(self, fetch: Callable[[Session], list[StageStats] | None] = fetch_prices,
+                 after_fetch: Callable[[Session], list[StageStats] | None] = run_after_fetch,
+                 full: Callable[[Session], list[StageStats] | None] | None = None,
+                 fresh_seconds: float = FRESH_SECONDS, history_size: int = HISTORY_SIZE):
+        self._fetch = fetch
+        self._after_fetch = after_fetch
+        self._full = full
+        self._fresh_seconds = fresh_seconds
+        self._lock = threading.Lock()
+        self._current: UpdateRun | None = None
+        self._pending: UpdateRun | None = None
+        self._history: deque[UpdateRun] = deque(maxlen=history_size)
+        self._last_fetch_at: float | None = None
+        self._next_id = 1
+
+    def trigger(self, kind: str, source: str) -> UpdateRun:
+        """更新を要求し、合流先または新規の実行を返す（実行完了は待たない）"""
+        with self._lock:
+            current = self._current
+            # 合流できるのは、実行中が全段 / 要求が株価のみ / まだ取得段を抜けていない場合
+            if current is not None and (
+                current.kind == FULL or kind == PRICES or current.status == 'queued' or current.stage == 'fetch'
+            ):
+                if kind == FULL:
+                    current.kind = FULL
+                current.sources.append(source)
+                return current
+            if current is not None:
+                if self._pending is None:
+                    self._pending = self._new_run(kind, source)
+                else:
+                    if kind == FULL:
+                        self._pending.kind = FULL
+                    self._pending.sources.append(source)
+                return self._pending
+            self._current = self._new_run(kind, source)
+            run = self._current
+        threading.Thread(target=self._drain, name='update-job', daemon=True).start()
+        return run
+
+    @property
+    def busy(self) -> bool:
+        return self._current is not None
+
+    def status(self) -> dict:
+        with self._lock:
+            return {
+                'current': self._current.to_dict() if self._current else None,
+                'pending': self._pending.to_dict() if self._pending else None,
+                'history': [run.to_dict() for run in self._history],
+            }
+
+    def _new_run(self, kind: str, source: str) -> UpdateRun:
+        run = UpdateRun(id=self._next_id, kind=kind, sources=[source])
+        self._next_id += 1
+        return run
+
+    def _drain(self):
+        """待機分がなくなるまで順に実行（ワーカースレッド）"""
+        while True:
+            with self._lock:
+                run = self._current
+            if run is None:
+                return
+            self._execute(run)
+            with self._lock:
+                self._history.appendleft(run)
+                self._current, self._pending = self._pending, None
+            run._done.set()
+
+    def _execute(self, run: UpdateRun):
+        logger.info(f"=== Update run #{run.id} ({run.kind}) started: {', '.join(run.sources)} ===")
+        run.status, run.started_at, run.stage = 'running', datetime.now(), 'fetch'
+        db = database.SessionLocal()
+        try:
+            # 各段はパイプラインのワーカースレッドで動くため全スレッドを採取する
+            with profiler.profile(f'update-{run.id}-{run.kind}', enabled=app_settings.profile_jobs, all_threads=True), \
+                    query_stats.track(f'update-{run.id}') as stats:
+                self._run_stages(run, db)
+            logger.info(f"Update run #{run.id}: {stats.count} queries, {stats.seconds:.2f}s in SQL")
+            run.status = 'succeeded'
+        except Exception as e:
+            logger.error(f"Update run #{run.id} failed: {e}", exc_info=True)
+            run.status, run.error = 'failed', str(e)
+        finally:
+            db.close()
+            run.stage, run.finished_at = None, datetime.now()
+            metrics.UPDATE_RUNS.inc(kind=run.kind, status=run.status)
+        events.bus.publish(events.PIPELINE, {
+            'status': 'finished', 'at': run.finished_at.isoformat(), 'run': run.to_dict(),
+        })
+        logger.info(f"=== Update run #{run.id} finished: {run.status} ===")
+
+    def _run_stages(self, run: UpdateRun, db: Session):
+        fresh = self._last_fetch_at is not None and time.monotonic() - self._last_fetch_at < self._fresh_seconds
+        if not fresh and run.kind == FULL and self._full is not None:
+            run.stages.extend(self._full(db) or [])
+            self._last_fetch_at = time.monotonic()
+            run.fetched = True
+            return
+        if fresh:
+            logger.info(f"Update run #{run.id}: prices fetched within {self._fresh_seconds}s, skipping fetch")
+        else:
+            run.stages.extend(self._fetch(db) or [])
+            self._last_fetch_at = time.monotonic()
+            run.fetched = True
+        with self._lock:
+            run.stage = 'after_fetch' if run.kind == FULL else None
+        if run.stage:
+            run.stages.extend(self._after_fetch(db) or [])
+
+
+manager = UpdateJobManager(full=run_full)
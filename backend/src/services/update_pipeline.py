@@ -0,0 +1,163 @@
+"""データ更新パイプラインのステージ定義
+
+fetch（yfinance 取得）→ indicators（テクニカル指標）→ signals（シグナル判定・保存）
+→ alerts（アラート判定）→ auto_trade（自動売買）を銘柄単位で流す（pipeline.py）。
+株価取得はネットワーク待ちが主なので並列、DB に書く段は SQLite の書き込み競合を避けて1本。
+自動売買は1回の実行を1つの作業単位として扱う（start_run → 銘柄ごとの trade_code → finish_run）ため、
+シグナルが出た銘柄から順に判定・発注し、全銘柄の株価取得を待たない。
+"""
+import logging
+from typing import Any
+
+import pandas as pd
+from sqlalchemy.orm import Session
+
+from src.models import database
+from src.models.stock import AlertHistory, AutoTradeLog, Stock
+from src.services import events, metrics
+from src.services.pipeline import Pipeline, Stage, StageStats
+
+logger = logging.getLogger(__name__)
+
+FETCH_CONCURRENCY = 3       # yfinance は1銘柄ごとに1秒待つため並列で待ち時間を重ねる
+INDICATOR_CONCURRENCY = 2
+ALERT_BATCH_SIZE = 50
+
+
+class FetchStage(Stage):
+    name = 'fetch'
+    concurrency = FETCH_CONCURRENCY
+
+    def process_one(self, db: Session, code: str, value: Any) -> pd.DataFrame | None:
+        from src.services.stock_service import StockService
+
+        df = StockService(db).fetch_stock_data(code)
+        return df if df is not None and not df.empty else None
+
+
+class IndicatorStage(Stage):
+    name = 'indicators'
+    concurrency = INDICATOR_CONCURRENCY
+
+    def open(self, db: Session):
+        from src.services.stock_service import StockService
+
+        self.settings = StockService(db).get_settings()
+
+    def process_one(self, db: Session, code: str, df: pd.DataFrame) -> pd.DataFrame:
+        from src.services.stock_service import StockService
+
+        return StockService(db).calculate_indicators(df, self.settings)
+
+
+class SignalStage(Stage):
+    """シグナル判定と株価・シグナル・最新状態・チャート系列の保存（銘柄ごとに commit）"""
+    name = 'signals'
+
+    def open(self, db: Session):
+        from src.services.stock_service import StockService
+
+        self.settings = StockService(db).get_settings()
+        self.before = events.latest_snapshot(db)
+
+    def process_one(self, db: Session, code: str, df: pd.DataFrame) -> str:
+        from src.services.stock_service import StockService
+
+        StockService(db).save_stock_data(code, df, self.settings)
+        return code
+
+    def close(self, db: Session):
+        events.publish_latest_changes(self.before, events.latest_snapshot(db))
+
+
+class AlertStage(Stage):
+    """更新済みの銘柄のアラートをまとめて判定。最後に更新されなかった銘柄の分も判定する"""
+    name = 'alerts'
+    batch_size = ALERT_BATCH_SIZE
+
+    def open(self, db: Session):
+        self.last_alert_id = events.max_id(db, AlertHistory)
+        self.checked: set[str] = set()
+
+    def process_batch(self, db: Session, batch: list[tuple[str, Any]]) -> list[tuple[str, Any]]:
+        from src.services.alert_service import AlertService
+
+        codes = [code for code, _ in batch]
+        AlertService(db).check_alerts(codes)
+        self.checked.update(codes)
+        # 値が None の銘柄は下流へ流れないため、株価取得を省略した実行でも銘柄コードを渡す
+        return [(code, code) for code in codes]
+
+    def close(self, db: Session):
+        from src.services.alert_service import AlertService
+
+        AlertService(db).check_alerts(exclude_codes=self.checked)
+        logger.info("Alert check completed")
+        events.publish_new_alerts(db, self.last_alert_id)
+
+
+class AutoTradeStage(Stage):
+    """自動売買。実行全体で1つの AutoTradeService（段専用の Session）を使う
+
+    SQLite の書き込みロックを他の段に渡すため銘柄ごとに commit する。失敗した銘柄は
+    サービスの Session をロールバックして次の銘柄へ進む（ワーカーの Session は使わない）。
+    株価更新に失敗した銘柄も、保有分の利確・損切り判定のため最後に前回のシグナルで判定する。
+    """
+    name = 'auto_trade'
+
+    def open(self, db: Session):
+        from src.services.auto_trade_service import AutoTradeService
+
+        self.last_log_id = events.max_id(db, AutoTradeLog)
+        self.service = AutoTradeService(db)
+        self.run = self.service.start_run(commit_each_code=True)
+        self.traded: set[str] = set()
+
+    def _trade(self, code: str):
+        self.traded.add(code)
+        if self.run is None:
+            return
+        try:
+            self.service.trade_code(self.run, code)
+        except Exception:
+            self.service.db.rollback()
+            raise
+
+    def process_one(self, db: Session, code: str, value: Any) -> str:
+        self._trade(code)
+        return code
+
+    def close(self, db: Session):
+        try:
+            for code in self.run.codes if self.run is not None else []:
+                if code in self.traded:
+                    continue
+                try:
+                    self._trade(code)
+                except Exception as e:
+                    logger.error(f"[pipeline] {self.name}: {code} failed: {e}", exc_info=True)
+        finally:
+            self.service.finish_run(self.run)
+        logger.info("Auto-trade processing completed")
+        events.publish_dry_run_fills(db, self.last_log_id)
+
+
+def price_stages() -> list[Stage]:
+    return [FetchStage(), IndicatorStage(), SignalStage()]
+
+
+def after_fetch_stages() -> list[Stage]:
+    return [AlertStage(), AutoTradeStage()]
+
+
+def run(db: Session, stages: list[Stage]) -> list[StageStats]:
+    """全銘柄を stages に流し、段ごとの所要時間をログとメトリクスに記録する"""
+    codes = [code for (code,) in db.query(Stock.code).order_by(Stock.id).all()]
+    stats = Pipeline(stages, database.SessionLocal).run(codes)
+    for s in stats:
+        metrics.UPDATE_STAGE_SECONDS.observe(s.busy_seconds, stage=s.name)
+        logger.info(
+            f"[pipeline] {s.name}: {s.items} items ({s.errors} errors), busy {s.busy_seconds:.2f}s "
+            f"x{s.concurrency}, first at {s.first_output or 0:.2f}s, done at {s.finished or 0:.2f}s"
+        )
+    return stats
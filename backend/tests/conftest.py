@@ -1,5 +1,7 @@
 """テスト共通フィクスチャ — SQLiteインメモリDB（接続共有）を使用"""
 import os
+from contextlib import contextmanager
+
 import pytest
 
 # テスト用環境変数（config.py読み込み前にセット）
@@ -13,11 +15,13 @@ from sqlalchemy.pool import StaticPool  # noqa: E402
 from fastapi import FastAPI  # noqa: E402
 from fastapi.testclient import TestClient  # noqa: E402
 from src.models import database as db_module  # noqa: E402
-from src.models.database import Base, get_db  # noqa: E402
+from src.models.database import Base, get_async_db, get_db  # noqa: E402
+from src.services import config_cache, query_stats  # noqa: E402
+from src.services.stock_service import invalidate_stock_names  # noqa: E402
 from src.routers import (  # noqa: E402
     stocks_router, settings_router, transactions_router,
     alerts_router, risk_router, backtests_router, brokerage_router,
-    auto_trade_router,
+    auto_trade_router, events_router, update_router, metrics_router,
 )
 
 # テスト用engine — StaticPool で単一接続を全セッションで共有
@@ -44,6 +48,9 @@ def _create_test_app() -> FastAPI:
     test_app.include_router(backtests_router)
     test_app.include_router(brokerage_router)
     test_app.include_router(auto_trade_router)
+    test_app.include_router(events_router)
+    test_app.include_router(update_router)
+    test_app.include_router(metrics_router)
 
     @test_app.get('/api/health')
     def health_check():
@@ -55,6 +62,14 @@ def _create_test_app() -> FastAPI:
 test_app = _create_test_app()
 
 
+@pytest.fixture(autouse=True)
+def _reset_process_caches():
+    """プロセス内キャッシュ（銘柄名・設定）はテストごとのDBと対応しないため毎回破棄"""
+    invalidate_stock_names()
+    config_cache.clear()
+    yield
+
+
 @pytest.fixture()
 def db():
     """各テストごとにクリーンなDBセッションを提供"""
@@ -77,6 +92,25 @@ def client(db):
             pass
 
     test_app.dependency_overrides[get_db] = _override_get_db
+    # async ルートも同じ同期セッションで実行（BrokerageService は両方を受け付ける）
+    test_app.dependency_overrides[get_async_db] = _override_get_db
     with TestClient(test_app) as c:
         yield c
     test_app.dependency_overrides.clear()
+
+
+@pytest.fixture()
+def query_budget(db):
+    """SQL 件数の上限を確認する: with query_budget(5): client.get(...)
+
+    上限超過と、同じ文が N_PLUS_ONE_THRESHOLD 回以上繰り返される（N+1）場合に失敗し、
+    実行された文の一覧をメッセージに出す。
+    """
+    @contextmanager
+    def _budget(max_queries: int):
+        with query_stats.capture(_test_engine, 'query_budget') as stats:
+            yield stats
+        assert stats.count <= max_queries, f'query budget {max_queries} exceeded\n{stats.report()}'
+        assert not stats.repeated(), f'N+1 suspected\n{stats.report()}'
+
+    return _budget
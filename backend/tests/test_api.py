@@ -1,5 +1,5 @@
 """API エンドポイント統合テスト"""
-from src.models.stock import Stock, StockPrice, Signal, Transaction, RiskRule
+from src.models.stock import Stock, StockPrice, Signal, Transaction, RiskRule, AutoTradeLog
 from datetime import datetime
 
 
@@ -54,6 +54,96 @@ class TestStocksAPI:
         assert res.status_code == 200
 
 
+class TestConditionalGet:
+    """ETag / If-None-Match"""
+
+    def _seed(self, db, code='7203', close=3000, days_ago=1):
+        from datetime import timedelta
+        from src.services.stock_service import StockService
+
+        if not db.query(Stock).filter(Stock.code == code).first():
+            db.add(Stock(code=code, name=f'銘柄{code}'))
+        db.add(StockPrice(code=code, date=datetime.now().date() - timedelta(days=days_ago),
+                          open=close, high=close, low=close, close=close, volume=1000))
+        db.commit()
+        StockService(db).refresh_latest([code])
+
+    def test_not_modified_until_data_changes(self, client, db):
+        self._seed(db)
+        first = client.get('/api/stocks')
+        etag = first.headers['etag']
+        assert first.status_code == 200 and first.json()
+
+        again = client.get('/api/stocks', headers={'If-None-Match': etag})
+        assert again.status_code == 304
+        assert again.content == b''
+
+        self._seed(db, code='6758')
+        changed = client.get('/api/stocks', headers={'If-None-Match': etag})
+        assert changed.status_code == 200
+        assert changed.headers['etag'] != etag
+
+    def test_per_code_etag(self, client, db):
+        self._seed(db, '7203')
+        self._seed(db, '6758')
+        etag = client.get('/api/stocks/7203').headers['etag']
+
+        self._seed(db, '6758', close=3100, days_ago=0)  # 他銘柄の更新は影響しない
+        assert client.get('/api/stocks/7203', headers={'If-None-Match': etag}).status_code == 304
+
+        client.put('/api/settings', json={  # 表示設定の変更で無効化
+            'rsiBuyThreshold': 33, 'rsiSellThreshold': 65,
+            'smaShortPeriod': 5, 'smaMidPeriod': 25, 'smaLongPeriod': 75,
+        })
+        assert client.get('/api/stocks/7203', headers={'If-None-Match': etag}).status_code == 200
+
+
+class TestDashboard:
+    """一覧・詳細の一括取得"""
+
+    def _seed(self, db, codes):
+        from datetime import timedelta
+        from src.services.stock_service import StockService
+
+        for code in codes:
+            db.add(Stock(code=code, name=f'銘柄{code}'))
+            for i in range(3):
+                db.add(StockPrice(code=code, date=datetime.now().date() - timedelta(days=3 - i),
+                                  open=3000, high=3030, low=2970, close=3000 + i, volume=1000))
+        db.commit()
+        StockService(db).refresh_latest(codes)
+
+    def test_matches_individual_endpoints(self, client, db):
+        self._seed(db, ['7203', '6758', '9984'])
+        res = client.get('/api/dashboard', params={'codes': '7203,6758,0000'})
+        assert res.status_code == 200
+        data = res.json()
+
+        assert [s['code'] for s in data['stocks']] == [s['code'] for s in client.get('/api/stocks').json()]
+        assert set(data['details']) == {'7203', '6758'}  # 株価のない銘柄は詳細なし
+        assert data['details']['7203'] == client.get('/api/stocks/7203').json()
+        assert data['charts']['6758'] == client.get('/api/stocks/6758/chart').json()
+        assert data['charts']['0000'] == []
+        assert data['checklists']['7203'] == client.get('/api/risk/checklist/7203').json()
+        assert data['suggestions']['6758'] == client.get('/api/risk/suggest-prices/6758').json()
+        assert data['checklists']['0000']['name'] == '銘柄0000'
+
+    def test_bulk_queries(self, client, db, query_budget):
+        codes = [f'{1000 + i}' for i in range(20)]
+        self._seed(db, codes)
+        # 銘柄数によらず一定（ETag / 設定 / 一覧 / 銘柄+最新 / 株価）
+        with query_budget(10):
+            res = client.get('/api/dashboard', params={'codes': ','.join(codes)})
+        assert res.status_code == 200
+        assert len(res.json()['charts']) == 20
+
+    def test_sections_and_validation(self, client, db):
+        self._seed(db, ['7203'])
+        data = client.get('/api/dashboard', params={'codes': '7203', 'sections': 'detail'}).json()
+        assert {k for k, v in data.items() if v is not None} == {'details'}
+        assert client.get('/api/dashboard', params={'sections': 'foo'}).status_code == 400
+
+
 class TestSettingsAPI:
 
     def test_get_settings(self, client):
@@ -100,6 +190,40 @@ class TestTransactionsAPI:
         res = client.get('/api/transactions/portfolio')
         assert res.status_code == 200
 
+    def test_cursor_pagination(self, client, db):
+        """同時刻の行を含めて重複・欠落なく全件を辿れる"""
+        same = datetime(2025, 1, 6, 9, 0)
+        for i in range(5):
+            db.add(Transaction(code='7203', transaction_type='buy', quantity=100, price=3000 + i,
+                               transaction_date=same))
+        for i in range(2):  # server_default（CURRENT_TIMESTAMP）で書式の異なる時刻
+            db.add(Transaction(code='6758', transaction_type='buy', quantity=100, price=2000 + i))
+        db.commit()
+
+        seen, cursor = [], None
+        while True:
+            res = client.get('/api/transactions', params={'limit': 3, **({'cursor': cursor} if cursor else {})})
+            assert res.status_code == 200
+            seen += [t['id'] for t in res.json()]
+            cursor = res.headers.get('X-Next-Cursor')
+            if not cursor:
+                break
+        assert len(seen) == 7 and len(set(seen)) == 7
+        assert seen[:2] == [7, 6]  # 新しい順、同時刻は id 降順
+        assert seen[2:] == [5, 4, 3, 2, 1]
+
+    def test_filter_by_code(self, client, db):
+        db.add(Transaction(code='7203', transaction_type='buy', quantity=100, price=3000))
+        db.add(Transaction(code='6758', transaction_type='buy', quantity=100, price=2000))
+        db.commit()
+        res = client.get('/api/transactions', params={'code': '6758'})
+        assert [t['code'] for t in res.json()] == ['6758']
+        assert 'X-Next-Cursor' not in res.headers
+
+    def test_invalid_cursor(self, client):
+        res = client.get('/api/transactions', params={'cursor': 'not-a-cursor'})
+        assert res.status_code == 400
+
 
 class TestRiskAPI:
 
@@ -167,6 +291,26 @@ class TestAutoTradeAPI:
         res = client.get('/api/auto-trade/log')
         assert res.status_code == 200
 
+    def test_get_logs_filters_and_cursor(self, client, db):
+        for i in range(4):
+            db.add(AutoTradeLog(code='7203', signal_type='buy', dry_run=i % 2 == 0,
+                                result_status='success' if i < 3 else 'skipped',
+                                created_at=datetime(2025, 1, 6, 9, i)))
+        db.add(AutoTradeLog(code='6758', signal_type='buy', dry_run=True, result_status='success',
+                            created_at=datetime(2025, 1, 6, 10, 0)))
+        db.commit()
+
+        res = client.get('/api/auto-trade/log', params={'code': '7203', 'status': 'success', 'limit': 2})
+        assert [log['createdAt'] for log in res.json()] == ['2025-01-06T09:02:00', '2025-01-06T09:01:00']
+        res = client.get('/api/auto-trade/log', params={
+            'code': '7203', 'status': 'success', 'limit': 2, 'cursor': res.headers['X-Next-Cursor'],
+        })
+        assert [log['createdAt'] for log in res.json()] == ['2025-01-06T09:00:00']
+
+        res = client.get('/api/auto-trade/log', params={'dryRun': 'true'})
+        assert {(log['code'], log['dryRun']) for log in res.json()} == {('7203', True), ('6758', True)}
+        assert len(res.json()) == 3
+
     def test_get_stocks(self, client):
         res = client.get('/api/auto-trade/stocks')
         assert res.status_code == 200
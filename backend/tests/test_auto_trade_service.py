@@ -5,6 +5,7 @@ from src.models.stock import (
     Stock, Signal, Transaction, StockPrice,
 )
 from src.services.auto_trade_service import AutoTradeService, _get_time_weight
+from src.services.position_service import PositionService
 
 
 class TestConfig:
@@ -94,22 +95,22 @@ class TestHoldingQuantity:
         assert service._get_holding_quantity('7203') == 0
 
     def test_buy_only(self, db):
-        db.add(Transaction(code='7203', transaction_type='buy', quantity=10, price=3000))
+        PositionService(db).add_transaction(Transaction(code='7203', transaction_type='buy', quantity=10, price=3000))
         db.commit()
         service = AutoTradeService(db)
         assert service._get_holding_quantity('7203') == 10
 
     def test_buy_and_sell(self, db):
-        db.add(Transaction(code='7203', transaction_type='buy', quantity=10, price=3000))
-        db.add(Transaction(code='7203', transaction_type='sell', quantity=3, price=3100))
+        PositionService(db).add_transaction(Transaction(code='7203', transaction_type='buy', quantity=10, price=3000))
+        PositionService(db).add_transaction(Transaction(code='7203', transaction_type='sell', quantity=3, price=3100))
         db.commit()
         service = AutoTradeService(db)
         assert service._get_holding_quantity('7203') == 7
 
     def test_sell_more_than_buy(self, db):
         """売り超過でも0を返す"""
-        db.add(Transaction(code='7203', transaction_type='buy', quantity=5, price=3000))
-        db.add(Transaction(code='7203', transaction_type='sell', quantity=10, price=3100))
+        PositionService(db).add_transaction(Transaction(code='7203', transaction_type='buy', quantity=5, price=3000))
+        PositionService(db).add_transaction(Transaction(code='7203', transaction_type='sell', quantity=10, price=3100))
         db.commit()
         service = AutoTradeService(db)
         assert service._get_holding_quantity('7203') == 0
@@ -123,12 +124,86 @@ class TestEntryPrice:
         assert service._get_entry_price('7203') is None
 
     def test_single_buy(self, db):
-        db.add(Transaction(code='7203', transaction_type='buy', quantity=10, price=3000))
+        PositionService(db).add_transaction(Transaction(code='7203', transaction_type='buy', quantity=10, price=3000))
         db.commit()
         service = AutoTradeService(db)
         assert service._get_entry_price('7203') == 3000.0
 
 
+class TestRunUnitOfWork:
+    """1回の実行 = 1作業単位"""
+
+    def test_logs_written_in_one_commit(self, db):
+        from sqlalchemy import event
+
+        codes = [f'{1000 + i}' for i in range(10)]
+        for code in codes:
+            db.add(Stock(code=code, name=f'銘柄{code}'))
+            db.add(AutoTradeStock(code=code, enabled=True))
+        db.commit()
+
+        commits = []
+
+        def _count(session):
+            commits.append(1)
+
+        event.listen(db, 'after_commit', _count)
+        try:
+            AutoTradeService(db).process_auto_trades()
+        finally:
+            event.remove(db, 'after_commit', _count)
+
+        # ロック掃除 + ロック取得 + 終了時の一括書き込み
+        assert len(commits) == 3
+        logs = db.query(AutoTradeLog).all()
+        assert sorted(log.code for log in logs) == codes
+        assert all(log.result_message == 'シグナルデータなし' for log in logs)
+
+    def test_dry_run_fill_visible_within_run(self, db):
+        """ドライラン約定は commit 前でも同じ実行内の保有数量に反映される"""
+        service = AutoTradeService(db)
+        service._log_buffer = []
+        service._add_log(code='7203', signal_type='hold', result_status='skipped')
+        service._add_log(code='7203', signal_type='buy', quantity=100, order_price=1000.0,
+                         dry_run=True, result_status='success')
+        assert service._get_dry_run_holding_quantity('7203') == 100
+        assert len(service._log_buffer) == 1
+
+        service._checkpoint()
+        assert db.query(AutoTradeLog).count() == 2
+
+    def test_buffered_log_keeps_decision_time(self, db):
+        service = AutoTradeService(db)
+        service._log_buffer = []
+        before = datetime.now()
+        log = service._add_log(code='7203', signal_type='hold', result_status='skipped')
+        assert log.created_at is not None and log.created_at >= before
+
+        service._checkpoint()
+        db.refresh(log)
+        assert log.created_at >= before
+
+    def test_order_and_log_commit_together(self, db):
+        """実注文の取引と実行ログは同じ commit（取引数の集計が取引とずれない）"""
+        service = AutoTradeService(db)
+        service._log_buffer = []
+        log = service._record_order(
+            Transaction(code='7203', transaction_type='buy', quantity=100, price=3000),
+            code='7203', signal_type='buy', quantity=100, order_price=3000.0, result_status='success',
+        )
+        db.rollback()
+
+        transaction = db.query(Transaction).one()
+        assert db.query(AutoTradeLog).one().transaction_id == transaction.id == log.transaction_id
+        assert service._get_today_trade_count(dry_run=False) == 1
+
+    def test_add_log_outside_run_commits(self, db):
+        service = AutoTradeService(db)
+        service._add_log(code='SYSTEM', signal_type='hold', result_status='skipped')
+        db.rollback()
+        assert db.query(AutoTradeLog).count() == 1
+
+
 class TestTimeWeight:
     """時間帯重みのテスト"""
 
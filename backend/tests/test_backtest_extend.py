@@ -0,0 +1,79 @@
+"""バックテスト延長（増分実行）のテスト"""
+import json
+import math
+from datetime import date, timedelta
+
+import numpy as np
+
+from src.models.equity_curve import EquityCurve
+from src.models.stock import StockPrice, Backtest, BacktestCurve, BacktestTrade
+from src.services.backtest_service import BacktestService
+
+
+def _add_prices(db, code='7203', n=20, phase=0.0):
+    """上昇トレンドに約30日周期の波を重ねた株価（指標が温まり売買シグナルが出る）"""
+    start = date(2025, 1, 6)
+    for i in range(n):
+        close = 1000 + i * 2 + 150 * math.sin(2 * math.pi * i / 30 + phase)
+        db.add(StockPrice(code=code, date=start + timedelta(days=i), open=close - 5,
+                          high=close + 10, low=close - 10, close=close, volume=100000 + (i % 7) * 20000))
+    db.commit()
+
+
+class TestExtendBacktest:
+
+    def test_extend_matches_full_run(self, db):
+        _add_prices(db, n=160)
+        _add_prices(db, code='6758', n=160, phase=1.5)
+        service = BacktestService(db)
+        full = service.create_backtest('full', '2025-01-01', '2025-06-14', 1000000, ['7203', '6758'])
+        part = service.create_backtest('part', '2025-01-01', '2025-03-31', 1000000, ['7203', '6758'])
+        assert full['status'] == part['status'] == 'completed'
+
+        # 分割点の前後どちらでも売買が発生している
+        split = date(2025, 3, 31)
+        full_trades = service.get_trades(full['id'])
+        assert any(date.fromisoformat(t['tradeDate']) <= split for t in full_trades)
+        assert any(date.fromisoformat(t['tradeDate']) > split for t in full_trades)
+
+        extended = service.extend_backtest(part['id'], '2025-06-14')
+        assert extended['endDate'] == '2025-06-14'
+        assert service.get_snapshots(part['id']) == service.get_snapshots(full['id'])
+        assert extended['resultSummary'] == full['resultSummary']
+        assert [(t['code'], t['tradeType'], t['quantity'], t['price'], t['tradeDate'])
+                for t in service.get_trades(part['id'])] == \
+            [(t['code'], t['tradeType'], t['quantity'], t['price'], t['tradeDate']) for t in full_trades]
+        assert db.query(BacktestCurve).count() == 2
+
+        # ベンチマークは資産推移のブロブに、取引累計は end_state に保持する
+        curves = {row.backtest_id: EquityCurve(row.data) for row in db.query(BacktestCurve).all()}
+        np.testing.assert_allclose(curves[part['id']].benchmark, curves[full['id']].benchmark)
+        state = json.loads(db.get(Backtest, part['id']).end_state)
+        assert state['lastDate'] == '2025-06-14'
+        assert 'benchmark' not in state
+        assert state['trades']['trades'] == len(full_trades) == extended['resultSummary']['totalTrades']
+
+    def test_extend_does_not_reread_trades(self, db):
+        _add_prices(db, n=20)
+        service = BacktestService(db)
+        bt = service.create_backtest('t', '2025-01-01', '2025-01-15', 1000000, ['7203'])
+        db.add(BacktestTrade(backtest_id=bt['id'], code='7203', trade_type='buy', quantity=100,
+                             price=1000, trade_date=date(2025, 1, 10)))
+        db.commit()
+
+        extended = service.extend_backtest(bt['id'], '2025-01-25')
+        # end_state の累計を使うため、後から足された取引行は集計に入らない
+        assert extended['resultSummary']['totalTrades'] == bt['resultSummary']['totalTrades']
+
+    def test_extend_validation(self, db, client):
+        _add_prices(db)
+        service = BacktestService(db)
+        bt = service.create_backtest('t', '2025-01-01', '2025-01-15', 1000000, ['7203'])
+
+        res = client.post(f"/api/backtests/{bt['id']}/extend", json={'endDate': '2025-01-10'})
+        assert res.status_code == 400
+        res = client.post('/api/backtests/9999/extend', json={'endDate': '2025-02-01'})
+        assert res.status_code == 404
+        res = client.post(f"/api/backtests/{bt['id']}/extend", json={'endDate': '2025-02-01'})
+        assert res.status_code == 200
+        assert res.json()['endDate'] == '2025-02-01'
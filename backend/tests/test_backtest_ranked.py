@@ -0,0 +1,89 @@
+"""スコア順位方式バックテストのテスト"""
+from datetime import date, timedelta
+
+import numpy as np
+
+from src.models.stock import RiskRule
+from src.services.backtest_service import BacktestService
+from src.services.stock_service import StockService
+
+
+def _dates(n):
+    start = date(2025, 1, 6)
+    return [start + timedelta(days=i) for i in range(n)]
+
+
+def _panel(close, signal, score, stop_loss=None):
+    close = np.asarray(close, dtype=float)
+    return {
+        'close': close,
+        'has_bar': np.ones_like(close, dtype=bool),
+        'signal': np.asarray(signal, dtype=np.int8),
+        'score': np.asarray(score, dtype=float),
+        'stop_loss': np.full_like(close, np.nan) if stop_loss is None else np.asarray(stop_loss, dtype=float),
+    }
+
+
+def _run(db, monkeypatch, panel, params, capital=1000000, positions=None):
+    n_codes, n_days = panel['close'].shape
+    stock_data = {f'{1000 + i}': None for i in range(n_codes)}
+    service = BacktestService(db)
+    monkeypatch.setattr(service, '_build_signal_panel', lambda *a, **k: panel)
+    trades, equity, cash_curve, _ = service._simulate_ranked(
+        list(stock_data), stock_data, _dates(n_days), {}, {},
+        StockService(db), {}, params, float(capital), {} if positions is None else positions,
+    )
+    return trades, equity, cash_curve
+
+
+class TestRankedBacktest:
+
+    def test_picks_top_scores_up_to_slots(self, db, monkeypatch):
+        close = [[100, 100]] * 4
+        signal = [[1, 0]] * 4
+        score = [[10, 0], [50, 0], [30, 0], [40, 0]]
+        trades, equity, cash = _run(db, monkeypatch, _panel(close, signal, score), {'maxPositions': 2})
+        bought = [t['code'] for t in trades if t['trade_type'] == 'buy']
+        assert bought == ['1001', '1003']
+        assert equity.size == 2
+
+    def test_sell_frees_slot(self, db, monkeypatch):
+        close = [[100, 110, 110], [100, 100, 100]]
+        signal = [[1, -1, 0], [1, 1, 1]]
+        score = [[90, 0, 0], [10, 10, 10]]
+        trades, equity, _ = _run(db, monkeypatch, _panel(close, signal, score), {'maxPositions': 1})
+        assert [(t['code'], t['trade_type']) for t in trades] == [
+            ('1000', 'buy'), ('1000', 'sell'), ('1001', 'buy'),
+        ]
+        assert trades[1]['pnl'] > 0
+        assert equity[-1] > 1000000
+
+    def test_position_percent_caps_allocation(self, db, monkeypatch):
+        db.add(RiskRule(key='maxPositionPercent', value='10'))
+        db.commit()
+        trades, _, cash = _run(db, monkeypatch, _panel([[100]], [[1]], [[50]]), {'maxPositions': 1})
+        assert trades[0]['quantity'] * trades[0]['price'] <= 100000
+        assert cash[0] >= 900000
+
+    def test_loss_per_trade_filters_candidates(self, db, monkeypatch):
+        """損切りまでの距離が maxLossPerTrade を超える候補は買わない"""
+        panel = _panel([[100], [100]], [[1], [1]], [[90], [10]], stop_loss=[[80], [97]])
+        trades, _, _ = _run(db, monkeypatch, panel, {'maxPositions': 2})
+        assert [t['code'] for t in trades] == ['1001']
+
+    def test_default_slots_from_risk_rules(self, db, monkeypatch):
+        n = 10
+        panel = _panel([[100]] * n, [[1]] * n, [[float(i + 1)] for i in range(n)])
+        trades, _, _ = _run(db, monkeypatch, panel, {})
+        assert len(trades) == 8  # maxOpenPositions のデフォルト
+
+    def test_resumes_from_positions(self, db, monkeypatch):
+        """延長実行: 既存保有は枠を消費し、売りシグナルで決済される"""
+        positions = {'1000': {'quantity': 100, 'avg_price': 90.0}}
+        panel = _panel([[100], [100]], [[-1], [1]], [[0], [10]])
+        trades, equity, _ = _run(db, monkeypatch, panel, {'maxPositions': 1},
+                                 capital=0, positions=positions)
+        assert trades[0] == {'code': '1000', 'trade_type': 'sell', 'quantity': 100,
+                             'price': 100.0, 'trade_date': date(2025, 1, 6), 'pnl': 1000.0}
+        assert trades[1]['code'] == '1001'
+        assert positions == {'1001': {'quantity': 50, 'avg_price': 100.0}}  # maxPositionPercent 50%
@@ -0,0 +1,86 @@
+"""BrokerageService の AsyncSession 経由のDB処理テスト（kabu STATION 未起動を前提）"""
+import pytest
+import pytest_asyncio
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from src.models.database import Base
+from src.models.stock import BrokerageConfig, BrokerageHealth, BrokerageOrder
+from src.services.brokerage_service import BrokerageService
+
+
+@pytest.fixture()
+def db_path(tmp_path):
+    """ファイルDBを作成し、到達不能な接続先を設定"""
+    path = tmp_path / 'broker.db'
+    engine = create_engine(f'sqlite:///{path}')
+    Base.metadata.create_all(bind=engine)
+    with sessionmaker(bind=engine)() as session:
+        session.add_all([
+            BrokerageConfig(key='host', value='127.0.0.1'),
+            BrokerageConfig(key='port', value='1'),
+        ])
+        session.commit()
+    engine.dispose()
+    return path
+
+
+@pytest_asyncio.fixture()
+async def async_db(db_path):
+    engine = create_async_engine(f'sqlite+aiosqlite:///{db_path}')
+    async with async_sessionmaker(engine, expire_on_commit=False)() as session:
+        yield session
+    await engine.dispose()
+
+
+def _read(db_path, model):
+    engine = create_engine(f'sqlite:///{db_path}')
+    with sessionmaker(bind=engine)() as session:
+        rows = session.query(model).all()
+        for row in rows:
+            session.expunge(row)
+    engine.dispose()
+    return rows
+
+
+@pytest.mark.asyncio
+async def test_connect_failure_recorded(async_db, db_path):
+    result = await BrokerageService(async_db).connect()
+    assert result['connected'] is False
+
+    health = _read(db_path, BrokerageHealth)
+    assert len(health) == 1
+    assert health[0].status == 'disconnected'
+    assert health[0].consecutive_failures == 1
+
+
+@pytest.mark.asyncio
+async def test_create_order_failure_marks_failed(async_db, db_path):
+    with pytest.raises(Exception):
+        await BrokerageService(async_db).create_order('7203', 'market', 'buy', 100)
+
+    orders = _read(db_path, BrokerageOrder)
+    assert [(o.code, o.status) for o in orders] == [('7203', 'failed')]
+
+
+@pytest.mark.asyncio
+async def test_cancel_unknown_order(async_db):
+    assert await BrokerageService(async_db).cancel_order(999) is False
+
+
+@pytest.mark.asyncio
+async def test_sync_orders_without_pending_skips_broker(async_db):
+    result = await BrokerageService(async_db).sync_orders()
+    assert result['updated'] == 0
+
+
+def test_sync_session_still_supported(db):
+    """スケジューラ/自動売買スレッドからの同期Session利用"""
+    import asyncio
+
+    db.add_all([BrokerageConfig(key='host', value='127.0.0.1'), BrokerageConfig(key='port', value='1')])
+    db.commit()
+    result = asyncio.run(BrokerageService(db).connect())
+    assert result['connected'] is False
+    assert BrokerageService(db).get_health()['consecutiveFailures'] == 1
@@ -0,0 +1,51 @@
+"""設定キャッシュ（config_cache）のテスト"""
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from src.services import query_stats
+from src.services.risk_service import RiskService
+from src.services.stock_service import StockService
+
+
+def test_loaded_once_per_session(db):
+    service = RiskService(db)
+    with query_stats.capture(db.get_bind()) as first:
+        service.get_risk_rules()
+    with query_stats.capture(db.get_bind()) as repeated:
+        rules = [service.get_risk_rules() for _ in range(50)]
+    assert first.count == 2  # バージョン確認 + 読み込み
+    assert repeated.count == 0
+    assert rules[0]['maxOpenPositions'] == 8
+
+
+def test_new_session_reuses_cache_after_version_check(db):
+    RiskService(db).get_risk_rules()
+    with Session(bind=db.get_bind()) as other, query_stats.capture(db.get_bind()) as stats:
+        RiskService(other).get_risk_rules()
+    assert stats.count == 1
+
+
+def test_update_invalidates(db):
+    service = StockService(db)
+    assert service.get_settings()['rsiBuyThreshold'] != 45
+    assert service.update_settings({'rsiBuyThreshold': 45})['rsiBuyThreshold'] == 45
+    assert service.get_settings()['rsiBuyThreshold'] == 45
+
+
+def test_update_from_other_worker_seen_by_next_session(db):
+    assert RiskService(db).get_risk_rules()['maxOpenPositions'] == 8
+
+    # 別ワーカーの更新（このプロセスのキャッシュには触れない）
+    db.execute(text("INSERT INTO risk_rules (key, value) VALUES ('maxOpenPositions', '3')"))
+    db.execute(text("INSERT INTO config_versions (section, version) VALUES ('risk_rules', 1)"))
+    db.commit()
+
+    # 同じ Session 内は確認済みバージョンのまま
+    assert RiskService(db).get_risk_rules()['maxOpenPositions'] == 8
+    with Session(bind=db.get_bind()) as other:
+        assert RiskService(other).get_risk_rules()['maxOpenPositions'] == 3
+
+
+def test_returned_dict_is_a_copy(db):
+    rules = RiskService(db).get_risk_rules()
+    rules['maxOpenPositions'] = 99
+    assert RiskService(db).get_risk_rules()['maxOpenPositions'] == 8
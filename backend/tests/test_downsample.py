@@ -0,0 +1,64 @@
+"""LTTBダウンサンプリングと比較用資産推移のテスト"""
+from datetime import date, timedelta
+
+import numpy as np
+
+from src.models.equity_curve import encode_curve
+from src.models.stock import Backtest, BacktestCurve
+from src.services.downsample import lttb_indices
+
+
+class TestLTTB:
+
+    def test_short_series_unchanged(self):
+        idx = lttb_indices(np.arange(5), np.arange(5), 10)
+        assert list(idx) == [0, 1, 2, 3, 4]
+
+    def test_keeps_endpoints_and_budget(self):
+        x = np.arange(1000)
+        y = np.sin(x / 50)
+        idx = lttb_indices(x, y, 100)
+        assert len(idx) == 100
+        assert idx[0] == 0 and idx[-1] == 999
+        assert np.all(np.diff(idx) > 0)
+
+    def test_preserves_spike(self):
+        """単発のスパイクは間引かれない"""
+        y = np.zeros(500)
+        y[250] = 100.0
+        idx = lttb_indices(np.arange(500), y, 20)
+        assert 250 in idx
+
+
+class TestCompareCurvesAPI:
+
+    def _add_backtest(self, db, name, capital, start, n):
+        bt = Backtest(name=name, start_date=start, end_date=start + timedelta(days=n),
+                      initial_capital=capital, status='completed')
+        db.add(bt)
+        db.commit()
+        dates = [start + timedelta(days=i) for i in range(n)]
+        values = [capital * (1 + i / 1000) for i in range(n)]
+        db.add(BacktestCurve(backtest_id=bt.id, num_points=n,
+                             data=encode_curve(dates, values, [capital] * n)))
+        db.commit()
+        return bt.id
+
+    def test_aligned_normalized_downsampled(self, client, db):
+        a = self._add_backtest(db, 'a', 1000000, date(2024, 1, 1), 400)
+        b = self._add_backtest(db, 'b', 500000, date(2024, 3, 1), 200)
+        res = client.post('/api/backtests/compare/curves', json={'ids': [a, b], 'points': 50})
+        assert res.status_code == 200
+        data = res.json()
+        assert data['startDate'] == '2024-01-01'
+        series = {s['name']: s for s in data['series']}
+        assert len(series['a']['values']) == 50
+        assert series['a']['values'][0] == 1.0
+        # 開始前の日付は含まない
+        assert series['b']['dates'][0] == '2024-03-01'
+        assert series['b']['values'][0] == 1.0
+        assert series['b']['dates'][-1] == data['endDate']
+
+    def test_requires_two_ids(self, client):
+        res = client.post('/api/backtests/compare/curves', json={'ids': [1]})
+        assert res.status_code == 422
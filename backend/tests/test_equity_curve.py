@@ -0,0 +1,92 @@
+"""資産推移バイナリ形式のテスト"""
+from datetime import date, timedelta
+
+import struct
+import zlib
+
+import numpy as np
+import pytest
+
+from src.models.equity_curve import EquityCurve, append_curve, encode_curve
+from src.models.stock import Backtest, BacktestSnapshot
+from src.services.backtest_service import BacktestService
+
+
+class TestCodec:
+
+    def test_roundtrip(self):
+        dates = [date(2025, 1, 6) + timedelta(days=i) for i in range(0, 30, 3)]
+        values = [1000000 + i * 123.45 for i in range(len(dates))]
+        cash = [500000.0 - i for i in range(len(dates))]
+        curve = EquityCurve(encode_curve(dates, values, cash))
+        assert len(curve) == len(dates)
+        assert curve.dates == dates
+        assert list(curve.portfolio_values) == values
+        assert list(curve.cash) == cash
+
+    def test_empty(self):
+        curve = EquityCurve(encode_curve([], [], []))
+        assert len(curve) == 0
+        assert curve.to_snapshots() == []
+
+    def test_length_mismatch_raises(self):
+        with pytest.raises(ValueError):
+            encode_curve([date(2025, 1, 1)], [1.0, 2.0], [1.0])
+
+    def test_invalid_blob_raises(self):
+        with pytest.raises(ValueError):
+            EquityCurve(b'XXXX\x01\x00\x00\x00\x00')
+
+    def test_compact(self):
+        """日次行より十分小さい"""
+        dates = [date(2020, 1, 1) + timedelta(days=i) for i in range(1000)]
+        blob = encode_curve(dates, [1000000.0] * 1000, [1000000.0] * 1000)
+        assert len(blob) < 1000
+
+
+    def test_append_keeps_existing_segment(self):
+        dates = [date(2025, 1, 6) + timedelta(days=i) for i in range(10)]
+        head = encode_curve(dates[:6], [1.0] * 6, [2.0] * 6, [1.0 + i for i in range(6)])
+        blob = append_curve(head, dates[6:], [3.0] * 4, [4.0] * 4, [7.0, 8.0, 9.0, 10.0])
+        assert blob[9:len(head)] == head[9:]  # 既存セグメントは再圧縮しない
+
+        curve = EquityCurve(blob)
+        assert len(curve) == 10
+        assert curve.dates == dates
+        assert list(curve.portfolio_values) == [1.0] * 6 + [3.0] * 4
+        assert list(curve.benchmark) == [1.0 + i for i in range(10)]
+
+    def test_reads_v1_blob(self):
+        """ベンチマーク列のない旧形式も読める（追記時に新形式へ変換）"""
+        dates = [date(2025, 1, 6), date(2025, 1, 7)]
+        body = b''.join((
+            np.array([dates[0].toordinal(), 1], dtype='<i4').tobytes(),
+            np.array([1.0, 2.0], dtype='<f8').tobytes(),
+            np.array([3.0, 4.0], dtype='<f8').tobytes(),
+        ))
+        v1 = struct.pack('<4sBI', b'EQCV', 1, 2) + zlib.compress(body)
+        curve = EquityCurve(v1)
+        assert curve.dates == dates and list(curve.cash) == [3.0, 4.0]
+        assert np.isnan(curve.benchmark).all()
+
+        extended = EquityCurve(append_curve(v1, [date(2025, 1, 8)], [5.0], [6.0], [1.0]))
+        assert list(extended.portfolio_values) == [1.0, 2.0, 5.0]
+        assert extended.benchmark[-1] == 1.0
+
+
+class TestSnapshotsCompat:
+
+    def test_legacy_snapshot_rows(self, client, db):
+        """旧形式（日次行）のバックテストも同じレスポンスで返る"""
+        bt = Backtest(name='legacy', start_date=date(2025, 1, 1), end_date=date(2025, 1, 31),
+                      initial_capital=1000000, status='completed')
+        db.add(bt)
+        db.commit()
+        for i in range(3):
+            db.add(BacktestSnapshot(backtest_id=bt.id, date=date(2025, 1, 6 + i),
+                                    portfolio_value=1000000 + i, cash=1000000))
+        db.commit()
+        res = client.get(f'/api/backtests/{bt.id}/snapshots')
+        assert res.status_code == 200
+        assert res.json()[0] == {'date': '2025-01-06', 'portfolioValue': 1000000.0, 'cash': 1000000.0}
+        assert len(BacktestService(db).get_snapshots(bt.id)) == 3
@@ -0,0 +1,115 @@
+"""パイプライン更新イベント（SSE）配信のテスト"""
+import asyncio
+import threading
+from datetime import date
+
+import pytest
+
+from src.models.stock import StockLatest
+from src.routers.events import _stream
+from src.services import events
+from src.services.events import EventBus
+
+
+async def _drain(subscriber) -> list:
+    received = []
+    while not subscriber._queue.empty():
+        received.append(await subscriber.get())
+    return received
+
+
+@pytest.mark.asyncio
+async def test_publish_from_thread_reaches_subscriber():
+    bus = EventBus()
+    subscriber = bus.subscribe()
+    thread = threading.Thread(target=bus.publish, args=(events.PRICES, {'updated': []}))
+    thread.start()
+    thread.join()
+
+    event = await asyncio.wait_for(subscriber.get(), 1)
+    assert (event.id, event.type) == (1, events.PRICES)
+
+
+@pytest.mark.asyncio
+async def test_slow_subscriber_gets_resync_instead_of_backlog():
+    bus = EventBus(queue_size=3)
+    slow = bus.subscribe()
+    for i in range(5):
+        bus.publish(events.PRICES, {'n': i})
+    await asyncio.sleep(0)
+
+    received = await _drain(slow)
+    assert len(received) <= 3
+    assert events.RESYNC in [e.type for e in received]
+    assert received[-1].data == {'n': 4}
+
+
+@pytest.mark.asyncio
+async def test_close_reaches_subscriber_with_full_queue():
+    bus = EventBus(queue_size=2)
+    slow = bus.subscribe()
+    for i in range(2):
+        bus.publish(events.PRICES, {'n': i})
+    bus.close()
+    await asyncio.sleep(0)
+
+    # 溜まった分は捨てられ、終了通知だけが届く
+    assert await _drain(slow) == [None]
+
+
+@pytest.mark.asyncio
+async def test_last_event_id_replays_missed_events():
+    bus = EventBus(history_size=3)
+    for i in range(5):
+        bus.publish(events.ALERTS, {'n': i})
+
+    replay = await _drain(bus.subscribe(last_event_id=3))
+    assert [e.id for e in replay] == [4, 5]
+
+    # 履歴(直近3件)より古い位置からの再接続・再起動で番号が戻った場合は resync
+    assert [e.type for e in await _drain(bus.subscribe(last_event_id=1))] == [events.RESYNC]
+    assert [e.type for e in await _drain(bus.subscribe(last_event_id=99))] == [events.RESYNC]
+
+
+@pytest.mark.asyncio
+async def test_stream_encodes_frames_and_unsubscribes_on_close(monkeypatch):
+    bus = EventBus()
+    monkeypatch.setattr(events, 'bus', bus)
+    subscriber = bus.subscribe()
+    bus.publish(events.SIGNALS, {'changes': [{'code': '7203', 'signal': 'buy'}]})
+    bus.close()
+
+    frames = [frame async for frame in _stream(subscriber)]
+    assert frames[0].startswith('retry:')
+    assert frames[1] == (
+        'id: 1\nevent: signals\n'
+        'data: {"changes":[{"code":"7203","signal":"buy"}]}\n\n'
+    )
+    assert bus.subscriber_count == 0
+
+
+@pytest.mark.asyncio
+async def test_latest_changes_publish_only_deltas(db, monkeypatch):
+    bus = EventBus()
+    monkeypatch.setattr(events, 'bus', bus)
+    subscriber = bus.subscribe()
+    db.add_all([
+        StockLatest(code='7203', price_date=date(2025, 1, 6), current_price=3000, previous_close=2970,
+                    change_percent=1.0, signal_type='hold'),
+        StockLatest(code='6758', price_date=date(2025, 1, 6), current_price=2000, previous_close=1990,
+                    change_percent=0.5, signal_type='hold'),
+    ])
+    db.commit()
+    before = events.latest_snapshot(db)
+    db.query(StockLatest).filter(StockLatest.code == '7203').update(
+        {StockLatest.current_price: 3100, StockLatest.signal_type: 'buy'},
+    )
+    db.commit()
+
+    events.publish_latest_changes(before, events.latest_snapshot(db))
+    await asyncio.sleep(0)
+    received = {e.type: e.data for e in await _drain(subscriber)}
+    assert received == {
+        events.PRICES: {'updated': [{'code': '7203', 'price': 3100, 'changePercent': 1.0}]},
+        events.SIGNALS: {'changes': [{'code': '7203', 'signal': 'buy', 'previous': 'hold'}]},
+    }
@@ -0,0 +1,84 @@
+"""メトリクス（/metrics）のテスト"""
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+
+from src.services import metrics
+from src.services.brokerage_service import KabuStationClient
+
+
+def test_http_middleware_labels_route_template():
+    app = FastAPI()
+    app.add_middleware(metrics.HTTPMetricsMiddleware, skip_prefixes=('/api/events',))
+
+    @app.get('/api/items/{code}')
+    def get_item(code: str):
+        return {'code': code}
+
+    @app.get('/api/events')
+    def stream():
+        return {}
+
+    labels = {'method': 'GET', 'route': '/api/items/{code}', 'status': 200}
+    before = metrics.HTTP_REQUEST_SECONDS.get(**labels)[0]
+    client = TestClient(app)
+    client.get('/api/items/7203')
+    client.get('/api/items/6758')
+    client.get('/api/events')
+    client.get('/nowhere')
+
+    assert metrics.HTTP_REQUEST_SECONDS.get(**labels)[0] == before + 2
+    assert metrics.HTTP_REQUEST_SECONDS.get(method='GET', route='/api/events', status=200)[0] == 0
+    assert metrics.HTTP_REQUEST_SECONDS.get(method='GET', route='unmatched', status=404)[0] >= 1
+
+
+def test_sql_queries_recorded_by_kind():
+    engine = create_engine('sqlite://')
+    metrics.instrument_engine(engine)
+    metrics.instrument_engine(engine)  # 二重登録しない
+    before = metrics.DB_QUERY_SECONDS.get(statement='select')[0]
+    errors = metrics.DB_QUERY_ERRORS.get(statement='select')
+
+    with engine.connect() as conn:
+        conn.execute(text('SELECT 1'))
+        with pytest.raises(Exception):
+            conn.execute(text('SELECT * FROM missing_table'))
+
+    assert metrics.DB_QUERY_SECONDS.get(statement='select')[0] == before + 1
+    assert metrics.DB_QUERY_ERRORS.get(statement='select') == errors + 1
+
+
+@pytest.mark.asyncio
+async def test_kabu_calls_timed_per_endpoint():
+    async def _respond():
+        return httpx.Response(200)
+
+    async def _fail():
+        raise httpx.ConnectError('refused')
+
+    before = metrics.KABU_REQUEST_SECONDS.get(method='GET', endpoint='/positions', status='200')[0]
+    await KabuStationClient._timed('get', '/positions', _respond())
+    with pytest.raises(httpx.ConnectError):
+        await KabuStationClient._timed('get', '/positions', _fail())
+
+    assert metrics.KABU_REQUEST_SECONDS.get(method='GET', endpoint='/positions', status='200')[0] == before + 1
+    assert metrics.KABU_REQUEST_SECONDS.get(method='GET', endpoint='/positions', status='error')[0] >= 1
+
+
+def test_metrics_endpoint(client):
+    metrics.UPDATE_STAGE_SECONDS.observe(3.0, stage='fetch')
+    metrics.UPDATE_RUNS.inc(kind='full', status='succeeded')
+
+    res = client.get('/metrics')
+    assert res.status_code == 200
+    assert res.headers['content-type'].startswith('text/plain; version=0.0.4')
+    body = res.text
+    assert '# TYPE update_stage_duration_seconds histogram' in body
+    assert 'update_stage_duration_seconds_bucket{stage="fetch",le="5"}' in body
+    assert 'update_stage_duration_seconds_bucket{stage="fetch",le="+Inf"}' in body
+    assert 'update_runs_total{kind="full",status="succeeded"}' in body
+    # バケットは累積値
+    count = metrics.UPDATE_STAGE_SECONDS.get(stage='fetch')[0]
+    assert f'update_stage_duration_seconds_bucket{{stage="fetch",le="+Inf"}} {count}' in body
@@ -0,0 +1,100 @@
+"""バージョン管理付きマイグレーションのテスト"""
+import pytest
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.pool import StaticPool
+
+from src.models.migrations import MIGRATIONS, run_migrations
+
+
+@pytest.fixture()
+def engine():
+    eng = create_engine('sqlite://', connect_args={'check_same_thread': False}, poolclass=StaticPool)
+    yield eng
+    eng.dispose()
+
+
+def _versions(engine):
+    with engine.connect() as conn:
+        return [row[0] for row in conn.execute(text("SELECT version FROM schema_version ORDER BY version"))]
+
+
+class TestRunMigrations:
+
+    def test_fresh_database_records_all_steps(self, engine):
+        applied = run_migrations(engine)
+        assert applied == [v for v, _, _ in MIGRATIONS]
+        assert _versions(engine) == applied
+
+    def test_second_run_is_noop(self, engine):
+        run_migrations(engine)
+        assert run_migrations(engine) == []
+
+    def test_indexes_created(self, engine):
+        run_migrations(engine)
+        insp = inspect(engine)
+        price_indexes = {i['name']: i for i in insp.get_indexes('stock_prices')}
+        assert price_indexes['uq_stock_prices_code_date']['unique']
+        assert 'ix_signals_code_date_desc' in {i['name'] for i in insp.get_indexes('signals')}
+        log_indexes = {i['name'] for i in insp.get_indexes('auto_trade_log')}
+        assert {'ix_auto_trade_log_created_at_id', 'ix_auto_trade_log_code_dry_run_status'} <= log_indexes
+        assert 'ix_auto_trade_log_created_at' not in log_indexes
+
+    def test_redundant_log_index_dropped(self, engine):
+        """v14 で created_at 単独インデックスを作った既存DBからは v18 で削除する"""
+        run_migrations(engine)
+        with engine.begin() as conn:
+            conn.execute(text("CREATE INDEX ix_auto_trade_log_created_at ON auto_trade_log (created_at)"))
+            conn.execute(text("DELETE FROM schema_version WHERE version = 18"))
+
+        assert run_migrations(engine) == [18]
+        assert 'ix_auto_trade_log_created_at' not in {i['name'] for i in inspect(engine).get_indexes('auto_trade_log')}
+
+    def test_legacy_database_upgraded(self, engine):
+        """旧スキーマ（列不足・重複株価・旧デフォルト値）を1回で移行"""
+        with engine.begin() as conn:
+            conn.execute(text(
+                "CREATE TABLE signals (id INTEGER PRIMARY KEY, code VARCHAR(10) NOT NULL, "
+                "date DATE NOT NULL, signal_type VARCHAR(10) NOT NULL)"
+            ))
+            conn.execute(text(
+                "CREATE TABLE stock_prices (id INTEGER PRIMARY KEY, code VARCHAR(10) NOT NULL, "
+                "date DATE NOT NULL, open FLOAT, high FLOAT, low FLOAT, close FLOAT, volume BIGINT)"
+            ))
+            conn.execute(text(
+                "INSERT INTO stock_prices (code, date, close) VALUES "
+                "('7203', '2025-01-06', 100), ('7203', '2025-01-06', 101), ('7203', '2025-01-07', 102)"
+            ))
+            conn.execute(text("CREATE TABLE risk_rules (id INTEGER PRIMARY KEY, key VARCHAR(50), value VARCHAR(100))"))
+            conn.execute(text("INSERT INTO risk_rules (key, value) VALUES ('maxLossPerTrade', '20')"))
+
+        run_migrations(engine)
+
+        insp = inspect(engine)
+        assert 'adx' in {c['name'] for c in insp.get_columns('signals')}
+        with engine.connect() as conn:
+            closes = [r[0] for r in conn.execute(text("SELECT close FROM stock_prices ORDER BY date"))]
+            value = conn.execute(text("SELECT value FROM risk_rules WHERE key = 'maxLossPerTrade'")).scalar()
+        assert closes == [101, 102]
+        assert value == '10'
+
+    def test_user_value_not_overwritten_on_reboot(self, engine):
+        """適用済みの値更新は再起動で再実行されない"""
+        run_migrations(engine)
+        with engine.begin() as conn:
+            conn.execute(text("INSERT INTO risk_rules (key, value) VALUES ('maxOpenPositions', '5')"))
+        run_migrations(engine)
+        with engine.connect() as conn:
+            value = conn.execute(text("SELECT value FROM risk_rules WHERE key = 'maxOpenPositions'")).scalar()
+        assert value == '5'
+
+    def test_failed_step_is_retried(self, engine, monkeypatch):
+        from src.models import migrations
+
+        def boom(conn):
+            raise RuntimeError('fail')
+
+        broken = [m if m[0] != 12 else (12, m[1], boom) for m in MIGRATIONS]
+        monkeypatch.setattr(migrations, 'MIGRATIONS', broken)
+        assert run_migrations(engine) == list(range(1, 12))
+        monkeypatch.setattr(migrations, 'MIGRATIONS', MIGRATIONS)
+        assert run_migrations(engine) == [v for v, _, _ in MIGRATIONS if v >= 12]
@@ -0,0 +1,126 @@
+"""performance モジュールのユニットテスト"""
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+from src.models.stock import StockPrice, Backtest, BacktestCurve, BacktestSnapshot
+from src.services import performance
+from src.services.backtest_service import BacktestService
+
+
+class TestDrawdown:
+
+    def test_max_drawdown(self):
+        equity = [100, 120, 90, 110, 130]
+        assert performance.max_drawdown(equity) == pytest.approx(25.0)
+
+    def test_initial_capital_is_peak(self):
+        """初日から下落した場合も初期資金をピークとして扱う"""
+        assert performance.max_drawdown([90, 95], initial=100) == pytest.approx(10.0)
+
+    def test_ulcer_index_zero_for_monotonic(self):
+        assert performance.ulcer_index([100, 101, 102, 103]) == 0.0
+
+    def test_empty(self):
+        assert performance.max_drawdown([]) == 0.0
+        assert performance.ulcer_index([]) == 0.0
+
+
+class TestRatios:
+
+    def test_sharpe_flat_is_zero(self):
+        assert performance.sharpe_ratio([0.0, 0.0, 0.0]) == 0.0
+
+    def test_sortino_no_downside_is_zero(self):
+        assert performance.sortino_ratio([0.01, 0.02, 0.03]) == 0.0
+
+    def test_sortino_positive_for_uptrend(self):
+        r = np.array([0.01, -0.002, 0.012, -0.001, 0.008])
+        assert performance.sortino_ratio(r) > performance.sharpe_ratio(r) > 0
+
+    def test_calmar(self):
+        equity = [100, 110, 99, 120]
+        assert performance.calmar_ratio(equity, initial=100) > 0
+
+    def test_rolling_sharpe_length(self):
+        r = np.random.default_rng(0).normal(0, 0.01, 50)
+        assert performance.rolling_sharpe(r, window=20).size == 31
+        assert performance.rolling_sharpe(r[:5], window=20).size == 0
+
+    def test_alpha_beta_against_self(self):
+        r = np.random.default_rng(1).normal(0.001, 0.01, 100)
+        alpha, beta = performance.alpha_beta(r, r)
+        assert beta == pytest.approx(1.0)
+        assert alpha == pytest.approx(0.0, abs=1e-9)
+
+
+class TestTradeMetrics:
+
+    def test_win_rate(self):
+        assert performance.win_rate([10, -5, 3, -1]) == 50.0
+        assert performance.win_rate([]) == 0.0
+
+    def test_profit_factor(self):
+        assert performance.profit_factor([10, -5]) == pytest.approx(2.0)
+        assert performance.profit_factor([10]) == performance.PROFIT_FACTOR_CAP
+        assert performance.profit_factor([]) == 0.0
+
+    def test_exposure_and_turnover(self):
+        equity = [100, 100, 100, 100]
+        cash = [100, 50, 50, 100]
+        assert performance.exposure(equity, cash) == 50.0
+        assert performance.turnover([50, 50], equity) == pytest.approx(1.0)
+
+
+class TestComputeSummary:
+
+    def test_keys_and_values(self):
+        summary = performance.compute_summary(
+            [1000, 1100, 1050], [1000, 0, 1050], 1000,
+            trade_pnls=[50], trade_values=[1000, 1050],
+            benchmark=[1.0, 1.05, 1.02],
+        )
+        assert summary['finalValue'] == 1050
+        assert summary['totalReturnPercent'] == 5.0
+        assert summary['winRate'] == 100.0
+        for key in ('sortinoRatio', 'calmarRatio', 'ulcerIndex', 'exposure', 'turnover', 'alpha', 'beta'):
+            assert key in summary
+
+    def test_empty_equity(self):
+        summary = performance.compute_summary([], [], 1000)
+        assert summary['finalValue'] == 1000
+        assert summary['maxDrawdown'] == 0.0
+
+
+class TestBacktestIntegration:
+
+    def _add_prices(self, db, code='7203', n=10):
+        start = date(2025, 1, 6)
+        for i in range(n):
+            db.add(StockPrice(code=code, date=start + timedelta(days=i),
+                              open=1000 + i, high=1010 + i, low=990 + i, close=1000 + i, volume=100000))
+        db.commit()
+
+    def test_backtest_summary_uses_metrics(self, db):
+        self._add_prices(db)
+        service = BacktestService(db)
+        result = service.create_backtest('t', '2025-01-01', '2025-02-01', 1000000, ['7203'])
+        assert result['status'] == 'completed'
+        summary = result['resultSummary']
+        assert summary['finalValue'] == 1000000
+        assert 'sortinoRatio' in summary
+        assert 'beta' in summary
+        assert db.query(BacktestSnapshot).count() == 0
+        assert db.query(BacktestCurve).count() == 1
+        assert len(service.get_snapshots(result['id'])) == 10
+
+    def test_compare_includes_metrics(self, db):
+        self._add_prices(db)
+        service = BacktestService(db)
+        a = service.create_backtest('a', '2025-01-01', '2025-02-01', 1000000, ['7203'])
+        b = service.create_backtest('b', '2025-01-01', '2025-02-01', 500000, ['7203'])
+        results = service.compare_backtests([a['id'], b['id']])
+        assert len(results) == 2
+        assert all('metrics' in r for r in results)
+        assert db.query(Backtest).count() == 2
@@ -0,0 +1,244 @@
+"""銘柄単位ステージパイプラインのテスト"""
+import threading
+from datetime import date, datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from src.models import database as db_module
+from src.models.database import Base
+from src.models.stock import (
+    Alert, AlertHistory, AutoTradeLog, AutoTradeStock, Signal, Stock, StockLatest, StockPrice,
+)
+from src.services import update_pipeline
+from src.services.pipeline import Pipeline, Stage
+from src.services.position_service import VirtualPositionService
+from src.services.update_jobs import FULL, PRICES, UpdateJobManager
+
+
+class _Session:
+    closed = False
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+class _Recorder(Stage):
+    def __init__(self, name, log, concurrency=1, fail=(), gate=None, batch_size=1):
+        self.name = name
+        self.log = log
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.fail = set(fail)
+        self.gate = gate or {}
+        self.batches = []
+        self.closed_after: list | None = None
+
+    def process_one(self, db, code, value):
+        if code in self.gate:
+            assert self.gate[code].wait(5)
+        if code in self.fail:
+            raise RuntimeError(f'{code} failed')
+        self.log.append((self.name, code))
+        return (value or []) + [self.name]
+
+    def process_batch(self, db, batch):
+        self.batches.append([code for code, _ in batch])
+        return super().process_batch(db, batch)
+
+    def close(self, db):
+        self.closed_after = list(self.log)
+
+
+def test_items_flow_through_all_stages():
+    log = []
+    stages = [_Recorder('fetch', log, concurrency=3), _Recorder('signals', log), _Recorder('trade', log)]
+    stats = Pipeline(stages, _Session).run(['7203', '6758', '9984'])
+
+    for code in ('7203', '6758', '9984'):
+        assert [name for name, c in log if c == code] == ['fetch', 'signals', 'trade']
+    assert [(s.name, s.items, s.errors) for s in stats] == [('fetch', 3, 0), ('signals', 3, 0), ('trade', 3, 0)]
+    assert all(s.finished is not None and s.first_output is not None for s in stats)
+    assert stats[0].to_dict()['concurrency'] == 3
+
+
+def test_early_code_reaches_last_stage_before_slow_fetch():
+    log = []
+    slow = threading.Event()
+    last = _Recorder('trade', log)
+    stages = [_Recorder('fetch', log, concurrency=2, gate={'slow': slow}), last]
+
+    def _release():
+        # 早い銘柄が最終段まで進んでから遅い銘柄の取得を終わらせる
+        for _ in range(500):
+            if ('trade', 'fast') in log:
+                break
+            threading.Event().wait(0.01)
+        slow.set()
+
+    threading.Thread(target=_release, daemon=True).start()
+    Pipeline(stages, _Session).run(['slow', 'fast'])
+
+    assert log.index(('trade', 'fast')) < log.index(('fetch', 'slow'))
+    # close は段の全銘柄が終わった後に呼ばれる
+    assert ('trade', 'slow') in last.closed_after
+
+
+def test_failed_code_is_dropped_and_counted():
+    log = []
+    stages = [_Recorder('fetch', log, fail={'6758'}), _Recorder('trade', log)]
+    stats = Pipeline(stages, _Session).run(['7203', '6758'])
+
+    assert ('trade', '6758') not in log and ('trade', '7203') in log
+    assert (stats[0].items, stats[0].errors) == (2, 1)
+    assert stats[1].items == 1
+
+
+def test_batch_stage_drains_queue():
+    log = []
+    started, fetched = threading.Event(), threading.Event()
+
+    class _Fetch(_Recorder):
+        def close(self, db):
+            fetched.set()
+
+    class _Alerts(_Recorder):
+        def process_batch(self, db, batch):
+            self.batches.append([code for code, _ in batch])
+            started.set()
+            return [(code, self.process_one(db, code, value)) for code, value in batch]
+
+    # A の判定中に残りの銘柄の取得が終わるようにする
+    alerts = _Alerts('alerts', log, batch_size=50, gate={'A': fetched})
+    Pipeline([_Fetch('fetch', log, gate={'B': started}), alerts], _Session).run(['A', 'B', 'C', 'D'])
+
+    # A の処理中に溜まった残りは1回にまとめて渡される
+    assert alerts.batches == [['A'], ['B', 'C', 'D']]
+
+
+def test_close_error_is_raised_after_all_stages():
+    log = []
+
+    class _Broken(_Recorder):
+        def close(self, db):
+            raise RuntimeError('close failed')
+
+    last = _Recorder('trade', log)
+    with pytest.raises(RuntimeError, match='close failed'):
+        Pipeline([_Broken('fetch', log), last], _Session).run(['7203'])
+    assert last.closed_after == [('fetch', '7203'), ('trade', '7203')]
+
+
+def test_full_run_uses_pipeline_when_prices_are_stale():
+    calls = []
+
+    def _stage(name):
+        def run(db):
+            calls.append(name)
+        return run
+
+    manager = UpdateJobManager(fetch=_stage('fetch'), after_fetch=_stage('after'), full=_stage('full'))
+    assert manager.trigger(FULL, 'schedule').wait(5)
+    # 取得直後の全段要求は後段だけ、株価のみの要求は取得段だけを使う
+    assert manager.trigger(FULL, 'api').wait(5)
+    stale = UpdateJobManager(fetch=_stage('fetch'), after_fetch=_stage('after'), full=_stage('full'),
+                             fresh_seconds=0)
+    assert stale.trigger(PRICES, 'api').wait(5)
+    assert calls == ['full', 'after', 'fetch']
+
+
+class TestFileBackedPipeline:
+    """ファイル DB（SQLite の書き込みロックが Session 間で効く）で実際の段を流す"""
+
+    CODES = ['1001', '1002', '1003', '1004']
+
+    @pytest.fixture()
+    def sessions(self, tmp_path, monkeypatch):
+        engine = create_engine(f"sqlite:///{tmp_path / 'pipeline.db'}", connect_args={'timeout': 1})
+        Base.metadata.create_all(bind=engine)
+        factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        monkeypatch.setattr(db_module, 'SessionLocal', factory)
+        yield factory
+        engine.dispose()
+
+    def _seed(self, db):
+        """各銘柄: 仮想保有 100株 @1000（損切り対象）と、価格下落で発火するアラート"""
+        yesterday = datetime.now() - timedelta(days=1)
+        for code in self.CODES:
+            db.add(Stock(code=code, name=f'銘柄{code}'))
+            db.add(AutoTradeStock(code=code, enabled=True))
+            db.add(Signal(code=code, date=date.today(), signal_type='hold', signal_strength=0))
+            db.add(StockPrice(code=code, date=date.today(), open=900, high=900, low=900, close=900, volume=1000))
+            db.add(StockLatest(code=code, price_date=date.today(), current_price=1000, previous_close=1000))
+            db.add(Alert(code=code, alert_type='price_below', condition_value=950))
+            log = AutoTradeLog(code=code, signal_type='buy', quantity=100, order_price=1000.0,
+                               dry_run=True, result_status='success', created_at=yesterday)
+            db.add(log)
+            db.flush()
+            VirtualPositionService(db).record_log(log)
+        db.commit()
+
+    def test_writers_are_not_blocked_by_auto_trade(self, sessions):
+        db = sessions()
+        self._seed(db)
+        traded = {code: threading.Event() for code in self.CODES}
+
+        class _Prices(Stage):
+            """シグナル段と同じく銘柄ごとに別 Session で commit する（前の銘柄の売買判定後に書く）"""
+            name = 'prices'
+
+            def process_one(self, db, code, value):
+                index = TestFileBackedPipeline.CODES.index(code)
+                if index:
+                    assert traded[TestFileBackedPipeline.CODES[index - 1]].wait(5)
+                db.query(StockLatest).filter(StockLatest.code == code).update({'current_price': 900})
+                db.commit()
+                return code
+
+        class _AutoTrade(update_pipeline.AutoTradeStage):
+            def process_one(self, db, code, value):
+                result = super().process_one(db, code, value)
+                traded[code].set()
+                return result
+
+        stats = update_pipeline.run(db, [_Prices(), update_pipeline.AlertStage(), _AutoTrade()])
+
+        assert [(s.name, s.items, s.errors) for s in stats] == [
+            ('prices', 4, 0), ('alerts', 4, 0), ('auto_trade', 4, 0),
+        ]
+        db.expire_all()
+        assert sorted(h.code for h in db.query(AlertHistory).all()) == self.CODES
+        sells = db.query(AutoTradeLog).filter(
+            AutoTradeLog.signal_type == 'sell', AutoTradeLog.result_status == 'success',
+        ).all()
+        assert sorted(log.code for log in sells) == self.CODES
+        db.close()
+
+    def test_failed_code_rolls_back_service_session(self, sessions, monkeypatch):
+        db = sessions()
+        self._seed(db)
+        from src.services.auto_trade_service import AutoTradeService
+
+        original = AutoTradeService._trade_code
+
+        def _trade_code(service, run, code):
+            original(service, run, code)
+            if code == '1002':
+                service.db.flush()
+                raise RuntimeError('flush failed')
+
+        monkeypatch.setattr(AutoTradeService, '_trade_code', _trade_code)
+        stats = update_pipeline.run(db, update_pipeline.after_fetch_stages())
+
+        assert (stats[1].items, stats[1].errors) == (4, 1)
+        db.expire_all()
+        sells = db.query(AutoTradeLog).filter(
+            AutoTradeLog.signal_type == 'sell', AutoTradeLog.result_status == 'success',
+        ).all()
+        # 失敗した銘柄の約定だけが取り消され、前後の銘柄と実行終了時のログは書き込まれる
+        assert sorted(log.code for log in sells) == ['1001', '1003', '1004']
+        db.close()
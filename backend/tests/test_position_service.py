@@ -0,0 +1,168 @@
+"""保有台帳（FIFO）のテスト"""
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import StaticPool
+
+from src.models.migrations import run_migrations
+from src.models.stock import AutoTradeLog, Position, Transaction, VirtualFill
+from src.services.auto_trade_service import AutoTradeService
+from src.services.position_service import PositionService, VirtualPositionService
+
+
+def _tx(side, qty, price, minutes=0):
+    return Transaction(code='7203', transaction_type=side, quantity=qty, price=price,
+                       transaction_date=datetime(2025, 1, 6, 9) + timedelta(minutes=minutes))
+
+
+class TestFifo:
+
+    def test_partial_sell_consumes_oldest_lot(self, db):
+        service = PositionService(db)
+        service.add_transaction(_tx('buy', 100, 1000, 0))
+        service.add_transaction(_tx('buy', 100, 1200, 1))
+        service.add_transaction(_tx('sell', 150, 1300, 2))
+        db.commit()
+
+        position = service.get('7203')
+        assert position.quantity == 50
+        assert position.lots == [[50, 1200]]
+        assert position.cost_basis == pytest.approx(50 * 1200)
+        assert position.realized_pnl == pytest.approx(100 * 300 + 50 * 100)
+        assert service.average_price('7203') == pytest.approx(1200)
+
+    def test_oversell_closes_only_held(self, db):
+        service = PositionService(db)
+        service.add_transaction(_tx('buy', 5, 3000))
+        service.add_transaction(_tx('sell', 10, 3100, 1))
+        db.commit()
+        position = service.get('7203')
+        assert position.quantity == 0
+        assert position.cost_basis == 0
+        assert position.realized_pnl == pytest.approx(500)
+        assert service.get_open() == {}
+        assert service.average_price('7203') is None
+
+    def test_delete_replays_remaining(self, db):
+        service = PositionService(db)
+        first = _tx('buy', 100, 1000, 0)
+        service.add_transaction(first)
+        service.add_transaction(_tx('buy', 100, 1200, 1))
+        service.add_transaction(_tx('sell', 100, 1300, 2))
+        db.commit()
+        assert service.get('7203').lots == [[100, 1200]]
+
+        service.delete_transaction(first)
+        db.commit()
+        position = service.get('7203')
+        assert position.quantity == 0
+        assert position.realized_pnl == pytest.approx(100 * 100)
+
+    def test_rebuild_matches_incremental(self, db):
+        service = PositionService(db)
+        for i, (side, qty, price) in enumerate([('buy', 10, 100), ('buy', 20, 110), ('sell', 15, 120)]):
+            service.add_transaction(_tx(side, qty, price, i))
+        db.commit()
+        before = (service.get('7203').quantity, service.get('7203').cost_basis, service.get('7203').realized_pnl)
+
+        assert service.rebuild() == 1
+        db.commit()
+        position = service.get('7203')
+        assert (position.quantity, position.cost_basis, position.realized_pnl) == before
+
+
+class TestVirtualLedger:
+
+    def _log(self, service, side, qty, price, at, **kwargs):
+        fields = dict(code='7203', signal_type=side, quantity=qty, order_price=price,
+                      dry_run=True, result_status='success', created_at=at)
+        fields.update(kwargs)
+        return service._add_log(**fields)
+
+    def test_hourly_dedupe(self, db):
+        service = AutoTradeService(db)
+        self._log(service, 'buy', 100, 1000, datetime(2025, 1, 6, 9, 5))
+        self._log(service, 'buy', 100, 1010, datetime(2025, 1, 6, 9, 40))   # 同一時間枠 → 無視
+        self._log(service, 'buy', 100, 1020, datetime(2025, 1, 6, 10, 0))
+        self._log(service, 'buy', 100, 999, datetime(2025, 1, 6, 11, 0), dry_run=False)
+        self._log(service, 'buy', 100, 999, datetime(2025, 1, 6, 11, 0), result_status='failed')
+
+        assert service._get_dry_run_holding_quantity('7203') == 200
+        assert service._get_dry_run_entry_price('7203') == pytest.approx(1010)
+        assert db.query(VirtualFill).count() == 2
+
+    def test_virtual_portfolio(self, db):
+        service = AutoTradeService(db)
+        self._log(service, 'buy', 100, 1000, datetime(2025, 1, 6, 9, 0))
+        self._log(service, 'buy', 100, 1200, datetime(2025, 1, 6, 10, 0))
+        self._log(service, 'sell', 150, 1300, datetime(2025, 1, 6, 11, 0))
+
+        portfolio = service.get_virtual_portfolio()
+        assert portfolio['tradeCount'] == 3
+        assert [t['side'] for t in portfolio['trades']] == ['buy', 'buy', 'sell']
+        assert portfolio['realizedProfitLoss'] == 100 * 300 + 50 * 100
+        assert portfolio['winRate'] == 100.0
+        assert [(h['code'], h['quantity'], h['averagePrice']) for h in portfolio['holdings']] == [('7203', 50, 1200.0)]
+
+    def test_rebuild_matches_incremental(self, db):
+        service = AutoTradeService(db)
+        self._log(service, 'buy', 100, 1000, datetime(2025, 1, 6, 9, 0))
+        self._log(service, 'buy', 100, 1100, datetime(2025, 1, 6, 9, 30))
+        self._log(service, 'sell', 40, 1050, datetime(2025, 1, 6, 10, 0))
+        ledger = VirtualPositionService(db)
+        before = (ledger.get('7203').quantity, ledger.get('7203').cost_basis, ledger.get('7203').realized_pnl)
+
+        assert ledger.rebuild() == 2
+        db.commit()
+        position = ledger.get('7203')
+        assert (position.quantity, position.cost_basis, position.realized_pnl) == before
+
+
+def test_api_portfolio_uses_ledger(client, db):
+    for body in [
+        {'code': '7203', 'transactionType': 'buy', 'quantity': 100, 'price': 1000.0},
+        {'code': '7203', 'transactionType': 'buy', 'quantity': 100, 'price': 1200.0},
+        {'code': '7203', 'transactionType': 'sell', 'quantity': 100, 'price': 1300.0},
+    ]:
+        assert client.post('/api/transactions', json=body).status_code == 200
+    holdings = client.get('/api/transactions/portfolio').json()['holdings']
+    assert [(h['code'], h['quantity'], h['averagePrice']) for h in holdings] == [('7203', 100, 1200.0)]
+
+    tx_id = next(t['id'] for t in client.get('/api/transactions').json() if t['price'] == 1000.0)
+    assert client.delete(f'/api/transactions/{tx_id}').status_code == 200
+    assert db.query(Position).filter(Position.code == '7203').one().quantity == 0
+
+
+def test_migration_backfills_positions():
+    engine = create_engine('sqlite://', connect_args={'check_same_thread': False}, poolclass=StaticPool)
+    with engine.begin() as conn:
+        conn.execute(text(
+            "CREATE TABLE transactions (id INTEGER PRIMARY KEY, code VARCHAR(10) NOT NULL, "
+            "transaction_type VARCHAR(4) NOT NULL, quantity INTEGER NOT NULL, price FLOAT NOT NULL, "
+            "transaction_date DATETIME, memo VARCHAR(200))"
+        ))
+        conn.execute(text(
+            "INSERT INTO transactions (code, transaction_type, quantity, price, transaction_date) VALUES "
+            "('7203', 'buy', 10, 100, '2025-01-06 09:00:00'), ('7203', 'sell', 4, 120, '2025-01-07 09:00:00')"
+        ))
+    run_migrations(engine)
+    with engine.connect() as conn:
+        row = conn.execute(text("SELECT quantity, cost_basis, realized_pnl FROM positions WHERE code = '7203'")).one()
+    assert tuple(row) == (6, 600.0, 80.0)
+    engine.dispose()
+
+
+def test_migration_backfills_virtual_positions():
+    engine = create_engine('sqlite://', connect_args={'check_same_thread': False}, poolclass=StaticPool)
+    AutoTradeLog.__table__.create(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(AutoTradeLog.__table__.insert(), [
+            dict(code='7203', signal_type='buy', quantity=10, order_price=100.0, dry_run=True,
+                 result_status='success', created_at=datetime(2025, 1, 6, 9, m))
+            for m in (0, 30)
+        ])
+    run_migrations(engine)
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT quantity FROM virtual_positions WHERE code = '7203'")).scalar() == 10
+    engine.dispose()
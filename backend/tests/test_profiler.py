@@ -0,0 +1,87 @@
+"""オンデマンドプロファイラのテスト"""
+import threading
+import time
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src.services import profiler
+
+
+def _busy(seconds: float):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        sum(range(1000))
+
+
+def test_profile_block_writes_folded_stacks(tmp_path):
+    with profiler.profile('update-1-full', directory=tmp_path) as result:
+        _busy(0.1)
+
+    path = result['path']
+    assert path.parent == tmp_path and path.suffix == '.folded'
+    lines = path.read_text().splitlines()
+    assert lines
+    stack, count = lines[0].rsplit(' ', 1)
+    assert int(count) > 0
+    assert any('tests.test_profiler:_busy' in line for line in lines)
+
+
+def test_disabled_profile_starts_nothing(tmp_path):
+    threads = profiler.threading.active_count()
+    with profiler.profile('noop', enabled=False, directory=tmp_path) as result:
+        assert profiler.threading.active_count() == threads
+    assert result['path'] is None
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_retention_keeps_newest(tmp_path):
+    sampler = profiler.Sampler()
+    paths = [profiler.save(f'run{i}', sampler, directory=tmp_path, keep=3) for i in range(5)]
+    assert sorted(tmp_path.iterdir()) == paths[2:]
+
+
+def test_middleware_profiles_only_flagged_requests(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiler, 'PROFILE_DIR', tmp_path)
+    app = FastAPI()
+    app.add_middleware(profiler.ProfilerMiddleware)
+
+    @app.get('/api/work')
+    def work():
+        _busy(0.05)
+        return {'ok': True}
+
+    client = TestClient(app)
+    assert profiler.ARTIFACT_HEADER not in client.get('/api/work').headers
+    assert list(tmp_path.iterdir()) == []
+
+    res = client.get('/api/work', params={'profile': 1})
+    artifact = res.headers[profiler.ARTIFACT_HEADER]
+    assert (tmp_path / artifact).exists() and 'GET_api_work' in artifact
+
+    res = client.get('/api/work', headers={'X-Profile': '1'})
+    assert res.headers[profiler.ARTIFACT_HEADER] != artifact
+    assert len(list(tmp_path.iterdir())) == 2
+
+
+def test_middleware_saves_off_the_event_loop(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiler, 'PROFILE_DIR', tmp_path)
+    threads = {}
+    original = profiler.save
+
+    def _save(name, sampler, directory=None, keep=profiler.PROFILE_KEEP):
+        threads['save'] = threading.get_ident()
+        return original(name, sampler, directory, keep)
+
+    monkeypatch.setattr(profiler, 'save', _save)
+    app = FastAPI()
+    app.add_middleware(profiler.ProfilerMiddleware)
+
+    @app.get('/api/work')
+    async def work():
+        threads['loop'] = threading.get_ident()
+        return {'ok': True}
+
+    res = TestClient(app).get('/api/work', params={'profile': 1})
+    assert profiler.ARTIFACT_HEADER in res.headers
+    assert threads['save'] != threads['loop']
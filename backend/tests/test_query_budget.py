@@ -0,0 +1,160 @@
+"""主要エンドポイントの SQL 件数（銘柄数・件数に比例して増えないこと）"""
+import logging
+from datetime import datetime, timedelta
+
+import pytest
+
+from src.models.stock import (
+    Alert, AlertHistory, AutoTradeLog, Position, Stock, StockPrice, Transaction, VirtualPosition,
+)
+from src.services import query_stats
+from src.services.stock_service import StockService
+
+CODES = [f'{1000 + i}' for i in range(20)]
+
+
+@pytest.fixture()
+def seeded(db):
+    today = datetime.now().date()
+    for i, code in enumerate(CODES):
+        db.add(Stock(code=code, name=f'銘柄{code}'))
+        for d in range(3):
+            db.add(StockPrice(code=code, date=today - timedelta(days=3 - d),
+                              open=3000, high=3030, low=2970, close=3000 + d, volume=1000))
+        db.add(Transaction(code=code, transaction_type='buy', quantity=100, price=2900))
+        db.add(Position(code=code, quantity=100, cost_basis=290000, lots=[[100, 2900]]))
+        db.add(VirtualPosition(code=code, quantity=100, cost_basis=290000, lots=[[100, 2900]]))
+        alert = Alert(code=code, alert_type='price_above', condition_value=3000 if i % 2 else 5000)
+        db.add(alert)
+        db.flush()
+        db.add(AlertHistory(alert_id=alert.id, code=code, message='test', alert_type='price_above'))
+        db.add(AutoTradeLog(code=code, signal_type='buy', result_status='skipped', dry_run=True))
+    db.commit()
+    StockService(db).refresh_latest(CODES)
+    return db
+
+
+@pytest.mark.parametrize('method, path, body, budget', [
+    ('get', '/api/stocks', None, 4),
+    ('get', '/api/stocks/1000', None, 4),
+    ('get', '/api/stocks/1000/chart', None, 6),
+    ('get', '/api/dashboard?codes=' + ','.join(CODES), None, 10),
+    ('get', '/api/transactions', None, 3),
+    ('get', '/api/transactions/portfolio', None, 4),
+    ('get', '/api/alerts', None, 3),
+    ('get', '/api/alerts/history', None, 3),
+    ('get', '/api/auto-trade/log', None, 2),
+    ('get', '/api/auto-trade/virtual-portfolio', None, 6),
+    ('post', '/api/risk/evaluate-trade', {'code': '1000', 'tradeType': 'buy', 'quantity': 100, 'price': 3000}, 5),
+])
+def test_hot_endpoint_query_budget(client, seeded, query_budget, method, path, body, budget):
+    with query_budget(budget):
+        res = getattr(client, method)(path, **({'json': body} if body else {}))
+    assert res.status_code == 200, res.text
+
+
+def test_check_alerts_query_budget(seeded, query_budget):
+    from src.models.stock import StockLatest
+    from src.services.alert_service import AlertService
+
+    for code in CODES[:6]:
+        latest = seeded.query(StockLatest).filter(StockLatest.code == code).one()
+        latest.signal_type, latest.previous_signal_type = 'buy', 'hold'
+        seeded.add(Alert(code=code, alert_type='signal_change'))
+    seeded.commit()
+
+    with query_budget(8):
+        AlertService(seeded).check_alerts()
+    changes = seeded.query(AlertHistory).filter(AlertHistory.alert_type == 'signal_change').all()
+    assert len(changes) == 6
+    assert {(h.signal_before, h.signal_after) for h in changes} == {('hold', 'buy')}
+    assert seeded.query(AlertHistory).filter(AlertHistory.alert_type == 'price_above').count() == 20 + 10
+
+    # 記録済みのシグナル変化は二重に記録しない
+    AlertService(seeded).check_alerts()
+    assert seeded.query(AlertHistory).filter(AlertHistory.alert_type == 'signal_change').count() == 6
+
+
+def test_track_flags_repeated_statements(db, caplog):
+    db.add_all([Stock(code=code, name=code) for code in CODES[:6]])
+    db.commit()
+
+    caplog.set_level(logging.WARNING, logger='src.services.query_stats')
+    query_stats.instrument_engine(db.get_bind())
+    with query_stats.track('loop') as stats:
+        for code in CODES[:6]:
+            db.query(Stock).filter(Stock.code == code).first()
+
+    assert stats.count == 6
+    assert stats.repeated()[0][1] == 6
+    assert 'N+1 suspected in loop: 6x' in caplog.text
+
+
+def test_slow_query_logged_with_params(db, caplog, monkeypatch):
+    from src.config import settings
+
+    monkeypatch.setattr(settings, 'slow_query_ms', 0)
+    caplog.set_level(logging.WARNING, logger='src.services.query_stats')
+    query_stats.instrument_engine(db.get_bind())
+    db.query(Stock).filter(Stock.code == '7203').all()
+    assert 'slow' in caplog.text and "'7203'" in caplog.text
+
+
+def test_middleware_reports_query_count(db):
+    from fastapi import Depends, FastAPI
+    from fastapi.testclient import TestClient
+
+    from src.models.database import get_db
+
+    app = FastAPI()
+    app.add_middleware(query_stats.QueryStatsMiddleware)
+
+    @app.get('/api/items/{code}')
+    def get_item(code: str, session=Depends(get_db)):
+        session.query(Stock).all()
+        session.query(StockPrice).all()
+        return {}
+
+    app.dependency_overrides[get_db] = lambda: db
+    query_stats.instrument_engine(db.get_bind())
+    res = TestClient(app).get('/api/items/7203')
+    assert res.headers[query_stats.QUERY_COUNT_HEADER] == '2'
+    assert res.headers['server-timing'].startswith('db;desc="2 queries"')
+
+
+def test_n_plus_one_metric_labelled_by_route_template(db):
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    from src.services import metrics
+
+    def _loop():
+        for code in CODES[:6]:
+            db.query(Stock).filter(Stock.code == code).first()
+
+    async def legacy(scope, receive, send):
+        # ルートを持たないマウント先（パスごとに別の計測範囲名にならないこと）
+        _loop()
+        await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+        await send({'type': 'http.response.body', 'body': b''})
+
+    app = FastAPI()
+    app.add_middleware(query_stats.QueryStatsMiddleware)
+    app.mount('/legacy', legacy)
+
+    @app.get('/api/items/{code}')
+    def get_item(code: str):
+        _loop()
+        return {}
+
+    query_stats.instrument_engine(db.get_bind())
+    before = metrics.DB_N_PLUS_ONE.get(scope='GET unmatched')
+    before_route = metrics.DB_N_PLUS_ONE.get(scope='GET /api/items/{code}')
+    client = TestClient(app)
+    client.get('/legacy/a')
+    client.get('/legacy/b')
+    client.get('/api/items/7203')
+
+    assert metrics.DB_N_PLUS_ONE.get(scope='GET unmatched') == before + 2
+    assert metrics.DB_N_PLUS_ONE.get(scope='GET /api/items/{code}') == before_route + 1
+    assert metrics.DB_N_PLUS_ONE.get(scope='GET /legacy/a') == 0
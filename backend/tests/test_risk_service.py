@@ -1,7 +1,9 @@
 """RiskService のユニットテスト"""
 from datetime import datetime
 from src.models.stock import RiskRule, Stock, StockPrice, Signal, Transaction
+from src.services.position_service import PositionService
 from src.services.risk_service import RiskService
+from src.services.stock_service import StockService
 
 
 class TestRiskRules:
@@ -37,6 +39,7 @@ class TestEvaluateTrade:
                           open=price, high=price * 1.01, low=price * 0.99,
                           close=price, volume=500000))
         db.commit()
+        StockService(db).refresh_latest()
 
     def test_first_trade_passes(self, db):
         """初回取引（空ポートフォリオ）は通過する"""
@@ -56,7 +59,7 @@ class TestEvaluateTrade:
             db.add(Stock(code=code, name=f'銘柄{code}'))
             db.add(StockPrice(code=code, date=datetime.now().date(),
                               open=3000, high=3030, low=2970, close=3000, volume=500000))
-            db.add(Transaction(code=code, transaction_type='buy', quantity=10, price=3000.0))
+            PositionService(db).add_transaction(Transaction(code=code, transaction_type='buy', quantity=10, price=3000.0))
         db.commit()
 
         # 3銘柄目の購入を試行
@@ -81,6 +84,7 @@ class TestEvaluateTrade:
             stop_loss_price=2400.0,  # 3000 → 2400 = 20% 損失
         ))
         db.commit()
+        StockService(db).refresh_latest()
 
         result = service.evaluate_trade('7203', 'buy', 10, 3000.0)
         assert result['passed'] is False
@@ -100,6 +104,7 @@ class TestChecklist:
             target_price=3200.0, stop_loss_price=2800.0,
         ))
         db.commit()
+        StockService(db).refresh_latest()
 
         service = RiskService(db)
         result = service.get_checklist('7203')
@@ -127,6 +132,7 @@ class TestSuggestPrices:
             support_price=2900.0, resistance_price=3100.0,
         ))
         db.commit()
+        StockService(db).refresh_latest()
 
         service = RiskService(db)
         result = service.suggest_prices('7203')
@@ -2,9 +2,10 @@
 import numpy as np
 import pandas as pd
 import pytest
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 
-from src.models.stock import Stock, StockPrice, Signal, Setting
+from src.models.stock import Stock, StockPrice, Signal, Setting, StockLatest
+from src.services import query_stats
 from src.services.stock_service import StockService
 
 
@@ -161,6 +162,49 @@ class TestSignalDetails:
             assert 'LowVolume' in result['active_signals']
 
 
+    @pytest.mark.parametrize('missing', [(), ('macd', 'macd_signal', 'adx', 'volume_ratio')])
+    def test_series_matches_row_by_row_details(self, db, missing):
+        """列演算の一括判定が、各行までを切り出した calculate_signal_details と一致する"""
+        service = StockService(db)
+        settings = service.get_settings()
+        rng = np.random.default_rng(7)
+        n = 400
+        close = 1000 + np.cumsum(rng.normal(0, 10, n))
+        df = pd.DataFrame({
+            'close': close,
+            'high': close * (1 + rng.uniform(0, 0.02, n)),
+            'low': close * (1 - rng.uniform(0, 0.02, n)),
+            'rsi': rng.uniform(10, 90, n),
+            'macd': rng.normal(0, 5, n),
+            'macd_signal': rng.normal(0, 5, n),
+            'macd_histogram': rng.normal(0, 5, n),
+            'sma5': close + rng.normal(0, 10, n),
+            'sma25': close + rng.normal(0, 15, n),
+            'sma75': close + rng.normal(0, 30, n),
+            'bb_upper': close * (1 + rng.uniform(0, 0.03, n)),
+            'bb_lower': close * (1 - rng.uniform(0, 0.03, n)),
+            'atr': rng.uniform(-5, 30, n),
+            'stoch_k': rng.uniform(0, 100, n),
+            'stoch_d': rng.uniform(0, 100, n),
+            'williams_r': rng.uniform(-100, 0, n),
+            'adx': rng.uniform(10, 50, n),
+            'volume_ratio': rng.uniform(0.5, 2.5, n),
+        })
+        # 指標の欠損（期間不足・データ欠け）も混ぜる
+        for column in df.columns.drop(['close', 'high', 'low']):
+            df.loc[rng.random(n) < 0.05, column] = np.nan
+        df = df.drop(columns=list(missing))
+
+        series = service.calculate_signal_series(df, settings)
+
+        codes = {'buy': 1, 'sell': -1, 'hold': 0}
+        expected = [service.calculate_signal_details(df.iloc[:i + 1], settings) for i in range(n)]
+        assert series['signal'].tolist() == [codes[d['signal_type']] for d in expected]
+        assert series['signal_score'].tolist() == [d['signal_score'] for d in expected]
+        np.testing.assert_array_equal(series['stop_loss_price'], [d['stop_loss_price'] or np.nan for d in expected])
+        assert {1, -1} <= set(series['signal'])
+
+
 class TestSettings:
     """設定CRUD"""
 
@@ -213,3 +257,264 @@ class TestStockCRUD:
     def test_delete_nonexistent_stock(self, db):
         service = StockService(db)
         assert service.delete_stock('9999') is False
+
+
+class TestLatestState:
+    """stock_latest からの最新状態取得（銘柄数によらずクエリ数一定）"""
+
+    def _seed(self, db, n):
+        for i in range(n):
+            code = str(1000 + i)
+            db.add(Stock(code=code, name=f'銘柄{i}'))
+            for d in range(3):
+                db.add(StockPrice(code=code, date=date(2025, 1, 6 + d), open=100, high=110,
+                                  low=90, close=100 + d * 10 + i, volume=1000))
+            db.add(Signal(code=code, date=date(2025, 1, 7), signal_type='hold', rsi=40.0))
+            db.add(Signal(code=code, date=date(2025, 1, 8), signal_type='buy', rsi=25.0,
+                          active_signals='rsi,macd'))
+        db.commit()
+        StockService(db).refresh_latest()
+
+    def test_latest_and_previous_values(self, db):
+        self._seed(db, 2)
+        stocks = StockService(db).get_all_stocks()
+        assert [s['code'] for s in stocks] == ['1000', '1001']
+        first = stocks[0]
+        assert first['currentPrice'] == 120
+        assert first['previousClose'] == 110
+        assert first['signal'] == 'buy'
+        assert first['rsi'] == 25.0
+        assert first['activeSignals'] == ['rsi', 'macd']
+        assert first['updatedAt'] == '2025-01-08'
+
+    def test_stock_without_prices_is_skipped(self, db):
+        self._seed(db, 1)
+        db.add(Stock(code='9999', name='価格なし'))
+        db.commit()
+        service = StockService(db)
+        assert [s['code'] for s in service.get_all_stocks()] == ['1000']
+        assert service.get_stock_detail('9999') is None
+
+    def test_detail_single_price_and_no_signal(self, db):
+        db.add(Stock(code='1234', name='単日'))
+        db.add(StockPrice(code='1234', date=date(2025, 1, 6), open=1, high=1, low=1, close=500, volume=1))
+        db.commit()
+        StockService(db).refresh_latest()
+        detail = StockService(db).get_stock_detail('1234')
+        assert detail['previousClose'] == 500
+        assert detail['changePercent'] == 0
+        assert detail['signal'] == 'hold'
+
+    def test_query_count_constant(self, db):
+        self._seed(db, 3)
+        service = StockService(db)
+        with query_stats.capture(db.get_bind()) as small_stats:
+            small = service.get_all_stocks()
+        self._seed_more(db)
+        with query_stats.capture(db.get_bind()) as large_stats:
+            large = service.get_all_stocks()
+        assert len(small) == 3 and len(large) == 30
+        assert small_stats.count == large_stats.count == 1
+        with query_stats.capture(db.get_bind()) as detail_stats:
+            service.get_stock_detail('1005')
+        assert detail_stats.count == 1
+
+    def _seed_more(self, db):
+        for i in range(3, 30):
+            code = str(1000 + i)
+            db.add(Stock(code=code, name=f'銘柄{i}'))
+            db.add(StockPrice(code=code, date=date(2025, 1, 6), open=1, high=1, low=1, close=100, volume=1))
+        db.commit()
+        StockService(db).refresh_latest()
+
+    def test_refresh_sets_previous_signal(self, db):
+        self._seed(db, 1)
+        row = db.query(StockLatest).filter(StockLatest.code == '1000').one()
+        assert row.signal_type == 'buy'
+        assert row.previous_signal_type == 'hold'
+        assert row.change_percent == pytest.approx(9.09)
+
+    def test_write_latest_rolls_previous_signal(self, db):
+        self._seed(db, 1)
+        service = StockService(db)
+        same_day = Signal(code='1000', date=date(2025, 1, 8), signal_type='sell')
+        service._write_latest('1000', date(2025, 1, 8), 120, 110, same_day)
+        assert db.query(StockLatest).one().previous_signal_type == 'hold'
+
+        next_day = Signal(code='1000', date=date(2025, 1, 9), signal_type='hold', target_price=150.0)
+        service._write_latest('1000', date(2025, 1, 9), 130, 120, next_day)
+        db.commit()
+        row = db.query(StockLatest).one()
+        assert row.previous_signal_type == 'sell'
+        assert row.target_price == 150.0
+        assert service.get_stock_detail('1000')['currentPrice'] == 130
+
+    def test_delete_stock_removes_latest(self, db):
+        self._seed(db, 1)
+        assert StockService(db).delete_stock('1000') is True
+        assert db.query(StockLatest).count() == 0
+
+
+class TestStockNameCache:
+    """銘柄名キャッシュ"""
+
+    def test_alert_history_resolves_names_once(self, db):
+        from src.models.stock import AlertHistory
+        from src.services.alert_service import AlertService
+
+        for i in range(100):
+            code = f'{1000 + i}'
+            db.add(Stock(code=code, name=f'銘柄名{code}'))
+            db.add(AlertHistory(alert_id=1, code=code, message='m', alert_type='price_above'))
+        db.commit()
+
+        with query_stats.capture(db.get_bind()) as stats:
+            history = AlertService(db).get_alert_history()
+        assert len(history) == 100
+        assert {h['name'] for h in history} == {f'銘柄名{1000 + i}' for i in range(100)}
+        # 履歴1回 + 銘柄名ロード1回
+        assert stats.count == 2
+
+    def test_invalidated_on_delete(self, db):
+        from src.services.stock_service import get_stock_name
+
+        db.add(Stock(code='7203', name='トヨタ（テスト）'))
+        db.commit()
+        assert get_stock_name(db, '7203') == 'トヨタ（テスト）'
+        StockService(db).delete_stock('7203')
+        assert get_stock_name(db, '7203') == 'トヨタ自動車'  # STOCK_NAMES へフォールバック
+        assert get_stock_name(db, '0000') == '銘柄0000'
+
+
+class TestChartFormat:
+    """チャートの行形式・列形式"""
+
+    def _frame(self, n=30):
+        df = pd.DataFrame({
+            'date': [date(2025, 1, 1) + timedelta(days=i) for i in range(n)],
+            'open': np.linspace(1000, 1100, n),
+            'high': np.linspace(1010, 1110, n),
+            'low': np.linspace(990, 1090, n),
+            'close': np.linspace(1000, 1100, n),
+            'volume': np.arange(n) * 1000,
+        })
+        df['sma5'] = df['close'].rolling(5).mean() + 0.4
+        return df
+
+    def test_columns_and_rows_agree(self):
+        from src.services.stock_service import chart_columns, chart_rows
+
+        df = self._frame()
+        columns = chart_columns(df)
+        rows = chart_rows(df)
+        assert columns['dates'][:2] == ['01/01', '01/02']
+        assert len(rows) == len(columns['close']) == 30
+        assert rows[0]['sma5'] is None and np.isnan(columns['sma5'][0])
+        assert rows[10]['sma5'] == columns['sma5'][10] == round(df['sma5'][10], 0)
+        assert rows[10]['volume'] == 10000 and isinstance(rows[10]['volume'], int)
+        # 計算されていない指標は全て null
+        assert all(r['sma75'] is None for r in rows)
+
+    def test_columnar_endpoint(self, client, db):
+        import orjson
+
+        db.add(Stock(code='7203', name='トヨタ'))
+        for i in range(3):
+            db.add(StockPrice(code='7203', date=date(2025, 1, 6) + timedelta(days=i),
+                              open=3000, high=3030, low=2970, close=3000 + i, volume=500000))
+        db.commit()
+
+        res = client.get('/api/stocks/7203/chart', params={'format': 'columnar'})
+        assert res.status_code == 200
+        assert res.headers['ETag']
+        data = orjson.loads(res.content)
+        assert data['dates'] == ['01/06', '01/07', '01/08']
+        assert data['close'] == [3000, 3001, 3002]
+        assert data['sma5'] == [None, None, None]
+
+        rows = client.get('/api/stocks/7203/chart').json()
+        assert [r['close'] for r in rows] == data['close']
+
+
+class TestChartSeries:
+    """保存済みチャート本文と LTTB 間引き"""
+
+    def _add_prices(self, db, n):
+        db.add(Stock(code='7203', name='トヨタ'))
+        for i in range(n):
+            db.add(StockPrice(code='7203', date=date(2025, 1, 6) + timedelta(days=i),
+                              open=3000, high=3030, low=2970, close=3000 + i, volume=500000))
+        db.commit()
+
+    def test_downsample_keeps_endpoints_and_peaks(self):
+        from src.services import chart_series
+
+        n = 500
+        close = np.full(n, 1000.0)
+        close[123] = 1500.0
+        columns = {
+            'dates': [f'd{i}' for i in range(n)],
+            'close': close,
+            'volume': np.arange(n, dtype=np.int64),
+            'sma5': np.full(n, np.nan),
+        }
+        result = chart_series.downsample(columns, 50)
+        assert len(result['dates']) == len(result['close']) == len(result['sma5']) == 50
+        assert result['dates'][0] == 'd0' and result['dates'][-1] == f'd{n - 1}'
+        assert 'd123' in result['dates'] and 1500.0 in result['close']
+        assert result['volume'].dtype == np.int64
+        # 点数以下なら間引かない
+        assert chart_series.downsample(columns, n) is columns
+
+    def test_stored_body_served_as_gzip(self, client, db):
+        self._add_prices(db, 3)
+        assert StockService(db).refresh_chart_series() == 1
+
+        res = client.get('/api/stocks/7203/chart', params={'period': '1m'})
+        assert res.status_code == 200
+        assert res.headers['content-encoding'] == 'gzip'
+        assert [r['close'] for r in res.json()] == [3000, 3001, 3002]
+        assert res.json()[0]['sma5'] is None
+
+        res = client.get('/api/stocks/7203/chart', params={'format': 'columnar'},
+                         headers={'Accept-Encoding': 'identity'})
+        assert 'content-encoding' not in res.headers
+        assert res.json()['dates'] == ['01/06', '01/07', '01/08']
+
+    def test_stale_settings_fall_back_to_live(self, db):
+        from src.services import config_cache
+
+        self._add_prices(db, 3)
+        service = StockService(db)
+        service.refresh_chart_series()
+        assert service.get_chart_body('7203', '3m') is not None
+
+        config_cache.bump(db, config_cache.SETTINGS)
+        db.commit()
+        assert service.get_chart_body('7203', '3m') is None
+        assert [r['close'] for r in service.get_chart_data('7203', '3m')] == [3000, 3001, 3002]
+
+    def test_points_downsamples(self, client, db):
+        from src.models.stock import ChartSeries
+        from src.services import chart_series
+
+        n = 120
+        columns = {
+            'dates': [f'{i:03d}' for i in range(n)],
+            'close': np.arange(3000, 3000 + n, dtype=np.float64),
+            **{key: np.zeros(n) for key in ['open', 'high', 'low', 'sma5', 'sma25', 'sma75']},
+            'volume': np.full(n, 500000),
+        }
+        db.add(Stock(code='7203', name='トヨタ'))
+        db.add(ChartSeries(
+            code='7203', period='6m', num_points=n, settings_version=0,
+            rows_body=chart_series.encode(chart_series.rows_from_columns(columns)),
+            columns_body=chart_series.encode(columns),
+        ))
+        db.commit()
+
+        rows = client.get('/api/stocks/7203/chart', params={'period': '6m', 'points': 10}).json()
+        assert len(rows) == 10
+        assert rows[0]['date'] == '000' and rows[-1]['close'] == 3119
+        assert len(client.get('/api/stocks/7203/chart', params={'period': '6m'}).json()) == n
+        assert client.get('/api/stocks/7203/chart', params={'points': 5}).status_code == 422
@@ -0,0 +1,89 @@
+"""更新ジョブ管理（要求の合流・鮮度による取得省略・状態/履歴）のテスト"""
+import threading
+
+from src.services.update_jobs import FULL, PRICES, UpdateJobManager
+
+
+class _Stages:
+    """取得段をゲートで止められる段関数"""
+
+    def __init__(self, fail: bool = False):
+        self.fetches = 0
+        self.after = 0
+        self.fail = fail
+        self.in_fetch = threading.Event()
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def fetch(self, db):
+        self.fetches += 1
+        self.in_fetch.set()
+        self.gate.wait(5)
+        if self.fail:
+            raise RuntimeError('yfinance down')
+
+    def after_fetch(self, db):
+        self.after += 1
+
+
+def _manager(stages: _Stages, **kwargs) -> UpdateJobManager:
+    return UpdateJobManager(fetch=stages.fetch, after_fetch=stages.after_fetch, **kwargs)
+
+
+def test_concurrent_triggers_share_one_fetch():
+    stages = _Stages()
+    stages.gate.clear()
+    manager = _manager(stages)
+
+    first = manager.trigger(PRICES, 'api')
+    assert stages.in_fetch.wait(5)
+    assert manager.trigger(FULL, 'schedule') is first
+    assert manager.trigger(FULL, 'watchdog') is first
+    assert manager.status()['current']['sources'] == ['api', 'schedule', 'watchdog']
+    stages.gate.set()
+
+    assert first.wait(5)
+    assert (stages.fetches, stages.after) == (1, 1)
+    assert first.kind == FULL and first.status == 'succeeded' and first.fetched
+
+
+def test_recent_fetch_is_not_repeated():
+    stages = _Stages()
+    manager = _manager(stages)
+
+    assert manager.trigger(PRICES, 'api').wait(5)
+    second = manager.trigger(FULL, 'schedule')
+    assert second.wait(5)
+    assert stages.fetches == 1 and stages.after == 1
+    assert not second.fetched
+
+    stale = _manager(stages, fresh_seconds=0)
+    stale.trigger(PRICES, 'api').wait(5)
+    assert stale.trigger(PRICES, 'api').wait(5)
+    assert stages.fetches == 3
+
+
+def test_failure_recorded_in_history():
+    stages = _Stages(fail=True)
+    manager = _manager(stages)
+
+    run = manager.trigger(FULL, 'startup')
+    assert run.wait(5)
+    status = manager.status()
+    assert status['current'] is None
+    assert status['history'][0]['status'] == 'failed'
+    assert status['history'][0]['error'] == 'yfinance down'
+    assert stages.after == 0
+
+    # 失敗した取得は鮮度に数えず、次の要求で取り直す
+    assert manager.trigger(PRICES, 'api').wait(5)
+    assert stages.fetches == 2
+
+
+def test_update_endpoint(client, db):
+    res = client.post('/api/update')
+    assert res.status_code == 200
+    assert res.json()['job']['status'] == 'succeeded'
+
+    status = client.get('/api/update/status').json()
+    assert status['history'][0]['id'] == res.json()['job']['id']
@@ -20,6 +20,7 @@ import BrokerageSetup from './pages/BrokerageSetup';
 import BrokerageOrders from './pages/BrokerageOrders';
 import AutoTradeSettings from './pages/AutoTradeSettings';
 import AlertBadge from './components/AlertBadge';
+import { useServerEvents } from './hooks/useServerEvents';
 
 const theme = createTheme({
   palette: {
@@ -33,7 +34,7 @@ const theme = createTheme({
 const queryClient = new QueryClient({
   defaultOptions: {
     queries: {
-      staleTime: 1000 * 60, // 1分
+      staleTime: 1000 * 60 * 5, // 5分（更新は /api/events で通知される）
       retry: 1,
     },
   },
@@ -97,6 +98,8 @@ function BottomNav() {
 }
 
 function AppContent() {
+  useServerEvents();
+
   return (
     <>
       <AppHeader />
@@ -1,10 +1,11 @@
 import { config } from '../config';
 import type {
   Stock, StockDetail, ChartData, Settings, AddStockRequest,
-  Transaction, TransactionRequest, Portfolio, Recommendations,
+  Transaction, TransactionRequest, Portfolio, Recommendations, CursorPage,
   Alert, AlertCreateRequest, AlertHistory, RiskRules,
-  TradeEvaluation, Checklist, PriceSuggestions,
+  TradeEvaluation, Checklist, PriceSuggestions, Dashboard, DashboardSection,
   BacktestSummary, BacktestCreateRequest, BacktestDetail, BacktestTrade, BacktestSnapshot,
+  BacktestCompareCurves,
   BrokerageConfig, BrokerageHealth, BrokerageBalance, BrokeragePosition, OrderCreateRequest, Order,
   AutoTradeConfig, AutoTradeStockSetting, AutoTradeLog, VirtualPortfolio,
 } from '../types';
@@ -28,7 +29,7 @@ async function fetchApi<T>(endpoint: string, options?: RequestInit): Promise<T>
   return response.json();
 }
 
-async function fetchTunnelApi<T>(endpoint: string, options?: RequestInit): Promise<T> {
+async function getTunnelUrl(): Promise<string> {
   if (!tunnelUrl) {
     const res = await fetchApi<{ url: string }>('/api/settings/tunnel-url');
     tunnelUrl = res.url || null;
@@ -36,7 +37,11 @@ async function fetchTunnelApi<T>(endpoint: string, options?: RequestInit): Promi
   if (!tunnelUrl) {
     throw new Error('証券会社連携はオフラインです（PCが起動していません）');
   }
-  const response = await fetch(`${tunnelUrl}${endpoint}`, {
+  return tunnelUrl;
+}
+
+async function fetchTunnelApi<T>(endpoint: string, options?: RequestInit): Promise<T> {
+  const response = await fetch(`${await getTunnelUrl()}${endpoint}`, {
     headers: { 'Content-Type': 'application/json' },
     ...options,
   });
@@ -46,6 +51,24 @@ async function fetchTunnelApi<T>(endpoint: string, options?: RequestInit): Promi
   return response.json();
 }
 
+// 一覧APIの1ページ分（次ページのカーソルは X-Next-Cursor ヘッダ）
+async function fetchPage<T>(url: string): Promise<CursorPage<T>> {
+  const response = await fetch(url, {
+    headers: { 'Content-Type': 'application/json' },
+  });
+  if (!response.ok) {
+    throw new Error(`API Error: ${response.status}`);
+  }
+  return {
+    items: await response.json(),
+    nextCursor: response.headers.get('X-Next-Cursor'),
+  };
+}
+
+function withCursor(endpoint: string, cursor?: string): string {
+  return cursor ? `${endpoint}?cursor=${encodeURIComponent(cursor)}` : endpoint;
+}
+
 export const api = {
   // おすすめ銘柄取得
   getRecommendations: () => fetchApi<Recommendations>('/api/recommendations'),
@@ -73,6 +96,12 @@ export const api = {
   getChartData: (code: string, period: string = '3m') =>
     fetchApi<ChartData[]>(`/api/stocks/${code}/chart?period=${period}`),
 
+  // 一覧・詳細・チャート・チェックリスト・指値提案の一括取得
+  getDashboard: (codes: string[], sections: DashboardSection[], period: string = '3m') =>
+    fetchApi<Dashboard>(
+      `/api/dashboard?codes=${codes.join(',')}&sections=${sections.join(',')}&period=${period}`,
+    ),
+
   // 設定取得
   getSettings: () => fetchApi<Settings>('/api/settings'),
 
@@ -89,8 +118,9 @@ export const api = {
       method: 'POST',
     }),
 
-  // 取引履歴取得
-  getTransactions: () => fetchApi<Transaction[]>('/api/transactions'),
+  // 取引履歴取得（新しい順に1ページずつ。cursor は前ページの nextCursor）
+  getTransactions: (cursor?: string) =>
+    fetchPage<Transaction>(`${BASE_URL}${withCursor('/api/transactions', cursor)}`),
 
   // 取引記録
   addTransaction: (data: TransactionRequest) =>
@@ -135,12 +165,20 @@ export const api = {
   getBacktest: (id: number) => fetchApi<BacktestDetail>(`/api/backtests/${id}`),
   deleteBacktest: (id: number) =>
     fetchApi<void>(`/api/backtests/${id}`, { method: 'DELETE' }),
+  extendBacktest: (id: number, endDate: string) =>
+    fetchApi<BacktestDetail>(`/api/backtests/${id}/extend`, {
+      method: 'POST', body: JSON.stringify({ endDate }),
+    }),
   getBacktestTrades: (id: number) => fetchApi<BacktestTrade[]>(`/api/backtests/${id}/trades`),
   getBacktestSnapshots: (id: number) => fetchApi<BacktestSnapshot[]>(`/api/backtests/${id}/snapshots`),
   compareBacktests: (ids: number[]) =>
     fetchApi<{ backtests: BacktestDetail[] }>('/api/backtests/compare', {
       method: 'POST', body: JSON.stringify({ ids }),
     }),
+  compareBacktestCurves: (ids: number[], points = 300) =>
+    fetchApi<BacktestCompareCurves>('/api/backtests/compare/curves', {
+      method: 'POST', body: JSON.stringify({ ids, points }),
+    }),
 
   // 証券API接続ヘルス（DB経由なのでトンネル不要）
   getBrokerageHealth: () => fetchApi<BrokerageHealth>('/api/brokerage/health'),
@@ -153,7 +191,8 @@ export const api = {
     fetchTunnelApi<{ connected: boolean; message: string }>('/api/brokerage/connect', { method: 'POST' }),
   getBrokerageBalance: () => fetchTunnelApi<BrokerageBalance>('/api/brokerage/balance'),
   getBrokeragePositions: () => fetchTunnelApi<BrokeragePosition[]>('/api/brokerage/positions'),
-  getOrders: () => fetchTunnelApi<Order[]>('/api/brokerage/orders'),
+  getOrders: async (cursor?: string) =>
+    fetchPage<Order>(`${await getTunnelUrl()}${withCursor('/api/brokerage/orders', cursor)}`),
   createOrder: (data: OrderCreateRequest) =>
     fetchTunnelApi<Order>('/api/brokerage/orders', { method: 'POST', body: JSON.stringify(data) }),
   cancelOrder: (id: number) =>
@@ -7,7 +7,7 @@ export default function AlertBadge() {
   const { data } = useQuery({
     queryKey: ['unreadAlertCount'],
     queryFn: api.getUnreadAlertCount,
-    refetchInterval: 30000,
+    refetchInterval: 5 * 60_000, // 新着は /api/events の alerts で取り直す
   });
 
   return (
@@ -4,8 +4,24 @@ import {
   Typography, CircularProgress, Box,
 } from '@mui/material';
 import { useQuery } from '@tanstack/react-query';
+import { LineChart, Line, XAxis, YAxis, CartesianGrid, Tooltip, ResponsiveContainer, Legend } from 'recharts';
 import { api } from '../api/client';
-import type { BacktestDetail } from '../types';
+import type { BacktestDetail, BacktestCompareCurves } from '../types';
+
+const LINE_COLORS = ['#1976d2', '#e53935', '#43a047', '#fb8c00', '#8e24aa'];
+
+// 系列ごとに間引かれた日付をマージしてチャート用の行に変換
+function toChartRows(curves: BacktestCompareCurves) {
+  const rows = new Map<string, Record<string, number | string>>();
+  curves.series.forEach((s) => {
+    s.dates.forEach((d, i) => {
+      const row = rows.get(d) ?? { date: d };
+      row[`bt${s.id}`] = s.values[i] * 100;
+      rows.set(d, row);
+    });
+  });
+  return [...rows.values()].sort((a, b) => String(a.date).localeCompare(String(b.date)));
+}
 
 interface Props {
   open: boolean;
@@ -19,6 +35,11 @@ export default function BacktestCompareDialog({ open, onClose, ids }: Props) {
     queryFn: () => api.compareBacktests(ids),
     enabled: open && ids.length >= 2,
   });
+  const { data: curves } = useQuery({
+    queryKey: ['backtestCompareCurves', ids],
+    queryFn: () => api.compareBacktestCurves(ids),
+    enabled: open && ids.length >= 2,
+  });
 
   const metrics = ['totalReturnPercent', 'maxDrawdown', 'winRate', 'profitFactor', 'sharpeRatio', 'totalTrades'];
   const labels: Record<string, string> = {
@@ -64,6 +85,26 @@ export default function BacktestCompareDialog({ open, onClose, ids }: Props) {
             </Table>
           </TableContainer>
         ) : null}
+        {curves && curves.series.length > 0 && (
+          <Box mt={2}>
+            <Typography variant="subtitle2" fontWeight="bold" mb={1}>資産推移（初期資金=100）</Typography>
+            <ResponsiveContainer width="100%" height={220}>
+              <LineChart data={toChartRows(curves)}>
+                <CartesianGrid strokeDasharray="3 3" />
+                <XAxis dataKey="date" tick={{ fontSize: 10 }} tickFormatter={(d: string) => d.slice(5)} />
+                <YAxis domain={['auto', 'auto']} tick={{ fontSize: 10 }} />
+                <Tooltip formatter={(value: number | undefined) => (value ?? 0).toFixed(1)} />
+                <Legend />
+                {curves.series.map((s, i) => (
+                  <Line
+                    key={s.id} type="monotone" dataKey={`bt${s.id}`} name={s.name}
+                    stroke={LINE_COLORS[i % LINE_COLORS.length]} dot={false} connectNulls
+                  />
+                ))}
+              </LineChart>
+            </ResponsiveContainer>
+          </Box>
+        )}
       </DialogContent>
       <DialogActions>
         <Button onClick={onClose}>閉じる</Button>
@@ -0,0 +1,40 @@
+import { useEffect } from 'react';
+import { useQueryClient } from '@tanstack/react-query';
+import { config } from '../config';
+
+// /api/events のイベント種別 → 取り直すクエリ
+const INVALIDATES: Record<string, string[][]> = {
+  prices: [['stocks'], ['stock'], ['chart'], ['recommendations'], ['portfolio'], ['priceSuggestions'], ['checklist']],
+  signals: [['stocks'], ['stock'], ['recommendations']],
+  alerts: [['alertHistory'], ['unreadAlertCount']],
+  orders: [['orders'], ['transactions'], ['portfolio'], ['brokerageBalance'], ['autoTradeLog'], ['virtualPortfolio']],
+};
+
+/**
+ * パイプライン更新イベント（Server-Sent Events）を購読し、該当するクエリを無効化する。
+ * 再接続と Last-Event-ID の送信は EventSource が行う。resync を受けたら全クエリを取り直す。
+ */
+export function useServerEvents() {
+  const queryClient = useQueryClient();
+
+  useEffect(() => {
+    const source = new EventSource(`${config.apiUrl}/api/events`);
+    const listeners = Object.entries(INVALIDATES).map(([type, keys]) => {
+      const listener = () => {
+        keys.forEach((queryKey) => queryClient.invalidateQueries({ queryKey }));
+      };
+      source.addEventListener(type, listener);
+      return [type, listener] as const;
+    });
+    const onResync = () => {
+      queryClient.invalidateQueries();
+    };
+    source.addEventListener('resync', onResync);
+
+    return () => {
+      listeners.forEach(([type, listener]) => source.removeEventListener(type, listener));
+      source.removeEventListener('resync', onResync);
+      source.close();
+    };
+  }, [queryClient]);
+}
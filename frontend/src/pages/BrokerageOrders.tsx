@@ -2,10 +2,10 @@ import { useState } from 'react';
 import { useNavigate } from 'react-router-dom';
 import {
   Box, Typography, IconButton, Card, CardContent, Chip, Fab,
-  CircularProgress, Alert,
+  CircularProgress, Alert, Button,
 } from '@mui/material';
 import { ArrowBack, Add, Cancel } from '@mui/icons-material';
-import { useQuery, useMutation, useQueryClient } from '@tanstack/react-query';
+import { useQuery, useInfiniteQuery, useMutation, useQueryClient } from '@tanstack/react-query';
 import { api } from '../api/client';
 import AccountBalanceCard from '../components/AccountBalanceCard';
 import OrderDialog from '../components/OrderDialog';
@@ -31,10 +31,13 @@ export default function BrokerageOrders() {
   const queryClient = useQueryClient();
   const [orderDialogOpen, setOrderDialogOpen] = useState(false);
 
-  const { data: orders, isLoading } = useQuery({
+  const { data, isLoading, hasNextPage, fetchNextPage, isFetchingNextPage } = useInfiniteQuery({
     queryKey: ['orders'],
-    queryFn: api.getOrders,
+    queryFn: ({ pageParam }) => api.getOrders(pageParam),
+    initialPageParam: undefined as string | undefined,
+    getNextPageParam: (lastPage) => lastPage.nextCursor ?? undefined,
   });
+  const orders = data?.pages.flatMap((page) => page.items);
 
   const { data: balance, isLoading: balanceLoading } = useQuery({
     queryKey: ['brokerageBalance'],
@@ -122,6 +125,14 @@ export default function BrokerageOrders() {
         ))
       )}
 
+      {hasNextPage && (
+        <Box display="flex" justifyContent="center" mt={1}>
+          <Button onClick={() => fetchNextPage()} disabled={isFetchingNextPage}>
+            {isFetchingNextPage ? '読み込み中...' : 'さらに読み込む'}
+          </Button>
+        </Box>
+      )}
+
       <Fab
         color="primary"
         sx={{ position: 'fixed', bottom: 72, right: 16 }}
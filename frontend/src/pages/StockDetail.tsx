@@ -79,16 +79,29 @@ export default function StockDetail() {
     },
   });
 
+  // 詳細・チャート・指値提案を1リクエストで取得し、チャートと指値提案はそれぞれのキャッシュに入れる
   const { data: stock, isLoading: stockLoading, error: stockError } = useQuery({
     queryKey: ['stock', code],
-    queryFn: () => api.getStockDetail(code!),
+    queryFn: async () => {
+      const dashboard = await api.getDashboard([code!], ['detail', 'chart', 'suggestions'], period);
+      queryClient.setQueryData(['chart', code, period], dashboard.charts?.[code!] ?? []);
+      if (dashboard.suggestions?.[code!]) {
+        queryClient.setQueryData(['priceSuggestions', code], dashboard.suggestions[code!]);
+      }
+      const detail = dashboard.details?.[code!];
+      if (!detail) {
+        throw new Error('API Error: 404');
+      }
+      return detail;
+    },
     enabled: !!code,
   });
 
+  // 期間を切り替えたときだけチャートを個別に取得する
   const { data: chartData, isLoading: chartLoading } = useQuery({
     queryKey: ['chart', code, period],
     queryFn: () => api.getChartData(code!, period),
-    enabled: !!code,
+    enabled: !!code && !!stock,
   });
 
   if (stockLoading) {
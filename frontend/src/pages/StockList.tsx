@@ -64,7 +64,7 @@ export default function StockList() {
 
   const { data: stocks, isLoading, error } = useQuery({
     queryKey: ['stocks'],
-    queryFn: api.getStocks,
+    queryFn: async () => (await api.getDashboard([], ['stocks'])).stocks ?? [],
   });
 
   const { data: brokerHealth } = useQuery<BrokerageHealth>({
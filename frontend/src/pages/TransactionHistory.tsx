@@ -7,19 +7,23 @@ import {
   Chip,
   CircularProgress,
   Alert,
+  Button,
 } from '@mui/material';
 import { Delete } from '@mui/icons-material';
-import { useQuery, useMutation, useQueryClient } from '@tanstack/react-query';
+import { useInfiniteQuery, useMutation, useQueryClient } from '@tanstack/react-query';
 import { api } from '../api/client';
 import type { Transaction } from '../types';
 
 export default function TransactionHistory() {
   const queryClient = useQueryClient();
 
-  const { data: transactions, isLoading, error } = useQuery({
+  const { data, isLoading, error, hasNextPage, fetchNextPage, isFetchingNextPage } = useInfiniteQuery({
     queryKey: ['transactions'],
-    queryFn: api.getTransactions,
+    queryFn: ({ pageParam }) => api.getTransactions(pageParam),
+    initialPageParam: undefined as string | undefined,
+    getNextPageParam: (lastPage) => lastPage.nextCursor ?? undefined,
   });
+  const transactions = data?.pages.flatMap((page) => page.items);
 
   const deleteMutation = useMutation({
     mutationFn: api.deleteTransaction,
@@ -119,6 +123,14 @@ export default function TransactionHistory() {
           </Card>
         ))
       )}
+
+      {hasNextPage && (
+        <Box display="flex" justifyContent="center" mt={1}>
+          <Button onClick={() => fetchNextPage()} disabled={isFetchingNextPage}>
+            {isFetchingNextPage ? '読み込み中...' : 'さらに読み込む'}
+          </Button>
+        </Box>
+      )}
     </Box>
   );
 }
@@ -113,6 +113,12 @@ export interface Transaction {
   memo?: string;
 }
 
+// カーソルページング（次ページのカーソルは X-Next-Cursor ヘッダ、最終ページは null）
+export interface CursorPage<T> {
+  items: T[];
+  nextCursor: string | null;
+}
+
 // 取引リクエスト
 export interface TransactionRequest {
   code: string;
@@ -224,6 +230,17 @@ export interface PriceSuggestions {
   suggestions: PriceSuggestion[];
 }
 
+// 一覧・詳細ページの一括取得（要求したセクションのみ。銘柄別は 銘柄コード → 値）
+export type DashboardSection = 'stocks' | 'detail' | 'chart' | 'checklist' | 'suggestions';
+
+export interface Dashboard {
+  stocks: Stock[] | null;
+  details: Record<string, StockDetail> | null;
+  charts: Record<string, ChartData[]> | null;
+  checklists: Record<string, Checklist> | null;
+  suggestions: Record<string, PriceSuggestions> | null;
+}
+
 // バックテスト
 export interface BacktestSummary {
   id: number;
@@ -274,6 +291,19 @@ export interface BacktestSnapshot {
   cash: number;
 }
 
+export interface BacktestCurveSeries {
+  id: number;
+  name: string;
+  dates: string[];
+  values: number[];  // 初期資金=1.0 の指数
+}
+
+export interface BacktestCompareCurves {
+  startDate: string | null;
+  endDate: string | null;
+  series: BacktestCurveSeries[];
+}
+
 // 証券API
 export interface BrokerageHealth {
   status: 'connected' | 'disconnected' | 'auth_error' | 'error' | 'unknown';